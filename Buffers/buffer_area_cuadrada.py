@@ -5,6 +5,8 @@
     - A partir de una capa de puntos, genera cuadrados centrados en cada punto
     - Cada cuadrado tiene el área o tamaño definido por el usuario
     - Los cuadrados se agregan como una nueva capa de polígonos en el proyecto QGIS
+    - Los vértices se calculan para todos los puntos a la vez (ver `comun/rectangulos.py`);
+      para rectángulos o lados/ángulos leídos de un campo, ver `buffer_area_rectangular.py`
 
  Uso:
     1. Abrir un proyecto en QGIS con una capa de puntos cargada
@@ -19,58 +21,51 @@
 Autor: 95devFran (https://github.com/95devFran)
 """
 
-from qgis.core import (
-    QgsProject, QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY, QgsField
-)
-from PyQt5.QtCore import QVariant
+import sys
+
+from qgis.core import QgsProject
 import math
 
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun import medicion
+from comun.rectangulos import generar_rectangulos
+
 #  Nombre de la capa de puntos sobre la que vas a crear el buffer
 nombre_capa_puntos = "nombre de capa de puntos"
 
 #  Lado del cuadrado (en unidades del CRS, por ejemplo, metros si el CRS es proyectado)
+#  También puede ser el nombre de un campo numérico de la capa de puntos
 lado = math.sqrt(199.9480)  # Aproximadamente 14.14 m para un área de 199.9480 m²
 
+# Salida: None crea una capa temporal en memoria; con la ruta de un GeoPackage (.gpkg) o
+# FlatGeobuf (.fgb) los resultados se escriben directamente en ese fichero por lotes, en una
+# sola transacción y con el índice espacial creado al final (ver comun/salidas.py)
+ruta_salida = None
+
+# Medición de tiempos, llamadas y memoria por fase (ver comun/medicion.py);
+# ruta_traza guarda además una traza JSON para chrome://tracing
+medir = False
+ruta_traza = None
+
 #  Buscar la capa en el proyecto actual
 capa_puntos = QgsProject.instance().mapLayersByName(nombre_capa_puntos)
 
-if not capa_puntos:e
+if not capa_puntos:
     print(f"No se encontró ninguna capa llamada '{nombre_capa_puntos}'. Verifica el nombre.")
 else:
     capa_puntos = capa_puntos[0]  # Selecciona la primera coincidencia
 
-    #  Crear una nueva capa vectorial de polígonos en memoria, con el mismo CRS
-    uri = "Polygon?crs=" + capa_puntos.crs().authid()
-    capa_poligonos = QgsVectorLayer(uri, "cuadrados_buffer", "memory")
-    prov = capa_poligonos.dataProvider()
-
-    #  Agregar campo ID a la capa de salida
-    prov.addAttributes([QgsField("ID", QVariant.Int)])
-    capa_poligonos.updateFields()
-
-    #  Crear un cuadrado centrado en cada punto
-    nueva_entidad_id = 1
-    for feature in capa_puntos.getFeatures():
-        x, y = feature.geometry().asPoint().x(), feature.geometry().asPoint().y()
-
-        # Definir las coordenadas de los vértices del cuadrado
-        poligono = QgsGeometry.fromPolygonXY([[
-            QgsPointXY(x - lado / 2, y - lado / 2),
-            QgsPointXY(x + lado / 2, y - lado / 2),
-            QgsPointXY(x + lado / 2, y + lado / 2),
-            QgsPointXY(x - lado / 2, y + lado / 2),
-            QgsPointXY(x - lado / 2, y - lado / 2)
-        ]])
-
-        # Crear la nueva entidad poligonal y asignar atributos
-        nueva_feature = QgsFeature()
-        nueva_feature.setGeometry(poligono)
-        nueva_feature.setAttributes([nueva_entidad_id])
-        prov.addFeatures([nueva_feature])
-        nueva_entidad_id += 1
-
-    #  Actualizar la capa y añadirla al proyecto
-    capa_poligonos.updateExtents()
+    #  Crear un cuadrado centrado en cada punto en una nueva capa, con el mismo CRS
+    with medicion.sesion("buffer_area_cuadrada", activa=medir, traza=ruta_traza):
+        capa_poligonos = generar_rectangulos(
+            capa_puntos, lado, nombre_salida="cuadrados_buffer", destino=ruta_salida
+        )
+
+    #  Añadir la capa al proyecto
     QgsProject.instance().addMapLayer(capa_poligonos)
 
-    print(f" Se generaron {nueva_entidad_id - 1} polígonos cuadrados como buffer.")
+    print(f" Se generaron {capa_poligonos.featureCount()} polígonos cuadrados como buffer.")
@@ -3,13 +3,17 @@
 
  ¿Qué hace?
     - A partir de una capa de puntos, genera rectángulos centrados en cada punto.
-    - Cada rectángulo tiene dimensiones fijas (ancho x alto) definidas por el usuario.
-    - Se crea una nueva capa de polígonos en memoria y se añade al proyecto.
+    - Cada rectángulo tiene dimensiones (ancho x alto) y giro definidos por el usuario:
+      valores fijos o el nombre de un campo numérico de la capa de puntos.
+    - Se crea una nueva capa de polígonos (en memoria, o en un GeoPackage/FlatGeobuf con
+      `ruta_salida` para salidas muy grandes) y se añade al proyecto.
+    - Los vértices se calculan para todos los puntos a la vez con NumPy y las geometrías
+      se añaden en lotes grandes (ver `comun/rectangulos.py`).
 
  Uso:
     1. Abre un proyecto de QGIS con una capa de puntos cargada.
     2. Modifica el valor de `nombre_capa_puntos` por el nombre exacto de la capa.
-    3. Ajusta los valores de `ancho` y `alto` según tus necesidades (en unidades del CRS).
+    3. Ajusta los valores de `ancho`, `alto` y `angulo` según tus necesidades (en unidades del CRS).
     4. Ejecuta el script en la consola de Python de QGIS.
 
  Requisitos:
@@ -19,17 +23,36 @@
 Autor: 95devFran (https://github.com/95devFran)
 """
 
-from qgis.core import (
-    QgsProject, QgsVectorLayer, QgsFeature, QgsGeometry, QgsPointXY, QgsField
-)
-from PyQt5.QtCore import QVariant
+import sys
+
+from qgis.core import QgsProject
+
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun import medicion
+from comun.rectangulos import generar_rectangulos
 
 #  Nombre de la capa de puntos sobre la que se crea el buffer
 nombre_capa_puntos = "nombre de la capa"
 
 #  Dimensiones del rectángulo (en unidades del CRS, p. ej., metros)
+#  Cada valor puede ser un número o el nombre de un campo numérico de la capa
 ancho = 4       # Ej. 4 metros de ancho
 alto = 2.5      # Ej. 2.5 metros de alto
+angulo = 0      # Giro en grados, en sentido antihorario (0 = alineado con los ejes)
+
+# Salida: None crea una capa temporal en memoria; con la ruta de un GeoPackage (.gpkg) o
+# FlatGeobuf (.fgb) los resultados se escriben directamente en ese fichero por lotes, en una
+# sola transacción y con el índice espacial creado al final (ver comun/salidas.py)
+ruta_salida = None
+
+# Medición de tiempos, llamadas y memoria por fase (ver comun/medicion.py);
+# ruta_traza guarda además una traza JSON para chrome://tracing
+medir = False
+ruta_traza = None
 
 #  Buscar la capa de puntos en el proyecto
 capa_puntos = QgsProject.instance().mapLayersByName(nombre_capa_puntos)
@@ -39,38 +62,13 @@ if not capa_puntos:
 else:
     capa_puntos = capa_puntos[0]
 
-    #  Crear una nueva capa de polígonos en memoria con el mismo CRS
-    uri = "Polygon?crs=" + capa_puntos.crs().authid()
-    capa_poligonos = QgsVectorLayer(uri, "rectangulos_buffer", "memory")
-    prov = capa_poligonos.dataProvider()
-
-    #  Agregar un campo ID a la capa de salida
-    prov.addAttributes([QgsField("ID", QVariant.Int)])
-    capa_poligonos.updateFields()
-
-    #  Crear rectángulos centrados en cada punto de entrada
-    nueva_entidad_id = 1
-    for feature in capa_puntos.getFeatures():
-        x, y = feature.geometry().asPoint().x(), feature.geometry().asPoint().y()
-
-        # Definir los vértices del rectángulo
-        poligono = QgsGeometry.fromPolygonXY([[ 
-            QgsPointXY(x - ancho / 2, y - alto / 2),
-            QgsPointXY(x + ancho / 2, y - alto / 2),
-            QgsPointXY(x + ancho / 2, y + alto / 2),
-            QgsPointXY(x - ancho / 2, y + alto / 2),
-            QgsPointXY(x - ancho / 2, y - alto / 2)  # Cierre del polígono
-        ]])
-
-        # Crear la nueva entidad y agregarla a la capa
-        nueva_feature = QgsFeature()
-        nueva_feature.setGeometry(poligono)
-        nueva_feature.setAttributes([nueva_entidad_id])
-        prov.addFeatures([nueva_feature])
-        nueva_entidad_id += 1
-
-    #  Actualizar la capa y agregarla al proyecto
-    capa_poligonos.updateExtents()
+    #  Crear rectángulos centrados en cada punto en una capa nueva con el mismo CRS
+    with medicion.sesion("buffer_area_rectangular", activa=medir, traza=ruta_traza):
+        capa_poligonos = generar_rectangulos(
+            capa_puntos, ancho, alto, angulo, nombre_salida="rectangulos_buffer", destino=ruta_salida
+        )
+
+    #  Agregar la capa al proyecto
     QgsProject.instance().addMapLayer(capa_poligonos)
 
-    print(f" Se generaron {nueva_entidad_id - 1} rectángulos en la capa 'rectangulos_buffer'.")
+    print(f" Se generaron {capa_poligonos.featureCount()} rectángulos en la capa 'rectangulos_buffer'.")
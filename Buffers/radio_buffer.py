@@ -1,26 +1,54 @@
+import sys
+
 from qgis.core import QgsProject
 
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun import medicion
+from comun.cache_indices import CacheIndices
+from comun.radio import seleccionar_en_radio
+
 # Obtener capas por nombre
 capa_radio = QgsProject.instance().mapLayersByName("layer2")[0]
 capa_principal = QgsProject.instance().mapLayersByName("layer1")[0]
 
 radio = 700  # metros
 
-# Obtener el único punto
-feat_punto = next(capa_radio.getFeatures())
-geom_punto = feat_punto.geometry()
+# Se usan todos los puntos de capa_radio como centros; con una sola
+# selección (union = True) se seleccionan los elementos de todos los radios
+union = True
 
-# Crear buffer
-buffer_geom = geom_punto.buffer(radio, 20)
+# Caché en disco del índice de la capa principal (ver comun/cache_indices.py): si la
+# capa no ha cambiado desde la ejecución anterior no se vuelve a leer ni a indexar.
+# carpeta_cache = None usa ~/.cache/pyqgis-scripts/indices (o PYQGIS_CACHE_INDICES)
+usar_cache_indices = True
+carpeta_cache = None
+
+# Medición de tiempos, llamadas y memoria por fase (ver comun/medicion.py);
+# ruta_traza guarda además una traza JSON para chrome://tracing
+medir = False
+ruta_traza = None
 
 # Limpiar selección previa
 capa_principal.removeSelection()
 
-ids_dentro = []
-
-for feat in capa_principal.getFeatures():
-    if buffer_geom.contains(feat.geometry()):
-        ids_dentro.append(feat.id())
+# Buscar los elementos dentro del radio: prefiltro por rectángulo, distancia
+# al cuadrado y test exacto con el buffer solo en el borde del círculo
+with medicion.sesion("radio_buffer", activa=medir, traza=ruta_traza):
+    resultado = seleccionar_en_radio(
+        capa_principal, capa_radio, radio, union=union,
+        cache=CacheIndices(carpeta_cache) if usar_cache_indices else None
+    )
+
+if union:
+    ids_dentro = resultado.tolist()
+else:
+    for id_centro, ids in resultado.items():
+        print(f"Punto {id_centro}: {len(ids)} elementos")
+    ids_dentro = sorted({fid for ids in resultado.values() for fid in ids.tolist()})
 
 # Seleccionar puntos dentro del radio
 capa_principal.selectByIds(ids_dentro)
@@ -5,11 +5,16 @@ Este script añade un nuevo campo a una capa vectorial en formato SHP
 y luego asigna valores a ese campo para cada entidad según una lógica
 personalizable (por ejemplo, a partir de un diccionario o datos externos).
 
+Los valores se buscan por clave en una tabla de búsqueda (ver `comun/uniones.py`)
+que puede ser un diccionario, un CSV u otra capa, y se pueden actualizar varios
+campos a la vez.
+
 Funcionalidades:
 - Verifica que la capa exista y sea válida.
 - Añade un campo nuevo con el nombre, tipo y longitud definidos.
 - Actualiza la capa con el nuevo campo.
-- Recorre las entidades y asigna valores personalizados a ese campo.
+- Recorre las entidades (leyendo solo el campo clave) y asigna los valores
+  de la tabla de búsqueda, escribiendo por lotes.
 - Guarda los cambios realizados en la capa.
 
 Requisitos:
@@ -21,11 +26,19 @@ Requisitos:
 
 from qgis.core import (
     QgsVectorLayer,
-    QgsField,
-    edit
+    QgsField
 )
 from PyQt5.QtCore import QVariant
 import os
+import sys
+
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun import medicion
+from comun.uniones import actualizar_por_clave
 
 # --- CONFIGURACIÓN ---
 
@@ -34,14 +47,31 @@ new_field_name = "NUEVO_CAMPO"           # Nombre del campo a crear
 new_field_type = QVariant.String         # Tipo del campo (ejemplo: String)
 new_field_length = 20                    # Longitud del campo (para campos string)
 
-# Diccionario ejemplo para asignar valores al campo nuevo:
-# Clave: ID o atributo único de la entidad (por ejemplo, 'id' o 'nombre')
-# Valor: valor a asignar en el nuevo campo
+# Campo de la capa con la clave para buscar los valores (por ejemplo, 'id' o 'nombre')
+key_field_name = "id"
+
+# Fuente de los valores. Puede ser:
+# - Un diccionario {clave: valor} para rellenar solo el campo nuevo (ejemplo de abajo)
+# - La ruta a un CSV con cabecera, p. ej. r"RUTA/A/VALORES.csv"
+# - Otra capa (QgsVectorLayer)
 values_dict = {
     "entidad_1": "valor_1",
     "entidad_2": "valor_2",
     # ...
 }
+lookup_source = values_dict
+
+# Campo clave en la fuente (CSV o capa); None si se llama igual que key_field_name
+lookup_key_field = None
+
+# Campos a actualizar. Con un diccionario {clave: valor}, el nombre del campo destino.
+# Con un CSV u otra capa, {campo_origen: campo_destino}, p. ej. {"material": "MAT", "dn": "DN"}
+fields_to_update = new_field_name
+
+# Medición de tiempos, llamadas y memoria por fase (ver comun/medicion.py);
+# ruta_traza guarda además una traza JSON para chrome://tracing
+medir = False
+ruta_traza = None
 
 # --- FIN DE CONFIGURACIÓN ---
 
@@ -56,30 +86,24 @@ else:
         print("Error al cargar la capa vectorial.")
     else:
         # Añadir nuevo campo si no existe
-        existing_fields = [field.name() for field in layer.fields()]
+        existing_fields = layer.fields().names()
         if new_field_name not in existing_fields:
-            layer.startEditing()
             new_field = QgsField(new_field_name, new_field_type, len=new_field_length)
             layer.dataProvider().addAttributes([new_field])
+            # Actualizar la capa para reflejar el nuevo campo (sin volver a cargarla)
             layer.updateFields()
-            layer.commitChanges()
             print(f"Campo '{new_field_name}' añadido correctamente.")
         else:
             print(f"El campo '{new_field_name}' ya existe en la capa.")
 
-        # Actualizar la capa para reflejar el nuevo campo
-        layer = QgsVectorLayer(shapefile_path, "CapaBase", "ogr")
-
-        # Asignar valores al nuevo campo según values_dict
-        field_idx = layer.fields().indexFromName(new_field_name)
-        if field_idx == -1:
-            print(f"No se encontró el campo '{new_field_name}' para asignar valores.")
+        # Asignar valores buscando la clave de cada entidad en la fuente
+        try:
+            with medicion.sesion("crear-campo-add-valores", activa=medir, traza=ruta_traza):
+                resultado = actualizar_por_clave(
+                    layer, lookup_source, key_field_name, fields_to_update, lookup_key_field
+                )
+        except ValueError as error:
+            print(f"No se pudieron asignar los valores: {error}")
         else:
-            with edit(layer):
-                for feature in layer.getFeatures():
-                    # Aquí se debe definir la clave para buscar en values_dict,
-                    # por ejemplo un campo identificador único:
-                    key = feature["id"] if "id" in layer.fields().names() else None
-                    if key and key in values_dict:
-                        layer.changeAttributeValue(feature.id(), field_idx, values_dict[key])
-            print(f"Valores asignados correctamente al campo '{new_field_name}'.")
+            print(f"Valores asignados correctamente: {resultado.actualizadas} entidades actualizadas, "
+                  f"{resultado.sin_coincidencia} sin coincidencia en la fuente.")
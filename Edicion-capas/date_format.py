@@ -1,16 +1,36 @@
-from datetime import datetime
+import sys
 from qgis.core import (
     QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterFileDestination,
+    QgsProcessingParameterString,
     QgsProcessingParameterVectorLayer,
     QgsProcessingParameterField,
-    QgsField,
-    edit
+    QgsField
 )
 from PyQt5.QtCore import QVariant
 
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun import medicion
+from comun.fechas import AvisoProgreso, FORMATO_SALIDA, FORMATOS_ENTRADA, convertir_campo_fecha
+
 class ConvertirEpochAFecha(QgsProcessingAlgorithm):
-    INPUT       = 'INPUT'
-    CAMPO_EPOCH = 'CAMPO_EPOCH'
+    INPUT          = 'INPUT'
+    CAMPO_EPOCH    = 'CAMPO_EPOCH'
+    FORMATOS       = 'FORMATOS'
+    UNIDAD         = 'UNIDAD'
+    FORMATO_SALIDA = 'FORMATO_SALIDA'
+    HORA_UTC       = 'HORA_UTC'
+    MEDIR          = 'MEDIR'
+    TRAZA          = 'TRAZA'
+
+    UNIDADES = ['s', 'ms']
 
     def initAlgorithm(self, config=None):
         self.addParameter(
@@ -23,36 +43,86 @@ class ConvertirEpochAFecha(QgsProcessingAlgorithm):
                 parentLayerParameterName=self.INPUT
             )
         )
+        self.addParameter(
+            QgsProcessingParameterString(
+                self.FORMATOS,
+                'Formatos de texto admitidos (separados por ;)',
+                defaultValue=';'.join(FORMATOS_ENTRADA)
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterEnum(
+                self.UNIDAD,
+                'Unidad del epoch',
+                options=['Segundos', 'Milisegundos'],
+                defaultValue=0
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterString(
+                self.FORMATO_SALIDA,
+                'Formato de salida',
+                defaultValue=FORMATO_SALIDA
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.HORA_UTC,
+                'Dejar los epoch en UTC (si no, hora local)',
+                defaultValue=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.MEDIR,
+                'Informar de tiempos, llamadas y memoria por fase',
+                defaultValue=False
+            )
+        )
+        self.addParameter(
+            QgsProcessingParameterFileDestination(
+                self.TRAZA,
+                'Traza de tiempos (Chrome trace JSON)',
+                fileFilter='JSON (*.json)',
+                optional=True,
+                createByDefault=False
+            )
+        )
 
     def processAlgorithm(self, parameters, context, feedback):
         capa        = self.parameterAsVectorLayer(parameters, self.INPUT, context)
         campo_epoch = self.parameterAsString(parameters, self.CAMPO_EPOCH, context)
-        idx         = capa.fields().indexOf(campo_epoch)
-        total       = capa.featureCount()
-
-        with edit(capa):
-            for i, feature in enumerate(capa.getFeatures()):
-                if feedback.isCanceled():
-                    break
-                feedback.setProgress(int(i / total * 100))
-
-                try:
-                    valor = feature[campo_epoch]
-
-                    # Intenta primero como epoch numérico
-                    try:
-                        dt = datetime.fromtimestamp(float(valor))
-                    except:
-                        # Si falla, intenta parsear el texto que ya hay
-                        dt = datetime.strptime(str(valor), '%Y-%m-%d %H:%M:%S')
-
-                    fecha_str = dt.strftime('%d/%m/%Y %H:%M:%S')
-                    capa.changeAttributeValue(feature.id(), idx, fecha_str)
-                except:
-                    pass  # NULL, vacío o cualquier error → lo salta
+        formatos    = [f for f in self.parameterAsString(parameters, self.FORMATOS, context).split(';') if f]
+        unidad      = self.UNIDADES[self.parameterAsEnum(parameters, self.UNIDAD, context)]
+        salida      = self.parameterAsString(parameters, self.FORMATO_SALIDA, context)
+        hora_utc    = self.parameterAsBoolean(parameters, self.HORA_UTC, context)
+        medir       = self.parameterAsBoolean(parameters, self.MEDIR, context)
+        traza       = self.parameterAsFileOutput(parameters, self.TRAZA, context)
 
+        if capa.fields().field(campo_epoch).type() != QVariant.String:
+            raise QgsProcessingException(
+                f"El campo '{campo_epoch}' no es de texto: la fecha formateada no cabe en él."
+            )
+
+        # El progreso solo se actualiza cuando cambia el porcentaje
+        progreso = AvisoProgreso(feedback.setProgress, feedback.isCanceled)
+        with medicion.sesion(self.name(), activa=medir or bool(traza),
+                             informar=feedback.pushInfo, traza=traza or None):
+            resultado = convertir_campo_fecha(
+                capa, campo_epoch, formatos or FORMATOS_ENTRADA, unidad, salida,
+                hora_local=not hora_utc, progreso=progreso
+            )
+
+        feedback.pushInfo(
+            f"{resultado.convertidas} valores convertidos ({resultado.numericas} epoch, "
+            f"{resultado.textos} textos); {resultado.nulos} nulos o vacíos saltados"
+        )
+        if resultado.no_interpretables:
+            feedback.reportError(
+                f"{resultado.no_interpretables} valores no se pudieron interpretar y no se han modificado."
+            )
         feedback.pushInfo("¡Proceso completado!")
-        return {}
+        return {self.TRAZA: traza} if traza else {}
 
     def name(self):           return 'convertir_epoch_a_fecha'
     def displayName(self):    return 'Formato fecha correcto'
@@ -4,7 +4,8 @@ Editor de campos en capas de QGIS mediante interfaz gráfica.
 Este script abre una ventana en QGIS donde puedes:
 1. Seleccionar una capa cargada en el proyecto.
 2. Cargar y seleccionar uno de sus campos existentes para editar.
-3. Introducir un valor que se asignará a todas las entidades de la capa en ese campo.
+3. Introducir un valor que se asignará a todas las entidades de la capa en ese campo
+   (o solo a las seleccionadas, o a las que cumplan una expresión).
 4. Si el campo seleccionado no existe, te preguntará si deseas crearlo (como campo texto).
 5. Aplicar los cambios sin cerrar la ventana, permitiendo editar otros campos o valores de forma iterativa.
 
@@ -15,26 +16,66 @@ El proceso es:
 - Escribe el valor que deseas asignar.
 - Presiona en "Aplicar valor a todas las entidades".
 - El campo se actualiza con ese valor para todas las entidades.
+- Las entidades a editar se recorren en segundo plano (QgsTask), con barra de progreso
+  y botón para cancelar, y los cambios se aplican al terminar en el hilo principal.
 - Puedes repetir la operación para otros campos o valores sin cerrar la ventana.
 
 Esta herramienta facilita la edición rápida de varios campos en capas vectoriales dentro de QGIS.
 """
 
+import sys
+
 from qgis.core import (
+    QgsApplication,
     QgsProject,
     QgsField,
-    QgsVectorLayer
+    QgsTask,
+    QgsVectorLayer,
+    QgsVectorLayerFeatureSource
 )
 from PyQt5.QtCore import QVariant
 from PyQt5.QtWidgets import (
-    QDialog, QVBoxLayout, QLabel, QComboBox, QLineEdit, QPushButton, QMessageBox
+    QDialog, QVBoxLayout, QLabel, QComboBox, QLineEdit, QPushButton, QMessageBox, QProgressBar
 )
 
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun.asignacion import RecogidaFids, aplicar_bloques, peticion_fids
+from comun.escritura import EscritorAtributos, ruta_geopackage
+
+class TareaAsignarValor(QgsTask):
+    """Recorre en segundo plano las entidades a editar; los cambios se aplican en `finished`."""
+
+    def __init__(self, layer, request, total, on_finished):
+        super().__init__(f"Asignar valor en '{layer.name()}'", QgsTask.CanCancel)
+        # La fuente se crea en el hilo principal y se puede leer desde el hilo de la tarea
+        self.source = QgsVectorLayerFeatureSource(layer)
+        self.request = request
+        self.recogida = RecogidaFids(total)
+        self.on_finished = on_finished
+        # Excepción de `run`, si la hubo (para distinguir un fallo de una cancelación)
+        self.error = None
+
+    def run(self):
+        try:
+            fids = (feature.id() for feature in self.source.getFeatures(self.request))
+            return self.recogida.ejecutar(fids, self.setProgress, self.isCanceled)
+        except Exception as error:
+            self.error = error
+            return False
+
+    def finished(self, result):
+        self.on_finished(result, self)
+
 class EditLayerDialog(QDialog):
     def __init__(self):
         super().__init__()
         self.setWindowTitle("Editor de campos en capa")
         self.setGeometry(300, 300, 400, 200)
+        self.task = None
         
         layout = QVBoxLayout()
         
@@ -63,11 +104,36 @@ class EditLayerDialog(QDialog):
         layout.addWidget(self.value_label)
         layout.addWidget(self.value_input)
         
+        # Entidades a editar
+        self.mode_label = QLabel("Entidades a modificar:")
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItem("Todas las entidades", "todas")
+        self.mode_combo.addItem("Solo las entidades seleccionadas", "seleccionadas")
+        self.mode_combo.addItem("Las que cumplan una expresión", "expresion")
+        self.expression_input = QLineEdit()
+        self.expression_input.setPlaceholderText("Ejemplo: \"DN\" > 100 AND \"MATERIAL\" = 'PVC'")
+        self.expression_input.setEnabled(False)
+        self.mode_combo.currentIndexChanged.connect(
+            lambda: self.expression_input.setEnabled(self.mode_combo.currentData() == "expresion")
+        )
+        layout.addWidget(self.mode_label)
+        layout.addWidget(self.mode_combo)
+        layout.addWidget(self.expression_input)
+        
         # Botón para aplicar cambios
-        self.apply_button = QPushButton("Aplicar valor a todas las entidades")
+        self.apply_button = QPushButton("Aplicar valor a las entidades")
         self.apply_button.clicked.connect(self.apply_value)
         layout.addWidget(self.apply_button)
         
+        # Progreso y cancelación del trabajo en segundo plano
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.cancel_button = QPushButton("Cancelar")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_task)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.cancel_button)
+        
         self.setLayout(layout)
     
     def load_fields(self):
@@ -111,42 +177,90 @@ class EditLayerDialog(QDialog):
                 QMessageBox.Yes | QMessageBox.No
             )
             if res == QMessageBox.Yes:
-                layer.startEditing()
                 new_field = QgsField(field_name, QVariant.String)
                 layer.dataProvider().addAttributes([new_field])
                 layer.updateFields()
-                layer.commitChanges()
                 QMessageBox.information(self, "Campo creado", f"Campo '{field_name}' creado correctamente.")
             else:
                 return
         
-        # Asignar valor a todas las entidades en modo edición
-        if not layer.isEditable():
-            layer.startEditing()
-        
         field_idx = layer.fields().indexFromName(field_name)
+        escritor = EscritorAtributos(layer)
+        
+        # El valor se convierte al tipo del campo una sola vez, antes de recorrer nada
+        try:
+            escritor.convertir(field_idx, value)
+        except ValueError as error:
+            QMessageBox.warning(self, "Error", str(error))
+            return
+        
+        mode = self.mode_combo.currentData()
         
-        with edit(layer):
-            for feature in layer.getFeatures():
-                # Intentar convertir valor si campo es numérico
-                field_type = layer.fields().field(field_idx).type()
-                if field_type in [QVariant.Int, QVariant.Double]:
-                    try:
-                        if field_type == QVariant.Int:
-                            val = int(value)
-                        else:
-                            val = float(value)
-                    except ValueError:
-                        QMessageBox.warning(self, "Error", f"El valor para '{field_name}' debe ser numérico.")
-                        return
-                else:
-                    val = value
-                
-                layer.changeAttributeValue(feature.id(), field_idx, val)
+        # Todas las entidades de un GeoPackage: un único UPDATE, no hace falta recorrerlas
+        if mode == "todas" and not layer.isEditable() and ruta_geopackage(layer) is not None:
+            try:
+                escritor.asignar_constante(field_idx, value)
+            except RuntimeError as error:
+                QMessageBox.critical(self, "Error", f"No se pudieron guardar los cambios: {error}")
+                return
+            self.finish_edit(layer, field_name, value, escritor)
+            return
         
+        try:
+            request = peticion_fids(
+                layer.fields(), mode, layer.selectedFeatureIds(), self.expression_input.text()
+            )
+        except ValueError as error:
+            QMessageBox.warning(self, "Atención", str(error))
+            return
+        total = layer.selectedFeatureCount() if mode == "seleccionadas" else layer.featureCount()
+        
+        # Recorrer las entidades en segundo plano sin bloquear QGIS
+        self.task = TareaAsignarValor(
+            layer, request, total,
+            lambda ok, task: self.on_task_finished(ok, task, layer, field_idx, field_name, value)
+        )
+        self.task.progressChanged.connect(lambda progress: self.progress_bar.setValue(int(progress)))
+        self.set_running(True)
+        QgsApplication.taskManager().addTask(self.task)
+    
+    def cancel_task(self):
+        if self.task is not None:
+            self.task.cancel()
+    
+    def set_running(self, running):
+        self.apply_button.setEnabled(not running)
+        self.cancel_button.setEnabled(running)
+        self.progress_bar.setValue(0)
+    
+    def on_task_finished(self, ok, task, layer, field_idx, field_name, value):
+        # Se ejecuta en el hilo principal: aquí sí se puede escribir en la capa
+        self.task = None
+        self.set_running(False)
+        if not ok:
+            if task.isCanceled():
+                QMessageBox.information(self, "Cancelado", "No se ha modificado ninguna entidad.")
+            else:
+                motivo = str(task.error) if task.error is not None else "la tarea terminó con un error"
+                QMessageBox.critical(
+                    self, "Error", f"No se ha modificado ninguna entidad: {motivo}"
+                )
+            return
+        try:
+            escritor = aplicar_bloques(layer, field_idx, value, task.recogida.bloques, self.progress_bar.setValue)
+        except RuntimeError as error:
+            QMessageBox.critical(self, "Error", f"No se pudieron guardar los cambios: {error}")
+            return
+        self.finish_edit(layer, field_name, value, escritor)
+    
+    def finish_edit(self, layer, field_name, value, escritor):
         # Guardar cambios
-        if layer.commitChanges():
-            QMessageBox.information(self, "Éxito", f"Valor '{value}' asignado a todas las entidades en '{field_name}'.")
+        if not layer.isEditable() or layer.commitChanges():
+            QMessageBox.information(
+                self, "Éxito",
+                f"Valor '{value}' asignado a {escritor.entidades} entidades en '{field_name}'.\n\n"
+                f"{escritor.resumen()}"
+            )
             # Limpiar el input para facilitar nueva edición
             self.value_input.clear()
         else:
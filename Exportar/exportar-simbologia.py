@@ -5,10 +5,15 @@ Script para exportar automáticamente los estilos (.qml) de todas las capas de u
     - Recorre todas las capas cargadas en el proyecto actual
     - Guarda el estilo (simbología) de cada capa como un archivo `.qml`
     - Los archivos se guardan en la ruta especificada
+    - Solo reescribe los `.qml` cuyo estilo ha cambiado desde la última ejecución y
+      borra los de capas que ya no existen (ver `comun/estilos.py`)
+    - Opcionalmente, exporta los estilos de muchos proyectos .qgs/.qgz en paralelo
+      leyendo su XML, sin cargar sus capas (cada proyecto en su propia subcarpeta)
 
  Cómo usar:
     1. Abrir un proyecto en QGIS con las capas cargadas
     2. Modificar la variable `ruta_destino` con la carpeta de destino deseada
+       (y `rutas_proyectos` si se quieren exportar proyectos guardados)
     3. Ejecutar este script desde la consola de Python en QGIS
 
  Requisitos:
@@ -18,23 +23,38 @@ Script para exportar automáticamente los estilos (.qml) de todas las capas de u
 Autor: 95devFran (GitHub: https://github.com/95devFran)
 """
 
-import os
-from qgis.core import QgsProject
+import sys
+
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun.estilos import exportar_estilos_proyecto, exportar_estilos_proyectos
 
 # Ruta donde quieres guardar los archivos .qml (básicamente es la simbología)
 ruta_destino = r'C:/ruta/de/salida/para/qml' 
 
-# Crear la carpeta si no existe
-os.makedirs(ruta_destino, exist_ok=True)
+# Proyectos .qgs/.qgz a exportar sin abrirlos. Si la lista está vacía se usa el proyecto actual
+rutas_proyectos = []
+# Proyectos procesados a la vez. En la consola de QGIS se deja en 1 (sin procesos: en
+# Windows cada proceso arrancaría otra instancia de QGIS); para usar varios, ejecuta
+# `python -m comun.cli estilos <carpeta> <proyectos> --procesos N` fuera de QGIS
+max_procesos = 1
+
 
-# Iterar por todas las capas del proyecto
-for capa in QgsProject.instance().mapLayers().values():
-    nombre = capa.name()
-    archivo_qml = os.path.join(ruta_destino, f"{nombre}.qml")
+def informar(resultado):
+    if resultado.error:
+        print(f" Error en '{resultado.proyecto}': {resultado.error}")
+    else:
+        print(f" {resultado.proyecto}: {resultado.escritos} escritos, "
+              f"{resultado.sin_cambios} sin cambios, {resultado.eliminados} eliminados "
+              f"-> {resultado.carpeta}")
 
-    # Guardar el estilo de la capa como archivo .qml
-    capa.saveNamedStyle(archivo_qml)
 
-    print(f" Estilo de '{nombre}' guardado en: {archivo_qml}")
+if rutas_proyectos:
+    exportar_estilos_proyectos(rutas_proyectos, ruta_destino, max_procesos, al_terminar=informar)
+else:
+    informar(exportar_estilos_proyecto(ruta_destino))
 
 print("✔ Exportación de estilos completada.")
@@ -1,48 +1,72 @@
 """
-Script para exportar automáticamente todas las capas cargadas en QGIS a archivos Shapefile (.shp).
+Script para exportar automáticamente todas las capas cargadas en QGIS a archivos (GeoPackage por defecto).
 
 ¿Qué hace?
-    - Recorre todas las capas visibles en el panel de capas del proyecto actual
-    - Exporta cada capa como un archivo .shp individual
+    - Recorre todas las capas vectoriales del proyecto actual
+    - Exporta cada capa como un archivo individual (.gpkg, .shp, .geojson, .fgb...)
     - Guarda los archivos en una ruta definida por el usuario
+    - Las capas guardadas en ficheros se exportan en paralelo con `ogr2ogr`, sin bloquear
+      un único núcleo (ver `comun/exportacion.py`); las capas en memoria, las que tienen
+      ediciones sin guardar, campos virtuales o uniones, o un CRS distinto del de su fichero
+      se exportan con Processing
+    - Al final muestra el tiempo de cada capa y las que han fallado, sin detener el resto
 
  Cómo usar:
     1. Abrir un proyecto en QGIS con las capas cargadas
     2. Modificar la variable `ruta_salida` con la carpeta de destino deseada
+       (y, si hace falta, `formato`, `max_procesos` y `ejecutable_ogr2ogr`)
     3. Ejecutar este script desde la consola de Python en QGIS
 
  Requisitos:
     - QGIS 3.x
     - Plugin 'Processing' habilitado
+    - `ogr2ogr` (incluido en la instalación de QGIS, en OSGeo4W Shell o en la carpeta bin)
 
 Autor: 95devFran (GitHub: https://github.com/95devFran)
 """
 
-import os
-import processing
+import sys
+
 from qgis.core import QgsProject
 
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun.exportacion import exportar_capas
+
 # Carpeta donde se guardarán las capas exportadas
 ruta_salida = "C:/ruta/de/salida"
 
-# Crear la carpeta si no existe
-if not os.path.exists(ruta_salida):
-    os.makedirs(ruta_salida)
+# Formato de salida: "gpkg", "shp", "geojson", "fgb", "csv" o "kml"
+formato = "gpkg"
+
+# Exportaciones simultáneas (None = una por núcleo)
+max_procesos = None
+
+# Ejecutable de ogr2ogr (ruta completa si no está en el PATH)
+ejecutable_ogr2ogr = "ogr2ogr"
+
+
+def informar(resultado):
+    if resultado.error:
+        print(f"✖ Capa '{resultado.nombre}' falló ({resultado.segundos:.1f} s): {resultado.error}")
+    else:
+        print(f"Capa '{resultado.nombre}' exportada a: {resultado.destino} ({resultado.segundos:.1f} s)")
+
 
 # Obtener todas las capas cargadas en el proyecto
 proyecto = QgsProject.instance()
 capas = proyecto.mapLayers().values()
 
-# Exportar cada capa como Shapefile
-for capa in capas:
-    nombre_capa = capa.name()
-    nombre_archivo = os.path.join(ruta_salida, f"{nombre_capa}.shp")
-
-    processing.run("native:savefeatures", {
-        'INPUT': capa,
-        'OUTPUT': nombre_archivo
-    })
-
-    print(f"Capa '{nombre_capa}' exportada a: {nombre_archivo}")
+# Exportar las capas en paralelo
+resultados = exportar_capas(
+    capas, ruta_salida, formato=formato, max_procesos=max_procesos,
+    ejecutable_ogr2ogr=ejecutable_ogr2ogr, al_terminar=informar
+)
 
-print("Exportación completada.")
+fallidas = [r for r in resultados if r.error]
+print(f"Exportación completada: {len(resultados) - len(fallidas)} capas exportadas, {len(fallidas)} con errores.")
+for resultado in fallidas:
+    print(f"  - {resultado.nombre}: {resultado.error}")
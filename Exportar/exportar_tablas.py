@@ -2,28 +2,45 @@
 # -*- coding: utf-8 -*-
 
 """
-Exporta campos específicos de una capa cargada en QGIS a un archivo CSV.
+Exporta campos específicos de una capa cargada en QGIS a un archivo CSV (o Parquet).
 
 Este script toma como entrada:
 - El nombre de una capa cargada en el proyecto.
 - Una lista de campos deseados a exportar.
-- La ruta de salida del archivo CSV.
+- La ruta de salida del archivo CSV (si termina en .parquet se exporta a Parquet).
+
+Solo se leen los campos pedidos, sin geometría, y las filas se escriben por bloques,
+de modo que la memoria no crece con el tamaño de la capa (ver `comun/tablas.py`).
 
 Requisitos:
 - Ejecutar dentro del entorno de QGIS (PyQGIS).
 - La capa debe estar previamente cargada en el proyecto.
+- Para exportar a Parquet: pyarrow instalado en el Python de QGIS.
 
 Autor: 95devFran 
 """
 
-import os
-import csv
+import sys
 from qgis.core import QgsProject
 
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun import medicion
+from comun.tablas import exportar_tabla
+
 # === Configuración ===
 nombre_capa = "capa deseada"  # Nombre exacto de la capa cargada en QGIS
-campos_deseados = ["campo 1, campo2"]  # Lista de campos a exportar
-ruta_salida = "ruta/salida/deseada.csv"  # Ruta donde se guardará el CSV
+campos_deseados = ["campo1", "campo2"]  # Lista de campos a exportar
+ruta_salida = "ruta/salida/deseada.csv"  # Ruta donde se guardará el CSV (o .parquet)
+filas_por_bloque = 10000  # Filas que se escriben de una vez
+
+# Medición de tiempos, llamadas y memoria por fase (ver comun/medicion.py);
+# ruta_traza guarda además una traza JSON para chrome://tracing
+medir = False
+ruta_traza = None
 
 # === Obtener la capa ===
 capas = QgsProject.instance().mapLayersByName(nombre_capa)
@@ -42,18 +59,16 @@ if not campos_exportables:
 
 print(f" Campos a exportar: {campos_exportables}")
 
-# === Escritura del archivo CSV ===
-with open(ruta_salida, mode="w", newline="", encoding="utf-8-sig") as archivo_csv:
-    writer = csv.writer(archivo_csv)
-    writer.writerow(campos_exportables)  # Cabecera
 
-    total = 0
-    for feature in capa.getFeatures():
-        fila = [feature[campo] for campo in campos_exportables]
-        writer.writerow(fila)
-        total += 1
+def informar(filas, segundos):
+    print(f"   {filas} filas escritas ({filas / segundos if segundos else 0:.0f} filas/s)")
+
 
-print(f" Exportación completa: {total} filas guardadas en '{ruta_salida}'")
+# === Escritura del archivo por bloques ===
+with medicion.sesion("exportar_tablas", activa=medir, traza=ruta_traza):
+    progreso = exportar_tabla(
+        capa, campos_exportables, ruta_salida, tam_bloque=filas_por_bloque, informar=informar
+    )
 
-# === Abrir el archivo exportado (opcional) ===
-os.startfile(ruta_salida)
+print(f" Exportación completa: {progreso.filas} filas guardadas en '{ruta_salida}' "
+      f"en {progreso.segundos:.1f} s ({progreso.filas_por_segundo:.0f} filas/s)")
@@ -1,21 +1,29 @@
 # -*- coding: utf-8 -*-
 import os
-from qgis.core import (
-    QgsApplication,
-    QgsProject,
-    QgsVectorLayer
-)
+import sys
 
-# Inicializar QGIS sin interfaz
-qgis_app = QgsApplication([], False)
-qgis_app.initQgis()
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
 
-def añadir_capa_a_proyectos_qgis(carpeta_proyectos, ruta_capa):
+from comun.arranque import iniciar_qgis, terminar_qgis
+from comun.proyectos import añadir_capa_a_proyectos, buscar_proyectos, preparar_capa
+
+# Inicializar QGIS sin interfaz (en la consola de QGIS se usa la aplicación que ya existe)
+iniciar_qgis()
+
+def añadir_capa_a_proyectos_qgis(carpeta_proyectos, ruta_capa, modo="xml", max_procesos=None):
     """
     Añade una capa vectorial a todos los proyectos de QGIS encontrados en una carpeta.
 
+    La capa se valida una sola vez y los proyectos se editan en paralelo (ver `comun/proyectos.py`).
+    Cada proyecto se guarda en un temporal que después se renombra sobre el original.
+
     :param carpeta_proyectos: Ruta a la carpeta con archivos de proyecto QGIS
     :param ruta_capa: Ruta a la capa vectorial (ej: shapefile .shp) que se va a añadir
+    :param modo: "xml" edita el XML del proyecto sin cargar sus capas; "qgis" abre cada proyecto con QGIS
+    :param max_procesos: Proyectos editados a la vez (None = número de CPU)
     """
     if not os.path.isdir(carpeta_proyectos):
         print(f" Carpeta no encontrada: {carpeta_proyectos}")
@@ -25,11 +33,7 @@ def añadir_capa_a_proyectos_qgis(carpeta_proyectos, ruta_capa):
         print(f" Capa no encontrada: {ruta_capa}")
         return
 
-    proyectos = [
-        os.path.join(carpeta_proyectos, f)
-        for f in os.listdir(carpeta_proyectos)
-        if f.endswith(".qgz") or f.endswith(".qgs")
-    ]
+    proyectos = buscar_proyectos(carpeta_proyectos)
 
     if not proyectos:
         print(" No se encontraron archivos de proyecto en la carpeta.")
@@ -37,30 +41,37 @@ def añadir_capa_a_proyectos_qgis(carpeta_proyectos, ruta_capa):
 
     print(f"Proyectos encontrados: {len(proyectos)}")
 
-    for proyecto_path in proyectos:
-        print(f"Abriendo: {proyecto_path}")
-        proyecto = QgsProject.instance()
-        proyecto.read(proyecto_path)
-
-        # Cargar capa vectorial
-        capa = QgsVectorLayer(ruta_capa, os.path.basename(ruta_capa), "ogr")
-        if not capa.isValid():
-            print(f" La capa no es válida: {ruta_capa}")
-            continue
+    # Cargar y validar la capa vectorial una sola vez
+    try:
+        capa = preparar_capa(ruta_capa)
+    except ValueError as error:
+        print(f" {error}")
+        return
 
-        # Añadir capa al proyecto
-        proyecto.addMapLayer(capa)
-        proyecto.write()  # Guarda el archivo original
+    def informar(resultado):
+        nombre = os.path.basename(resultado.proyecto)
+        if resultado.error:
+            print(f" Error en {nombre}: {resultado.error}")
+        elif resultado.omitido:
+            print(f"La capa ya estaba en: {nombre}")
+        else:
+            print(f"Capa añadida a: {nombre} ({resultado.segundos:.2f} s)")
 
-        print(f"Capa añadida a: {os.path.basename(proyecto_path)}")
+    resultados = añadir_capa_a_proyectos(proyectos, capa, modo, max_procesos, al_terminar=informar)
 
-    print("Proceso completado con éxito.")
+    errores = [r for r in resultados if r.error]
+    if errores:
+        print(f"Proceso completado con {len(errores)} errores de {len(resultados)} proyectos.")
+    else:
+        print("Proceso completado con éxito.")
 
 # --- ZONA DE CONFIGURACIÓN ---
 if __name__ == "__main__":
     carpeta_proyectos = r"C:/ruta/a/carpeta_de_proyectos"
     ruta_capa = r"C:/ruta/a/la_capa.shp"
-    añadir_capa_a_proyectos_qgis(carpeta_proyectos, ruta_capa)
+    modo = "xml"  # "xml" (rápido, sin cargar capas) o "qgis"
+    max_procesos = None  # Proyectos editados a la vez (None = número de CPU)
+    añadir_capa_a_proyectos_qgis(carpeta_proyectos, ruta_capa, modo, max_procesos)
 
-    # Finalizar QGIS
-    qgis_app.exitQgis()
+    # Finalizar QGIS (solo si lo ha iniciado este script)
+    terminar_qgis()
@@ -0,0 +1,29 @@
+"""
+Registro del proveedor de Processing con los motores del repositorio.
+
+Al ejecutarlo desde la consola de Python de QGIS aparece en la caja de
+herramientas de Processing el grupo "PyQGIS-Scripts" con:
+
+- Análisis espacial: unir por cercanía, distancia mínima por identificador y agrupar puntos por campo.
+- Buffers: rectángulos centrados en puntos y entidades en un radio.
+- Exportar: exportar capas y exportar la tabla de atributos.
+
+A diferencia de los scripts de consola, estos algoritmos no modifican la capa de entrada: escriben una
+capa nueva (temporal o en fichero), se ejecutan en segundo plano sin bloquear QGIS, se pueden cancelar
+y se pueden lanzar en modo por lotes (ver `comun/algoritmos.py`).
+
+Volver a ejecutar el script sustituye el proveedor en lugar de duplicarlo.
+"""
+
+import sys
+
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun.algoritmos import registrar_proveedor
+
+proveedor = registrar_proveedor()
+
+print(f"Proveedor '{proveedor.name()}' registrado con {len(proveedor.algorithms())} algoritmos.")
@@ -9,6 +9,10 @@ Campos generados:
 - latit: coordenada Y convertida a DMS
 - longi: coordenada X convertida a DMS
 
+La conversión se hace por columnas (ver `comun/dms.py`): se leen los campos en arrays,
+se convierten todos a la vez con NumPy y se guardan con una única escritura en el proveedor.
+Con `sentido = "dms_a_decimal"` se hace la conversión inversa (de los campos DMS a los decimales).
+
 Requisitos:
 - Ejecutar dentro del entorno de QGIS.
 - La capa activa debe tener los campos 'dd_x' y 'dd_y'.
@@ -16,15 +20,36 @@ Requisitos:
 Autor: 95devFran
 """
 
-from qgis.core import QgsField, edit
+import sys
+
+from qgis.core import QgsField
 from PyQt5.QtCore import QVariant
 from qgis.utils import iface
 
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun import medicion
+from comun.dms import convertir_capa_a_decimal, convertir_capa_a_dms
+
 # Configuración de campos
 campo_dd_y = "campo de Y"    # Latitud en decimal
 campo_dd_x = "campo de X"    # Longitud en decimal
 campo_lat_dms = "campo de latitud"
 campo_lon_dms = "campo de longitud"
+sentido = "decimal_a_dms"    # "decimal_a_dms" o "dms_a_decimal"
+
+# Modo incremental (ver comun/incremental.py): guarda una huella por entidad en un
+# fichero .incremental.sqlite junto a la capa y en las siguientes ejecuciones solo
+# convierte las entidades cuyos campos de entrada han cambiado. Para recalcular todo, borra ese fichero.
+incremental = False
+
+# Medición de tiempos, llamadas y memoria por fase (ver comun/medicion.py);
+# ruta_traza guarda además una traza JSON para chrome://tracing
+medir = False
+ruta_traza = None
 
 # Obtener capa activa
 layer = iface.activeLayer()
@@ -36,43 +61,31 @@ if not layer or not layer.isValid():
 # Añadir campos si no existen
 field_names = [f.name() for f in layer.fields()]
 nuevos_campos = []
-if campo_lat_dms not in field_names:
-    nuevos_campos.append(QgsField(campo_lat_dms, QVariant.String))
-if campo_lon_dms not in field_names:
-    nuevos_campos.append(QgsField(campo_lon_dms, QVariant.String))
+if sentido == "decimal_a_dms":
+    if campo_lat_dms not in field_names:
+        nuevos_campos.append(QgsField(campo_lat_dms, QVariant.String))
+    if campo_lon_dms not in field_names:
+        nuevos_campos.append(QgsField(campo_lon_dms, QVariant.String))
+else:
+    if campo_dd_y not in field_names:
+        nuevos_campos.append(QgsField(campo_dd_y, QVariant.Double))
+    if campo_dd_x not in field_names:
+        nuevos_campos.append(QgsField(campo_dd_x, QVariant.Double))
 
 if nuevos_campos:
     layer.dataProvider().addAttributes(nuevos_campos)
     layer.updateFields()
     print("➕ Campos añadidos.")
 
-# Función de conversión de decimal a DMS
-def convert_to_dms(dd):
-    degrees = int(dd)
-    abs_dd = abs(dd - degrees)
-    minutes = int(abs_dd * 60)
-    seconds = round((abs_dd * 60 - minutes) * 60, 2)
-
-    if seconds >= 60:
-        seconds = 0
-        minutes += 1
-    if minutes >= 60:
-        minutes = 0
-        degrees += 1
-
-    return f"{degrees}°{minutes}'{seconds}\""
-
-# Aplicar conversión y actualizar campos
-with edit(layer):
-    for feature in layer.getFeatures():
-        dd_lat = feature[campo_dd_y]
-        dd_lon = feature[campo_dd_x]
-
-        if dd_lat is None or dd_lon is None:
-            continue
-
-        feature[campo_lat_dms] = convert_to_dms(dd_lat)
-        feature[campo_lon_dms] = convert_to_dms(dd_lon)
-        layer.updateFeature(feature)
-
-print("✅ Conversión completada.")
+# Aplicar conversión y actualizar campos (una sola escritura en el proveedor)
+with medicion.sesion("Coordenadas-GPS", activa=medir, traza=ruta_traza):
+    if sentido == "decimal_a_dms":
+        actualizadas = convertir_capa_a_dms(
+            layer, campo_dd_y, campo_dd_x, campo_lat_dms, campo_lon_dms, incremental=incremental
+        )
+    else:
+        actualizadas = convertir_capa_a_decimal(
+            layer, campo_lat_dms, campo_lon_dms, campo_dd_y, campo_dd_x, incremental=incremental
+        )
+
+print(f"✅ Conversión completada: {actualizadas} entidades actualizadas.")
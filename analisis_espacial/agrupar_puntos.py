@@ -6,56 +6,60 @@ Este script realiza lo siguiente:
 1. Obtiene una capa de puntos cargada en el proyecto (por ejemplo, una capa de "portales").
 2. Agrupa los puntos de dicha capa según los valores de un campo común (ejemplo: "direccion").
 3. Para cada grupo, calcula un punto representativo que es el centroide simple (promedio de coordenadas) de los puntos agrupados.
-4. Crea una nueva capa temporal de tipo punto que contiene un punto representativo por cada grupo con el valor del campo agrupador asignado.
+   Los grupos se calculan en streaming (ver `comun/agregacion.py`): por cada valor solo se guardan el número de puntos
+   y la suma de coordenadas, no las geometrías. Se pueden añadir otros agregados (extensión, centroide ponderado,
+   moda de un campo, medoide, envolvente convexa) y volcar los estados a disco si hay muchísimos grupos.
+4. Crea una nueva capa de tipo punto (temporal, o un GeoPackage/FlatGeobuf con `ruta_salida`) que contiene un punto representativo
+   por cada grupo con el valor del campo agrupador asignado.
 5. Añade esta nueva capa al proyecto actual de QGIS para su visualización y uso.
 
 Este método es útil para simplificar visualizaciones, análisis o resumen espacial agrupando múltiples puntos que comparten un mismo atributo.
 """
 
-from qgis.core import QgsProject, QgsField, QgsFeature, QgsGeometry, QgsPointXY
-from PyQt5.QtCore import QVariant
+import sys
 
-# Nombre de la capa de puntos a procesar (modificar según la capa cargada en tu proyecto)
-layer_name = "portales"  # Ejemplo: capa de puntos con ubicación de portales
-layer = QgsProject.instance().mapLayersByName(layer_name)[0]
-
-# Preparar campos para la nueva capa de salida, incluyendo un campo para el agrupador (ejemplo: "direccion")
-fields = layer.fields()  # Copia de los campos existentes
-fields.append(QgsField("direccion", QVariant.String))  # Añadir campo para el agrupador si no está
-
-# Crear una capa temporal de puntos para almacenar los puntos agrupados (centroides)
-output_layer = QgsVectorLayer("Point?crs=EPSG:25830", "Portales Agrupados", "memory")
-output_provider = output_layer.dataProvider()
-output_provider.addAttributes(fields)  # Añadir campos a la capa de salida
-output_layer.updateFields()
-
-# Diccionario para almacenar listas de geometrías agrupadas por valor del campo "direccion"
-grouped_points = {}
+from qgis.core import QgsProject
 
-# Agrupar los puntos según el campo "direccion"
-for feature in layer.getFeatures():
-    direccion = feature["direccion"]
-    geometry = feature.geometry()
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
 
-    if direccion not in grouped_points:
-        grouped_points[direccion] = []
+from comun import medicion
+from comun.agregacion import Centroide, Conteo, agrupar_capa
 
-    grouped_points[direccion].append(geometry)
-
-# Para cada grupo, calcular el centroide simple y crear un nuevo punto representativo
-for direccion, geometries in grouped_points.items():
-    x_coords = [geometry.asPoint().x() for geometry in geometries]
-    y_coords = [geometry.asPoint().y() for geometry in geometries]
-
-    x_avg = sum(x_coords) / len(x_coords)
-    y_avg = sum(y_coords) / len(y_coords)
-
-    point = QgsPointXY(x_avg, y_avg)
-    new_feature = QgsFeature(fields)
-    new_feature.setGeometry(QgsGeometry.fromPointXY(point))
-    new_feature.setAttribute("direccion", direccion)  # Asignar valor del agrupador
+# Nombre de la capa de puntos a procesar (modificar según la capa cargada en tu proyecto)
+layer_name = "portales"  # Ejemplo: capa de puntos con ubicación de portales
+layer = QgsProject.instance().mapLayersByName(layer_name)[0]
 
-    output_provider.addFeature(new_feature)
+# Campo agrupador (ejemplo: "direccion")
+campo_agrupador = "direccion"
+
+# Agregados a calcular por grupo: el centroide da la geometría y el conteo añade un campo "n"
+agregadores = {
+    "centroide": Centroide(),
+    "conteo": Conteo(),
+}
+
+# Número máximo de grupos en memoria antes de volcar a disco (None = sin límite)
+max_grupos_en_memoria = None
+
+# Salida: None crea una capa temporal en memoria; con la ruta de un GeoPackage (.gpkg) o
+# FlatGeobuf (.fgb) los resultados se escriben directamente en ese fichero por lotes, en una
+# sola transacción y con el índice espacial creado al final (ver comun/salidas.py)
+ruta_salida = None
+
+# Medición de tiempos, llamadas y memoria por fase (ver comun/medicion.py);
+# ruta_traza guarda además una traza JSON para chrome://tracing
+medir = False
+ruta_traza = None
+
+# Agrupar los puntos y crear la capa con un punto por grupo
+with medicion.sesion("agrupar_puntos", activa=medir, traza=ruta_traza):
+    output_layer = agrupar_capa(
+        layer, campo_agrupador, agregadores, geometria="centroide",
+        nombre_salida="Portales Agrupados", max_claves=max_grupos_en_memoria, destino=ruta_salida
+    )
 
 # Añadir la nueva capa con puntos agrupados al proyecto QGIS
 QgsProject.instance().addMapLayer(output_layer)
@@ -10,18 +10,55 @@ Este script realiza los siguientes pasos:
 2. Verifica si el campo destino existe en la capa principal; si no, lo crea.
 
 3. Para cada entidad de la capa principal, calcula cuál es la entidad más cercana en la capa secundaria basándose en la distancia geométrica.
+   La capa secundaria se indexa una sola vez (R-tree en `comun/indice_espacial.py`), así que cada búsqueda
+   solo compara la geometría con los candidatos cercanos.
 
 4. Extrae un valor de atributo de la entidad más cercana (por ejemplo, un texto descriptivo) y lo asigna al campo de la capa principal para esa entidad.
 
-5. Guarda los cambios realizados en la capa principal.
+5. Guarda todos los cambios en la capa principal con una única escritura en el proveedor de datos.
 
 Este método es útil para asignar atributos basados en la cercanía espacial entre dos capas, como etiquetar líneas con el nombre 
 del punto más cercano o asociar atributos de puntos vecinos.
 """
 
+import sys
+
 from qgis.core import QgsProject, QgsField
 from PyQt5.QtCore import QVariant
 
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun import medicion
+from comun.cache_indices import CacheIndices
+from comun.vecino_cercano import unir_por_cercania
+
+# Distancia máxima de búsqueda (en unidades del CRS); None para no limitarla
+distancia_maxima = None
+
+# Procesos para el cálculo: 1 = en serie; None = todos los núcleos (la capa principal
+# se reparte en teselas y el resultado es el mismo que en serie)
+max_procesos = 1
+
+# Caché en disco del índice de la capa secundaria (ver comun/cache_indices.py; solo en
+# serie): si la capa no ha cambiado desde la ejecución anterior no se vuelve a leer ni a indexar.
+# carpeta_cache = None usa ~/.cache/pyqgis-scripts/indices (o PYQGIS_CACHE_INDICES)
+usar_cache_indices = True
+carpeta_cache = None
+
+# Modo incremental (ver comun/incremental.py): guarda una huella por entidad de ambas
+# capas en un fichero .incremental.sqlite junto a la capa principal y en las siguientes
+# ejecuciones solo recalcula las entidades principales nuevas o modificadas y las que
+# pueden cambiar de vecino. Para recalcular todo, borra ese fichero.
+incremental = False
+
+# Medición de tiempos, llamadas y memoria por fase (ver comun/medicion.py);
+# ruta_traza guarda además una traza JSON para chrome://tracing
+medir = False
+ruta_traza = None
+
 # Obtener las capas por nombre (modificar por los nombres que existan en tu proyecto)
 capa_principal = QgsProject.instance().mapLayersByName("CAPA_PRINCIPAL")[0]
 capa_secundaria = QgsProject.instance().mapLayersByName("CAPA_SECUNDARIA")[0]
@@ -37,31 +74,15 @@ else:
         capa_principal.updateFields()
         print("Campo 'campo_destino' agregado a la capa principal.")
 
-    # Iniciar edición en la capa principal
-    capa_principal.startEditing()
-
-    # Iterar por cada entidad de la capa principal
-    for entidad_principal in capa_principal.getFeatures():
-        geom_principal = entidad_principal.geometry()
-        valor_cercano = None
-        distancia_minima = float("inf")
-
-        # Buscar la entidad más cercana en la capa secundaria
-        for entidad_secundaria in capa_secundaria.getFeatures():
-            geom_secundaria = entidad_secundaria.geometry()
-            distancia = geom_principal.distance(geom_secundaria)
-
-            if distancia < distancia_minima:
-                distancia_minima = distancia
-                valor_cercano = entidad_secundaria["CAMPO_ORIGEN"]
-
-        # Asignar el valor más cercano al campo destino
-        if valor_cercano:
-            entidad_principal["campo_destino"] = valor_cercano
-            capa_principal.updateFeature(entidad_principal)
-
-    # Guardar los cambios
-    if capa_principal.commitChanges():
-        print("Campo 'campo_destino' actualizado con éxito.")
-    else:
-        print("Error al guardar los cambios.")
+    # Indexar la capa secundaria una sola vez, buscar la entidad más cercana
+    # a cada entidad principal y guardar todos los valores de una vez
+    try:
+        with medicion.sesion("aplicar_punto-cercano", activa=medir, traza=ruta_traza):
+            actualizadas = unir_por_cercania(
+                capa_principal, capa_secundaria, "CAMPO_ORIGEN", "campo_destino",
+                distancia_max=distancia_maxima, max_procesos=max_procesos,
+                cache=CacheIndices(carpeta_cache) if usar_cache_indices else None, incremental=incremental
+            )
+        print(f"Campo 'campo_destino' actualizado con éxito en {actualizadas} entidades.")
+    except RuntimeError as error:
+        print(f"Error al guardar los cambios: {error}")
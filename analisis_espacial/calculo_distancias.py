@@ -11,6 +11,9 @@ Uso:
 - Asegúrate de tener dos capas vectoriales cargadas en QGIS.
 - El campo común debe estar presente en ambas capas.
 - Se añadirá automáticamente un nuevo campo en la capa origen si no existe.
+- La capa destino se lee una sola vez y se agrupa por identificador (modo "memoria").
+  Si es demasiado grande para la memoria, usa el modo "filtro", que pide al
+  proveedor solo las entidades de cada identificador.
 
 Requisitos:
 - Ejecutar desde el entorno de QGIS 
@@ -18,14 +21,38 @@ Requisitos:
 Autor: 95devFran
 """
 
-from qgis.core import QgsProject, QgsField, edit
+import sys
+
+from qgis.core import QgsProject, QgsField
 from PyQt5.QtCore import QVariant
 
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
+
+from comun import medicion
+from comun.cache_indices import CacheIndices
+from comun.distancias_clave import calcular_distancias_por_clave
+
 # Parámetros configurables
 nombre_capa_origen = "capa origen"
 nombre_capa_destino = "capa destino"
 campo_identificador = "campo que comparten ambas capas"
 campo_distancia = "campo nuevo para ver la distancia"
+modo_lectura = "memoria"  # "memoria" o "filtro" (capas destino muy grandes)
+max_procesos = 1  # Solo en modo "memoria": 1 = en serie; None = todos los núcleos
+
+# Caché en disco de la capa destino agrupada por identificador (ver comun/cache_indices.py;
+# modo "memoria" en serie): si la capa no ha cambiado desde la ejecución anterior no se vuelve a leer.
+# carpeta_cache = None usa ~/.cache/pyqgis-scripts/indices (o PYQGIS_CACHE_INDICES)
+usar_cache_indices = True
+carpeta_cache = None
+
+# Medición de tiempos, llamadas y memoria por fase (ver comun/medicion.py);
+# ruta_traza guarda además una traza JSON para chrome://tracing
+medir = False
+ruta_traza = None
 
 # Obtener capas
 capa_origen = QgsProject.instance().mapLayersByName(nombre_capa_origen)
@@ -48,30 +75,14 @@ else:
         capa_origen.updateFields()
         print(f"➕ Campo '{campo_distancia}' añadido.")
 
-    with edit(capa_origen):
-        for f_origen in capa_origen.getFeatures():
-            id_origen = f_origen[campo_identificador]
-            geom_origen = f_origen.geometry()
-
-            min_dist = float("inf")
-            found = False
-
-            for f_destino in capa_destino.getFeatures():
-                if f_destino[campo_identificador] == id_origen:
-                    geom_destino = f_destino.geometry()
-                    dist = geom_origen.distance(geom_destino)
-                    if dist < min_dist:
-                        min_dist = dist
-                        found = True
-
-            if found:
-                capa_origen.changeAttributeValue(
-                    f_origen.id(),
-                    capa_origen.fields().indexOf(campo_distancia),
-                    min_dist
-                )
-                print(f"✔ Distancia actualizada para ID {id_origen}: {min_dist}")
-            else:
-                print(f"⚠ No se encontró coincidencia para ID: {id_origen}")
+    with medicion.sesion("calculo_distancias", activa=medir, traza=ruta_traza):
+        actualizadas, sin_coincidencia = calcular_distancias_por_clave(
+            capa_origen, capa_destino, campo_identificador, campo_distancia, modo=modo_lectura,
+            max_procesos=max_procesos, cache=CacheIndices(carpeta_cache) if usar_cache_indices else None
+        )
+
+    print(f"✔ Distancia actualizada en {actualizadas} entidades.")
+    for id_origen in sin_coincidencia:
+        print(f"⚠ No se encontró coincidencia para ID: {id_origen}")
 
     print("✅ Proceso completado correctamente.")
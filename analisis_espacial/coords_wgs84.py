@@ -1,22 +1,43 @@
-layer = iface.activeLayer()
+"""
+Guarda en los campos 'long' y 'lat' de la capa activa las coordenadas del centroide
+de cada entidad, reproyectadas a otro sistema de referencia (por defecto WGS84, EPSG:4326).
+
+Los centroides se reúnen en arrays y se reproyectan por bloques (ver `comun/reproyeccion.py`);
+los valores se guardan con una única escritura en el proveedor de datos.
+
+Requisitos:
+- Ejecutar dentro del entorno de QGIS.
+- La capa activa debe tener los campos 'long' y 'lat'.
+"""
 
-crs_src = layer.crs()
-crs_dest = QgsCoordinateReferenceSystem("EPSG:4326")
+import sys
 
-transform = QgsCoordinateTransform(crs_src, crs_dest, QgsProject.instance())
+from qgis.utils import iface
 
-with edit(layer):
-    for feat in layer.getFeatures():
-        geom = feat.geometry()
+# Ruta a la carpeta raíz de este repositorio (para importar el paquete `comun`)
+ruta_repositorio = r"C:/ruta/a/PyQGIS-Scripts"
+if ruta_repositorio not in sys.path:
+    sys.path.append(ruta_repositorio)
 
-        #obtener centroide
-        centroid = geom.entroid().asPoint()
+from comun import medicion
+from comun.reproyeccion import reproyectar_centroides
 
-        point_wgs = transform.transform(centroid)
+crs_dest = "EPSG:4326"
 
-        feat["long"] = round(point_wgs.x(), 3)
-        feat["lat"] = round(point_wgs.y(), 3)
+# Modo incremental (ver comun/incremental.py): guarda una huella por entidad en un
+# fichero .incremental.sqlite junto a la capa y en las siguientes ejecuciones solo
+# recalcula las entidades cuya geometría ha cambiado. Para recalcular todo, borra ese fichero.
+incremental = False
+
+# Medición de tiempos, llamadas y memoria por fase (ver comun/medicion.py);
+# ruta_traza guarda además una traza JSON para chrome://tracing
+medir = False
+ruta_traza = None
+
+layer = iface.activeLayer()
 
-        layer.updateFeature(feat)
+with medicion.sesion("coords_wgs84", activa=medir, traza=ruta_traza):
+    actualizadas = reproyectar_centroides(layer, crs_dest, campo_x="long", campo_y="lat", decimales=3,
+                                         incremental=incremental)
 
-print("ok")
+print(f"ok: {actualizadas} entidades")
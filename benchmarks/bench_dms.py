@@ -0,0 +1,72 @@
+"""
+Benchmark de la conversión DD -> DMS: bucle entidad a entidad frente a la versión por columnas.
+
+Genera filas sintéticas de latitud/longitud y mide, sin QGIS:
+    - el bucle original (`convertir_a_dms` por entidad y un cambio por entidad)
+    - la conversión por columnas con NumPy y un único diccionario de cambios
+    - el análisis inverso DMS -> decimal
+
+Uso:
+    python benchmarks/bench_dms.py --filas 1000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comun.dms import convertir_a_dms, decimal_a_dms, dms_a_decimal
+
+
+def bucle_por_entidad(fids, latitudes, longitudes):
+    """Reproduce el bucle original: una conversión y una escritura por entidad."""
+    cambios = {}
+    for fid, lat, lon in zip(fids, latitudes, longitudes):
+        cambios[fid] = {0: convertir_a_dms(lat), 1: convertir_a_dms(lon)}
+    return cambios
+
+
+def por_columnas(fids, latitudes, longitudes):
+    textos_lat = decimal_a_dms(latitudes)
+    textos_lon = decimal_a_dms(longitudes)
+    return {fid: {0: lat, 1: lon} for fid, lat, lon in zip(fids.tolist(), textos_lat, textos_lon)}
+
+
+def medir(nombre, funcion, *argumentos):
+    inicio = time.perf_counter()
+    resultado = funcion(*argumentos)
+    segundos = time.perf_counter() - inicio
+    print(f"{nombre:<28} {segundos:8.3f} s")
+    return resultado, segundos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--filas", type=int, default=1_000_000, help="número de filas sintéticas")
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.semilla)
+    fids = np.arange(args.filas, dtype=np.int64)
+    latitudes = rng.uniform(-90, 90, args.filas)
+    longitudes = rng.uniform(-180, 180, args.filas)
+
+    print(f"Filas: {args.filas}")
+    escalar, t_escalar = medir("Bucle por entidad", bucle_por_entidad,
+                               fids.tolist(), latitudes.tolist(), longitudes.tolist())
+    columnar, t_columnar = medir("Por columnas (NumPy)", por_columnas, fids, latitudes, longitudes)
+    print(f"{'Aceleración':<28} {t_escalar / t_columnar:8.1f} x")
+
+    if escalar != columnar:
+        raise SystemExit("Los resultados de ambas versiones no coinciden.")
+
+    textos = [cambio[0] for cambio in columnar.values()]
+    medir("DMS -> decimal", dms_a_decimal, textos)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+"""
+Benchmark de los motores de `comun` sobre capas sintéticas de distintos tamaños.
+
+Para cada caso y tamaño se generan los datos (sin cronometrar), se ejecuta el
+algoritmo y se guardan en JSON el tiempo, las entidades por segundo y la
+memoria (RSS) del proceso. Cada medición se hace en un proceso nuevo para que
+el pico de memoria de un caso no contamine al siguiente.
+
+Casos: vecino_cercano, vecino_cercano_paralelo (con todos los núcleos),
+distancias_clave, dms, agrupacion, rectangulos, radio, exportacion_csv,
+exportacion_parquet (si hay pyarrow) y fechas. Solo se mide el cálculo y la
+lectura; la escritura en la capa necesita QGIS y no se incluye.
+
+Sin QGIS se usan capas `CapaMemoria`; con `--capas qgis` (o `auto` si QGIS
+está instalado) los mismos datos se cargan en capas "memory" de QGIS.
+
+Con `--base` se comparan los resultados con una ejecución anterior y el
+programa termina con código 1 si algún caso es más lento (o usa más memoria)
+que la base por encima de la tolerancia.
+
+Uso:
+    python benchmarks/bench_motores.py --tamanos 1000 10000 100000
+    python benchmarks/bench_motores.py --salida base.json
+    python benchmarks/bench_motores.py --base base.json --tolerancia 0.25
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datos_sinteticos import CAMPOS, LADO, a_capa_qgis, generar_lineas, generar_poligonos, generar_puntos
+
+from comun import tablas
+from comun.agregacion import AgrupadorStreaming, Centroide, Conteo
+from comun.distancias_clave import agrupar_por_clave, distancias_minimas
+from comun.dms import decimal_a_dms
+from comun.fechas import convertir_fechas, formatear, leer_campo
+from comun.lectura import leer_columnas, leer_filas
+from comun.particiones import cercanos_en_paralelo
+from comun.radio import ConsultaRadio, leer_centros
+from comun.rectangulos import vertices_rectangulos, wkb_poligonos
+from comun.vecino_cercano import UnionCercania
+
+TAMANOS = (1_000, 10_000, 100_000)
+
+# Por debajo de estas diferencias no se considera regresión (ruido de la medición)
+MARGEN_SEGUNDOS = 0.05
+MARGEN_MB = 5
+
+# preparar(n, semilla, convertir) -> argumentos; ejecutar(*argumentos) sin cronometrar la preparación
+Caso = namedtuple("Caso", "preparar ejecutar")
+
+
+def _vecino_cercano(principal, secundaria):
+    union = UnionCercania.desde_capa(secundaria, "clave")
+    return {fid: union.mas_cercano(geometria) for fid, geometria in leer_filas(principal, geometria="geometria")}
+
+
+def _vecino_cercano_paralelo(principal, secundaria):
+    return cercanos_en_paralelo(principal, secundaria, "clave", max_procesos=None)
+
+
+def _distancias_clave(origen, destino):
+    grupos = agrupar_por_clave(
+        (clave, geometria) for _, geometria, clave in leer_filas(destino, ["clave"], "geometria")
+    )
+    origenes = ((fid, clave, geometria) for fid, geometria, clave in leer_filas(origen, ["clave"], "geometria"))
+    return distancias_minimas(origenes, grupos)
+
+
+def _dms(capa):
+    return decimal_a_dms(leer_columnas(capa, ["lat"], tipos={"lat": np.float64})["lat"])
+
+
+def _agrupacion(capa):
+    agrupador = AgrupadorStreaming({"centroide": Centroide(), "conteo": Conteo()})
+    for _, x, y, clave in leer_filas(capa, ["clave"], "punto"):
+        agrupador.acumular(clave, x, y)
+    return list(agrupador.resultados())
+
+
+def _rectangulos(capa):
+    puntos = leer_columnas(capa, geometria="punto")
+    return wkb_poligonos(vertices_rectangulos(puntos["x"], puntos["y"], 10.0, 5.0, 30.0))
+
+
+def _radio(poligonos, centros):
+    consulta = ConsultaRadio.desde_capa(poligonos, exacto=False)
+    return consulta.consultar_varios(leer_centros(centros), LADO / 100, union=True)
+
+
+def _exportacion_csv(capa, carpeta):
+    return tablas.exportar_csv(tablas.bloques_de_filas(capa, CAMPOS), CAMPOS, os.path.join(carpeta, "tabla.csv"))
+
+
+def _exportacion_parquet(capa, carpeta):
+    pa = tablas.pa
+    esquema = pa.schema([("id", pa.int64()), ("clave", pa.string()), ("valor", pa.float64()),
+                         ("lat", pa.float64()), ("epoch", pa.int64()), ("fecha", pa.string())])
+    return tablas.exportar_parquet(tablas.bloques_de_filas(capa, CAMPOS), esquema,
+                                   os.path.join(carpeta, "tabla.parquet"))
+
+
+def _fechas(capa):
+    resultados = []
+    for campo in ("epoch", "fecha"):
+        _, valores = leer_campo(capa, campo)
+        fechas, _ = convertir_fechas(valores)
+        resultados.append(formatear(fechas))
+    return resultados
+
+
+CASOS = {
+    "vecino_cercano": Caso(
+        lambda n, s, c: (c(generar_puntos(n, s)), c(generar_puntos(max(n // 10, 1), s + 1))),
+        _vecino_cercano,
+    ),
+    "vecino_cercano_paralelo": Caso(
+        lambda n, s, c: (c(generar_puntos(n, s)), c(generar_puntos(max(n // 10, 1), s + 1))),
+        _vecino_cercano_paralelo,
+    ),
+    "distancias_clave": Caso(
+        lambda n, s, c: (c(generar_puntos(n, s)), c(generar_lineas(max(n // 100, 1), s + 1))),
+        _distancias_clave,
+    ),
+    "dms": Caso(lambda n, s, c: (c(generar_puntos(n, s)),), _dms),
+    "agrupacion": Caso(lambda n, s, c: (c(generar_puntos(n, s)),), _agrupacion),
+    "rectangulos": Caso(lambda n, s, c: (c(generar_puntos(n, s)),), _rectangulos),
+    "radio": Caso(
+        lambda n, s, c: (c(generar_poligonos(n, s)), c(generar_puntos(max(n // 1000, 1), s + 1))),
+        _radio,
+    ),
+    "exportacion_csv": Caso(
+        lambda n, s, c: (c(generar_puntos(n, s)), tempfile.mkdtemp(prefix="bench_")),
+        _exportacion_csv,
+    ),
+    "exportacion_parquet": Caso(
+        lambda n, s, c: (c(generar_puntos(n, s)), tempfile.mkdtemp(prefix="bench_")),
+        _exportacion_parquet,
+    ),
+    "fechas": Caso(lambda n, s, c: (c(generar_puntos(n, s)),), _fechas),
+}
+
+
+def casos_disponibles():
+    return [nombre for nombre in CASOS if nombre != "exportacion_parquet" or tablas.pa is not None]
+
+
+def qgis_disponible():
+    try:
+        import qgis.core  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _rss_actual_mb():
+    """RSS actual del proceso (solo Linux); None si no se puede leer."""
+    try:
+        with open("/proc/self/statm") as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _reiniciar_pico():
+    """Pone a cero el pico de RSS (VmHWM) en Linux; en otros sistemas no hace nada."""
+    try:
+        with open("/proc/self/clear_refs", "w") as archivo:
+            archivo.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _pico_rss_mb(reiniciado):
+    if reiniciado:
+        try:
+            with open("/proc/self/status") as archivo:
+                for linea in archivo:
+                    if linea.startswith("VmHWM:"):
+                        return int(linea.split()[1]) / 1024
+        except OSError:
+            pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 2 ** 20 if sys.platform == "darwin" else pico / 1024
+
+
+def medir(caso, entidades, semilla=0, capas="memoria"):
+    """Prepara los datos y cronometra un caso. Devuelve un diccionario con el resultado."""
+    convertir = (lambda capa: capa)
+    if capas == "qgis":
+        from comun.proyectos import iniciar_qgis
+
+        iniciar_qgis()
+        convertir = a_capa_qgis
+
+    argumentos = CASOS[caso].preparar(entidades, semilla, convertir)
+    rss_datos = _rss_actual_mb()
+    reiniciado = _reiniciar_pico()
+
+    inicio = time.perf_counter()
+    CASOS[caso].ejecutar(*argumentos)
+    segundos = time.perf_counter() - inicio
+
+    pico = _pico_rss_mb(reiniciado)
+    return {
+        "caso": caso,
+        "entidades": entidades,
+        "capas": capas,
+        "segundos": segundos,
+        "entidades_por_segundo": entidades / segundos if segundos else None,
+        "rss_datos_mb": rss_datos,
+        "pico_rss_mb": pico,
+        "pico_solo_calculo": reiniciado,
+    }
+
+
+def medir_en_proceso_nuevo(caso, entidades, semilla, capas):
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as grupo:
+        return grupo.submit(medir, caso, entidades, semilla, capas).result()
+
+
+def comparar(resultados, base, tolerancia):
+    """
+    Compara con una ejecución anterior.
+
+    :return: lista de textos con las regresiones (vacía si no hay)
+    """
+    anteriores = {(r["caso"], r["entidades"]): r for r in base["resultados"]}
+    regresiones = []
+    for resultado in resultados:
+        anterior = anteriores.get((resultado["caso"], resultado["entidades"]))
+        if anterior is None:
+            continue
+        nombre = f"{resultado['caso']} ({resultado['entidades']})"
+        limite = anterior["segundos"] * (1 + tolerancia)
+        if resultado["segundos"] > limite and resultado["segundos"] - anterior["segundos"] > MARGEN_SEGUNDOS:
+            regresiones.append(
+                f"{nombre}: {resultado['segundos']:.3f} s frente a {anterior['segundos']:.3f} s "
+                f"({resultado['segundos'] / anterior['segundos']:.2f} x)"
+            )
+        if resultado.get("pico_rss_mb") and anterior.get("pico_rss_mb") \
+                and resultado["pico_rss_mb"] > anterior["pico_rss_mb"] * (1 + tolerancia) \
+                and resultado["pico_rss_mb"] - anterior["pico_rss_mb"] > MARGEN_MB:
+            regresiones.append(
+                f"{nombre}: pico de {resultado['pico_rss_mb']:.0f} MB frente a {anterior['pico_rss_mb']:.0f} MB"
+            )
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tamanos", type=int, nargs="+", default=list(TAMANOS),
+                        help="número de entidades de cada prueba (de 1000 a 10000000)")
+    parser.add_argument("--casos", nargs="+", choices=list(CASOS), help="casos a medir (por defecto, todos)")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--capas", choices=("auto", "memoria", "qgis"), default="auto",
+                        help="tipo de capas: CapaMemoria, capas de QGIS o QGIS si está instalado")
+    parser.add_argument("--salida", default="resultados_benchmark.json", help="fichero JSON de resultados")
+    parser.add_argument("--base", help="JSON de una ejecución anterior con el que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="empeoramiento relativo admitido frente a la base (0.25 = 25 %%)")
+    parser.add_argument("--mismo-proceso", action="store_true",
+                        help="medir todo en este proceso (más rápido, picos de memoria menos fiables)")
+    args = parser.parse_args()
+
+    capas = args.capas
+    if capas == "auto":
+        capas = "qgis" if qgis_disponible() else "memoria"
+    casos = args.casos or casos_disponibles()
+
+    resultados = []
+    print(f"{'Caso':<22} {'Entidades':>10} {'Segundos':>10} {'Entidades/s':>12} {'Pico MB':>9}")
+    for caso in casos:
+        for entidades in args.tamanos:
+            if args.mismo_proceso:
+                resultado = medir(caso, entidades, args.semilla, capas)
+            else:
+                resultado = medir_en_proceso_nuevo(caso, entidades, args.semilla, capas)
+            resultados.append(resultado)
+            pico = f"{resultado['pico_rss_mb']:9.0f}" if resultado["pico_rss_mb"] is not None else f"{'-':>9}"
+            print(f"{caso:<22} {entidades:>10} {resultado['segundos']:>10.3f} "
+                  f"{resultado['entidades_por_segundo']:>12.0f} {pico}")
+
+    informe = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "capas": capas,
+        "semilla": args.semilla,
+        "resultados": resultados,
+    }
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump(informe, archivo, indent=2)
+    print(f"Resultados guardados en {args.salida}")
+
+    if args.base:
+        with open(args.base, encoding="utf-8") as archivo:
+            regresiones = comparar(resultados, json.load(archivo), args.tolerancia)
+        if regresiones:
+            print("REGRESIONES frente a la base:")
+            for regresion in regresiones:
+                print(f"  - {regresion}")
+            raise SystemExit(1)
+        print("Sin regresiones frente a la base.")
+
+
+if __name__ == "__main__":
+    main()
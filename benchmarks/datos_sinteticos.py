@@ -0,0 +1,121 @@
+"""
+Capas sintéticas de puntos, líneas y polígonos para los benchmarks.
+
+Las capas se generan como `CapaMemoria` (sin QGIS) con los campos que usan
+los motores:
+
+- "id": entero correlativo
+- "clave": texto con ~1 valor distinto por cada 100 entidades
+- "valor": número real
+- "lat": latitud en grados decimales
+- "epoch": segundos desde 1970 (un 2 % nulos)
+- "fecha": la misma fecha como texto ISO (un 2 % nulos)
+
+Si QGIS está disponible, `a_capa_qgis` convierte una de estas capas en una
+capa "memory" de QGIS con los mismos datos.
+
+Las coordenadas están en un cuadrado de `lado` unidades; con la semilla
+fijada las capas son siempre las mismas.
+"""
+
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from comun.memoria import CapaMemoria
+
+CAMPOS = ("id", "clave", "valor", "lat", "epoch", "fecha")
+
+LADO = 100_000.0
+
+
+def _atributos(n, rng):
+    claves = rng.integers(0, max(n // 100, 1), n)
+    epochs = rng.integers(1_500_000_000, 1_800_000_000, n)
+    nulos = rng.random(n) < 0.02
+    fechas = [
+        datetime.fromtimestamp(int(e), timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+        for e in epochs.tolist()
+    ]
+    return {
+        "id": list(range(n)),
+        "clave": [f"K{c}" for c in claves.tolist()],
+        "valor": rng.normal(100, 25, n).tolist(),
+        "lat": rng.uniform(-90, 90, n).tolist(),
+        "epoch": [None if nulo else e for nulo, e in zip(nulos.tolist(), epochs.tolist())],
+        "fecha": [None if nulo else f for nulo, f in zip(nulos.tolist(), fechas)],
+    }
+
+
+def _filas(columnas):
+    return zip(*(columnas[campo] for campo in CAMPOS))
+
+
+def generar_puntos(n, semilla=0, lado=LADO):
+    rng = np.random.default_rng(semilla)
+    xs, ys = rng.uniform(0, lado, n), rng.uniform(0, lado, n)
+    return CapaMemoria.desde_puntos(xs, ys, _atributos(n, rng), nombre=f"puntos_{n}")
+
+
+def generar_lineas(n, semilla=0, lado=LADO, vertices=4, longitud=None):
+    """Líneas quebradas de `vertices` vértices con pasos aleatorios de ~`longitud`."""
+    rng = np.random.default_rng(semilla)
+    longitud = longitud or lado / max(np.sqrt(n), 1)
+    inicios = rng.uniform(0, lado, (n, 1, 2))
+    pasos = rng.normal(0, longitud / 2, (n, vertices - 1, 2))
+    coordenadas = np.concatenate((inicios, inicios + np.cumsum(pasos, axis=1)), axis=1)
+
+    capa = CapaMemoria("LineString", CAMPOS, nombre=f"lineas_{n}")
+    for linea, fila in zip(coordenadas, _filas(_atributos(n, rng))):
+        capa.añadir(linea, fila)
+    return capa
+
+
+def generar_poligonos(n, semilla=0, lado=LADO, tamano=None):
+    """Cuadriláteros convexos alrededor de centros aleatorios."""
+    rng = np.random.default_rng(semilla)
+    tamano = tamano or lado / max(np.sqrt(n), 1) / 2
+    centros = rng.uniform(0, lado, (n, 1, 2))
+    angulos = np.sort(rng.uniform(0, 2 * np.pi, (n, 4)), axis=1)
+    radios = rng.uniform(0.5, 1.0, (n, 4)) * tamano
+    anillos = centros + np.stack((radios * np.cos(angulos), radios * np.sin(angulos)), axis=2)
+    anillos = np.concatenate((anillos, anillos[:, :1]), axis=1)
+
+    capa = CapaMemoria("Polygon", CAMPOS, nombre=f"poligonos_{n}")
+    for anillo, fila in zip(anillos, _filas(_atributos(n, rng))):
+        capa.añadir(anillo, fila)
+    return capa
+
+
+GENERADORES = {
+    "puntos": generar_puntos,
+    "lineas": generar_lineas,
+    "poligonos": generar_poligonos,
+}
+
+
+def a_capa_qgis(capa):
+    """Copia una `CapaMemoria` en una capa "memory" de QGIS (requiere QGIS inicializado)."""
+    from qgis.core import QgsFeature, QgsField, QgsGeometry, QgsVectorLayer
+    from PyQt5.QtCore import QVariant
+
+    tipos = {"id": QVariant.LongLong, "valor": QVariant.Double, "lat": QVariant.Double,
+             "epoch": QVariant.LongLong}
+    salida = QgsVectorLayer(f"{capa.tipo}?crs={capa.crs().authid()}", capa.nombre, "memory")
+    proveedor = salida.dataProvider()
+    proveedor.addAttributes([QgsField(campo, tipos.get(campo, QVariant.String)) for campo in capa.campos])
+    salida.updateFields()
+
+    entidades = []
+    for geometria, atributos in zip(capa.geometrias, capa.atributos):
+        entidad = QgsFeature(salida.fields())
+        if geometria is not None:
+            entidad.setGeometry(QgsGeometry.fromWkt(geometria.asWkt()))
+        entidad.setAttributes(list(atributos))
+        entidades.append(entidad)
+    proveedor.addFeatures(entidades)
+    return salida
@@ -0,0 +1,12 @@
+"""
+Módulos compartidos por los scripts del repositorio.
+
+Contiene los motores de cálculo que usan los scripts de cada carpeta. Las
+partes que solo necesitan NumPy no importan QGIS, de modo que se pueden
+probar y medir fuera de la aplicación; las funciones que trabajan con capas
+importan `qgis.core` en el momento de usarse.
+
+Para usarlos desde la consola de Python de QGIS basta con añadir la carpeta
+raíz del repositorio a `sys.path` (los scripts lo hacen con la variable
+`ruta_repositorio`).
+"""
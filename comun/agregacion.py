@@ -0,0 +1,482 @@
+"""
+Agregación en streaming de puntos agrupados por un campo.
+
+En lugar de guardar todas las geometrías de cada grupo, se mantiene por
+clave un estado acumulado pequeño (por ejemplo número de puntos y suma de X
+e Y) que se actualiza punto a punto. Cada agregador define cómo crear,
+actualizar, combinar y cerrar su estado, de modo que se pueden añadir
+agregados nuevos sin tocar el motor.
+
+Cuando el número de claves distintas supera `max_claves`, los estados
+parciales se vuelcan a disco repartidos por hash de la clave; al final cada
+partición se lee por separado y se combinan sus estados, así que en memoria
+solo hay una partición cada vez.
+
+Los grupos se escriben en una capa en memoria o, si son muchos, directamente
+en un GeoPackage o FlatGeobuf (`comun/salidas.py`).
+
+Agregadores incluidos:
+    - Conteo: número de puntos
+    - Centroide: media de coordenadas
+    - CentroidePonderado: media ponderada por un campo
+    - Extension: caja envolvente (xmin, ymin, xmax, ymax)
+    - Moda: valor más frecuente de un campo
+    - Medoide: punto del grupo con menor suma de distancias al resto
+    - EnvolventeConvexa: envolvente convexa de los puntos
+"""
+
+import os
+import pickle
+import shutil
+import tempfile
+from collections import Counter
+
+import numpy as np
+
+from . import medicion
+from .lectura import es_nulo, leer_filas
+from .salidas import abrir_salida
+
+
+class Agregador:
+    """
+    Interfaz de un agregador.
+
+    - `atributos`: campos de la capa de entrada que necesita en `acumular`
+    - `campos`: (nombre, tipo) de los valores que aporta a la capa de salida,
+      con tipo "int", "double" o "string"
+    - `tipo_geometria`: "Point" o "Polygon" si el agregador puede dar la
+      geometría de salida, None si no
+    """
+
+    atributos = ()
+    campos = ()
+    tipo_geometria = None
+
+    def nuevo(self):
+        raise NotImplementedError
+
+    def acumular(self, estado, x, y, atributos):
+        """Añade un punto al estado y devuelve el estado actualizado."""
+        raise NotImplementedError
+
+    def combinar(self, a, b):
+        """Une dos estados parciales de la misma clave."""
+        raise NotImplementedError
+
+    def resultado(self, estado):
+        return estado
+
+    def valores(self, resultado):
+        """Valores para los `campos` de la capa de salida."""
+        return [resultado] if self.campos else []
+
+    def wkt(self, resultado):
+        """Geometría de salida en WKT (solo agregadores con `tipo_geometria`)."""
+        return None
+
+
+class Conteo(Agregador):
+    campos = (("n", "int"),)
+
+    def nuevo(self):
+        return 0
+
+    def acumular(self, estado, x, y, atributos):
+        return estado + 1
+
+    def combinar(self, a, b):
+        return a + b
+
+
+class Centroide(Agregador):
+    tipo_geometria = "Point"
+
+    def nuevo(self):
+        return [0, 0.0, 0.0]
+
+    def acumular(self, estado, x, y, atributos):
+        estado[0] += 1
+        estado[1] += x
+        estado[2] += y
+        return estado
+
+    def combinar(self, a, b):
+        return [a[0] + b[0], a[1] + b[1], a[2] + b[2]]
+
+    def resultado(self, estado):
+        n, suma_x, suma_y = estado
+        return (suma_x / n, suma_y / n) if n else None
+
+    def wkt(self, resultado):
+        return None if resultado is None else f"POINT({resultado[0]!r} {resultado[1]!r})"
+
+
+class CentroidePonderado(Centroide):
+    """Centroide ponderado por un campo numérico; los pesos nulos se ignoran."""
+
+    def __init__(self, campo_peso):
+        self.campo_peso = campo_peso
+        self.atributos = (campo_peso,)
+
+    def acumular(self, estado, x, y, atributos):
+        peso = atributos[self.campo_peso]
+        if es_nulo(peso):
+            return estado
+        peso = float(peso)
+        estado[0] += peso
+        estado[1] += peso * x
+        estado[2] += peso * y
+        return estado
+
+
+class Extension(Agregador):
+    campos = (("xmin", "double"), ("ymin", "double"), ("xmax", "double"), ("ymax", "double"))
+    tipo_geometria = "Polygon"
+
+    def nuevo(self):
+        return [float("inf"), float("inf"), float("-inf"), float("-inf")]
+
+    def acumular(self, estado, x, y, atributos):
+        if x < estado[0]:
+            estado[0] = x
+        if y < estado[1]:
+            estado[1] = y
+        if x > estado[2]:
+            estado[2] = x
+        if y > estado[3]:
+            estado[3] = y
+        return estado
+
+    def combinar(self, a, b):
+        return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+    def valores(self, resultado):
+        return list(resultado)
+
+    def wkt(self, resultado):
+        xmin, ymin, xmax, ymax = resultado
+        return (f"POLYGON(({xmin!r} {ymin!r}, {xmax!r} {ymin!r}, {xmax!r} {ymax!r}, "
+                f"{xmin!r} {ymax!r}, {xmin!r} {ymin!r}))")
+
+
+class Moda(Agregador):
+    """Valor más frecuente de un campo (los nulos no cuentan)."""
+
+    campos = (("moda", "string"),)
+
+    def __init__(self, campo):
+        self.campo = campo
+        self.atributos = (campo,)
+
+    def nuevo(self):
+        return Counter()
+
+    def acumular(self, estado, x, y, atributos):
+        valor = atributos[self.campo]
+        if not es_nulo(valor):
+            estado[valor] += 1
+        return estado
+
+    def combinar(self, a, b):
+        a.update(b)
+        return a
+
+    def resultado(self, estado):
+        return str(estado.most_common(1)[0][0]) if estado else None
+
+
+class Medoide(Agregador):
+    """
+    Punto del grupo con menor suma de distancias al resto.
+
+    No es acumulable: guarda todos los puntos del grupo, así que su memoria
+    crece con el tamaño de los grupos (los estados sí se pueden volcar a disco).
+    """
+
+    tipo_geometria = "Point"
+
+    def nuevo(self):
+        return []
+
+    def acumular(self, estado, x, y, atributos):
+        estado.append((x, y))
+        return estado
+
+    def combinar(self, a, b):
+        a.extend(b)
+        return a
+
+    def resultado(self, estado):
+        if not estado:
+            return None
+        puntos = np.asarray(estado, dtype=np.float64)
+        sumas = np.zeros(len(puntos))
+        # Por filas para no crear la matriz de distancias completa
+        for i in range(len(puntos)):
+            sumas[i] = np.hypot(*(puntos - puntos[i]).T).sum()
+        x, y = puntos[int(np.argmin(sumas))]
+        return float(x), float(y)
+
+    def wkt(self, resultado):
+        return None if resultado is None else f"POINT({resultado[0]!r} {resultado[1]!r})"
+
+
+def envolvente_convexa(puntos):
+    """Envolvente convexa (cadena monótona) de una lista de tuplas (x, y), en sentido antihorario."""
+    puntos = sorted(set(puntos))
+    if len(puntos) <= 2:
+        return puntos
+
+    def giro(o, a, b):
+        return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+    inferior, superior = [], []
+    for p in puntos:
+        while len(inferior) >= 2 and giro(inferior[-2], inferior[-1], p) <= 0:
+            inferior.pop()
+        inferior.append(p)
+    for p in reversed(puntos):
+        while len(superior) >= 2 and giro(superior[-2], superior[-1], p) <= 0:
+            superior.pop()
+        superior.append(p)
+    return inferior[:-1] + superior[:-1]
+
+
+class EnvolventeConvexa(Agregador):
+    """
+    Envolvente convexa de los puntos del grupo.
+
+    El estado se reduce a la envolvente cada `limite` puntos, así que su
+    tamaño no depende del número de puntos del grupo. Los grupos con menos de
+    tres puntos no alineados no tienen polígono: su geometría queda nula (ver
+    `AgrupadorStreaming.sin_geometria`).
+    """
+
+    tipo_geometria = "Polygon"
+
+    def __init__(self, limite=1024):
+        self.limite = limite
+
+    def nuevo(self):
+        return []
+
+    def acumular(self, estado, x, y, atributos):
+        estado.append((x, y))
+        if len(estado) >= self.limite:
+            estado[:] = envolvente_convexa(estado)
+        return estado
+
+    def combinar(self, a, b):
+        return envolvente_convexa(a + b)
+
+    def resultado(self, estado):
+        return envolvente_convexa(estado)
+
+    def wkt(self, resultado):
+        # Un punto, dos puntos o puntos alineados: la envolvente no es un polígono
+        if not resultado or len(resultado) < 3:
+            return None
+        anillo = ", ".join(f"{x!r} {y!r}" for x, y in resultado + resultado[:1])
+        return f"POLYGON(({anillo}))"
+
+
+class AgrupadorStreaming:
+    """
+    Mantiene un estado por clave para cada agregador.
+
+    :param agregadores: diccionario nombre -> Agregador
+    :param max_claves: número de claves en memoria antes de volcar a disco (None: sin límite)
+    :param particiones: número de ficheros de volcado (reparto por hash de la clave)
+    :param carpeta_temporal: carpeta para los volcados (por defecto la temporal del sistema)
+    """
+
+    def __init__(self, agregadores, max_claves=None, particiones=16, carpeta_temporal=None):
+        self.agregadores = dict(agregadores)
+        self._lista = list(self.agregadores.values())
+        self.max_claves = max_claves
+        self.particiones = particiones
+        self.carpeta_temporal = carpeta_temporal
+        self.estados = {}
+        self._carpeta_volcados = None
+        self.volcados = 0
+        # Grupos escritos sin geometría porque su agregador no pudo darla (p. ej. envolventes degeneradas)
+        self.sin_geometria = 0
+
+    def acumular(self, clave, x, y, atributos=None):
+        if es_nulo(clave):
+            clave = None
+        estado = self.estados.get(clave)
+        if estado is None:
+            if self.max_claves is not None and len(self.estados) >= self.max_claves:
+                self._volcar()
+            estado = self.estados[clave] = [agregador.nuevo() for agregador in self._lista]
+        for i, agregador in enumerate(self._lista):
+            estado[i] = agregador.acumular(estado[i], x, y, atributos)
+
+    def _ruta_particion(self, particion):
+        return os.path.join(self._carpeta_volcados, f"particion_{particion}.pkl")
+
+    def _volcar(self):
+        """Escribe los estados en memoria en sus particiones y los libera."""
+        if self._carpeta_volcados is None:
+            self._carpeta_volcados = tempfile.mkdtemp(prefix="agrupar_", dir=self.carpeta_temporal)
+
+        por_particion = {}
+        for clave, estado in self.estados.items():
+            por_particion.setdefault(hash(clave) % self.particiones, []).append((clave, estado))
+        for particion, registros in por_particion.items():
+            with open(self._ruta_particion(particion), "ab") as fichero:
+                pickle.dump(registros, fichero, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.estados = {}
+        self.volcados += 1
+
+    def _leer_particion(self, particion):
+        estados = {}
+        ruta = self._ruta_particion(particion)
+        if not os.path.exists(ruta):
+            return estados
+        with open(ruta, "rb") as fichero:
+            while True:
+                try:
+                    registros = pickle.load(fichero)
+                except EOFError:
+                    break
+                for clave, estado in registros:
+                    previo = estados.get(clave)
+                    if previo is None:
+                        estados[clave] = estado
+                    else:
+                        estados[clave] = [
+                            agregador.combinar(a, b)
+                            for agregador, a, b in zip(self._lista, previo, estado)
+                        ]
+        return estados
+
+    def _cerrar(self, estado):
+        return {
+            nombre: agregador.resultado(parcial)
+            for (nombre, agregador), parcial in zip(self.agregadores.items(), estado)
+        }
+
+    def resultados(self):
+        """Genera tuplas (clave, {nombre: resultado}) y libera los estados."""
+        if self._carpeta_volcados is None:
+            estados, self.estados = self.estados, {}
+            for clave, estado in estados.items():
+                yield clave, self._cerrar(estado)
+            return
+
+        self._volcar()
+        try:
+            for particion in range(self.particiones):
+                for clave, estado in self._leer_particion(particion).items():
+                    yield clave, self._cerrar(estado)
+        finally:
+            shutil.rmtree(self._carpeta_volcados, ignore_errors=True)
+            self._carpeta_volcados = None
+
+
+_TIPOS_CAMPO = {"int": "Int", "double": "Double", "string": "String"}
+
+
+def campos_salida(capa, campo, agregadores):
+    """`QgsFields` de la salida: el campo agrupador y los campos de cada agregador."""
+    from qgis.core import QgsField, QgsFields
+    from PyQt5.QtCore import QVariant
+
+    campos = QgsFields()
+    campos.append(capa.fields().field(campo))
+    for nombre, agregador in agregadores.items():
+        for sufijo, tipo in agregador.campos:
+            nombre_campo = sufijo if len(agregadores) == 1 else f"{nombre}_{sufijo}"
+            campos.append(QgsField(nombre_campo, getattr(QVariant, _TIPOS_CAMPO[tipo])))
+    return campos
+
+
+def agregador_geometria(agregadores, geometria):
+    """Agregador que da la geometría de salida; error si no genera geometrías."""
+    agregador = agregadores[geometria]
+    if agregador.tipo_geometria is None:
+        raise ValueError(f"El agregador '{geometria}' no genera geometrías.")
+    return agregador
+
+
+def agrupar_puntos(capa, campo, agregadores, max_claves=None):
+    """`AgrupadorStreaming` con los puntos de `capa` acumulados por `campo` en una sola pasada."""
+    atributos = [campo]
+    for agregador in agregadores.values():
+        atributos.extend(a for a in agregador.atributos if a not in atributos)
+
+    agrupador = AgrupadorStreaming(agregadores, max_claves=max_claves)
+    for _, x, y, *fila in leer_filas(capa, atributos, "punto"):
+        valores = dict(zip(atributos, fila))
+        agrupador.acumular(valores[campo], x, y, valores)
+    return agrupador
+
+
+def filas_grupos(agrupador, geometria):
+    """
+    Genera una tupla (wkt, valores) por grupo con la geometría del agregador `geometria`.
+
+    Los grupos sin geometría (wkt None) se cuentan en `agrupador.sin_geometria`.
+    """
+    agregadores = agrupador.agregadores
+    agregador = agregadores[geometria]
+    for clave, resultados in agrupador.resultados():
+        valores = [clave]
+        for nombre, otro in agregadores.items():
+            valores.extend(otro.valores(resultados[nombre]))
+        wkt = agregador.wkt(resultados[geometria])
+        if wkt is None:
+            agrupador.sin_geometria += 1
+        yield wkt, valores
+
+
+def entidades_grupos(agrupador, campos, geometria):
+    """
+    Genera una `QgsFeature` por grupo con la geometría del agregador `geometria`.
+
+    :param campos: `QgsFields` de `campos_salida`
+    """
+    from qgis.core import QgsFeature, QgsGeometry
+
+    for wkt, valores in filas_grupos(agrupador, geometria):
+        entidad = QgsFeature(campos)
+        if wkt is not None:
+            entidad.setGeometry(QgsGeometry.fromWkt(wkt))
+        entidad.setAttributes(valores)
+        yield entidad
+
+
+@medicion.medir()
+def agrupar_capa(capa, campo, agregadores=None, geometria="centroide",
+                 nombre_salida="Puntos agrupados", max_claves=None, tam_lote=50_000, destino=None,
+                 **opciones_salida):
+    """
+    Agrupa los puntos de `capa` por `campo` y crea una capa con un punto (o
+    polígono) por grupo.
+
+    :param agregadores: diccionario nombre -> Agregador; por defecto solo el centroide
+    :param geometria: nombre del agregador que da la geometría de salida
+    :param max_claves: claves en memoria antes de volcar estados a disco
+    :param tam_lote: entidades por lote de escritura
+    :param destino: None para una capa en memoria, o la ruta de un GeoPackage (.gpkg) o
+                    FlatGeobuf (.fgb) en el que se escriben los grupos por lotes
+    :param opciones_salida: opciones de la salida en fichero (`wal`, `sincrono`, `indice`;
+                            ver `comun/salidas.py`)
+    :return: la capa de salida (sin añadir al proyecto); los grupos para los que el agregador
+             no da geometría (envolventes de menos de tres puntos no alineados) van sin ella
+    """
+    if agregadores is None:
+        agregadores = {"centroide": Centroide()}
+    tipo_geometria = agregador_geometria(agregadores, geometria).tipo_geometria
+
+    agrupador = agrupar_puntos(capa, campo, agregadores, max_claves)
+
+    salida = abrir_salida(destino, tipo_geometria, capa.crs(), campos_salida(capa, campo, agregadores),
+                          nombre_salida, tam_lote=tam_lote, **opciones_salida)
+    with salida:
+        salida.añadir(filas_grupos(agrupador, geometria))
+    return salida.capa()
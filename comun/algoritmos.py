@@ -0,0 +1,748 @@
+"""
+Proveedor de Processing con los motores de `comun`.
+
+Los scripts de consola modifican las capas del proyecto desde el hilo de la
+interfaz, así que QGIS queda bloqueado hasta que terminan. Estos algoritmos
+hacen lo mismo desde la caja de herramientas de Processing:
+
+- leen las capas como `QgsProcessingFeatureSource` (admiten "solo entidades
+  seleccionadas" y capas de fuera del proyecto) y escriben el resultado en un
+  `QgsFeatureSink` (capa temporal, GeoPackage...), en lugar de editar la capa
+  de entrada;
+- no piden el hilo principal, de modo que Processing los ejecuta en segundo
+  plano y en modo por lotes (salvo "Exportar capas", que usa las capas del
+  proyecto y las tiene que leer desde el hilo principal);
+- dentro de QGIS Desktop no usan grupos de procesos: en Windows cada proceso
+  del grupo arrancaría otra instancia de QGIS, así que el parámetro de
+  procesos solo se aplica con `qgis_process` o desde un script independiente;
+- comprueban la cancelación e informan del progreso cada `CADA` entidades,
+  no en cada una.
+
+Los motores esperan capas: `FuenteProcessing` da a una fuente de Processing
+la parte de la interfaz de `QgsVectorLayer` que usan (`name`, `crs`,
+`getFeatures`...) y deja de dar entidades en cuanto se cancela, así que
+cualquier lectura de un motor se puede interrumpir. Con fuentes no se usa la
+caché de índices (`comun/cache_indices.py`), que necesita la capa y su fichero.
+
+A diferencia del resto de `comun`, este módulo importa QGIS al cargarse: solo
+tiene sentido dentro de QGIS. El proveedor se registra con `registrar_proveedor`
+(ver `Procesos/registrar_proveedor.py`).
+"""
+
+import os
+
+from PyQt5.QtCore import QVariant
+from qgis.core import (
+    QgsApplication,
+    QgsFeature,
+    QgsFeatureRequest,
+    QgsFeatureSink,
+    QgsField,
+    QgsFields,
+    QgsGeometry,
+    QgsProcessing,
+    QgsProcessingAlgorithm,
+    QgsProcessingException,
+    QgsProcessingMultiStepFeedback,
+    QgsProcessingParameterBoolean,
+    QgsProcessingParameterDistance,
+    QgsProcessingParameterEnum,
+    QgsProcessingParameterFeatureSink,
+    QgsProcessingParameterFeatureSource,
+    QgsProcessingParameterField,
+    QgsProcessingParameterFileDestination,
+    QgsProcessingParameterFolderDestination,
+    QgsProcessingParameterMultipleLayers,
+    QgsProcessingParameterNumber,
+    QgsProcessingParameterString,
+    QgsProcessingProvider,
+    QgsWkbTypes,
+)
+
+from . import medicion
+from .fechas import AvisoProgreso
+
+# Entidades entre dos comprobaciones de cancelación y progreso
+CADA = 1000
+
+
+def recorrer(elementos, progreso, total, cada=CADA):
+    """
+    Genera los `elementos` llamando a `progreso(fraccion)` cada `cada` elementos.
+
+    :param progreso: función `f(fraccion)`; si devuelve True se deja de generar
+    :param total: número de elementos esperado (0 o negativo si no se conoce)
+    """
+    for i, elemento in enumerate(elementos):
+        if i % cada == 0 and progreso(min(i / total, 1.0) if total > 0 else 0.0):
+            return
+        yield elemento
+
+
+def tramo(progreso, inicio, fin):
+    """Función de progreso que lleva la fracción [0, 1] al tramo [inicio, fin] de `progreso`."""
+    return lambda fraccion: progreso(inicio + (fin - inicio) * fraccion)
+
+
+class FuenteProcessing:
+    """
+    Fuente de Processing con la interfaz de capa que usan los motores.
+
+    :param fuente: `QgsProcessingFeatureSource`
+    :param feedback: `QgsProcessingFeedback` del algoritmo
+    :param cada: entidades entre dos comprobaciones de cancelación
+    """
+
+    def __init__(self, fuente, feedback, cada=CADA):
+        self.fuente = fuente
+        self.feedback = feedback
+        self.cada = cada
+        # Función `f(fraccion)` opcional para informar del avance de las lecturas
+        self.progreso = None
+
+    def __getattr__(self, nombre):
+        return getattr(self.fuente, nombre)
+
+    def name(self):
+        return self.fuente.sourceName()
+
+    def crs(self):
+        return self.fuente.sourceCrs()
+
+    def getFeatures(self, peticion=None):
+        progreso = self.progreso or (lambda fraccion: self.feedback.isCanceled())
+        entidades = self.fuente.getFeatures(peticion or QgsFeatureRequest())
+        return recorrer(entidades, progreso, self.fuente.featureCount(), self.cada)
+
+
+def campos_con(campos, campo):
+    """(campos, posición) con `campo` añadido a una copia de `campos`; si ya hay uno con su nombre se reutiliza."""
+    campos = QgsFields(campos)
+    idx = campos.indexOf(campo.name())
+    if idx == -1:
+        campos.append(campo)
+        idx = campos.count() - 1
+    return campos, idx
+
+
+def entidad_con(entidad, campos, idx, valor):
+    """Copia de `entidad` con los `campos` de salida y `valor` en la posición `idx` (si no es None)."""
+    atributos = entidad.attributes()
+    atributos += [None] * (campos.count() - len(atributos))
+    if valor is not None:
+        atributos[idx] = valor
+    salida = QgsFeature(campos)
+    salida.setGeometry(entidad.geometry())
+    salida.setAttributes(atributos)
+    return salida
+
+
+class AlgoritmoComun(QgsProcessingAlgorithm):
+    """
+    Base de los algoritmos del proveedor.
+
+    Cada algoritmo define `nombre`, `titulo`, `grupo`, `parametros()` y
+    `procesar(parameters, context, feedback)`; la base añade la medición
+    opcional, convierte los `ValueError` de los motores en errores de
+    Processing y se declara segura para ejecutarse fuera del hilo principal.
+    """
+
+    MEDIR = "MEDIR"
+
+    nombre = titulo = grupo = id_grupo = ""
+
+    def name(self):           return self.nombre
+    def displayName(self):    return self.titulo
+    def group(self):          return self.grupo
+    def groupId(self):        return self.id_grupo
+    def createInstance(self): return type(self)()
+    def tr(self, string):     return string
+
+    def flags(self):
+        # Sin FlagNoThreading: Processing puede ejecutarlo en segundo plano
+        return (super().flags() | QgsProcessingAlgorithm.FlagCanCancel) & ~QgsProcessingAlgorithm.FlagNoThreading
+
+    def initAlgorithm(self, config=None):
+        for parametro in self.parametros():
+            self.addParameter(parametro)
+        self.addParameter(
+            QgsProcessingParameterBoolean(
+                self.MEDIR,
+                'Informar de tiempos, llamadas y memoria por fase',
+                defaultValue=False
+            )
+        )
+
+    def parametros(self):
+        raise NotImplementedError
+
+    def procesar(self, parameters, context, feedback):
+        raise NotImplementedError
+
+    def processAlgorithm(self, parameters, context, feedback):
+        medir = self.parameterAsBoolean(parameters, self.MEDIR, context)
+        with medicion.sesion(self.name(), activa=medir, informar=feedback.pushInfo):
+            try:
+                resultados = self.procesar(parameters, context, feedback)
+            except ValueError as error:
+                raise QgsProcessingException(str(error)) from error
+        if feedback.isCanceled():
+            feedback.reportError("Cancelado: la salida está incompleta.")
+        return resultados
+
+    def fuente(self, parameters, nombre, context, feedback):
+        """`FuenteProcessing` del parámetro `nombre`."""
+        fuente = self.parameterAsSource(parameters, nombre, context)
+        if fuente is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, nombre))
+        return FuenteProcessing(fuente, feedback)
+
+    def salida(self, parameters, nombre, context, campos, tipo, crs):
+        """(sink, id) del parámetro de salida `nombre`."""
+        sink, destino = self.parameterAsSink(parameters, nombre, context, campos, tipo, crs)
+        if sink is None:
+            raise QgsProcessingException(self.invalidSinkError(parameters, nombre))
+        return sink, destino
+
+    def procesos(self, parameters, nombre, context, feedback):
+        """
+        Número de procesos del parámetro `nombre`: 0 es None (número de CPU).
+
+        Dentro de QGIS Desktop siempre es 1 (ver el docstring del módulo).
+        """
+        procesos = self.parameterAsInt(parameters, nombre, context) or None
+        if procesos != 1 and en_interfaz():
+            feedback.pushInfo("Dentro de QGIS Desktop se usa un único proceso; "
+                              "para usar varios, ejecútalo con qgis_process.")
+            return 1
+        return procesos
+
+
+def en_interfaz():
+    """True si se ejecuta dentro de QGIS Desktop (no en `qgis_process` ni en un script aparte)."""
+    return QgsApplication.platform() == "desktop"
+
+
+def parametro_procesos(nombre):
+    return QgsProcessingParameterNumber(
+        nombre,
+        'Procesos (1 = en este proceso, 0 = uno por CPU; fuera de QGIS Desktop)',
+        type=QgsProcessingParameterNumber.Integer,
+        minValue=0,
+        defaultValue=1
+    )
+
+
+class UnirPorCercania(AlgoritmoComun):
+    """Valor del campo de la entidad secundaria más cercana (`comun/vecino_cercano.py`)."""
+
+    INPUT         = 'INPUT'
+    SECUNDARIA    = 'SECUNDARIA'
+    CAMPO_ORIGEN  = 'CAMPO_ORIGEN'
+    CAMPO_DESTINO = 'CAMPO_DESTINO'
+    DISTANCIA_MAX = 'DISTANCIA_MAX'
+    PROCESOS      = 'PROCESOS'
+    OUTPUT        = 'OUTPUT'
+
+    nombre = 'unir_por_cercania'
+    titulo = 'Unir por cercanía'
+    grupo = 'Análisis espacial'
+    id_grupo = 'analisis_espacial'
+
+    def parametros(self):
+        return [
+            QgsProcessingParameterFeatureSource(self.INPUT, 'Capa principal'),
+            QgsProcessingParameterFeatureSource(self.SECUNDARIA, 'Capa secundaria'),
+            QgsProcessingParameterField(
+                self.CAMPO_ORIGEN,
+                'Campo de la capa secundaria a copiar',
+                parentLayerParameterName=self.SECUNDARIA
+            ),
+            QgsProcessingParameterString(self.CAMPO_DESTINO, 'Campo de salida', defaultValue='cercano'),
+            QgsProcessingParameterDistance(
+                self.DISTANCIA_MAX,
+                'Distancia máxima (0 = sin límite)',
+                parentParameterName=self.INPUT,
+                minValue=0,
+                defaultValue=0
+            ),
+            parametro_procesos(self.PROCESOS),
+            QgsProcessingParameterFeatureSink(self.OUTPUT, 'Unión por cercanía'),
+        ]
+
+    def procesar(self, parameters, context, feedback):
+        from .vecino_cercano import UnionCercania
+
+        principal     = self.fuente(parameters, self.INPUT, context, feedback)
+        secundaria    = self.fuente(parameters, self.SECUNDARIA, context, feedback)
+        campo_origen  = self.parameterAsString(parameters, self.CAMPO_ORIGEN, context)
+        campo_destino = self.parameterAsString(parameters, self.CAMPO_DESTINO, context)
+        distancia_max = self.parameterAsDouble(parameters, self.DISTANCIA_MAX, context) or None
+        procesos      = self.procesos(parameters, self.PROCESOS, context, feedback)
+
+        campo = QgsField(secundaria.fields().field(campo_origen))
+        campo.setName(campo_destino)
+        campos, idx = campos_con(principal.fields(), campo)
+        sink, destino = self.salida(parameters, self.OUTPUT, context, campos,
+                                    principal.wkbType(), principal.sourceCrs())
+
+        progreso = AvisoProgreso(feedback.setProgress, feedback.isCanceled)
+        if procesos != 1:
+            from .particiones import cercanos_en_paralelo
+
+            principal.progreso = tramo(progreso, 0.0, 0.2)
+            secundaria.progreso = tramo(progreso, 0.2, 0.4)
+            valores = dict(cercanos_en_paralelo(principal, secundaria, campo_origen, distancia_max, procesos))
+            inicio = 0.6
+
+            def cercano(entidad):
+                return valores.get(entidad.id())
+        else:
+            secundaria.progreso = tramo(progreso, 0.0, 0.2)
+            union = UnionCercania.desde_capa(secundaria, campo_origen)
+            inicio = 0.2
+
+            def cercano(entidad):
+                geometria = entidad.geometry()
+                return None if geometria.isEmpty() else union.mas_cercano(geometria, distancia_max)
+
+        if feedback.isCanceled():
+            return {}
+        entidades = recorrer(principal.fuente.getFeatures(), tramo(progreso, inicio, 1.0),
+                             principal.featureCount())
+        for entidad in entidades:
+            # Igual que en el script: los valores vacíos o NULL no se copian
+            sink.addFeature(entidad_con(entidad, campos, idx, cercano(entidad) or None), QgsFeatureSink.FastInsert)
+        return {self.OUTPUT: destino}
+
+
+class DistanciasPorClave(AlgoritmoComun):
+    """Distancia mínima a las entidades destino con el mismo identificador (`comun/distancias_clave.py`)."""
+
+    INPUT           = 'INPUT'
+    DESTINO         = 'DESTINO'
+    CAMPO           = 'CAMPO'
+    CAMPO_DISTANCIA = 'CAMPO_DISTANCIA'
+    MODO            = 'MODO'
+    PROCESOS        = 'PROCESOS'
+    OUTPUT          = 'OUTPUT'
+
+    MODOS = ['memoria', 'filtro']
+
+    nombre = 'distancias_por_clave'
+    titulo = 'Distancia mínima por identificador'
+    grupo = 'Análisis espacial'
+    id_grupo = 'analisis_espacial'
+
+    def parametros(self):
+        return [
+            QgsProcessingParameterFeatureSource(self.INPUT, 'Capa origen'),
+            QgsProcessingParameterFeatureSource(self.DESTINO, 'Capa destino'),
+            QgsProcessingParameterField(
+                self.CAMPO,
+                'Campo identificador (en las dos capas)',
+                parentLayerParameterName=self.INPUT
+            ),
+            QgsProcessingParameterString(self.CAMPO_DISTANCIA, 'Campo de salida', defaultValue='distancia'),
+            QgsProcessingParameterEnum(
+                self.MODO,
+                'Lectura de la capa destino',
+                options=['Una vez, en memoria', 'Por identificador, con filtro'],
+                defaultValue=0
+            ),
+            parametro_procesos(self.PROCESOS),
+            QgsProcessingParameterFeatureSink(self.OUTPUT, 'Distancias'),
+        ]
+
+    def procesar(self, parameters, context, feedback):
+        from .distancias_clave import distancias_por_clave
+
+        origen          = self.fuente(parameters, self.INPUT, context, feedback)
+        destino_capa    = self.fuente(parameters, self.DESTINO, context, feedback)
+        campo           = self.parameterAsString(parameters, self.CAMPO, context)
+        campo_distancia = self.parameterAsString(parameters, self.CAMPO_DISTANCIA, context)
+        modo            = self.MODOS[self.parameterAsEnum(parameters, self.MODO, context)]
+        procesos        = self.procesos(parameters, self.PROCESOS, context, feedback)
+
+        campos, idx = campos_con(origen.fields(), QgsField(campo_distancia, QVariant.Double))
+        sink, destino = self.salida(parameters, self.OUTPUT, context, campos, origen.wkbType(), origen.sourceCrs())
+
+        progreso = AvisoProgreso(feedback.setProgress, feedback.isCanceled)
+        if modo == "memoria":
+            # En modo "filtro" la capa destino se lee una vez por identificador
+            destino_capa.progreso = tramo(progreso, 0.0, 0.3)
+        origen.progreso = tramo(progreso, 0.3, 0.6)
+        distancias, sin_coincidencia = distancias_por_clave(origen, destino_capa, campo, modo, procesos)
+        if feedback.isCanceled():
+            return {}
+
+        entidades = recorrer(origen.fuente.getFeatures(), tramo(progreso, 0.6, 1.0), origen.featureCount())
+        for entidad in entidades:
+            sink.addFeature(entidad_con(entidad, campos, idx, distancias.get(entidad.id())),
+                            QgsFeatureSink.FastInsert)
+
+        feedback.pushInfo(f"{len(distancias)} distancias calculadas")
+        if sin_coincidencia:
+            feedback.reportError(f"{len(sin_coincidencia)} entidades sin coincidencia en la capa destino.")
+        return {self.OUTPUT: destino}
+
+
+class AgruparPuntos(AlgoritmoComun):
+    """Una entidad por valor del campo agrupador (`comun/agregacion.py`)."""
+
+    INPUT      = 'INPUT'
+    CAMPO      = 'CAMPO'
+    GEOMETRIA  = 'GEOMETRIA'
+    CONTEO     = 'CONTEO'
+    MAX_CLAVES = 'MAX_CLAVES'
+    OUTPUT     = 'OUTPUT'
+
+    GEOMETRIAS = ['centroide', 'medoide', 'extension', 'envolvente']
+
+    nombre = 'agrupar_puntos'
+    titulo = 'Agrupar puntos por campo'
+    grupo = 'Análisis espacial'
+    id_grupo = 'analisis_espacial'
+
+    def parametros(self):
+        return [
+            QgsProcessingParameterFeatureSource(self.INPUT, 'Capa de puntos', [QgsProcessing.TypeVectorPoint]),
+            QgsProcessingParameterField(self.CAMPO, 'Campo agrupador', parentLayerParameterName=self.INPUT),
+            QgsProcessingParameterEnum(
+                self.GEOMETRIA,
+                'Geometría de cada grupo',
+                options=['Centroide', 'Medoide', 'Extensión', 'Envolvente convexa'],
+                defaultValue=0
+            ),
+            QgsProcessingParameterBoolean(self.CONTEO, 'Añadir el número de puntos', defaultValue=True),
+            QgsProcessingParameterNumber(
+                self.MAX_CLAVES,
+                'Grupos en memoria antes de volcar a disco (0 = sin límite)',
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=0,
+                defaultValue=0
+            ),
+            QgsProcessingParameterFeatureSink(self.OUTPUT, 'Puntos agrupados'),
+        ]
+
+    def procesar(self, parameters, context, feedback):
+        from .agregacion import (
+            Centroide, Conteo, EnvolventeConvexa, Extension, Medoide,
+            agregador_geometria, agrupar_puntos, campos_salida, entidades_grupos,
+        )
+
+        capa       = self.fuente(parameters, self.INPUT, context, feedback)
+        campo      = self.parameterAsString(parameters, self.CAMPO, context)
+        geometria  = self.GEOMETRIAS[self.parameterAsEnum(parameters, self.GEOMETRIA, context)]
+        conteo     = self.parameterAsBoolean(parameters, self.CONTEO, context)
+        max_claves = self.parameterAsInt(parameters, self.MAX_CLAVES, context) or None
+
+        clases = {"centroide": Centroide, "medoide": Medoide, "extension": Extension,
+                  "envolvente": EnvolventeConvexa}
+        agregadores = {geometria: clases[geometria]()}
+        if conteo:
+            agregadores["conteo"] = Conteo()
+        tipo = QgsWkbTypes.parseType(agregador_geometria(agregadores, geometria).tipo_geometria)
+
+        campos = campos_salida(capa, campo, agregadores)
+        sink, destino = self.salida(parameters, self.OUTPUT, context, campos, tipo, capa.sourceCrs())
+
+        progreso = AvisoProgreso(feedback.setProgress, feedback.isCanceled)
+        capa.progreso = tramo(progreso, 0.0, 0.9)
+        agrupador = agrupar_puntos(capa, campo, agregadores, max_claves)
+        if feedback.isCanceled():
+            return {}
+
+        # Con volcados a disco no se sabe cuántos grupos hay hasta leer las particiones
+        grupos = 0 if agrupador.volcados else len(agrupador.estados)
+        for entidad in recorrer(entidades_grupos(agrupador, campos, geometria), tramo(progreso, 0.9, 1.0), grupos):
+            sink.addFeature(entidad, QgsFeatureSink.FastInsert)
+        if agrupador.sin_geometria:
+            feedback.reportError(
+                f"{agrupador.sin_geometria} grupos sin geometría (menos de tres puntos no alineados)."
+            )
+        return {self.OUTPUT: destino}
+
+
+class RectangulosEnPuntos(AlgoritmoComun):
+    """Rectángulo (o cuadrado) centrado en cada punto (`comun/rectangulos.py`)."""
+
+    INPUT        = 'INPUT'
+    ANCHO        = 'ANCHO'
+    CAMPO_ANCHO  = 'CAMPO_ANCHO'
+    ALTO         = 'ALTO'
+    CAMPO_ALTO   = 'CAMPO_ALTO'
+    ANGULO       = 'ANGULO'
+    CAMPO_ANGULO = 'CAMPO_ANGULO'
+    OUTPUT       = 'OUTPUT'
+
+    nombre = 'rectangulos_en_puntos'
+    titulo = 'Rectángulos centrados en puntos'
+    grupo = 'Buffers'
+    id_grupo = 'buffers'
+
+    def parametros(self):
+        def campo_numerico(nombre, descripcion):
+            return QgsProcessingParameterField(
+                nombre, descripcion, parentLayerParameterName=self.INPUT,
+                type=QgsProcessingParameterField.Numeric, optional=True
+            )
+
+        return [
+            QgsProcessingParameterFeatureSource(self.INPUT, 'Capa de puntos', [QgsProcessing.TypeVectorPoint]),
+            QgsProcessingParameterDistance(self.ANCHO, 'Ancho', parentParameterName=self.INPUT,
+                                           minValue=0, defaultValue=10),
+            campo_numerico(self.CAMPO_ANCHO, 'Campo con el ancho (en lugar del valor fijo)'),
+            QgsProcessingParameterDistance(self.ALTO, 'Alto (0 = cuadrados)', parentParameterName=self.INPUT,
+                                           minValue=0, defaultValue=0),
+            campo_numerico(self.CAMPO_ALTO, 'Campo con el alto (en lugar del valor fijo)'),
+            QgsProcessingParameterNumber(self.ANGULO, 'Giro en grados (antihorario)',
+                                         type=QgsProcessingParameterNumber.Double, defaultValue=0),
+            campo_numerico(self.CAMPO_ANGULO, 'Campo con el giro (en lugar del valor fijo)'),
+            QgsProcessingParameterFeatureSink(self.OUTPUT, 'Rectángulos', QgsProcessing.TypeVectorPolygon),
+        ]
+
+    def procesar(self, parameters, context, feedback):
+        from .rectangulos import calcular_rectangulos, wkb_poligonos
+
+        capa = self.fuente(parameters, self.INPUT, context, feedback)
+
+        def valor(parametro, parametro_campo):
+            campo = self.parameterAsString(parameters, parametro_campo, context)
+            return campo or self.parameterAsDouble(parameters, parametro, context)
+
+        ancho  = valor(self.ANCHO, self.CAMPO_ANCHO)
+        alto   = valor(self.ALTO, self.CAMPO_ALTO) or None
+        angulo = valor(self.ANGULO, self.CAMPO_ANGULO)
+
+        sink, destino = self.salida(parameters, self.OUTPUT, context, capa.fields(),
+                                    QgsWkbTypes.Polygon, capa.sourceCrs())
+
+        progreso = AvisoProgreso(feedback.setProgress, feedback.isCanceled)
+        capa.progreso = tramo(progreso, 0.0, 0.4)
+        fids, vertices = calcular_rectangulos(capa, ancho, alto, angulo)
+        if feedback.isCanceled():
+            return {}
+        posiciones = dict(zip(fids.tolist(), range(len(fids))))
+        wkbs = wkb_poligonos(vertices)
+
+        # Segunda lectura con todos los atributos: se copian a cada rectángulo
+        for entidad in recorrer(capa.fuente.getFeatures(), tramo(progreso, 0.4, 1.0), capa.featureCount()):
+            posicion = posiciones.get(entidad.id())
+            if posicion is None:
+                continue
+            geometria = QgsGeometry()
+            geometria.fromWkb(wkbs[posicion])
+            entidad.setGeometry(geometria)
+            sink.addFeature(entidad, QgsFeatureSink.FastInsert)
+        return {self.OUTPUT: destino}
+
+
+class SeleccionarEnRadio(AlgoritmoComun):
+    """Entidades dentro del radio de alguno de los centros (`comun/radio.py`)."""
+
+    INPUT   = 'INPUT'
+    CENTROS = 'CENTROS'
+    RADIO   = 'RADIO'
+    EXACTO  = 'EXACTO'
+    OUTPUT  = 'OUTPUT'
+
+    nombre = 'seleccionar_en_radio'
+    titulo = 'Entidades en un radio'
+    grupo = 'Buffers'
+    id_grupo = 'buffers'
+
+    def parametros(self):
+        return [
+            QgsProcessingParameterFeatureSource(self.INPUT, 'Capa principal'),
+            QgsProcessingParameterFeatureSource(self.CENTROS, 'Capa con los centros'),
+            QgsProcessingParameterDistance(self.RADIO, 'Radio', parentParameterName=self.INPUT,
+                                           minValue=0, defaultValue=700),
+            QgsProcessingParameterBoolean(
+                self.EXACTO,
+                'Comparar con el buffer de QGIS en el borde (si no, círculo exacto)',
+                defaultValue=True
+            ),
+            QgsProcessingParameterFeatureSink(self.OUTPUT, 'Entidades en el radio'),
+        ]
+
+    def procesar(self, parameters, context, feedback):
+        from .radio import seleccionar_en_radio
+
+        principal = self.fuente(parameters, self.INPUT, context, feedback)
+        centros   = self.fuente(parameters, self.CENTROS, context, feedback)
+        radio     = self.parameterAsDouble(parameters, self.RADIO, context)
+        exacto    = self.parameterAsBoolean(parameters, self.EXACTO, context)
+
+        sink, destino = self.salida(parameters, self.OUTPUT, context, principal.fields(),
+                                    principal.wkbType(), principal.sourceCrs())
+
+        progreso = AvisoProgreso(feedback.setProgress, feedback.isCanceled)
+        centros.progreso = tramo(progreso, 0.0, 0.1)
+        fids = seleccionar_en_radio(principal, centros, radio, union=True, exacto=exacto).tolist()
+        if feedback.isCanceled():
+            return {}
+
+        peticion = QgsFeatureRequest().setFilterFids(fids)
+        for entidad in recorrer(principal.fuente.getFeatures(peticion), tramo(progreso, 0.5, 1.0), len(fids)):
+            sink.addFeature(entidad, QgsFeatureSink.FastInsert)
+        feedback.pushInfo(f"{len(fids)} entidades en un radio de {radio}")
+        return {self.OUTPUT: destino}
+
+
+class ExportarCapas(AlgoritmoComun):
+    """Un fichero por capa, en paralelo para las capas de fichero (`comun/exportacion.py`)."""
+
+    CAPAS    = 'CAPAS'
+    CARPETA  = 'CARPETA'
+    FORMATO  = 'FORMATO'
+    PROCESOS = 'PROCESOS'
+    MOTOR    = 'MOTOR'
+
+    nombre = 'exportar_capas'
+    titulo = 'Exportar capas'
+    grupo = 'Exportar'
+    id_grupo = 'exportar'
+
+    def flags(self):
+        # Lee las capas del proyecto (fuente, edición, campos) y exporta algunas con
+        # Processing: solo es seguro en el hilo principal
+        return super().flags() | QgsProcessingAlgorithm.FlagNoThreading
+
+    def parametros(self):
+        from .exportacion import FORMATOS, MOTORES
+
+        return [
+            QgsProcessingParameterMultipleLayers(self.CAPAS, 'Capas', QgsProcessing.TypeVectorAnyGeometry),
+            QgsProcessingParameterEnum(self.FORMATO, 'Formato', options=list(FORMATOS), defaultValue=0),
+            QgsProcessingParameterEnum(self.MOTOR, 'Motor', options=list(MOTORES), defaultValue=0),
+            QgsProcessingParameterNumber(
+                self.PROCESOS,
+                'Exportaciones simultáneas (0 = una por CPU)',
+                type=QgsProcessingParameterNumber.Integer,
+                minValue=0,
+                defaultValue=1
+            ),
+            QgsProcessingParameterFolderDestination(self.CARPETA, 'Carpeta de salida'),
+        ]
+
+    def procesar(self, parameters, context, feedback):
+        from .exportacion import FORMATOS, MOTORES, ejecutar_trabajos, exportar_en_qgis, planificar
+
+        capas    = self.parameterAsLayerList(parameters, self.CAPAS, context)
+        carpeta  = self.parameterAsFileOutput(parameters, self.CARPETA, context)
+        formato  = list(FORMATOS)[self.parameterAsEnum(parameters, self.FORMATO, context)]
+        motor    = MOTORES[self.parameterAsEnum(parameters, self.MOTOR, context)]
+        if motor == "gdal":
+            # Grupo de procesos de Python: el mismo límite que el resto de algoritmos
+            procesos = self.procesos(parameters, self.PROCESOS, context, feedback)
+        else:
+            # Con ogr2ogr son hilos que esperan a procesos `ogr2ogr`, también en QGIS Desktop
+            procesos = self.parameterAsInt(parameters, self.PROCESOS, context) or None
+
+        os.makedirs(carpeta, exist_ok=True)
+        trabajos, locales = planificar(capas, carpeta, formato)
+        pasos = QgsProcessingMultiStepFeedback(max(len(trabajos) + len(locales), 1), feedback)
+        errores = []
+
+        def al_terminar(resultado):
+            pasos.setCurrentStep(pasos.currentStep() + 1)
+            if resultado.error:
+                errores.append(resultado.nombre)
+                feedback.reportError(f"{resultado.nombre}: {resultado.error}")
+            else:
+                feedback.pushInfo(f"{resultado.nombre} -> {resultado.destino} ({resultado.segundos:.1f} s)")
+
+        ejecutar_trabajos(trabajos, procesos, motor, al_terminar=al_terminar, cancelado=feedback.isCanceled)
+        for capa, destino in locales:
+            if feedback.isCanceled():
+                break
+            al_terminar(exportar_en_qgis(capa, destino, context, pasos))
+
+        if errores:
+            feedback.reportError(f"{len(errores)} capas no se han podido exportar.")
+        return {self.CARPETA: carpeta}
+
+
+class ExportarTabla(AlgoritmoComun):
+    """Tabla de atributos a CSV o Parquet por bloques (`comun/tablas.py`)."""
+
+    INPUT  = 'INPUT'
+    CAMPOS = 'CAMPOS'
+    OUTPUT = 'OUTPUT'
+
+    nombre = 'exportar_tabla'
+    titulo = 'Exportar tabla de atributos'
+    grupo = 'Exportar'
+    id_grupo = 'exportar'
+
+    def parametros(self):
+        return [
+            QgsProcessingParameterFeatureSource(self.INPUT, 'Capa', [QgsProcessing.TypeVector]),
+            QgsProcessingParameterField(
+                self.CAMPOS,
+                'Campos (vacío = todos)',
+                parentLayerParameterName=self.INPUT,
+                allowMultiple=True,
+                optional=True
+            ),
+            QgsProcessingParameterFileDestination(self.OUTPUT, 'Tabla', fileFilter='CSV (*.csv);;Parquet (*.parquet)'),
+        ]
+
+    def procesar(self, parameters, context, feedback):
+        from .tablas import exportar_tabla
+
+        capa   = self.fuente(parameters, self.INPUT, context, feedback)
+        campos = self.parameterAsFields(parameters, self.CAMPOS, context) or capa.fields().names()
+        ruta   = self.parameterAsFileOutput(parameters, self.OUTPUT, context)
+
+        capa.progreso = AvisoProgreso(feedback.setProgress, feedback.isCanceled)
+        try:
+            progreso = exportar_tabla(capa, campos, ruta)
+        except RuntimeError as error:
+            raise QgsProcessingException(str(error)) from error
+        feedback.pushInfo(f"{progreso.filas} filas ({progreso.filas_por_segundo:.0f} filas/s)")
+        return {self.OUTPUT: ruta}
+
+
+ALGORITMOS = (
+    UnirPorCercania,
+    DistanciasPorClave,
+    AgruparPuntos,
+    RectangulosEnPuntos,
+    SeleccionarEnRadio,
+    ExportarCapas,
+    ExportarTabla,
+)
+
+
+class ProveedorPyQGIS(QgsProcessingProvider):
+    """Proveedor de Processing con los algoritmos de `ALGORITMOS`."""
+
+    ID = 'pyqgis_scripts'
+
+    def id(self):       return self.ID
+    def name(self):     return 'PyQGIS-Scripts'
+    def longName(self): return 'Scripts PyQGIS (motores de comun)'
+
+    def loadAlgorithms(self):
+        for clase in ALGORITMOS:
+            self.addAlgorithm(clase())
+
+
+def registrar_proveedor():
+    """
+    Añade el proveedor al registro de Processing.
+
+    Si ya estaba registrado se sustituye, de modo que volver a ejecutar el
+    script de registro no duplica los algoritmos.
+
+    :return: el proveedor registrado
+    """
+    registro = QgsApplication.processingRegistry()
+    anterior = registro.providerById(ProveedorPyQGIS.ID)
+    if anterior is not None:
+        registro.removeProvider(anterior)
+    proveedor = ProveedorPyQGIS()
+    registro.addProvider(proveedor)
+    return proveedor
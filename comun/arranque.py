@@ -0,0 +1,79 @@
+"""
+Arranque de QGIS sin interfaz, una sola vez por proceso.
+
+Dentro de la consola de Python de QGIS la aplicación ya existe y estas
+funciones no hacen nada. Fuera de ella (línea de órdenes, procesos de un
+grupo, tareas programadas en un servidor) la primera llamada a
+`iniciar_qgis` crea el `QgsApplication` sin interfaz y las siguientes lo
+reutilizan, de modo que un lote de trabajos solo paga el arranque una vez.
+
+`processing` es caro de importar e inicializar (carga todos los proveedores
+de algoritmos), así que solo se prepara cuando un trabajo lo necesita,
+con `iniciar_processing`.
+"""
+
+import os
+import sys
+
+_aplicacion = None
+_processing = False
+
+
+def iniciar_qgis():
+    """`QgsApplication` del proceso; se crea sin interfaz la primera vez si no existe."""
+    global _aplicacion
+    from qgis.core import QgsApplication
+
+    if QgsApplication.instance() is None:
+        _aplicacion = QgsApplication([], False)
+        _aplicacion.initQgis()
+    return QgsApplication.instance()
+
+
+def iniciar_processing():
+    """Importa e inicializa `processing` con los algoritmos nativos la primera vez que se pide."""
+    global _processing
+    if _processing:
+        return
+    iniciar_qgis()
+    from qgis.core import QgsApplication
+
+    try:
+        from processing.core.Processing import Processing
+    except ImportError:
+        # Fuera de QGIS los complementos de Python no están en la ruta de importación
+        sys.path.append(os.path.join(QgsApplication.prefixPath(), "python", "plugins"))
+        from processing.core.Processing import Processing
+
+    Processing.initialize()
+    if QgsApplication.processingRegistry().providerById("native") is None:
+        from qgis.analysis import QgsNativeAlgorithms
+
+        QgsApplication.processingRegistry().addProvider(QgsNativeAlgorithms())
+    _processing = True
+
+
+def terminar_qgis():
+    """Cierra el `QgsApplication` si lo creó `iniciar_qgis` (el de la consola de QGIS no se toca)."""
+    global _aplicacion, _processing
+    if _aplicacion is not None:
+        _aplicacion.exitQgis()
+        _aplicacion = None
+        _processing = False
+
+
+def abrir_capa(ruta, nombre=None, proveedor="ogr"):
+    """
+    Abre una capa vectorial de un fichero (gpkg, shp...).
+
+    :param ruta: ruta del fichero; en un GeoPackage con varias tablas, "ruta.gpkg|layername=tabla"
+    :raises ValueError: si la capa no es válida
+    """
+    iniciar_qgis()
+    from qgis.core import QgsVectorLayer
+
+    fichero = ruta.split("|", 1)[0]
+    capa = QgsVectorLayer(ruta, nombre or os.path.splitext(os.path.basename(fichero))[0], proveedor)
+    if not capa.isValid():
+        raise ValueError(f"La capa no es válida: {ruta}")
+    return capa
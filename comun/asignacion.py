@@ -0,0 +1,102 @@
+"""
+Asignación de un valor a un campo en segundo plano.
+
+El trabajo se divide en dos partes:
+
+- `RecogidaFids`: recorre las entidades a editar (todas, las seleccionadas o
+  las que cumplen una expresión) y las agrupa en bloques de fids, informando
+  del progreso y comprobando la cancelación cada cierto número de entidades.
+  No usa Qt ni QGIS, así que puede ejecutarse dentro de un `QgsTask` (con una
+  `QgsVectorLayerFeatureSource`, que es segura entre hilos) o probarse con
+  cualquier iterable de fids.
+- `aplicar_bloques`: escribe los bloques con `EscritorAtributos`. Se llama en
+  el hilo principal al terminar la tarea, porque el búfer de edición de la
+  capa no se puede tocar desde otro hilo.
+"""
+
+from .escritura import EscritorAtributos, TAM_BLOQUE
+from .fechas import AvisoProgreso
+
+MODOS = ("todas", "seleccionadas", "expresion")
+
+
+def peticion_fids(campos, modo="todas", seleccion=None, expresion=None):
+    """
+    QgsFeatureRequest sin geometría que solo devuelve las entidades a editar.
+
+    :param campos: QgsFields de la capa (para los campos que use la expresión)
+    :param seleccion: fids seleccionados (modo "seleccionadas")
+    :param expresion: filtro de QGIS (modo "expresion")
+    :raises ValueError: si el modo es desconocido o la expresión no es válida
+    """
+    from qgis.core import QgsExpression, QgsFeatureRequest
+
+    if modo not in MODOS:
+        raise ValueError(f"Modo desconocido '{modo}'. Usa uno de: {', '.join(MODOS)}.")
+    peticion = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+    if modo == "seleccionadas":
+        return peticion.setFilterFids(list(seleccion or [])).setNoAttributes()
+    if modo == "expresion":
+        filtro = QgsExpression(expresion or "")
+        if filtro.hasParserError():
+            raise ValueError(f"Expresión no válida: {filtro.parserErrorString()}")
+        peticion.setFilterExpression(expresion)
+        return peticion.setSubsetOfAttributes(list(filtro.referencedColumns()), campos)
+    return peticion.setNoAttributes()
+
+
+class RecogidaFids:
+    """
+    Agrupa en bloques los fids a editar.
+
+    :param total: número aproximado de entidades (para el porcentaje de progreso)
+    :param tam_bloque: fids por bloque
+    :param cada: entidades entre avisos de progreso y comprobaciones de cancelación
+    """
+
+    def __init__(self, total=None, tam_bloque=TAM_BLOQUE, cada=1000):
+        self.total = total
+        self.tam_bloque = tam_bloque
+        self.cada = cada
+        self.bloques = []
+        self.cantidad = 0
+        self.cancelada = False
+
+    def ejecutar(self, fids, progreso=None, cancelado=None):
+        """
+        Recorre `fids` guardándolos en `self.bloques`.
+
+        :param progreso: función opcional `f(porcentaje)`; solo se llama cuando el porcentaje cambia
+        :param cancelado: función opcional sin argumentos que devuelve True para detener el recorrido
+        :return: False si se canceló
+        """
+        aviso = AvisoProgreso(progreso, cancelado)
+        total = max(self.total or 0, 1)
+        bloque = []
+        for fid in fids:
+            bloque.append(fid)
+            self.cantidad += 1
+            if len(bloque) >= self.tam_bloque:
+                self.bloques.append(bloque)
+                bloque = []
+            if self.cantidad % self.cada == 0 and aviso(min(self.cantidad / total, 1.0)):
+                self.cancelada = True
+                return False
+        if bloque:
+            self.bloques.append(bloque)
+        aviso(1.0)
+        return True
+
+
+def aplicar_bloques(capa, idx, valor, bloques, progreso=None):
+    """
+    Asigna `valor` al campo `idx` de las entidades de cada bloque (en el hilo principal).
+
+    :return: el `EscritorAtributos` usado, con las estadísticas de escritura
+    """
+    escritor = EscritorAtributos(capa)
+    aviso = AvisoProgreso(progreso)
+    for i, bloque in enumerate(bloques):
+        escritor.asignar_constante(idx, valor, fids=bloque)
+        aviso((i + 1) / len(bloques))
+    return escritor
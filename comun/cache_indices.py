@@ -0,0 +1,275 @@
+"""
+Caché en disco de índices espaciales y de las geometrías que usan.
+
+Las capas de referencia (callejeros, redes, parcelas...) cambian pocas veces,
+pero los scripts de cercanía, radio y distancias las leen e indexan en cada
+ejecución. `CacheIndices` guarda lo construido la primera vez (los arrays de
+`IndiceSTR`, los fids, las cajas y las geometrías como un único buffer de WKB)
+en una carpeta con un `.npy` por array; en las siguientes ejecuciones se abre
+con `np.load(mmap_mode="r")` sin leer la capa.
+
+Cada entrada se identifica por:
+
+- la fuente de la capa (URI) y su filtro (`subsetString`),
+- el tamaño y la fecha de modificación de sus ficheros (en un shapefile
+  también .dbf y .shx; en un GeoPackage también el -wal),
+- el número de entidades,
+- lo que se ha guardado (tipo de índice, campo...).
+
+Las capas en edición con cambios sin guardar no usan la caché.
+
+Si la capa cambia, la clave cambia: la entrada antigua de esa misma fuente se
+borra al guardar la nueva. Además la carpeta tiene un tamaño máximo y, si se
+supera, se borran las entradas usadas hace más tiempo.
+
+Solo se guardan en caché capas de ficheros locales; con el resto (PostGIS,
+capas en memoria...) todo funciona igual pero sin caché.
+
+Los arrays de objetos (valores de atributos, claves) se guardan sin pickle,
+como texto, enteros, reales o booleanos con una máscara de nulos (ver
+`objetos_a_array` en `comun/lectura.py`), y se cargan enteros; el resto se
+proyecta en memoria. Si mezclan tipos (o son fechas...) la entrada no se
+guarda. Una carpeta de caché puede estar compartida (PYQGIS_CACHE_INDICES),
+así que nunca se carga código de ella, y cualquier error al leer una entrada
+(ficheros truncados o dañados) se trata como si no estuviera.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .lectura import DTYPES_OBJETOS, array_a_objetos, objetos_a_array
+
+FICHERO_DESCRIPCION = "entrada.json"
+
+MAX_MB = 2048
+
+# Ficheros que acompañan a la fuente y cuyo cambio también invalida la caché
+FICHEROS_ASOCIADOS = (".dbf", ".shx", ".cpg")
+
+
+def carpeta_por_defecto():
+    """Carpeta de la caché: la variable de entorno PYQGIS_CACHE_INDICES o ~/.cache/pyqgis-scripts/indices."""
+    return os.environ.get("PYQGIS_CACHE_INDICES") or os.path.join(
+        os.path.expanduser("~"), ".cache", "pyqgis-scripts", "indices"
+    )
+
+
+def ruta_fuente(capa):
+    """Ruta del fichero local de la capa, o None si no tiene (capas en memoria, bases de datos...)."""
+    if hasattr(capa, "consultar"):
+        return None
+    from qgis.core import QgsProviderRegistry
+
+    partes = QgsProviderRegistry.instance().decodeUri(capa.dataProvider().name(), capa.source())
+    ruta = partes.get("path") or ""
+    return ruta if os.path.isfile(ruta) else None
+
+
+def _huella_ficheros(ruta):
+    """[(nombre, tamaño, mtime)] de la fuente y sus ficheros asociados."""
+    base = os.path.splitext(ruta)[0]
+    candidatos = [ruta, ruta + "-wal"] + [base + extension for extension in FICHEROS_ASOCIADOS]
+    huella = []
+    for candidato in candidatos:
+        if os.path.isfile(candidato):
+            estado = os.stat(candidato)
+            huella.append((os.path.basename(candidato), estado.st_size, estado.st_mtime_ns))
+    return huella
+
+
+def _resumen(datos):
+    return hashlib.sha256(json.dumps(datos, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+
+def clave_capa(capa, *contenido):
+    """
+    (fuente, clave) de lo que se quiere guardar de la capa, o None si no se puede guardar en caché.
+
+    :param contenido: lo que distingue esta entrada de otras de la misma capa (tipo, campo...)
+    """
+    ruta = ruta_fuente(capa)
+    # Con cambios sin guardar la capa ya no coincide con su fichero
+    if ruta is None or (capa.isEditable() and capa.isModified()):
+        return None
+    fuente = _resumen([capa.source(), capa.subsetString(), *contenido])
+    clave = _resumen([fuente, _huella_ficheros(ruta), capa.featureCount()])
+    return fuente, clave
+
+
+def geometrias_a_wkb(geometrias):
+    """(buffer uint8, desplazamientos int64) con el WKB de todas las geometrías seguidas."""
+    trozos = [bytes(geometria.asWkb()) for geometria in geometrias]
+    desplazamientos = np.zeros(len(trozos) + 1, dtype=np.int64)
+    np.cumsum([len(trozo) for trozo in trozos], out=desplazamientos[1:])
+    return np.frombuffer(b"".join(trozos), dtype=np.uint8), desplazamientos
+
+
+class GeometriasWkb:
+    """
+    Secuencia de geometrías guardadas como WKB; cada una se construye al pedirla.
+
+    :param tipo: "qgis" o "memoria" (ver `comun/particiones.py`)
+    """
+
+    def __init__(self, buffer, desplazamientos, tipo="qgis"):
+        self.buffer = buffer
+        self.desplazamientos = desplazamientos
+        self.tipo = tipo
+
+    def __len__(self):
+        return len(self.desplazamientos) - 1
+
+    def __getitem__(self, i):
+        from .particiones import desde_wkb
+
+        inicio, fin = int(self.desplazamientos[i]), int(self.desplazamientos[i + 1])
+        return desde_wkb(self.buffer[inicio:fin].tobytes(), self.tipo)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+class CacheIndices:
+    """
+    Carpeta con entradas de arrays, con límite de tamaño.
+
+    :param carpeta: carpeta de la caché (por defecto, `carpeta_por_defecto()`)
+    :param max_mb: tamaño máximo; al superarlo se borran las entradas menos usadas
+    """
+
+    def __init__(self, carpeta=None, max_mb=MAX_MB):
+        self.carpeta = carpeta or carpeta_por_defecto()
+        self.max_bytes = max_mb * 2 ** 20
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _ruta(self, clave):
+        return os.path.join(self.carpeta, clave)
+
+    def obtener(self, clave):
+        """Arrays de la entrada `clave`, o None si no está o no se puede leer."""
+        ruta = self._ruta(clave)
+        descripcion = os.path.join(ruta, FICHERO_DESCRIPCION)
+
+        def cargar(nombre, mmap=True):
+            return np.load(os.path.join(ruta, nombre + ".npy"), mmap_mode="r" if mmap else None,
+                           allow_pickle=False)
+
+        try:
+            with open(descripcion, encoding="utf-8") as archivo:
+                tipos = json.load(archivo)["arrays"]
+            arrays = {}
+            for nombre, tipo in tipos.items():
+                if tipo is None:
+                    arrays[nombre] = cargar(nombre)
+                elif tipo in DTYPES_OBJETOS:
+                    arrays[nombre] = array_a_objetos(cargar(nombre, False), cargar(nombre + ".nulos", False))
+                else:
+                    raise ValueError(f"Tipo de array desconocido: {tipo!r}")
+        except Exception:  # entrada incompleta, truncada o de otra versión: se reconstruye
+            # Se borra para que la nueva se pueda guardar con la misma clave
+            if os.path.isdir(ruta):
+                self._borrar(clave)
+            return None
+        # La fecha de modificación de la descripción marca el último uso (LRU)
+        try:
+            os.utime(descripcion)
+        except OSError:
+            pass
+        return arrays
+
+    def guardar(self, fuente, clave, arrays):
+        """
+        Guarda la entrada, borra las antiguas de la misma fuente y aplica el límite de tamaño.
+
+        Si algún array de objetos no se puede guardar sin pickle la entrada no se guarda.
+        """
+        ficheros, tipos = {}, {}
+        for nombre, valores in arrays.items():
+            valores = np.asarray(valores)
+            tipos[nombre] = None
+            if valores.dtype == object:
+                tipada = objetos_a_array(valores.tolist())
+                if tipada is None:
+                    return
+                valores, ficheros[nombre + ".nulos"], tipos[nombre] = tipada
+            ficheros[nombre] = valores
+
+        os.makedirs(self.carpeta, exist_ok=True)
+        temporal = self._ruta(f"{clave}.{os.getpid()}.tmp")
+        shutil.rmtree(temporal, ignore_errors=True)
+        os.makedirs(temporal)
+        for nombre, valores in ficheros.items():
+            np.save(os.path.join(temporal, nombre + ".npy"), valores, allow_pickle=False)
+        with open(os.path.join(temporal, FICHERO_DESCRIPCION), "w", encoding="utf-8") as archivo:
+            json.dump({"fuente": fuente, "creada": time.time(), "arrays": tipos}, archivo)
+        try:
+            os.rename(temporal, self._ruta(clave))
+        except OSError:
+            # Otro proceso la ha guardado a la vez
+            shutil.rmtree(temporal, ignore_errors=True)
+        self._borrar_antiguas(fuente, clave)
+        self.limpiar()
+
+    def _entradas(self):
+        """[(último uso, bytes, clave, fuente)] de las entradas completas."""
+        entradas = []
+        if not os.path.isdir(self.carpeta):
+            return entradas
+        for clave in os.listdir(self.carpeta):
+            ruta = self._ruta(clave)
+            descripcion = os.path.join(ruta, FICHERO_DESCRIPCION)
+            if clave.endswith(".tmp") or not os.path.isfile(descripcion):
+                continue
+            try:
+                with open(descripcion, encoding="utf-8") as archivo:
+                    fuente = json.load(archivo).get("fuente")
+                tamano = sum(entrada.stat().st_size for entrada in os.scandir(ruta))
+                entradas.append((os.path.getmtime(descripcion), tamano, clave, fuente))
+            except (OSError, ValueError):
+                continue
+        return entradas
+
+    def _borrar(self, clave):
+        # En Windows no se puede borrar un fichero proyectado en memoria: se deja para otra vez
+        shutil.rmtree(self._ruta(clave), ignore_errors=True)
+
+    def _borrar_antiguas(self, fuente, clave):
+        for _, _, otra, otra_fuente in self._entradas():
+            if otra_fuente == fuente and otra != clave:
+                self._borrar(otra)
+
+    def limpiar(self):
+        """Borra las entradas usadas hace más tiempo hasta quedar por debajo del tamaño máximo."""
+        entradas = sorted(self._entradas())
+        total = sum(tamano for _, tamano, _, _ in entradas)
+        for _, tamano, clave, _ in entradas:
+            if total <= self.max_bytes:
+                break
+            self._borrar(clave)
+            total -= tamano
+
+    def obtener_o_construir(self, capa, contenido, construir):
+        """
+        Arrays de la caché para (capa, contenido) o, si no están, los de `construir()`, que se guardan.
+
+        :param contenido: tupla que identifica lo guardado (p. ej. ("cercania", campo))
+        :param construir: función sin argumentos que devuelve un diccionario {nombre: array}
+        """
+        claves = clave_capa(capa, *contenido)
+        if claves is None:
+            return construir()
+        fuente, clave = claves
+        arrays = self.obtener(clave)
+        if arrays is not None:
+            self.aciertos += 1
+            return arrays
+        self.fallos += 1
+        arrays = construir()
+        self.guardar(fuente, clave, arrays)
+        return arrays
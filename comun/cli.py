@@ -0,0 +1,466 @@
+"""
+Ejecución de las operaciones del repositorio desde la línea de órdenes, sin QGIS Desktop.
+
+Los scripts de las carpetas están pensados para la consola de Python de QGIS
+(capa activa, capas del proyecto por nombre, constantes que se editan). Este
+módulo ejecuta las mismas operaciones de `comun` sobre ficheros (gpkg, shp...)
+con argumentos, de modo que se pueden programar en servidores Linux:
+
+    python -m comun.cli coordenadas parcelas.gpkg --crs EPSG:4326 --incremental
+    python -m comun.cli cercania "redes.gpkg|layername=tuberias" etiquetas.shp NOMBRE nombre_red
+    python -m comun.cli --medir radio parcelas.shp pozos.shp 700 --salida ids.json
+    python -m comun.cli lote trabajos.txt
+
+Un fichero de lote tiene un trabajo por línea, con los mismos argumentos que
+la línea de órdenes (las líneas vacías y las que empiezan por # se ignoran).
+Todos los trabajos se ejecutan en el mismo proceso: QGIS se inicia una sola
+vez, con el primer trabajo que abre una capa (`comun/arranque.py`), y
+`processing` solo se carga si algún trabajo guarda una capa nueva. Un error en
+un trabajo se informa y el lote sigue (salvo con --parar); el código de salida
+es 1 si algún trabajo ha fallado.
+
+`--help` y los errores de argumentos no importan QGIS ni los motores.
+"""
+
+import argparse
+import json
+import os
+import shlex
+import sys
+import time
+
+from . import medicion
+
+
+def _capa(ruta):
+    from .arranque import abrir_capa
+
+    return abrir_capa(ruta)
+
+
+def _procesos(texto):
+    """Número de procesos: un entero o "todos" (None = número de CPU)."""
+    return None if texto == "todos" else int(texto)
+
+
+def _numero_o_campo(texto):
+    """Número si se puede interpretar, si no el nombre de un campo."""
+    try:
+        return float(texto)
+    except ValueError:
+        return texto
+
+
+def _asegurar_campos(capa, campos):
+    """Añade a la capa los campos {nombre: "texto" o "real"} que no tenga."""
+    from qgis.core import QgsField
+    from PyQt5.QtCore import QVariant
+
+    nuevos = [
+        QgsField(nombre, QVariant.String if tipo == "texto" else QVariant.Double)
+        for nombre, tipo in campos.items() if capa.fields().indexOf(nombre) == -1
+    ]
+    if nuevos:
+        capa.dataProvider().addAttributes(nuevos)
+        capa.updateFields()
+
+
+def _cache(args):
+    if args.sin_cache:
+        return None
+    from .cache_indices import CacheIndices
+
+    return CacheIndices(args.carpeta_cache)
+
+
+def _guardar_capa(capa, destino):
+    from .exportacion import exportar_en_qgis
+
+    resultado = exportar_en_qgis(capa, destino)
+    if resultado.error:
+        raise RuntimeError(f"No se pudo guardar '{destino}': {resultado.error}")
+
+
+def _informe_resultados(resultados):
+    """Texto con los correctos y los errores de una lista de resultados con `error`."""
+    errores = [r for r in resultados if r.error]
+    for resultado in errores:
+        print(f"  error: {resultado[0]}: {resultado.error}", file=sys.stderr)
+    if errores:
+        raise RuntimeError(f"{len(errores)} de {len(resultados)} con errores")
+    return f"{len(resultados)} correctos"
+
+
+# --- Operaciones: cada una recibe los argumentos y devuelve un resumen ---
+
+def _coordenadas(args):
+    from .reproyeccion import reproyectar_centroides
+
+    capa = _capa(args.capa)
+    _asegurar_campos(capa, {args.campo_x: "real", args.campo_y: "real"})
+    actualizadas = reproyectar_centroides(
+        capa, args.crs, args.campo_x, args.campo_y, args.decimales, incremental=args.incremental
+    )
+    return f"{actualizadas} entidades actualizadas"
+
+
+def _dms(args):
+    from .dms import convertir_capa_a_decimal, convertir_capa_a_dms
+
+    capa = _capa(args.capa)
+    if args.sentido == "decimal_a_dms":
+        _asegurar_campos(capa, {args.campo_lat_dms: "texto", args.campo_lon_dms: "texto"})
+        actualizadas = convertir_capa_a_dms(
+            capa, args.campo_y, args.campo_x, args.campo_lat_dms, args.campo_lon_dms,
+            incremental=args.incremental,
+        )
+    else:
+        _asegurar_campos(capa, {args.campo_y: "real", args.campo_x: "real"})
+        actualizadas = convertir_capa_a_decimal(
+            capa, args.campo_lat_dms, args.campo_lon_dms, args.campo_y, args.campo_x,
+            incremental=args.incremental,
+        )
+    return f"{actualizadas} entidades actualizadas"
+
+
+def _cercania(args):
+    from .vecino_cercano import unir_por_cercania
+
+    principal, secundaria = _capa(args.principal), _capa(args.secundaria)
+    _asegurar_campos(principal, {args.campo_destino: "texto"})
+    actualizadas = unir_por_cercania(
+        principal, secundaria, args.campo_origen, args.campo_destino, distancia_max=args.distancia_max,
+        max_procesos=args.procesos, cache=_cache(args), incremental=args.incremental,
+    )
+    return f"{actualizadas} entidades actualizadas"
+
+
+def _distancias(args):
+    from .distancias_clave import calcular_distancias_por_clave
+
+    origen, destino = _capa(args.origen), _capa(args.destino)
+    _asegurar_campos(origen, {args.campo_distancia: "real"})
+    actualizadas, sin_coincidencia = calcular_distancias_por_clave(
+        origen, destino, args.campo_identificador, args.campo_distancia, modo=args.modo,
+        max_procesos=args.procesos, cache=_cache(args),
+    )
+    return f"{actualizadas} entidades actualizadas, {len(sin_coincidencia)} sin coincidencia"
+
+
+def _radio(args):
+    from .radio import seleccionar_en_radio
+
+    resultado = seleccionar_en_radio(
+        _capa(args.principal), _capa(args.centros), args.radio, union=not args.por_centro,
+        exacto=not args.aproximado, cache=_cache(args),
+    )
+    if args.por_centro:
+        datos = {str(centro): ids.tolist() for centro, ids in resultado.items()}
+        total = len({fid for ids in datos.values() for fid in ids})
+    else:
+        datos = resultado.tolist()
+        total = len(datos)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as archivo:
+            json.dump(datos, archivo)
+    return f"{total} entidades dentro del radio"
+
+
+def _fechas(args):
+    from .fechas import FORMATOS_ENTRADA, convertir_campo_fecha
+
+    formatos = args.formatos.split(";") if args.formatos else FORMATOS_ENTRADA
+    opciones = {} if args.formato_salida is None else {"formato_salida": args.formato_salida}
+    resultado = convertir_campo_fecha(
+        _capa(args.capa), args.campo, formatos, args.unidad, hora_local=not args.utc, **opciones
+    )
+    return (f"{resultado.convertidas} convertidas ({resultado.numericas} epoch, {resultado.textos} textos), "
+            f"{resultado.nulos} nulas, {resultado.no_interpretables} no interpretables")
+
+
+def _agrupar(args):
+    from .agregacion import Centroide, Conteo, agrupar_capa
+    from .salidas import formato_fichero
+
+    # GeoPackage y FlatGeobuf se escriben directamente; el resto pasa por una capa en memoria
+    directo = formato_fichero(args.salida) is not None
+    salida = agrupar_capa(
+        _capa(args.capa), args.campo, {"centroide": Centroide(), "conteo": Conteo()},
+        geometria="centroide", nombre_salida=args.nombre or args.campo, max_claves=args.max_grupos,
+        destino=args.salida if directo else None,
+    )
+    if not directo:
+        _guardar_capa(salida, args.salida)
+    return f"{salida.featureCount()} grupos en {args.salida}"
+
+
+def _rectangulos(args):
+    from .rectangulos import generar_rectangulos
+    from .salidas import formato_fichero
+
+    directo = formato_fichero(args.salida) is not None
+    alto = None if args.alto is None else _numero_o_campo(args.alto)
+    salida = generar_rectangulos(
+        _capa(args.capa), _numero_o_campo(args.ancho), alto, _numero_o_campo(args.angulo),
+        nombre_salida=os.path.splitext(os.path.basename(args.salida))[0],
+        destino=args.salida if directo else None,
+    )
+    if not directo:
+        _guardar_capa(salida, args.salida)
+    return f"{salida.featureCount()} rectángulos en {args.salida}"
+
+
+def _tabla(args):
+    from .tablas import exportar_tabla
+
+    progreso = exportar_tabla(_capa(args.capa), args.campos, args.salida, tam_bloque=args.filas_por_bloque)
+    return f"{progreso.filas} filas en {args.salida} ({progreso.filas_por_segundo:.0f} filas/s)"
+
+
+def _union_clave(args):
+    from .uniones import actualizar_por_clave
+
+    fuente = args.fuente if args.fuente.lower().endswith(".csv") else _capa(args.fuente)
+    if any(":" in campo for campo in args.campos):
+        campos = dict(campo.split(":", 1) if ":" in campo else (campo, campo) for campo in args.campos)
+    else:
+        campos = args.campos
+    resultado = actualizar_por_clave(
+        _capa(args.capa), fuente, args.campo_clave, campos, args.clave_fuente, sql=not args.sin_sql
+    )
+    return f"{resultado.actualizadas} entidades actualizadas, {resultado.sin_coincidencia} sin coincidencia"
+
+
+def _exportar(args):
+    from .exportacion import exportar_capas
+
+    capas = [_capa(ruta) for ruta in args.capas]
+    resultados = exportar_capas(
+        capas, args.carpeta, formato=args.formato, max_procesos=args.procesos, motor=args.motor
+    )
+    return _informe_resultados(resultados)
+
+
+def _añadir_capa(args):
+    from .arranque import iniciar_qgis
+    from .proyectos import añadir_capa_a_proyectos, buscar_proyectos, preparar_capa
+
+    iniciar_qgis()
+    proyectos = buscar_proyectos(args.carpeta)
+    resultados = añadir_capa_a_proyectos(proyectos, preparar_capa(args.capa), args.modo, args.procesos)
+    omitidos = sum(1 for r in resultados if r.omitido)
+    return f"{_informe_resultados(resultados)} ({omitidos} ya tenían la capa)"
+
+
+def _estilos(args):
+    from .estilos import exportar_estilos_proyectos
+
+    return _informe_resultados(exportar_estilos_proyectos(args.proyectos, args.carpeta, args.procesos))
+
+
+def _opciones_cache(parser):
+    parser.add_argument("--sin-cache", action="store_true", help="no usar la caché de índices en disco")
+    parser.add_argument("--carpeta-cache", help="carpeta de la caché de índices (ver comun/cache_indices.py)")
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m comun.cli",
+        description="Operaciones del repositorio sobre ficheros, sin QGIS Desktop.",
+    )
+    parser.add_argument("--medir", action="store_true", help="informar de tiempos, llamadas y memoria por fase")
+    parser.add_argument("--traza", help="guardar una traza JSON para chrome://tracing")
+    operaciones = parser.add_subparsers(dest="operacion", required=True, metavar="operacion")
+
+    p = operaciones.add_parser("lote", help="ejecutar un fichero con un trabajo por línea")
+    p.add_argument("fichero")
+    p.add_argument("--parar", action="store_true", help="parar en el primer trabajo que falle")
+
+    p = operaciones.add_parser("coordenadas", help="centroides reproyectados en dos campos (coords_wgs84)")
+    p.add_argument("capa")
+    p.add_argument("--crs", default="EPSG:4326")
+    p.add_argument("--campo-x", default="long")
+    p.add_argument("--campo-y", default="lat")
+    p.add_argument("--decimales", type=int, default=3)
+    p.add_argument("--incremental", action="store_true", help="solo las entidades que han cambiado")
+    p.set_defaults(ejecutar=_coordenadas)
+
+    p = operaciones.add_parser("dms", help="coordenadas decimales <-> DMS (Coordenadas-GPS)")
+    p.add_argument("capa")
+    p.add_argument("campo_y", help="latitud en decimal")
+    p.add_argument("campo_x", help="longitud en decimal")
+    p.add_argument("campo_lat_dms")
+    p.add_argument("campo_lon_dms")
+    p.add_argument("--sentido", choices=("decimal_a_dms", "dms_a_decimal"), default="decimal_a_dms")
+    p.add_argument("--incremental", action="store_true", help="solo las entidades que han cambiado")
+    p.set_defaults(ejecutar=_dms)
+
+    p = operaciones.add_parser("cercania", help="valor de la entidad más cercana (aplicar_punto-cercano)")
+    p.add_argument("principal")
+    p.add_argument("secundaria")
+    p.add_argument("campo_origen")
+    p.add_argument("campo_destino")
+    p.add_argument("--distancia-max", type=float)
+    p.add_argument("--procesos", type=_procesos, default=1, help='número de procesos o "todos"')
+    p.add_argument("--incremental", action="store_true", help="solo las entidades que pueden haber cambiado")
+    _opciones_cache(p)
+    p.set_defaults(ejecutar=_cercania)
+
+    p = operaciones.add_parser("distancias", help="distancia mínima por identificador (calculo_distancias)")
+    p.add_argument("origen")
+    p.add_argument("destino")
+    p.add_argument("campo_identificador")
+    p.add_argument("campo_distancia")
+    p.add_argument("--modo", choices=("memoria", "filtro"), default="memoria")
+    p.add_argument("--procesos", type=_procesos, default=1, help='número de procesos o "todos"')
+    _opciones_cache(p)
+    p.set_defaults(ejecutar=_distancias)
+
+    p = operaciones.add_parser("radio", help="entidades dentro de un radio de cada centro (radio_buffer)")
+    p.add_argument("principal")
+    p.add_argument("centros")
+    p.add_argument("radio", type=float)
+    p.add_argument("--salida", help="fichero JSON con los ids encontrados")
+    p.add_argument("--por-centro", action="store_true", help="ids por centro en lugar de la unión")
+    p.add_argument("--aproximado", action="store_true", help="círculo exacto en lugar del buffer de QGIS")
+    _opciones_cache(p)
+    p.set_defaults(ejecutar=_radio)
+
+    p = operaciones.add_parser("fechas", help="epoch o textos a fecha con formato (date_format)")
+    p.add_argument("capa")
+    p.add_argument("campo")
+    p.add_argument("--formatos", help="formatos de texto admitidos separados por ;")
+    p.add_argument("--unidad", choices=("s", "ms"), default="s")
+    p.add_argument("--formato-salida")
+    p.add_argument("--utc", action="store_true", help="dejar los epoch en UTC (si no, hora local)")
+    p.set_defaults(ejecutar=_fechas)
+
+    p = operaciones.add_parser("agrupar", help="un punto por valor del campo con su conteo (agrupar_puntos)")
+    p.add_argument("capa")
+    p.add_argument("campo")
+    p.add_argument("salida", help="fichero de salida (gpkg, shp...)")
+    p.add_argument("--nombre", help="nombre de la capa de salida")
+    p.add_argument("--max-grupos", type=int, help="grupos en memoria antes de volcar a disco")
+    p.set_defaults(ejecutar=_agrupar)
+
+    p = operaciones.add_parser("rectangulos", help="rectángulos centrados en cada punto (buffer_area_*)")
+    p.add_argument("capa")
+    p.add_argument("ancho", help="número o nombre de un campo")
+    p.add_argument("salida", help="fichero de salida (gpkg, shp...)")
+    p.add_argument("--alto", help="número o nombre de un campo (por defecto, igual que el ancho)")
+    p.add_argument("--angulo", default="0", help="grados antihorarios, número o nombre de un campo")
+    p.set_defaults(ejecutar=_rectangulos)
+
+    p = operaciones.add_parser("tabla", help="atributos a CSV o Parquet (exportar_tablas)")
+    p.add_argument("capa")
+    p.add_argument("salida")
+    p.add_argument("--campos", nargs="+", required=True)
+    p.add_argument("--filas-por-bloque", type=int, default=10_000)
+    p.set_defaults(ejecutar=_tabla)
+
+    p = operaciones.add_parser("union-clave", help="valores de un CSV u otra capa por clave (crear-campo-add-valores)")
+    p.add_argument("capa")
+    p.add_argument("fuente", help="CSV con cabecera u otra capa")
+    p.add_argument("campo_clave")
+    p.add_argument("--campos", nargs="+", required=True, help="campos, o pares origen:destino")
+    p.add_argument("--clave-fuente", help="campo clave de la fuente si se llama distinto")
+    p.add_argument("--sin-sql", action="store_true", help="no usar UPDATE ... FROM en GeoPackage")
+    p.set_defaults(ejecutar=_union_clave)
+
+    p = operaciones.add_parser("exportar", help="capas a una carpeta, un fichero por capa (exportar_capas)")
+    p.add_argument("carpeta")
+    p.add_argument("capas", nargs="+")
+    p.add_argument("--formato", default="gpkg")
+    p.add_argument("--procesos", type=_procesos, default=None, help='número de procesos o "todos"')
+    p.add_argument("--motor", choices=("ogr2ogr", "gdal"), default="ogr2ogr")
+    p.set_defaults(ejecutar=_exportar)
+
+    p = operaciones.add_parser("anadir-capa", help="añadir una capa a los proyectos de una carpeta (add_layer)")
+    p.add_argument("carpeta")
+    p.add_argument("capa")
+    p.add_argument("--modo", choices=("xml", "qgis"), default="xml")
+    p.add_argument("--procesos", type=_procesos, default=None, help='número de procesos o "todos"')
+    p.set_defaults(ejecutar=_añadir_capa)
+
+    p = operaciones.add_parser("estilos", help="estilos .qml de proyectos (exportar-simbologia)")
+    p.add_argument("carpeta")
+    p.add_argument("proyectos", nargs="+")
+    p.add_argument("--procesos", type=_procesos, default=None, help='número de procesos o "todos"')
+    p.set_defaults(ejecutar=_estilos)
+
+    return parser
+
+
+def ejecutar(args):
+    """Ejecuta un trabajo ya interpretado e informa de su resultado y su duración."""
+    inicio = time.perf_counter()
+    with medicion.sesion(args.operacion, activa=args.medir, traza=args.traza):
+        mensaje = args.ejecutar(args)
+    print(f"{args.operacion}: {mensaje} ({time.perf_counter() - inicio:.1f} s)")
+
+
+def _traza_linea(traza, numero):
+    if not traza:
+        return None
+    base, extension = os.path.splitext(traza)
+    return f"{base}_{numero}{extension or '.json'}"
+
+
+def ejecutar_lote(fichero, parser=None, parar=False, medir=False, traza=None):
+    """
+    Ejecuta los trabajos de un fichero (uno por línea) en este proceso.
+
+    :param medir: medir todos los trabajos aunque su línea no lleve --medir
+    :param traza: una traza por trabajo, con el número de línea añadido al nombre
+    :return: número de trabajos con error
+    """
+    parser = parser or crear_parser()
+    with open(fichero, encoding="utf-8") as archivo:
+        lineas = archivo.read().splitlines()
+
+    errores = 0
+    for numero, linea in enumerate(lineas, 1):
+        if not linea.strip() or linea.lstrip().startswith("#"):
+            continue
+        try:
+            args = parser.parse_args(shlex.split(linea))
+            if args.operacion == "lote":
+                raise ValueError("un lote no puede incluir otro lote")
+            args.medir = args.medir or medir
+            args.traza = args.traza or _traza_linea(traza, numero)
+            ejecutar(args)
+        except SystemExit:
+            # argparse ya ha explicado el error de argumentos
+            print(f"línea {numero}: argumentos no válidos", file=sys.stderr)
+            errores += 1
+        except Exception as error:  # el error se informa y el resto de trabajos sigue
+            print(f"línea {numero}: error: {error}", file=sys.stderr)
+            errores += 1
+        else:
+            continue
+        if parar:
+            break
+    return errores
+
+
+def main(argv=None):
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    try:
+        if args.operacion == "lote":
+            errores = ejecutar_lote(args.fichero, parser, args.parar, args.medir, args.traza)
+        else:
+            ejecutar(args)
+            errores = 0
+    except Exception as error:
+        print(f"error: {error}", file=sys.stderr)
+        errores = 1
+    finally:
+        from .arranque import terminar_qgis
+
+        terminar_qgis()
+    return 1 if errores else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Distancia mínima entre entidades de dos capas que comparten identificador.
+
+Para cada entidad de la capa origen se busca la distancia mínima a las
+entidades de la capa destino con el mismo valor en el campo identificador.
+Hay dos modos de lectura de la capa destino:
+
+- "memoria": se lee una sola vez y se agrupan sus geometrías en un
+  diccionario por identificador; después se recorre la capa origen una vez.
+- "filtro": para capas destino demasiado grandes, se pide al proveedor solo
+  las entidades de cada identificador con una expresión de filtro, de modo
+  que en memoria solo hay un grupo cada vez.
+
+En ambos casos las distancias se escriben por lotes con `EscritorAtributos`.
+En modo "memoria", con una `CacheIndices` (`comun/cache_indices.py`) las
+claves y geometrías de la capa destino se guardan en disco y se reutilizan
+mientras la capa no cambie.
+"""
+
+import numpy as np
+
+from . import medicion
+from .escritura import EscritorAtributos
+from .lectura import es_nulo, leer_filas
+from .vecino_cercano import distancia_geometrias
+
+MODOS = ("memoria", "filtro")
+
+
+def agrupar_por_clave(pares):
+    """
+    Agrupa pares (clave, geometria) en un diccionario clave -> [geometrias].
+
+    Las claves nulas se descartan.
+    """
+    grupos = {}
+    for clave, geometria in pares:
+        if es_nulo(clave):
+            continue
+        grupos.setdefault(clave, []).append(geometria)
+    return grupos
+
+
+def distancias_minimas(origenes, grupos, distancia=distancia_geometrias):
+    """
+    Distancia mínima de cada origen a las geometrías de su grupo.
+
+    :param origenes: iterable de tuplas (id, clave, geometria)
+    :param grupos: diccionario clave -> lista de geometrías destino
+    :return: (distancias, sin_coincidencia) donde `distancias` es un
+        diccionario id -> distancia mínima y `sin_coincidencia` la lista de
+        claves de los orígenes que no tienen ningún destino
+    """
+    distancias = {}
+    sin_coincidencia = []
+    for id_origen, clave, geometria in origenes:
+        destinos = None if es_nulo(clave) else grupos.get(clave)
+        if not destinos:
+            sin_coincidencia.append(clave)
+            continue
+        distancias[id_origen] = min(distancia(geometria, destino) for destino in destinos)
+    return distancias, sin_coincidencia
+
+
+def _leer_pares(capa, campo, expresion=None):
+    """(clave, geometria) de cada entidad de la capa con geometría."""
+    for _, geometria, clave in leer_filas(capa, [campo], "geometria", expresion=expresion):
+        yield clave, geometria
+
+
+def _origenes(capa, campo):
+    """(id, clave, geometria) de cada entidad de la capa origen con geometría (las demás se saltan)."""
+    for fid, geometria, clave in leer_filas(capa, [campo], "geometria"):
+        yield fid, clave, geometria
+
+
+def _grupos_destino(capa, campo, cache=None):
+    """Geometrías de la capa destino agrupadas por clave, desde la caché si se indica."""
+    if cache is None:
+        return agrupar_por_clave(_leer_pares(capa, campo))
+
+    from .cache_indices import GeometriasWkb, geometrias_a_wkb
+    from .particiones import tipo_geometrias
+
+    def construir():
+        claves, geometrias = [], []
+        for clave, geometria in _leer_pares(capa, campo):
+            if not es_nulo(clave):
+                claves.append(clave)
+                geometrias.append(geometria)
+        buffer, desplazamientos = geometrias_a_wkb(geometrias)
+        columna = np.empty(len(claves), dtype=object)
+        columna[:] = claves
+        return {"claves": columna, "wkb": buffer, "desplazamientos": desplazamientos}
+
+    arrays = cache.obtener_o_construir(capa, ("distancias_clave", campo), construir)
+    geometrias = GeometriasWkb(arrays["wkb"], arrays["desplazamientos"], tipo_geometrias(capa))
+    return agrupar_por_clave(zip(arrays["claves"].tolist(), geometrias))
+
+
+def _distancias_en_memoria(capa_origen, capa_destino, campo, cache=None):
+    grupos = _grupos_destino(capa_destino, campo, cache)
+    return distancias_minimas(_origenes(capa_origen, campo), grupos)
+
+
+def _distancias_con_filtro(capa_origen, capa_destino, campo):
+    from qgis.core import QgsExpression
+
+    # Agrupar los orígenes por clave para consultar cada clave una sola vez
+    origenes_por_clave = {}
+    sin_coincidencia = []
+    for id_origen, clave, geometria in _origenes(capa_origen, campo):
+        if es_nulo(clave):
+            sin_coincidencia.append(clave)
+            continue
+        origenes_por_clave.setdefault(clave, []).append((id_origen, clave, geometria))
+
+    distancias = {}
+    for clave, origenes in origenes_por_clave.items():
+        expresion = QgsExpression.createFieldEqualityExpression(campo, clave)
+        grupos = {clave: [geometria for _, geometria in _leer_pares(capa_destino, campo, expresion)]}
+        parciales, faltan = distancias_minimas(origenes, grupos)
+        distancias.update(parciales)
+        sin_coincidencia.extend(faltan)
+    return distancias, sin_coincidencia
+
+
+def distancias_por_clave(capa_origen, capa_destino, campo_identificador, modo="memoria",
+                         max_procesos=1, cache=None):
+    """
+    Distancia mínima de cada entidad origen a las entidades destino con el mismo identificador.
+
+    Los parámetros son los de `calcular_distancias_por_clave`.
+
+    :return: (distancias, sin_coincidencia) como en `distancias_minimas`
+    """
+    if modo not in MODOS:
+        raise ValueError(f"Modo desconocido '{modo}'. Usa uno de: {', '.join(MODOS)}.")
+
+    if modo == "memoria" and max_procesos != 1:
+        from .particiones import distancias_clave_en_paralelo
+
+        return distancias_clave_en_paralelo(capa_origen, capa_destino, campo_identificador, max_procesos)
+    if modo == "memoria":
+        return _distancias_en_memoria(capa_origen, capa_destino, campo_identificador, cache)
+    return _distancias_con_filtro(capa_origen, capa_destino, campo_identificador)
+
+
+@medicion.medir()
+def calcular_distancias_por_clave(capa_origen, capa_destino, campo_identificador,
+                                  campo_distancia, modo="memoria", max_procesos=1, cache=None):
+    """
+    Guarda en `campo_distancia` de la capa origen la distancia mínima a las
+    entidades de la capa destino con el mismo `campo_identificador`.
+
+    :param modo: "memoria" (lee la capa destino una vez) o "filtro" (consulta
+        al proveedor cada identificador por separado)
+    :param max_procesos: en modo "memoria", procesos entre los que se reparten las claves
+        (1 = sin procesos, None = número de CPU; ver `comun/particiones.py`)
+    :param cache: `CacheIndices` opcional para la capa destino (modo "memoria" en serie)
+    :return: (número de entidades actualizadas, claves sin coincidencia)
+    """
+    distancias, sin_coincidencia = distancias_por_clave(
+        capa_origen, capa_destino, campo_identificador, modo, max_procesos, cache
+    )
+
+    idx_distancia = capa_origen.fields().indexOf(campo_distancia)
+    with EscritorAtributos(capa_origen) as escritor:
+        for fid, distancia in distancias.items():
+            escritor.cambiar(fid, idx_distancia, distancia)
+    return escritor.entidades, sin_coincidencia
@@ -0,0 +1,225 @@
+"""
+Conversión de coordenadas decimales (DD) a grados, minutos y segundos (DMS) y viceversa.
+
+Las conversiones trabajan por columnas: se leen los campos de la capa en
+arrays de NumPy en una sola pasada, se calcula todo con operaciones sobre
+arrays y los textos resultantes se guardan por lotes con `EscritorAtributos`.
+
+`convertir_a_dms` es la versión escalar original, que se mantiene como
+referencia: la versión por columnas produce los mismos textos.
+
+Las conversiones de capa admiten un modo incremental que solo convierte las
+entidades cuyos campos de entrada han cambiado (ver `comun/incremental.py`).
+"""
+
+import re
+
+import numpy as np
+
+from . import lectura, medicion
+from .escritura import EscritorAtributos
+
+# Grados, minutos y segundos con hemisferio opcional delante o detrás
+_PATRON_DMS = re.compile(
+    r"""^\s*([NSEWO])?\s*
+        (-?\d+(?:\.\d+)?)\s*°\s*
+        (\d+(?:\.\d+)?)\s*'\s*
+        (\d+(?:\.\d+)?)\s*(?:"|'')?\s*
+        ([NSEWO])?\s*$""",
+    re.VERBOSE | re.IGNORECASE,
+)
+
+
+def convertir_a_dms(dd):
+    """Convierte un valor decimal a texto DMS (versión escalar, entidad a entidad)."""
+    degrees = int(dd)
+    abs_dd = abs(dd - degrees)
+    minutes = int(abs_dd * 60)
+    seconds = round((abs_dd * 60 - minutes) * 60, 2)
+
+    if seconds >= 60:
+        seconds = 0
+        minutes += 1
+    if minutes >= 60:
+        minutes = 0
+        degrees += 1
+
+    return f"{degrees}°{minutes}'{seconds}\""
+
+
+def grados_minutos_segundos(valores):
+    """
+    Descompone un array de valores decimales en grados, minutos y segundos.
+
+    Aplica el mismo acarreo que `convertir_a_dms` (segundos -> minutos -> grados).
+
+    :return: tupla (grados, minutos, segundos, acarreo); grados y minutos como
+        int64 y `acarreo` marca las filas cuyos segundos pasaron a minutos
+        (la versión escalar escribe esos segundos como el entero 0)
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    grados = np.trunc(valores)
+    fraccion = np.abs(valores - grados) * 60
+    minutos = np.floor(fraccion)
+    segundos = np.round((fraccion - minutos) * 60, 2)
+
+    acarreo = segundos >= 60
+    segundos[acarreo] = 0.0
+    minutos += acarreo
+
+    acarreo_minutos = minutos >= 60
+    minutos[acarreo_minutos] = 0
+    grados += acarreo_minutos
+
+    return grados.astype(np.int64), minutos.astype(np.int64), segundos, acarreo
+
+
+def formatear_dms(grados, minutos, segundos, acarreo=None):
+    """Textos DMS a partir de los arrays de `grados_minutos_segundos`."""
+    segundos = segundos.tolist()
+    if acarreo is not None:
+        for i in np.flatnonzero(acarreo).tolist():
+            segundos[i] = 0
+    return [
+        f"{g}°{m}'{s}\""
+        for g, m, s in zip(grados.tolist(), minutos.tolist(), segundos)
+    ]
+
+
+def decimal_a_dms(valores):
+    """Convierte un array de valores decimales en una lista de textos DMS."""
+    return formatear_dms(*grados_minutos_segundos(valores))
+
+
+def dms_a_decimal(textos):
+    """
+    Convierte textos DMS en un array de valores decimales.
+
+    Acepta el formato que genera `convertir_a_dms` (por ejemplo `-3°41'12.5"`)
+    y un hemisferio opcional (N, S, E, W/O); S y W/O hacen el valor negativo.
+    Los textos nulos o que no se pueden interpretar quedan como NaN.
+    """
+    n = len(textos)
+    signos = np.ones(n, dtype=np.float64)
+    grados = np.full(n, np.nan, dtype=np.float64)
+    minutos = np.zeros(n, dtype=np.float64)
+    segundos = np.zeros(n, dtype=np.float64)
+
+    for i, texto in enumerate(textos):
+        coincidencia = _PATRON_DMS.match(texto) if isinstance(texto, str) else None
+        if coincidencia is None:
+            continue
+        antes, g, m, s, despues = coincidencia.groups()
+        hemisferio = (antes or despues or "").upper()
+        if g.startswith("-") or hemisferio in ("S", "W", "O"):
+            signos[i] = -1.0
+        grados[i] = abs(float(g))
+        minutos[i] = float(m)
+        segundos[i] = float(s)
+
+    return signos * (grados + minutos / 60 + segundos / 3600)
+
+
+def leer_textos(capa, campos, fids=None):
+    """
+    Lee varios campos de una capa en una sola pasada y sin geometría.
+
+    :param fids: leer solo estas entidades
+    :return: (fids, {campo: lista de valores tal cual})
+    """
+    columnas = {campo: [] for campo in campos}
+    leidos = []
+    for fid, *valores in lectura.leer_filas(capa, campos, fids=fids):
+        leidos.append(fid)
+        for campo, valor in zip(campos, valores):
+            columnas[campo].append(valor)
+    return np.asarray(leidos, dtype=np.int64), columnas
+
+
+def leer_columnas(capa, campos, fids=None):
+    """
+    Como `leer_textos`, pero convierte cada campo en un array float64.
+
+    Los valores nulos o no numéricos quedan como NaN.
+    """
+    datos = lectura.leer_columnas(capa, campos, tipos=dict.fromkeys(campos, np.float64), fids=fids)
+    return datos["fid"], {campo: datos[campo] for campo in campos}
+
+
+def _guardar(capa, fids, columnas):
+    """Escribe por lotes {idx: array de valores} para las entidades `fids`."""
+    with EscritorAtributos(capa) as escritor:
+        for fila, fid in enumerate(fids):
+            escritor.cambiar_varios(fid, {idx: valores[fila] for idx, valores in columnas.items()})
+    return escritor.entidades
+
+
+def _convertir_incremental(convertir, capa, sentido, entradas, salidas):
+    """Ejecuta `convertir` solo sobre las entidades cuyos campos de `entradas` han cambiado."""
+    from .incremental import ejecutar_incremental
+
+    tarea = "|".join([sentido, *entradas, *salidas])
+    return ejecutar_incremental(
+        capa, tarea, lambda fids: convertir(capa, *entradas, *salidas, fids=fids),
+        campos=entradas, geometria=False,
+    )[0]
+
+
+@medicion.medir()
+def convertir_capa_a_dms(capa, campo_lat, campo_lon, campo_lat_dms, campo_lon_dms, fids=None,
+                         incremental=False):
+    """
+    Rellena los campos DMS de la capa a partir de los campos decimales.
+
+    Las entidades con latitud o longitud nula se dejan sin cambios.
+
+    :param fids: convertir solo estas entidades
+    :param incremental: convertir solo las entidades cuyos campos decimales han cambiado
+                        desde la ejecución anterior
+    :return: número de entidades actualizadas
+    """
+    if incremental:
+        return _convertir_incremental(
+            convertir_capa_a_dms, capa, "decimal_a_dms", [campo_lat, campo_lon], [campo_lat_dms, campo_lon_dms]
+        )
+
+    fids, columnas = leer_columnas(capa, [campo_lat, campo_lon], fids)
+    with medicion.fase("calcular", len(fids)):
+        validos = ~(np.isnan(columnas[campo_lat]) | np.isnan(columnas[campo_lon]))
+        textos_lat = decimal_a_dms(columnas[campo_lat][validos])
+        textos_lon = decimal_a_dms(columnas[campo_lon][validos])
+
+    return _guardar(capa, fids[validos].tolist(), {
+        capa.fields().indexOf(campo_lat_dms): textos_lat,
+        capa.fields().indexOf(campo_lon_dms): textos_lon,
+    })
+
+
+@medicion.medir()
+def convertir_capa_a_decimal(capa, campo_lat_dms, campo_lon_dms, campo_lat, campo_lon, fids=None,
+                             incremental=False):
+    """
+    Rellena los campos decimales de la capa a partir de los campos DMS.
+
+    Las entidades con algún texto que no se pueda interpretar se dejan sin cambios.
+
+    :param fids: convertir solo estas entidades
+    :param incremental: convertir solo las entidades cuyos campos DMS han cambiado
+                        desde la ejecución anterior
+    :return: número de entidades actualizadas
+    """
+    if incremental:
+        return _convertir_incremental(
+            convertir_capa_a_decimal, capa, "dms_a_decimal", [campo_lat_dms, campo_lon_dms], [campo_lat, campo_lon]
+        )
+
+    fids, columnas = leer_textos(capa, [campo_lat_dms, campo_lon_dms], fids)
+    with medicion.fase("calcular", len(fids)):
+        latitudes = dms_a_decimal(columnas[campo_lat_dms])
+        longitudes = dms_a_decimal(columnas[campo_lon_dms])
+        validos = ~(np.isnan(latitudes) | np.isnan(longitudes))
+
+    return _guardar(capa, fids[validos].tolist(), {
+        capa.fields().indexOf(campo_lat): latitudes[validos].tolist(),
+        capa.fields().indexOf(campo_lon): longitudes[validos].tolist(),
+    })
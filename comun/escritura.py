@@ -0,0 +1,370 @@
+"""
+Escritura de atributos por lotes.
+
+`EscritorAtributos` acumula cambios {fid: {idx: valor}} y los guarda con
+`dataProvider().changeAttributeValues` en bloques de tamaño configurable, en
+lugar de llamar a `changeAttributeValue` entidad a entidad. El tipo de cada
+campo se consulta una sola vez y los valores se convierten con el conversor
+de su campo. Al terminar informa del número de entidades escritas por segundo.
+
+Para fuentes que admiten transacciones (GeoPackage, PostGIS...) cada
+vaciado se hace dentro de una única transacción. Para asignar el mismo valor
+a todas las entidades de un GeoPackage, o los valores de una tabla de búsqueda
+por clave, se usa directamente un `UPDATE` de SQL.
+
+Si la capa está en modo edición, los cambios van al búfer de edición de la
+capa (y se guardan cuando el usuario confirme la edición) en lugar de ir al
+proveedor.
+
+Uso:
+    with EscritorAtributos(capa) as escritor:
+        for fid, valor in ...:
+            escritor.cambiar(fid, idx, valor)
+    print(escritor.resumen())
+"""
+
+import os
+import sqlite3
+import time
+
+from . import medicion
+from .lectura import leer_filas
+
+TAM_BLOQUE = 50_000
+
+
+# Textos admitidos en los campos booleanos (en minúsculas y sin espacios)
+VERDADEROS = ("true", "t", "1", "sí", "si", "s", "yes", "y", "verdadero")
+FALSOS = ("false", "f", "0", "no", "n", "falso")
+
+
+def _a_entero(valor):
+    """int de un número o de un texto con un entero ("12", "12.0"); los textos con decimales son un error."""
+    if isinstance(valor, str):
+        texto = valor.strip()
+        try:
+            return int(texto)
+        except ValueError:
+            numero = float(texto)
+            if not numero.is_integer():
+                raise
+            return int(numero)
+    return int(valor)
+
+
+def _a_booleano(valor):
+    """bool de un valor; los textos se interpretan ("false" y "0" son False) en lugar de usar `bool`."""
+    if isinstance(valor, str):
+        texto = valor.strip().lower()
+        if texto in VERDADEROS:
+            return True
+        if texto in FALSOS:
+            return False
+        raise ValueError(texto)
+    return bool(valor)
+
+
+def _conversor_tipo(campo):
+    """Función que convierte un valor al tipo de `campo` (los nulos se dejan tal cual)."""
+    from PyQt5.QtCore import QVariant
+
+    tipos = {
+        QVariant.Int: _a_entero,
+        QVariant.UInt: _a_entero,
+        QVariant.LongLong: _a_entero,
+        QVariant.ULongLong: _a_entero,
+        QVariant.Double: float,
+        QVariant.Bool: _a_booleano,
+        QVariant.String: str,
+    }
+    tipo = tipos.get(campo.type())
+    if tipo is None:
+        return None
+
+    def convertir(valor):
+        if valor is None:
+            return None
+        try:
+            return tipo(valor)
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(
+                f"El valor '{valor}' no es válido para el campo '{campo.name()}' ({campo.typeName()})."
+            ) from None
+
+    return convertir
+
+
+def _identificador(nombre):
+    """Nombre de tabla o campo entre comillas dobles para SQL."""
+    return '"' + nombre.replace('"', '""') + '"'
+
+
+def ruta_geopackage(capa):
+    """(ruta, tabla) si la capa es una tabla de un GeoPackage local; None si no."""
+    if capa.dataProvider().name() != "ogr":
+        return None
+    from qgis.core import QgsProviderRegistry
+
+    partes = QgsProviderRegistry.instance().decodeUri("ogr", capa.source())
+    ruta = partes.get("path", "")
+    if not ruta.lower().endswith(".gpkg") or not os.path.isfile(ruta):
+        return None
+    return ruta, partes.get("layerName") or os.path.splitext(os.path.basename(ruta))[0]
+
+
+class EscritorAtributos:
+    """
+    Búfer de cambios de atributos que se vacía por bloques.
+
+    :param capa: QgsVectorLayer a actualizar
+    :param tam_bloque: entidades por llamada a `changeAttributeValues`
+    :param transaccion: envolver cada vaciado en una transacción si la fuente lo admite
+    """
+
+    def __init__(self, capa, tam_bloque=TAM_BLOQUE, transaccion=True):
+        self.capa = capa
+        self.tam_bloque = tam_bloque
+        self.transaccion = transaccion
+        self._campos = capa.fields()
+        self._conversores = {}
+        self._pendientes = {}
+        self.entidades = 0
+        self.valores = 0
+        self.llamadas = 0
+        self.segundos = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_error, error, traza):
+        if tipo_error is None:
+            self.vaciar()
+        else:
+            self.descartar()
+        return False
+
+    def conversor(self, idx):
+        """Conversor del campo `idx`, calculado una sola vez por campo."""
+        if idx not in self._conversores:
+            self._conversores[idx] = _conversor_tipo(self._campos.field(idx))
+        return self._conversores[idx]
+
+    def convertir(self, idx, valor):
+        conversor = self.conversor(idx)
+        return valor if conversor is None else conversor(valor)
+
+    def cambiar(self, fid, idx, valor):
+        """Anota un cambio; se escribe al llenarse el bloque o al llamar a `vaciar`."""
+        self._pendientes.setdefault(fid, {})[idx] = self.convertir(idx, valor)
+        if len(self._pendientes) >= self.tam_bloque:
+            self.vaciar()
+
+    def cambiar_varios(self, fid, valores):
+        """Anota varios cambios {idx: valor} de una misma entidad."""
+        pendientes = self._pendientes.setdefault(fid, {})
+        for idx, valor in valores.items():
+            pendientes[idx] = self.convertir(idx, valor)
+        if len(self._pendientes) >= self.tam_bloque:
+            self.vaciar()
+
+    def descartar(self):
+        """Olvida los cambios pendientes sin escribirlos."""
+        self._pendientes = {}
+
+    def vaciar(self):
+        """Escribe todos los cambios pendientes (en bloques de `tam_bloque`)."""
+        if not self._pendientes:
+            return
+        pendientes, self._pendientes = self._pendientes, {}
+        fids = list(pendientes)
+        bloques = [
+            {fid: pendientes[fid] for fid in fids[inicio:inicio + self.tam_bloque]}
+            for inicio in range(0, len(fids), self.tam_bloque)
+        ]
+
+        inicio = time.perf_counter()
+        with medicion.fase("escribir", len(fids)):
+            if self.capa.isEditable():
+                self._escribir_en_edicion(bloques)
+            elif self.transaccion and self._admite_transaccion():
+                self._escribir_en_transaccion(bloques)
+            else:
+                for bloque in bloques:
+                    self._escribir(bloque)
+        self.segundos += time.perf_counter() - inicio
+        self.capa.triggerRepaint()
+
+    def _escribir(self, bloque):
+        medicion.contar("changeAttributeValues")
+        if not self.capa.dataProvider().changeAttributeValues(bloque):
+            raise RuntimeError(f"No se pudieron guardar los cambios en '{self.capa.name()}'.")
+        self._contar(bloque)
+
+    def _contar(self, bloque):
+        self.llamadas += 1
+        self.entidades += len(bloque)
+        self.valores += sum(len(valores) for valores in bloque.values())
+
+    def _escribir_en_edicion(self, bloques):
+        for bloque in bloques:
+            for fid, valores in bloque.items():
+                self.capa.changeAttributeValues(fid, valores)
+            medicion.contar("changeAttributeValues (edición)", len(bloque))
+            self._contar(bloque)
+
+    def _admite_transaccion(self):
+        from qgis.core import QgsTransaction
+
+        return QgsTransaction.supportsTransaction(self.capa)
+
+    def _escribir_en_transaccion(self, bloques):
+        from qgis.core import QgsTransaction
+
+        transaccion = QgsTransaction.create([self.capa])
+        if transaccion is None:
+            raise RuntimeError(f"No se pudo crear una transacción para '{self.capa.name()}'.")
+        correcto, mensaje = transaccion.begin()
+        if not correcto:
+            raise RuntimeError(f"No se pudo iniciar la transacción: {mensaje}")
+        try:
+            for bloque in bloques:
+                self._escribir(bloque)
+        except Exception:
+            transaccion.rollback()
+            raise
+        with medicion.fase("confirmar"):
+            correcto, mensaje = transaccion.commit()
+        if not correcto:
+            # Sin deshacer, la transacción quedaría abierta y los cambios a medias en la fuente
+            transaccion.rollback()
+            raise RuntimeError(f"No se pudo confirmar la transacción en '{self.capa.name()}': {mensaje}")
+
+    def asignar_constante(self, idx, valor, fids=None):
+        """
+        Asigna el mismo valor al campo `idx` de todas las entidades (o de `fids`).
+
+        En un GeoPackage sin edición abierta y sin `fids` se hace con un único
+        `UPDATE` de SQL; en el resto de casos se escriben los cambios por bloques.
+
+        :return: número de entidades actualizadas
+        """
+        valor = self.convertir(idx, valor)
+        geopackage = None if fids is not None or self.capa.isEditable() else ruta_geopackage(self.capa)
+        if geopackage is not None:
+            return self._update_sql(idx, valor, *geopackage)
+
+        if fids is None:
+            fids = (fid for fid, in leer_filas(self.capa))
+
+        antes = self.entidades
+        for fid in fids:
+            self._pendientes.setdefault(fid, {})[idx] = valor
+            if len(self._pendientes) >= self.tam_bloque:
+                self.vaciar()
+        self.vaciar()
+        return self.entidades - antes
+
+    def _update_sql(self, idx, valor, ruta, tabla):
+        campo = self._campos.field(idx).name()
+        inicio = time.perf_counter()
+        conexion = sqlite3.connect(ruta)
+        try:
+            with medicion.fase("escribir") as fase, conexion:
+                medicion.contar("UPDATE sql")
+                cursor = conexion.execute(
+                    f"UPDATE {_identificador(tabla)} SET {_identificador(campo)} = ?", (valor,)
+                )
+                actualizadas = cursor.rowcount
+                fase.sumar(actualizadas)
+        except sqlite3.Error as error:
+            # P. ej. "database is locked" si QGIS está escribiendo en el mismo fichero
+            raise RuntimeError(f"No se pudo actualizar '{tabla}' en '{ruta}': {error}") from error
+        finally:
+            conexion.close()
+
+        self.segundos += time.perf_counter() - inicio
+        self.llamadas += 1
+        self.entidades += actualizadas
+        self.valores += actualizadas
+        self.capa.dataProvider().reloadData()
+        self.capa.triggerRepaint()
+        return actualizadas
+
+    def actualizar_por_clave_sql(self, idx_clave, filas, idxs, normalizar):
+        """
+        Actualiza un GeoPackage con un único `UPDATE ... FROM` sobre una tabla temporal.
+
+        La clave de cada fila de la capa pasa por `normalizar` dentro de SQLite (se
+        registra como función SQL), así que se compara igual que en Python.
+
+        :param idx_clave: campo de la capa con la clave
+        :param filas: iterable de tuplas (clave normalizada, valor de idxs[0], valor de idxs[1], ...)
+        :param idxs: campos a actualizar
+        :param normalizar: función valor -> texto (o None) con la que se normalizaron las claves de `filas`
+        :return: número de entidades actualizadas, o None si la capa no es un GeoPackage
+                 sin edición abierta o el SQLite disponible no admite `UPDATE ... FROM` (< 3.33)
+        """
+        geopackage = None if self.capa.isEditable() else ruta_geopackage(self.capa)
+        if geopackage is None or sqlite3.sqlite_version_info < (3, 33, 0):
+            return None
+        ruta, tabla = geopackage
+        nombres = [self._campos.field(idx).name() for idx in idxs]
+        clave = self._campos.field(idx_clave).name()
+        columnas = [f"v{i}" for i in range(len(idxs))]
+        asignaciones = ", ".join(
+            f"{_identificador(nombre)} = _busqueda.{columna}" for nombre, columna in zip(nombres, columnas)
+        )
+
+        inicio = time.perf_counter()
+        conexion = sqlite3.connect(ruta)
+        try:
+            conexion.create_function("normalizar_clave", 1, normalizar, deterministic=True)
+            with medicion.fase("escribir") as fase, conexion:
+                medicion.contar("UPDATE sql")
+                conexion.execute(
+                    f"CREATE TEMP TABLE _busqueda (clave TEXT PRIMARY KEY, {', '.join(columnas)})"
+                )
+                conexion.executemany(
+                    f"INSERT OR REPLACE INTO _busqueda VALUES ({', '.join('?' * (len(idxs) + 1))})",
+                    (
+                        (fila[0], *(self.convertir(idx, valor) for idx, valor in zip(idxs, fila[1:])))
+                        for fila in filas
+                    ),
+                )
+                cursor = conexion.execute(
+                    f"UPDATE {_identificador(tabla)} SET {asignaciones} FROM _busqueda "
+                    f"WHERE _busqueda.clave = normalizar_clave({_identificador(tabla)}.{_identificador(clave)})"
+                )
+                actualizadas = cursor.rowcount
+                fase.sumar(actualizadas)
+        except sqlite3.Error as error:
+            # P. ej. "database is locked" si QGIS está escribiendo en el mismo fichero
+            raise RuntimeError(f"No se pudo actualizar '{tabla}' en '{ruta}': {error}") from error
+        finally:
+            conexion.close()
+
+        self.segundos += time.perf_counter() - inicio
+        self.llamadas += 1
+        self.entidades += actualizadas
+        self.valores += actualizadas * len(idxs)
+        self.capa.dataProvider().reloadData()
+        self.capa.triggerRepaint()
+        return actualizadas
+
+    def informe(self):
+        """Estadísticas de lo escrito hasta ahora."""
+        return {
+            "entidades": self.entidades,
+            "valores": self.valores,
+            "llamadas": self.llamadas,
+            "segundos": self.segundos,
+            "entidades_por_segundo": self.entidades / self.segundos if self.segundos else 0.0,
+        }
+
+    def resumen(self):
+        datos = self.informe()
+        return (
+            f"{datos['entidades']} entidades ({datos['valores']} valores) escritas en "
+            f"{datos['llamadas']} llamadas y {datos['segundos']:.2f} s "
+            f"({datos['entidades_por_segundo']:.0f} entidades/s)"
+        )
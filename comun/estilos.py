@@ -0,0 +1,213 @@
+"""
+Exportación incremental de estilos (.qml).
+
+Junto a los .qml se guarda un manifiesto (`estilos.json`) con la huella
+SHA-256 del contenido de cada estilo. En cada ejecución se genera el XML del
+estilo en memoria y solo se escribe el fichero si su huella ha cambiado; los
+.qml que figuran en el manifiesto pero ya no corresponden a ninguna capa se
+borran. Los ficheros se escriben de forma atómica (temporal + `os.replace`).
+
+Los estilos se pueden obtener de dos formas:
+
+- del proyecto abierto en QGIS, con `exportNamedStyle` (igual que `saveNamedStyle`);
+- directamente del XML de ficheros .qgs/.qgz, sin cargar QGIS ni los datos de
+  las capas. Así se pueden procesar muchos proyectos en paralelo con un
+  `ProcessPoolExecutor`, cada uno en su propia subcarpeta.
+"""
+
+import hashlib
+import json
+import os
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.etree import ElementTree as ET
+
+from .exportacion import nombre_fichero
+
+MANIFIESTO = "estilos.json"
+
+CABECERA_QML = "<!DOCTYPE qgis PUBLIC 'http://mrcc.com/qgis.dtd' 'SYSTEM'>\n"
+
+# Elementos de <maplayer> que describen la fuente de datos y no el estilo
+ELEMENTOS_NO_ESTILO = {
+    "id", "datasource", "keywordList", "layername", "srs", "resourceMetadata", "provider",
+    "extent", "wgs84extent", "vectorjoins", "layerDependencies", "dataDependencies",
+    "auxiliaryLayer", "metadataUrls", "dataUrl", "legendUrl", "attribution", "abstract",
+    "title", "shortname", "noData",
+}
+ATRIBUTOS_NO_ESTILO = {"type", "geometry", "wkbType"}
+
+ResultadoEstilos = namedtuple("ResultadoEstilos", "proyecto carpeta escritos sin_cambios eliminados error")
+
+
+def huella(texto):
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def escribir_atomico(ruta, texto):
+    """Escribe `texto` en un temporal junto a `ruta` y lo renombra sobre ella."""
+    temporal = f"{ruta}.tmp{os.getpid()}"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        archivo.write(texto)
+    os.replace(temporal, ruta)
+
+
+class SincronizadorEstilos:
+    """
+    Escribe en `carpeta` solo los estilos cuyo contenido ha cambiado.
+
+    Uso:
+        sincronizador = SincronizadorEstilos(carpeta)
+        for nombre, qml in estilos:
+            sincronizador.guardar(nombre, qml)
+        escritos, sin_cambios, eliminados = sincronizador.terminar()
+    """
+
+    def __init__(self, carpeta):
+        self.carpeta = carpeta
+        os.makedirs(carpeta, exist_ok=True)
+        self.ruta_manifiesto = os.path.join(carpeta, MANIFIESTO)
+        try:
+            with open(self.ruta_manifiesto, encoding="utf-8") as archivo:
+                self.anterior = json.load(archivo)
+        except (OSError, ValueError):
+            self.anterior = {}
+        self.actual = {}
+        self.escritos = 0
+        self.sin_cambios = 0
+
+    def guardar(self, nombre, qml):
+        """Guarda el estilo de la capa `nombre` si es nuevo o ha cambiado."""
+        base = nombre_fichero(nombre)
+        archivo, sufijo = f"{base}.qml", 1
+        while archivo in self.actual:
+            sufijo += 1
+            archivo = f"{base}_{sufijo}.qml"
+
+        valor = huella(qml)
+        self.actual[archivo] = valor
+        ruta = os.path.join(self.carpeta, archivo)
+        if self.anterior.get(archivo) == valor and os.path.exists(ruta):
+            self.sin_cambios += 1
+        else:
+            escribir_atomico(ruta, qml)
+            self.escritos += 1
+        return ruta
+
+    def terminar(self):
+        """
+        Borra los .qml del manifiesto anterior que ya no existen y guarda el nuevo.
+
+        :return: (escritos, sin_cambios, eliminados)
+        """
+        eliminados = 0
+        for archivo in set(self.anterior) - set(self.actual):
+            ruta = os.path.join(self.carpeta, archivo)
+            if os.path.exists(ruta):
+                os.remove(ruta)
+                eliminados += 1
+        escribir_atomico(self.ruta_manifiesto, json.dumps(self.actual, indent=1, sort_keys=True))
+        return self.escritos, self.sin_cambios, eliminados
+
+
+def estilo_capa(capa):
+    """XML del estilo de una capa cargada, el mismo que escribe `saveNamedStyle`."""
+    from qgis.PyQt.QtXml import QDomDocument
+
+    documento = QDomDocument("qgis")
+    error = capa.exportNamedStyle(documento)
+    if error:
+        raise RuntimeError(f"No se pudo exportar el estilo de '{capa.name()}': {error}")
+    return documento.toString()
+
+
+def exportar_estilos_proyecto(carpeta, proyecto=None):
+    """Exporta de forma incremental los estilos de las capas de un QgsProject (el actual por defecto)."""
+    from qgis.core import QgsProject
+
+    proyecto = proyecto or QgsProject.instance()
+    sincronizador = SincronizadorEstilos(carpeta)
+    for capa in proyecto.mapLayers().values():
+        sincronizador.guardar(capa.name(), estilo_capa(capa))
+    return ResultadoEstilos(proyecto.fileName(), carpeta, *sincronizador.terminar(), None)
+
+
+def leer_xml_proyecto(ruta):
+    """Raíz XML de un proyecto .qgs, o del .qgs que contiene un .qgz."""
+    if ruta.lower().endswith(".qgz"):
+        with zipfile.ZipFile(ruta) as comprimido:
+            nombre = next(n for n in comprimido.namelist() if n.lower().endswith(".qgs"))
+            return ET.fromstring(comprimido.read(nombre))
+    return ET.parse(ruta).getroot()
+
+
+def estilos_desde_xml(raiz):
+    """
+    Genera (nombre de capa, qml) a partir de los <maplayer> del XML de un proyecto.
+
+    El .qml se construye con los elementos de estilo de cada capa (simbología,
+    etiquetas, formularios...) y deja fuera los que describen la fuente de datos.
+    """
+    version = raiz.get("version", "")
+    for maplayer in raiz.iter("maplayer"):
+        qgis = ET.Element("qgis", {"version": version, "styleCategories": "AllStyleCategories"})
+        for atributo, valor in maplayer.attrib.items():
+            if atributo not in ATRIBUTOS_NO_ESTILO:
+                qgis.set(atributo, valor)
+        for hijo in maplayer:
+            if hijo.tag not in ELEMENTOS_NO_ESTILO:
+                qgis.append(hijo)
+        yield maplayer.findtext("layername", ""), CABECERA_QML + ET.tostring(qgis, encoding="unicode")
+
+
+def exportar_estilos_fichero(ruta_proyecto, carpeta):
+    """Exporta los estilos de un .qgs/.qgz leyendo su XML; los errores se devuelven en el resultado."""
+    try:
+        sincronizador = SincronizadorEstilos(carpeta)
+        for nombre, qml in estilos_desde_xml(leer_xml_proyecto(ruta_proyecto)):
+            sincronizador.guardar(nombre, qml)
+        return ResultadoEstilos(ruta_proyecto, carpeta, *sincronizador.terminar(), None)
+    except Exception as excepcion:  # el error se informa y el resto de proyectos sigue
+        return ResultadoEstilos(ruta_proyecto, carpeta, 0, 0, 0, str(excepcion))
+
+
+def exportar_estilos_proyectos(rutas_proyectos, carpeta, max_procesos=None, al_terminar=None):
+    """
+    Exporta en paralelo los estilos de varios proyectos, cada uno en `carpeta/<nombre del proyecto>`.
+
+    :param max_procesos: proyectos simultáneos (por defecto, el número de CPU; 1 = sin procesos)
+    :param al_terminar: función opcional que recibe cada `ResultadoEstilos` según acaba
+    :return: lista de resultados en el orden en que terminaron
+    """
+    trabajos, usados = [], set()
+    for ruta in rutas_proyectos:
+        base = nombre_fichero(os.path.splitext(os.path.basename(ruta))[0])
+        nombre, sufijo = base, 1
+        while nombre.lower() in usados:
+            sufijo += 1
+            nombre = f"{base}_{sufijo}"
+        usados.add(nombre.lower())
+        trabajos.append((ruta, os.path.join(carpeta, nombre)))
+    if not trabajos:
+        return []
+
+    resultados = []
+    max_procesos = max(1, min(max_procesos or os.cpu_count() or 1, len(trabajos)))
+    if max_procesos == 1:
+        # Sin grupo de procesos (p. ej. desde la consola de QGIS en Windows)
+        for ruta, destino in trabajos:
+            resultado = exportar_estilos_fichero(ruta, destino)
+            resultados.append(resultado)
+            if al_terminar is not None:
+                al_terminar(resultado)
+        return resultados
+
+    with ProcessPoolExecutor(max_workers=max_procesos) as grupo:
+        futuros = [grupo.submit(exportar_estilos_fichero, ruta, destino) for ruta, destino in trabajos]
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            resultados.append(resultado)
+            if al_terminar is not None:
+                al_terminar(resultado)
+    return resultados
@@ -0,0 +1,261 @@
+"""
+Exportación en paralelo de las capas de un proyecto.
+
+En el proceso principal solo se resuelve la fuente de cada capa (ruta del
+fichero, nombre de la capa dentro de él y filtro). Las capas con fuente en
+fichero se exportan después en procesos independientes sin interfaz, sin
+pasar por QGIS:
+
+- motor "ogr2ogr": un proceso `ogr2ogr` por capa, lanzados desde un grupo de
+  hilos que solo esperan a que terminen (funciona desde la consola de QGIS).
+- motor "gdal": un `ProcessPoolExecutor` cuyos procesos usan
+  `gdal.VectorTranslate` (útil en scripts fuera de QGIS); con un solo proceso
+  las capas se exportan una tras otra en el proceso actual, sin grupo.
+
+Las capas sin fichero de origen (capas en memoria, bases de datos...) y las
+que en QGIS no coinciden con su fichero (ediciones sin guardar, campos
+virtuales o de uniones, otro CRS asignado) se exportan al final en el proceso
+principal con `native:savefeatures`, que exporta lo que se ve en QGIS.
+
+Cada exportación se cronometra y los errores se recogen sin detener el
+resto; el resultado es una lista de `ResultadoExportacion`.
+"""
+
+import os
+import re
+import subprocess
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+# Extensión de salida -> driver de GDAL/OGR
+FORMATOS = {
+    "gpkg": "GPKG",
+    "shp": "ESRI Shapefile",
+    "geojson": "GeoJSON",
+    "fgb": "FlatGeobuf",
+    "csv": "CSV",
+    "kml": "KML",
+}
+
+MOTORES = ("ogr2ogr", "gdal")
+
+# Trabajo de exportación independiente de QGIS (se puede enviar a otro proceso)
+TrabajoExportacion = namedtuple("TrabajoExportacion", "nombre origen capa_origen filtro destino driver")
+
+ResultadoExportacion = namedtuple("ResultadoExportacion", "nombre destino segundos error")
+
+
+def nombre_fichero(nombre):
+    """Nombre de capa apto para usar como nombre de fichero."""
+    return re.sub(r'[\\/:*?"<>|]+', "_", nombre).strip() or "capa"
+
+
+def fuente_fichero(capa):
+    """
+    (ruta, capa dentro del fichero, filtro) si la capa se lee de un fichero con OGR; None si no.
+    """
+    if capa.dataProvider().name() != "ogr":
+        return None
+    from qgis.core import QgsProviderRegistry
+
+    partes = QgsProviderRegistry.instance().decodeUri("ogr", capa.source())
+    ruta = partes.get("path", "")
+    if not os.path.exists(ruta):
+        return None
+    return ruta, partes.get("layerName") or None, capa.subsetString() or None
+
+
+def difiere_del_fichero(capa):
+    """
+    True si exportar el fichero de la capa no daría lo mismo que exportar la capa de QGIS:
+    está en edición o tiene cambios sin guardar, tiene campos virtuales o de uniones, o
+    se le ha asignado un CRS distinto del del fichero.
+    """
+    from qgis.core import QgsFields
+
+    if capa.isEditable() or capa.isModified():
+        return True
+    campos = capa.fields()
+    if any(campos.fieldOrigin(i) in (QgsFields.OriginExpression, QgsFields.OriginJoin)
+           for i in range(campos.count())):
+        return True
+    return capa.crs() != capa.dataProvider().crs()
+
+
+def planificar(capas, carpeta, formato="gpkg"):
+    """
+    Reparte las capas entre trabajos para los procesos y capas a exportar en el proceso principal.
+
+    Van al proceso principal las capas sin fichero de origen y las que difieren
+    de él (ver `difiere_del_fichero`).
+
+    :return: (trabajos, locales) donde `locales` es una lista de tuplas (capa, destino)
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado '{formato}'. Usa uno de: {', '.join(FORMATOS)}.")
+
+    from qgis.core import QgsVectorLayer
+
+    trabajos, locales, usados = [], [], set()
+    for capa in capas:
+        if not isinstance(capa, QgsVectorLayer):
+            continue
+        base = nombre_fichero(capa.name())
+        nombre, sufijo = base, 1
+        while nombre.lower() in usados:
+            sufijo += 1
+            nombre = f"{base}_{sufijo}"
+        usados.add(nombre.lower())
+        destino = os.path.join(carpeta, f"{nombre}.{formato}")
+
+        fuente = None if difiere_del_fichero(capa) else fuente_fichero(capa)
+        if fuente is None:
+            locales.append((capa, destino))
+        else:
+            ruta, capa_origen, filtro = fuente
+            trabajos.append(TrabajoExportacion(nombre, ruta, capa_origen, filtro, destino, FORMATOS[formato]))
+    return trabajos, locales
+
+
+def exportar_con_ogr2ogr(trabajo, ejecutable="ogr2ogr"):
+    """Exporta un trabajo lanzando `ogr2ogr` en un proceso aparte."""
+    inicio = time.perf_counter()
+    orden = [ejecutable, "-f", trabajo.driver, "-overwrite", "-nln", trabajo.nombre]
+    if trabajo.filtro:
+        orden += ["-where", trabajo.filtro]
+    orden += [trabajo.destino, trabajo.origen]
+    if trabajo.capa_origen:
+        orden.append(trabajo.capa_origen)
+
+    try:
+        proceso = subprocess.run(orden, capture_output=True, text=True)
+        error = None
+        if proceso.returncode != 0:
+            error = proceso.stderr.strip() or f"ogr2ogr terminó con código {proceso.returncode}"
+    except OSError as excepcion:
+        error = str(excepcion)
+    return ResultadoExportacion(trabajo.nombre, trabajo.destino, time.perf_counter() - inicio, error)
+
+
+def exportar_con_gdal(trabajo):
+    """
+    Exporta un trabajo con `gdal.VectorTranslate` (en un proceso del grupo o, con un
+    solo proceso, en el actual).
+
+    El modo de excepciones de GDAL se restaura al terminar: en el proceso de QGIS lo
+    comparten la consola y los complementos.
+    """
+    inicio = time.perf_counter()
+    excepciones = None
+    try:
+        from osgeo import gdal
+
+        excepciones = gdal.GetUseExceptions()
+        gdal.UseExceptions()
+        gdal.VectorTranslate(
+            trabajo.destino,
+            trabajo.origen,
+            format=trabajo.driver,
+            accessMode="overwrite",
+            layerName=trabajo.nombre,
+            layers=[trabajo.capa_origen] if trabajo.capa_origen else None,
+            where=trabajo.filtro,
+        )
+        error = None
+    except Exception as excepcion:  # el error se informa y el resto de capas sigue
+        error = str(excepcion)
+    finally:
+        if excepciones == 0:
+            gdal.DontUseExceptions()
+    return ResultadoExportacion(trabajo.nombre, trabajo.destino, time.perf_counter() - inicio, error)
+
+
+def exportar_en_qgis(capa, destino, contexto=None, feedback=None):
+    """
+    Exporta una capa en el proceso principal con `native:savefeatures`.
+
+    :param contexto, feedback: los del algoritmo de Processing que la llama, si lo hay
+    """
+    from .arranque import iniciar_processing
+
+    iniciar_processing()
+    import processing
+
+    inicio = time.perf_counter()
+    try:
+        processing.run("native:savefeatures", {"INPUT": capa, "OUTPUT": destino},
+                       context=contexto, feedback=feedback, is_child_algorithm=contexto is not None)
+        error = None
+    except Exception as excepcion:
+        error = str(excepcion)
+    return ResultadoExportacion(capa.name(), destino, time.perf_counter() - inicio, error)
+
+
+def ejecutar_trabajos(trabajos, max_procesos=None, motor="ogr2ogr", ejecutable_ogr2ogr="ogr2ogr",
+                      al_terminar=None, cancelado=None):
+    """
+    Ejecuta trabajos de exportación con como mucho `max_procesos` a la vez.
+
+    :param al_terminar: función opcional que recibe cada `ResultadoExportacion` según acaba
+    :param cancelado: función opcional sin argumentos; si devuelve True al acabar un trabajo
+                      no se empiezan los pendientes (los que están en marcha terminan)
+    :return: lista de resultados en el orden en que terminaron
+    """
+    if motor not in MOTORES:
+        raise ValueError(f"Motor desconocido '{motor}'. Usa uno de: {', '.join(MOTORES)}.")
+    if not trabajos:
+        return []
+
+    max_procesos = max(1, min(max_procesos or os.cpu_count() or 1, len(trabajos)))
+    if motor == "gdal" and max_procesos == 1:
+        # Sin grupo de procesos: dentro de QGIS cada proceso arrancaría otra instancia
+        resultados = []
+        for trabajo in trabajos:
+            resultado = exportar_con_gdal(trabajo)
+            resultados.append(resultado)
+            if al_terminar is not None:
+                al_terminar(resultado)
+            if cancelado is not None and cancelado():
+                break
+        return resultados
+    if motor == "ogr2ogr":
+        grupo = ThreadPoolExecutor(max_workers=max_procesos)
+        futuros = [grupo.submit(exportar_con_ogr2ogr, t, ejecutable_ogr2ogr) for t in trabajos]
+    else:
+        grupo = ProcessPoolExecutor(max_workers=max_procesos)
+        futuros = [grupo.submit(exportar_con_gdal, t) for t in trabajos]
+
+    resultados = []
+    with grupo:
+        for futuro in as_completed(futuros):
+            if futuro.cancelled():
+                continue
+            resultado = futuro.result()
+            resultados.append(resultado)
+            if al_terminar is not None:
+                al_terminar(resultado)
+            if cancelado is not None and cancelado():
+                for pendiente in futuros:
+                    pendiente.cancel()
+    return resultados
+
+
+def exportar_capas(capas, carpeta, formato="gpkg", max_procesos=None, motor="ogr2ogr",
+                   ejecutable_ogr2ogr="ogr2ogr", al_terminar=None):
+    """
+    Exporta las capas vectoriales a `carpeta`, un fichero por capa.
+
+    :param formato: extensión de salida (ver `FORMATOS`); GeoPackage por defecto
+    :param max_procesos: exportaciones simultáneas (por defecto, el número de CPU)
+    :return: lista de `ResultadoExportacion`
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    trabajos, locales = planificar(capas, carpeta, formato)
+    resultados = ejecutar_trabajos(trabajos, max_procesos, motor, ejecutable_ogr2ogr, al_terminar)
+    for capa, destino in locales:
+        resultado = exportar_en_qgis(capa, destino)
+        resultados.append(resultado)
+        if al_terminar is not None:
+            al_terminar(resultado)
+    return resultados
@@ -0,0 +1,252 @@
+"""
+Conversión por columnas de fechas (epoch o texto) a un formato de texto.
+
+El campo se lee una sola vez, sin geometría, y los valores se clasifican en
+bloque como:
+
+- nulos (None, NULL o texto vacío), que no se tocan;
+- epoch numérico (números o textos numéricos), en segundos o milisegundos;
+- texto, que se interpreta probando en orden una lista de formatos.
+
+Los valores se trabajan sobre los valores distintos (`np.unique`), de modo
+que las fechas repetidas se interpretan una sola vez. Los epoch se convierten
+con `datetime64` de NumPy y los textos con `pandas.to_datetime` si pandas está
+instalado (si no, con `strptime` sobre los valores distintos). Como hacía
+`datetime.fromtimestamp`, los epoch se pasan por defecto a la hora local; el
+desfase se calcula una vez por cada hora distinta, no por valor.
+
+Lo que no se puede interpretar se cuenta en `no_interpretables` en lugar de
+ignorarse en silencio.
+"""
+
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from . import medicion
+from .lectura import es_nulo, leer_filas
+from .escritura import EscritorAtributos
+
+try:
+    import pandas as pd
+except ImportError:  # pandas es opcional: solo acelera la lectura de textos
+    pd = None
+
+FORMATOS_ENTRADA = ("%Y-%m-%d %H:%M:%S",)
+
+FORMATO_SALIDA = "%d/%m/%Y %H:%M:%S"
+
+FECHA_MINIMA = np.datetime64("0001-01-01T00:00:00", "s")
+FECHA_MAXIMA = np.datetime64("9999-12-31T23:59:59", "s")
+
+# Divisor para pasar el epoch a segundos
+UNIDADES = {"s": 1, "ms": 1000}
+
+ResultadoFechas = namedtuple("ResultadoFechas", "convertidas numericas textos nulos no_interpretables")
+
+
+class AvisoProgreso:
+    """
+    Llama a `informar(porcentaje)` solo cuando el porcentaje entero cambia.
+
+    :param cancelado: función opcional sin argumentos; si devuelve True se detiene el proceso
+    """
+
+    def __init__(self, informar=None, cancelado=None):
+        self.informar = informar
+        self.cancelado = cancelado
+        self._ultimo = -1
+
+    def __call__(self, fraccion):
+        porcentaje = int(fraccion * 100)
+        if self.informar is not None and porcentaje != self._ultimo:
+            self._ultimo = porcentaje
+            self.informar(porcentaje)
+        return self.cancelado is not None and self.cancelado()
+
+
+def clasificar(valores):
+    """
+    Clasifica los valores en nulos, numéricos y textos.
+
+    :return: (numeros, es_numero, es_texto, es_nulo) con `numeros` float64 (NaN donde no es número)
+    """
+    n = len(valores)
+    numeros = np.full(n, np.nan)
+    es_numero = np.zeros(n, dtype=bool)
+    es_texto = np.zeros(n, dtype=bool)
+    nulos = np.zeros(n, dtype=bool)
+
+    textos = {}
+    for i, valor in enumerate(valores):
+        if es_nulo(valor) or valor == "":
+            nulos[i] = True
+        elif isinstance(valor, (int, float)):
+            numeros[i] = valor
+            es_numero[i] = True
+        else:
+            textos.setdefault(str(valor), []).append(i)
+
+    # Los textos numéricos ("1700000000") también son epoch, como con float(valor)
+    for texto, posiciones in textos.items():
+        try:
+            numero = float(texto)
+        except ValueError:
+            es_texto[posiciones] = True
+            continue
+        numeros[posiciones] = numero
+        es_numero[posiciones] = True
+    return numeros, es_numero, es_texto, nulos
+
+
+def _desfase_hora(hora):
+    """Desfase local de la hora `hora` (horas desde 1970), o None si la plataforma no lo da."""
+    try:
+        return time.localtime(hora * 3600).tm_gmtoff
+    except (OSError, OverflowError, ValueError):
+        # En Windows `localtime` no admite instantes anteriores a 1970 ni posteriores al año 3000
+        return None
+
+
+def _desfase_local(segundos):
+    """
+    Desfase UTC -> hora local (en segundos) de cada instante, calculado por horas distintas.
+
+    :return: (desfases, validos) con `validos` False donde no se pudo calcular el desfase
+    """
+    horas, inversa = np.unique(np.floor_divide(segundos, 3600), return_inverse=True)
+    por_hora = [_desfase_hora(int(h)) for h in horas]
+    desfases = np.array([0 if d is None else d for d in por_hora], dtype=np.int64)
+    validos = np.array([d is not None for d in por_hora], dtype=bool)
+    return desfases[inversa], validos[inversa]
+
+
+def epoch_a_datetime64(numeros, unidad="s", hora_local=True):
+    """
+    Epoch (segundos o milisegundos) a `datetime64[s]`; NaT donde no es válido.
+
+    Como `datetime.fromtimestamp(...).strftime(...)`, las fracciones de segundo se descartan.
+    """
+    if unidad not in UNIDADES:
+        raise ValueError(f"Unidad desconocida '{unidad}'. Usa una de: {', '.join(UNIDADES)}.")
+    numeros = np.asarray(numeros, dtype=np.float64)
+    resultado = np.full(len(numeros), np.datetime64("NaT"), dtype="datetime64[s]")
+
+    with np.errstate(invalid="ignore", over="ignore"):
+        microsegundos = np.round(numeros / UNIDADES[unidad] * 1e6)
+    validos = np.isfinite(microsegundos) & (np.abs(microsegundos) < 2 ** 62)
+    segundos = np.floor_divide(microsegundos[validos].astype(np.int64), 1_000_000)
+    if hora_local and len(segundos):
+        desfases, con_desfase = _desfase_local(segundos)
+        segundos = segundos + desfases
+        # Sin hora local conocida el valor no se puede convertir: queda como NaT
+        validos[validos] = con_desfase
+        segundos = segundos[con_desfase]
+    resultado[validos] = segundos.astype("datetime64[s]")
+    # Fuera del rango de `datetime` (años 1 a 9999) no se puede formatear
+    resultado[(resultado < FECHA_MINIMA) | (resultado > FECHA_MAXIMA)] = np.datetime64("NaT")
+    return resultado
+
+
+def textos_a_datetime64(textos, formatos=FORMATOS_ENTRADA):
+    """
+    Interpreta textos probando los formatos en orden; NaT donde ninguno encaja.
+    """
+    unicos, inversa = np.unique(np.asarray(textos, dtype=object).astype(str), return_inverse=True)
+    fechas = np.full(len(unicos), np.datetime64("NaT"), dtype="datetime64[s]")
+    pendientes = np.arange(len(unicos))
+
+    for formato in formatos:
+        if not len(pendientes):
+            break
+        if pd is not None:
+            leidas = pd.to_datetime(pd.Series(unicos[pendientes]), format=formato, errors="coerce")
+            leidas = leidas.to_numpy(dtype="datetime64[s]")
+        else:
+            leidas = np.array([_strptime(t, formato) for t in unicos[pendientes]], dtype="datetime64[s]")
+        correctas = ~np.isnat(leidas)
+        fechas[pendientes[correctas]] = leidas[correctas]
+        pendientes = pendientes[~correctas]
+    return fechas[inversa]
+
+
+def _strptime(texto, formato):
+    try:
+        return datetime.strptime(texto, formato)
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def formatear(fechas, formato=FORMATO_SALIDA):
+    """Lista de textos con `strftime`; None donde la fecha es NaT."""
+    return [None if f is None else f.strftime(formato) for f in fechas.astype(object)]
+
+
+def leer_campo(capa, campo):
+    """(fids, valores) del campo, leído sin geometría."""
+    fids, valores = [], []
+    for fid, valor in leer_filas(capa, [campo]):
+        fids.append(fid)
+        valores.append(valor)
+    return np.asarray(fids, dtype=np.int64), valores
+
+
+def convertir_fechas(valores, formatos=FORMATOS_ENTRADA, unidad="s", hora_local=True):
+    """
+    Convierte una columna de valores a `datetime64[s]`.
+
+    :return: (fechas, clases) donde `clases` es la tupla de `clasificar`
+    """
+    numeros, es_numero, es_texto, nulos = clasificar(valores)
+    fechas = np.full(len(valores), np.datetime64("NaT"), dtype="datetime64[s]")
+    fechas[es_numero] = epoch_a_datetime64(numeros[es_numero], unidad, hora_local)
+    if es_texto.any():
+        textos = [valores[i] for i in np.flatnonzero(es_texto)]
+        fechas[es_texto] = textos_a_datetime64(textos, formatos)
+    return fechas, (numeros, es_numero, es_texto, nulos)
+
+
+@medicion.medir()
+def convertir_campo_fecha(capa, campo, formatos=FORMATOS_ENTRADA, unidad="s",
+                          formato_salida=FORMATO_SALIDA, hora_local=True, progreso=None,
+                          cada=10_000):
+    """
+    Reescribe `campo` con las fechas en `formato_salida`, escribiendo por lotes.
+
+    :param progreso: función opcional `f(fraccion)` (p. ej. un `AvisoProgreso`); si devuelve
+                     True se cancela la escritura de lo que queda
+    :param cada: filas entre avisos de progreso
+    :return: `ResultadoFechas`
+    """
+    progreso = progreso or (lambda fraccion: False)
+    fids, valores = leer_campo(capa, campo)
+    if progreso(0.2):
+        return ResultadoFechas(0, 0, 0, 0, 0)
+
+    with medicion.fase("calcular", len(valores)):
+        fechas, (_, es_numero, es_texto, nulos) = convertir_fechas(valores, formatos, unidad, hora_local)
+        validas = ~np.isnat(fechas)
+    if progreso(0.4):
+        return ResultadoFechas(0, 0, 0, 0, 0)
+
+    idx = capa.fields().indexOf(campo)
+    fids_validos = fids[validas].tolist()
+    with medicion.fase("calcular", len(fids_validos)):
+        textos = formatear(fechas[validas], formato_salida)
+    total = max(len(textos), 1)
+    with EscritorAtributos(capa) as escritor:
+        for i, (fid, texto) in enumerate(zip(fids_validos, textos)):
+            if i % cada == 0 and progreso(0.4 + 0.6 * i / total):
+                break
+            escritor.cambiar(fid, idx, texto)
+    progreso(1.0)
+
+    return ResultadoFechas(
+        convertidas=escritor.entidades,
+        numericas=int(np.count_nonzero(es_numero & validas)),
+        textos=int(np.count_nonzero(es_texto & validas)),
+        nulos=int(np.count_nonzero(nulos)),
+        no_interpretables=int(np.count_nonzero(~nulos & ~validas)),
+    )
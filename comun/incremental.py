@@ -0,0 +1,362 @@
+"""
+Ejecución incremental: solo se recalculan las entidades que han cambiado.
+
+Los trabajos que se repiten cada noche (coordenadas, DMS, unión por cercanía)
+recalculan la capa entera aunque cambie menos de un 1 % de las entidades.
+`EstadoIncremental` guarda en un fichero SQLite junto a la capa una huella
+por entidad (fid y un resumen del WKB de la geometría y de los atributos de
+entrada) y en la siguiente ejecución la compara con la actual:
+
+- nuevas: fids que no estaban,
+- modificadas: fids cuya huella ha cambiado,
+- borradas: fids que ya no están.
+
+Solo las nuevas y las modificadas se recalculan y se escriben. Las huellas se
+guardan en la misma transacción al terminar, después de escribir: si el
+trabajo falla, la siguiente ejecución vuelve a encontrar los mismos cambios.
+
+Cada trabajo se identifica con una `tarea` que incluye sus parámetros (CRS,
+campos...): si se cambian no hay huellas previas y se recalcula todo. Para
+calcular las huellas hay que leer la capa entera, pero leer es mucho más
+barato que reproyectar, buscar vecinos o escribir.
+
+En la unión por cercanía (`cercanos_incremental`) se guarda además, para
+cada entidad principal, su vecino, la distancia y su caja. Así también se
+vuelven a evaluar las entidades principales sin cambios cuyo vecino se ha
+movido, ha cambiado de valor o se ha borrado, y aquellas a las que una
+entidad secundaria nueva o movida puede quedar a la misma distancia o más
+cerca que su vecino actual. El resultado es el mismo que recalculando todo.
+
+Los cambios hechos a mano en los campos de salida no se detectan: para
+recalcular todo basta con borrar el fichero de estado o usar `reiniciar=True`.
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+from collections import namedtuple
+
+import numpy as np
+
+from . import medicion
+from .escritura import EscritorAtributos
+from .indice_espacial import IndiceSTR
+from .lectura import leer_filas
+from .vecino_cercano import UnionCercania, caja_geometria
+
+SUFIJO_ESTADO = ".incremental.sqlite"
+
+
+class Cambios(namedtuple("Cambios", "nuevas modificadas borradas total")):
+    """Conjuntos de fids nuevos, modificados y borrados; `total` es el número de entidades actual."""
+
+    __slots__ = ()
+
+    @property
+    def pendientes(self):
+        """fids a recalcular (nuevos y modificados), ordenados."""
+        return sorted(self.nuevas | self.modificadas)
+
+    @property
+    def todas(self):
+        """True si hay que recalcular todas las entidades (p. ej. en la primera ejecución)."""
+        return len(self.nuevas) + len(self.modificadas) == self.total
+
+    def resumen(self):
+        return f"{len(self.nuevas)} nuevas, {len(self.modificadas)} modificadas, {len(self.borradas)} borradas"
+
+
+def huella(geometria, valores=()):
+    """Resumen de 64 bits (entero con signo, como los INTEGER de SQLite) del WKB y los valores."""
+    resumen = hashlib.blake2b(digest_size=8)
+    if geometria is not None:
+        resumen.update(bytes(geometria.asWkb()))
+    resumen.update(b"\0")
+    resumen.update(repr(tuple(valores)).encode("utf-8"))
+    return int.from_bytes(resumen.digest(), "little", signed=True)
+
+
+def huellas_capa(capa, campos=(), geometria=True):
+    """
+    Huella de cada entidad de la capa.
+
+    :param campos: atributos de entrada que forman parte de la huella
+    :param geometria: incluir la geometría en la huella
+    :return: diccionario fid -> huella
+    """
+    if not geometria:
+        return {fid: huella(None, valores) for fid, *valores in leer_filas(capa, campos)}
+    return {
+        fid: huella(geom, valores)
+        for fid, geom, *valores in leer_filas(capa, campos, "geometria", omitir_vacias=False)
+    }
+
+
+def ruta_estado(capa):
+    """
+    Fichero de estado por defecto de la capa.
+
+    Junto al fichero de la capa (con el nombre de la tabla en un GeoPackage); para capas
+    que no son ficheros locales, en ~/.cache/pyqgis-scripts/incremental.
+    """
+    from .cache_indices import ruta_fuente
+
+    if hasattr(capa, "consultar"):
+        raise ValueError(f"La capa '{capa.name()}' no es un fichero: indica la ruta del estado.")
+    ruta = ruta_fuente(capa)
+    if ruta is None:
+        carpeta = os.path.join(os.path.expanduser("~"), ".cache", "pyqgis-scripts", "incremental")
+        os.makedirs(carpeta, exist_ok=True)
+        nombre = hashlib.sha256(capa.source().encode("utf-8")).hexdigest()[:32]
+        return os.path.join(carpeta, nombre + SUFIJO_ESTADO)
+
+    from qgis.core import QgsProviderRegistry
+
+    tabla = QgsProviderRegistry.instance().decodeUri(capa.dataProvider().name(), capa.source()).get("layerName")
+    base = os.path.splitext(ruta)[0]
+    return f"{base}_{tabla}{SUFIJO_ESTADO}" if tabla else base + SUFIJO_ESTADO
+
+
+class EstadoIncremental:
+    """
+    Huellas (y vecinos, en la unión por cercanía) de cada tarea en un fichero SQLite.
+
+    Los cambios se confirman al salir del bloque `with` sin errores; si hay un error se descartan.
+
+    :param ruta: fichero SQLite (se crea si no existe)
+    """
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._conexion = sqlite3.connect(ruta)
+        self._conexion.execute("PRAGMA journal_mode = WAL")
+        self._conexion.execute("PRAGMA synchronous = NORMAL")
+        with self._conexion:
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS huellas ("
+                "tarea TEXT, fid INTEGER, huella INTEGER, PRIMARY KEY (tarea, fid)) WITHOUT ROWID"
+            )
+            self._conexion.execute(
+                "CREATE TABLE IF NOT EXISTS vecinos ("
+                "tarea TEXT, fid INTEGER, vecino INTEGER, distancia REAL, "
+                "xmin REAL, ymin REAL, xmax REAL, ymax REAL, PRIMARY KEY (tarea, fid)) WITHOUT ROWID"
+            )
+
+    @classmethod
+    def para_capa(cls, capa, ruta=None):
+        """Estado en `ruta` o, si no se indica, en el fichero por defecto de la capa (`ruta_estado`)."""
+        return cls(ruta or ruta_estado(capa))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_error, error, traza):
+        if tipo_error is None:
+            self._conexion.commit()
+        else:
+            self._conexion.rollback()
+        self._conexion.close()
+        return False
+
+    def reiniciar(self, tarea):
+        """Olvida todo lo guardado de la tarea: la siguiente comparación la recalcula entera."""
+        self._conexion.execute("DELETE FROM huellas WHERE tarea = ?", (tarea,))
+        self._conexion.execute("DELETE FROM vecinos WHERE tarea = ?", (tarea,))
+
+    def huellas(self, tarea):
+        """Diccionario fid -> huella guardado para la tarea."""
+        return dict(self._conexion.execute("SELECT fid, huella FROM huellas WHERE tarea = ?", (tarea,)))
+
+    def comparar(self, tarea, actuales):
+        """`Cambios` entre las huellas guardadas de la tarea y `actuales` ({fid: huella})."""
+        anteriores = self.huellas(tarea)
+        nuevas = {fid for fid in actuales if fid not in anteriores}
+        modificadas = {fid for fid, valor in actuales.items() if fid in anteriores and anteriores[fid] != valor}
+        borradas = {fid for fid in anteriores if fid not in actuales}
+        return Cambios(nuevas, modificadas, borradas, len(actuales))
+
+    def guardar(self, tarea, actuales, cambios):
+        """Guarda las huellas de las entidades nuevas y modificadas y olvida las borradas."""
+        self._conexion.executemany(
+            "INSERT OR REPLACE INTO huellas VALUES (?, ?, ?)",
+            ((tarea, fid, actuales[fid]) for fid in cambios.nuevas | cambios.modificadas),
+        )
+        self._borrar("huellas", tarea, cambios.borradas)
+
+    def vecinos(self, tarea):
+        """
+        Vecinos guardados de la tarea.
+
+        :return: (fids, vecinos, distancias, cajas) como arrays; vecino -1 y distancia NaN
+                 para las entidades sin vecino
+        """
+        filas = self._conexion.execute(
+            "SELECT fid, ifnull(vecino, -1), ifnull(distancia, 'nan'), xmin, ymin, xmax, ymax "
+            "FROM vecinos WHERE tarea = ?", (tarea,)
+        ).fetchall()
+        datos = np.array(filas, dtype=np.float64).reshape(-1, 7)
+        return datos[:, 0].astype(np.int64), datos[:, 1].astype(np.int64), datos[:, 2], datos[:, 3:]
+
+    def guardar_vecinos(self, tarea, filas, borrados=()):
+        """
+        Guarda los vecinos recalculados y olvida los de `borrados`.
+
+        :param filas: iterable de tuplas (fid, vecino o None, distancia o None, (xmin, ymin, xmax, ymax))
+        """
+        self._borrar("vecinos", tarea, borrados)
+        self._conexion.executemany(
+            "INSERT OR REPLACE INTO vecinos VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((tarea, fid, vecino, distancia, *caja) for fid, vecino, distancia, caja in filas),
+        )
+
+    def _borrar(self, tabla, tarea, fids):
+        self._conexion.executemany(
+            f"DELETE FROM {tabla} WHERE tarea = ? AND fid = ?", ((tarea, fid) for fid in fids)
+        )
+
+
+def _identidad(capa):
+    return capa.source() if hasattr(capa, "source") else capa.name()
+
+
+@medicion.medir()
+def ejecutar_incremental(capa, tarea, calcular, campos=(), geometria=True, ruta=None, reiniciar=False):
+    """
+    Ejecuta `calcular` solo sobre las entidades nuevas o modificadas desde la última vez.
+
+    :param tarea: nombre del trabajo con sus parámetros (p. ej. "reproyectar_centroides|EPSG:4326|long|lat")
+    :param calcular: función `f(fids) -> entidades actualizadas`; recibe None si hay que
+                     recalcular todas las entidades
+    :param campos: atributos de entrada que forman parte de la huella
+    :param geometria: incluir la geometría en la huella
+    :param ruta: fichero de estado (por defecto, `ruta_estado(capa)`)
+    :param reiniciar: olvidar el estado guardado y recalcular todo
+    :return: (entidades actualizadas, `Cambios`)
+    """
+    with EstadoIncremental.para_capa(capa, ruta) as estado:
+        if reiniciar:
+            estado.reiniciar(tarea)
+        actuales = huellas_capa(capa, campos, geometria)
+        cambios = estado.comparar(tarea, actuales)
+        pendientes = cambios.pendientes
+        actualizadas = 0
+        if pendientes:
+            actualizadas = calcular(None if cambios.todas else pendientes)
+        estado.guardar(tarea, actuales, cambios)
+    return actualizadas, cambios
+
+
+def _afectadas_por_secundarias(guardados, cambios_secundaria, cajas_secundarias, distancia_max):
+    """
+    fids principales sin cambios que hay que volver a evaluar por cambios en la capa secundaria.
+
+    :param guardados: (fids, vecinos, distancias, cajas) de `EstadoIncremental.vecinos`
+    :param cajas_secundarias: cajas de las entidades secundarias nuevas o modificadas
+    """
+    fids, vecinos, distancias, cajas = guardados
+    if not len(fids):
+        return set()
+
+    # Su vecino se ha movido, ha cambiado de valor o ya no existe
+    perdidos = np.fromiter(cambios_secundaria.modificadas | cambios_secundaria.borradas, dtype=np.int64)
+    afectadas = set(fids[np.isin(vecinos, perdidos)].tolist())
+    if not len(cajas_secundarias):
+        return afectadas
+
+    # Una secundaria nueva o movida puede quedar igual o más cerca que el vecino actual:
+    # se amplía la caja de cada principal con su distancia y se buscan las que tocan
+    alcance = np.where(np.isnan(distancias), math.inf if distancia_max is None else distancia_max, distancias)
+    sin_limite = np.isinf(alcance)
+    afectadas.update(fids[sin_limite].tolist())
+    ampliadas = cajas[~sin_limite] + np.outer(alcance[~sin_limite], [-1.0, -1.0, 1.0, 1.0])
+    indice = IndiceSTR(ampliadas)
+    fids_limitadas = fids[~sin_limite]
+    for caja in cajas_secundarias:
+        afectadas.update(fids_limitadas[indice.en_caja(caja)].tolist())
+    return afectadas
+
+
+def cercanos_incremental(estado, capa_principal, capa_secundaria, campo_origen, distancia_max=None,
+                         tarea="cercania", reiniciar=False):
+    """
+    Vecino más cercano de las entidades principales que hay que recalcular.
+
+    Guarda en `estado` (sin confirmar) las huellas de ambas capas y los vecinos recalculados.
+
+    :param tarea: prefijo de las tareas de la capa principal y la secundaria en `estado`
+    :return: ([(fid, valor)] de las entidades recalculadas con vecino, `Cambios` de la
+             capa principal, `Cambios` de la secundaria, número de entidades recalculadas)
+    """
+    tarea_principal = f"{tarea}|principal"
+    tarea_secundaria = f"{tarea}|secundaria"
+    if reiniciar:
+        estado.reiniciar(tarea_principal)
+        estado.reiniciar(tarea_secundaria)
+
+    # La capa secundaria se lee entera: hace falta para el índice si algo se recalcula
+    fids_secundarios, geometrias, valores, huellas_secundarias = [], [], [], {}
+    for fid, geometria, valor in leer_filas(capa_secundaria, [campo_origen], "geometria", omitir_vacias=False):
+        huellas_secundarias[fid] = huella(geometria, (valor,))
+        if geometria is not None and not geometria.isEmpty():
+            fids_secundarios.append(fid)
+            geometrias.append(geometria)
+            valores.append(valor)
+    cambios_secundaria = estado.comparar(tarea_secundaria, huellas_secundarias)
+
+    huellas_principales = huellas_capa(capa_principal)
+    cambios_principal = estado.comparar(tarea_principal, huellas_principales)
+
+    cambiadas_secundaria = cambios_secundaria.nuevas | cambios_secundaria.modificadas
+    cajas_secundarias = [
+        caja_geometria(geometria) for fid, geometria in zip(fids_secundarios, geometrias)
+        if fid in cambiadas_secundaria
+    ]
+    pendientes = set(cambios_principal.pendientes)
+    pendientes |= _afectadas_por_secundarias(
+        estado.vecinos(tarea_principal), cambios_secundaria, cajas_secundarias, distancia_max
+    ) - cambios_principal.borradas
+
+    resultados, filas = [], []
+    if pendientes:
+        union = UnionCercania(geometrias, range(len(geometrias)))
+        todas = len(pendientes) == cambios_principal.total
+        for fid, geometria in leer_filas(capa_principal, geometria="geometria",
+                                         fids=None if todas else sorted(pendientes)):
+            vecinos = union.vecinos(geometria, 1, distancia_max)
+            if vecinos:
+                distancia, posicion = vecinos[0]
+                resultados.append((fid, valores[posicion]))
+                filas.append((fid, fids_secundarios[posicion], distancia, caja_geometria(geometria)))
+            else:
+                filas.append((fid, None, None, caja_geometria(geometria)))
+
+    # Las recalculadas sin geometría pierden su vecino guardado
+    estado.guardar_vecinos(tarea_principal, filas, cambios_principal.borradas | pendientes)
+    estado.guardar(tarea_principal, huellas_principales, cambios_principal)
+    estado.guardar(tarea_secundaria, huellas_secundarias, cambios_secundaria)
+    return resultados, cambios_principal, cambios_secundaria, len(pendientes)
+
+
+@medicion.medir()
+def unir_por_cercania_incremental(capa_principal, capa_secundaria, campo_origen, campo_destino,
+                                  distancia_max=None, ruta=None, reiniciar=False):
+    """
+    Como `unir_por_cercania`, pero solo escribe las entidades principales cuyo vecino puede haber cambiado.
+
+    :param ruta: fichero de estado (por defecto, `ruta_estado(capa_principal)`)
+    :param reiniciar: olvidar el estado guardado y recalcular todo
+    :return: (entidades actualizadas, `Cambios` de la capa principal, `Cambios` de la secundaria)
+    """
+    tarea = f"cercania|{_identidad(capa_secundaria)}|{campo_origen}|{campo_destino}|{distancia_max}"
+    idx_destino = capa_principal.fields().indexOf(campo_destino)
+    with EstadoIncremental.para_capa(capa_principal, ruta) as estado:
+        resultados, cambios_principal, cambios_secundaria, _ = cercanos_incremental(
+            estado, capa_principal, capa_secundaria, campo_origen, distancia_max, tarea, reiniciar
+        )
+        with EscritorAtributos(capa_principal) as escritor:
+            for fid, valor in resultados:
+                # Igual que `unir_por_cercania`: los valores vacíos o NULL no se copian
+                if valor:
+                    escritor.cambiar(fid, idx_destino, valor)
+    return escritor.entidades, cambios_principal, cambios_secundaria
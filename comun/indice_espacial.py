@@ -0,0 +1,202 @@
+"""
+Índice espacial R-tree empaquetado (STR) sobre arrays de NumPy.
+
+El índice se construye una sola vez a partir de las cajas envolventes
+(xmin, ymin, xmax, ymax) de las entidades y responde a dos tipos de consulta:
+
+- `en_caja`: elementos cuya caja se cruza con un rectángulo.
+- `vecinos`: los k elementos más cercanos a una caja, con distancia máxima
+  opcional. Si se pasa una función de distancia exacta, la distancia entre
+  cajas se usa solo como cota inferior y cada candidato se refina con la
+  geometría real (por ejemplo `QgsGeometry.distance`).
+
+Los nodos se guardan en un único array de cajas, nivel a nivel, de modo que
+el índice completo son dos arrays (`cajas` e `indices`) más los límites de
+cada nivel (`a_arrays` / `desde_arrays`, que usa `comun/cache_indices.py`
+para guardarlo en disco). No depende de QGIS.
+"""
+
+import heapq
+import math
+
+import numpy as np
+
+
+def _orden_str(cajas, capacidad):
+    """Orden Sort-Tile-Recursive de las cajas: franjas por X y, dentro, por Y."""
+    n = len(cajas)
+    cx = (cajas[:, 0] + cajas[:, 2]) * 0.5
+    cy = (cajas[:, 1] + cajas[:, 3]) * 0.5
+
+    num_hojas = math.ceil(n / capacidad)
+    num_franjas = math.ceil(math.sqrt(num_hojas))
+    tam_franja = num_franjas * capacidad
+
+    rango_x = np.empty(n, dtype=np.int64)
+    rango_x[np.argsort(cx, kind="stable")] = np.arange(n)
+    franja = rango_x // tam_franja
+
+    # lexsort ordena por la última clave: primero franja, después Y
+    return np.lexsort((cy, franja))
+
+
+def _agrupar(cajas, capacidad):
+    """Caja envolvente de cada grupo consecutivo de `capacidad` cajas."""
+    inicios = np.arange(0, len(cajas), capacidad)
+    return np.column_stack((
+        np.minimum.reduceat(cajas[:, 0], inicios),
+        np.minimum.reduceat(cajas[:, 1], inicios),
+        np.maximum.reduceat(cajas[:, 2], inicios),
+        np.maximum.reduceat(cajas[:, 3], inicios),
+    ))
+
+
+def distancia_cajas(caja, cajas):
+    """Distancia mínima entre una caja y un array de cajas (0 si se cruzan)."""
+    dx = np.maximum(np.maximum(cajas[:, 0] - caja[2], caja[0] - cajas[:, 2]), 0.0)
+    dy = np.maximum(np.maximum(cajas[:, 1] - caja[3], caja[1] - cajas[:, 3]), 0.0)
+    return np.sqrt(dx * dx + dy * dy)
+
+
+class IndiceSTR:
+    """
+    R-tree estático empaquetado con el algoritmo STR.
+
+    :param cajas: secuencia o array (n, 4) con las cajas xmin, ymin, xmax, ymax
+    :param capacidad: número máximo de hijos por nodo
+    """
+
+    def __init__(self, cajas, capacidad=16):
+        cajas = np.asarray(cajas, dtype=np.float64).reshape(-1, 4)
+        self.capacidad = capacidad
+        self.num_elementos = len(cajas)
+
+        if self.num_elementos == 0:
+            self.indices = np.empty(0, dtype=np.int64)
+            self.cajas = np.empty((0, 4), dtype=np.float64)
+            self.limites = np.zeros(1, dtype=np.int64)
+            return
+
+        # Nivel 0: los elementos en orden STR; cada nivel superior agrupa
+        # nodos consecutivos del anterior hasta quedar una sola raíz
+        self.indices = _orden_str(cajas, capacidad).astype(np.int64)
+        niveles = [cajas[self.indices]]
+        while len(niveles[-1]) > 1:
+            niveles.append(_agrupar(niveles[-1], capacidad))
+
+        self.cajas = np.concatenate(niveles)
+        self.limites = np.cumsum([0] + [len(nivel) for nivel in niveles]).astype(np.int64)
+
+    def a_arrays(self):
+        """Arrays que definen el índice, para guardarlo y reconstruirlo con `desde_arrays`."""
+        return {
+            "indices": self.indices,
+            "cajas": self.cajas,
+            "limites": self.limites,
+            "parametros": np.array([self.capacidad, self.num_elementos], dtype=np.int64),
+        }
+
+    @classmethod
+    def desde_arrays(cls, arrays):
+        """Índice a partir de `a_arrays` (los arrays pueden estar proyectados en memoria)."""
+        indice = cls.__new__(cls)
+        indice.indices = arrays["indices"]
+        indice.cajas = arrays["cajas"]
+        indice.limites = arrays["limites"]
+        indice.capacidad, indice.num_elementos = (int(v) for v in arrays["parametros"])
+        return indice
+
+    def __len__(self):
+        return self.num_elementos
+
+    @property
+    def nivel_raiz(self):
+        return len(self.limites) - 2
+
+    def _hijos(self, nivel, posicion):
+        """
+        Rango [inicio, fin) de los hijos de un nodo dentro del nivel inferior.
+
+        El nivel ficticio `nivel_raiz + 1` es la entrada al árbol: su único
+        hijo es la raíz.
+        """
+        if nivel == self.nivel_raiz + 1:
+            return 0, 1
+        tam_inferior = int(self.limites[nivel] - self.limites[nivel - 1])
+        inicio = posicion * self.capacidad
+        return inicio, min(inicio + self.capacidad, tam_inferior)
+
+    def _cajas_hijas(self, nivel, posicion):
+        inicio, fin = self._hijos(nivel, posicion)
+        base = self.limites[nivel - 1]
+        return inicio, self.cajas[base + inicio:base + fin]
+
+    def en_caja(self, caja):
+        """Índices (en el orden original) de los elementos cuya caja cruza `caja`."""
+        if self.num_elementos == 0:
+            return np.empty(0, dtype=np.int64)
+
+        xmin, ymin, xmax, ymax = caja
+        encontrados = []
+        pendientes = [(self.nivel_raiz + 1, 0)]
+        while pendientes:
+            nivel, posicion = pendientes.pop()
+            inicio, bloque = self._cajas_hijas(nivel, posicion)
+            cruza = np.flatnonzero(
+                (bloque[:, 0] <= xmax) & (bloque[:, 2] >= xmin)
+                & (bloque[:, 1] <= ymax) & (bloque[:, 3] >= ymin)
+            ) + inicio
+            if nivel == 1:
+                encontrados.append(self.indices[cruza])
+            else:
+                pendientes.extend((nivel - 1, int(p)) for p in cruza)
+
+        if not encontrados:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(encontrados))
+
+    def vecinos(self, caja, k=1, distancia_max=None, distancia_exacta=None):
+        """
+        Los `k` elementos más cercanos a `caja`.
+
+        :param caja: caja de consulta (xmin, ymin, xmax, ymax); un punto es una caja degenerada
+        :param k: número de vecinos a devolver
+        :param distancia_max: descarta los elementos más lejanos que esta distancia
+        :param distancia_exacta: función opcional `f(indice) -> distancia` para refinar
+            candidatos; la distancia entre cajas debe ser una cota inferior de ella
+        :return: lista de tuplas (distancia, indice) ordenada de menor a mayor distancia;
+            los empates se resuelven por el índice original más bajo
+        """
+        if self.num_elementos == 0 or k <= 0:
+            return []
+
+        caja = tuple(float(v) for v in caja)
+        # Cola de prioridad de nodos por distancia mínima y montículo de los k mejores
+        cola = [(0.0, self.nivel_raiz + 1, 0)]
+        mejores = []  # (-distancia, -indice): el peor resultado queda arriba
+
+        while cola:
+            cota, nivel, posicion = heapq.heappop(cola)
+            if distancia_max is not None and cota > distancia_max:
+                break
+            if len(mejores) == k and cota > -mejores[0][0]:
+                break
+
+            if nivel == 0:
+                indice = int(self.indices[posicion])
+                distancia = cota if distancia_exacta is None else float(distancia_exacta(indice))
+                if distancia_max is not None and distancia > distancia_max:
+                    continue
+                candidato = (-distancia, -indice)
+                if len(mejores) < k:
+                    heapq.heappush(mejores, candidato)
+                elif candidato > mejores[0]:
+                    heapq.heapreplace(mejores, candidato)
+                continue
+
+            inicio, bloque = self._cajas_hijas(nivel, posicion)
+            distancias = distancia_cajas(caja, bloque)
+            for desplazamiento, distancia in enumerate(distancias.tolist()):
+                heapq.heappush(cola, (distancia, nivel - 1, inicio + desplazamiento))
+
+        return sorted((-d, -i) for d, i in mejores)
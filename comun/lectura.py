@@ -0,0 +1,231 @@
+"""
+Lectura mínima de entidades.
+
+Cada motor declara qué necesita de la capa (campos, tipo de geometría y
+filtros) y este módulo construye la `QgsFeatureRequest` más pequeña posible:
+subconjunto de atributos (o ninguno), `NoGeometry` si no hace falta la
+geometría, `setFilterRect`, expresión o lista de fids.
+
+Las entidades se devuelven como tuplas ligeras (`leer_filas`) o como lotes
+de arrays estructurados de NumPy (`leer_lotes`, `leer_columnas`) en lugar de
+objetos `QgsFeature`. Los NULL de QGIS se devuelven como None. Si hay una
+sesión de `comun/medicion.py` activa, el tiempo de lectura se anota en la
+fase "leer".
+
+Geometría pedida (`geometria`) y columnas que añade a cada fila, tras el fid:
+
+- None: ninguna (la petición lleva `NoGeometry`)
+- "geometria": la geometría completa
+- "punto": x, y de `asPoint()` (capas de puntos)
+- "centroide": x, y del centroide
+- "caja": xmin, ymin, xmax, ymax
+
+Si la capa es una `CapaMemoria` (ver `comun/memoria.py`) se lee sin QGIS, de
+modo que los motores se pueden probar y medir sin tenerlo instalado.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from . import medicion
+
+GEOMETRIAS = {
+    None: (),
+    "geometria": ("geometria",),
+    "punto": ("x", "y"),
+    "centroide": ("x", "y"),
+    "caja": ("xmin", "ymin", "xmax", "ymax"),
+}
+
+TAM_LOTE = 100_000
+
+# Lo que un motor necesita leer de una capa
+Consulta = namedtuple("Consulta", "campos geometria rect expresion fids")
+
+
+def es_nulo(valor):
+    """True para None y para los NULL de QGIS (QVariant nulo)."""
+    return valor is None or (hasattr(valor, "isNull") and valor.isNull())
+
+
+def a_float(valores):
+    """Array float64 con los valores; NaN para nulos y no numéricos."""
+    resultado = np.full(len(valores), np.nan, dtype=np.float64)
+    for i, valor in enumerate(valores):
+        try:
+            resultado[i] = float(valor)
+        except (TypeError, ValueError):
+            pass
+    return resultado
+
+
+def consulta(campos=(), geometria=None, rect=None, expresion=None, fids=None):
+    """Valida y agrupa lo que se quiere leer."""
+    if geometria not in GEOMETRIAS:
+        raise ValueError(f"Geometría desconocida '{geometria}'. Usa una de: {', '.join(map(str, GEOMETRIAS))}.")
+    if expresion is not None and fids is not None:
+        raise ValueError("No se puede filtrar a la vez por expresión y por fids.")
+    return Consulta(tuple(campos), geometria, rect, expresion, None if fids is None else list(fids))
+
+
+def peticion_minima(capa, consulta):
+    """`QgsFeatureRequest` que solo pide lo indicado en `consulta`."""
+    from qgis.core import QgsFeatureRequest, QgsRectangle
+
+    peticion = QgsFeatureRequest()
+    if consulta.geometria is None:
+        peticion.setFlags(QgsFeatureRequest.NoGeometry)
+    if consulta.campos:
+        peticion.setSubsetOfAttributes(list(consulta.campos), capa.fields())
+    else:
+        peticion.setNoAttributes()
+    if consulta.rect is not None:
+        peticion.setFilterRect(QgsRectangle(*consulta.rect))
+    if consulta.expresion is not None:
+        # QGIS añade por su cuenta los campos que use la expresión
+        peticion.setFilterExpression(consulta.expresion)
+    if consulta.fids is not None:
+        peticion.setFilterFids([int(fid) for fid in consulta.fids])
+    return peticion
+
+
+def _entidades(capa, consulta):
+    """(fid, geometria, valores) de cada entidad; `geometria` es None si no se pidió."""
+    if hasattr(capa, "consultar"):
+        medicion.contar("consultar")
+        yield from capa.consultar(consulta)
+        return
+
+    indices = [capa.fields().indexOf(campo) for campo in consulta.campos]
+    if -1 in indices:
+        faltan = [campo for campo, i in zip(consulta.campos, indices) if i == -1]
+        raise ValueError(f"La capa '{capa.name()}' no tiene los campos: {', '.join(faltan)}")
+    con_geometria = consulta.geometria is not None
+    medicion.contar("getFeatures")
+    for entidad in capa.getFeatures(peticion_minima(capa, consulta)):
+        atributos = entidad.attributes()
+        valores = tuple(None if es_nulo(atributos[i]) else atributos[i] for i in indices)
+        yield entidad.id(), entidad.geometry() if con_geometria else None, valores
+
+
+def _partes_geometria(geometria, tipo):
+    if tipo == "geometria":
+        return (geometria,)
+    if tipo == "punto":
+        punto = geometria.asPoint()
+        return punto.x(), punto.y()
+    if tipo == "centroide":
+        punto = geometria.centroid().asPoint()
+        return punto.x(), punto.y()
+    rect = geometria.boundingBox()
+    return rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum()
+
+
+def leer_filas(capa, campos=(), geometria=None, rect=None, expresion=None, fids=None,
+               omitir_vacias=True):
+    """
+    Genera una tupla (fid, <columnas de geometría>, <valores de campos>) por entidad.
+
+    :param omitir_vacias: saltar las entidades sin geometría cuando se pide geometría; si es
+                          False se devuelven con None (o NaN en las coordenadas)
+    """
+    pedida = consulta(campos, geometria, rect, expresion, fids)
+    vacias = (None,) if geometria == "geometria" else (np.nan,) * len(GEOMETRIAS[geometria])
+    # Con una medición activa el tiempo dentro del proveedor se anota en la fase "leer"
+    for fid, geom, valores in medicion.iterar("leer", _entidades(capa, pedida)):
+        if geometria is None:
+            yield (fid, *valores)
+        elif geom is None or geom.isEmpty():
+            if not omitir_vacias:
+                yield (fid, *vacias, *valores)
+        else:
+            yield (fid, *_partes_geometria(geom, geometria), *valores)
+
+
+def tipo_lote(campos=(), geometria=None, tipos=None):
+    """dtype estructurado de los lotes: fid, columnas de geometría y campos."""
+    tipos = tipos or {}
+    columnas = [("fid", np.int64)]
+    columnas += [(nombre, object if nombre == "geometria" else np.float64) for nombre in GEOMETRIAS[geometria]]
+    columnas += [(campo, tipos.get(campo, object)) for campo in campos]
+    return np.dtype(columnas)
+
+
+def _lote(filas, dtype):
+    lote = np.empty(len(filas), dtype=dtype)
+    for posicion, nombre in enumerate(dtype.names):
+        valores = [fila[posicion] for fila in filas]
+        if dtype[nombre].kind == "f":
+            lote[nombre] = a_float(valores)
+        else:
+            lote[nombre] = valores
+    return lote
+
+
+def leer_lotes(capa, campos=(), geometria=None, tipos=None, tam_lote=TAM_LOTE, **filtros):
+    """
+    Como `leer_filas`, pero en lotes de arrays estructurados de NumPy.
+
+    :param tipos: dtype de cada campo ({campo: np.float64, ...}); object por defecto.
+                  En los campos float los nulos y valores no numéricos quedan como NaN.
+    """
+    dtype = tipo_lote(campos, geometria, tipos)
+    filas = []
+    for fila in leer_filas(capa, campos, geometria, **filtros):
+        filas.append(fila)
+        if len(filas) >= tam_lote:
+            yield _lote(filas, dtype)
+            filas = []
+    if filas:
+        yield _lote(filas, dtype)
+
+
+def leer_columnas(capa, campos=(), geometria=None, tipos=None, **filtros):
+    """Todas las entidades en un único array estructurado (ver `leer_lotes`)."""
+    lotes = list(leer_lotes(capa, campos, geometria, tipos, **filtros))
+    if not lotes:
+        return np.empty(0, dtype=tipo_lote(campos, geometria, tipos))
+    return lotes[0] if len(lotes) == 1 else np.concatenate(lotes)
+
+
+# Columnas de objetos que se pueden guardar como arrays de NumPy con una máscara de nulos
+DTYPES_OBJETOS = {"texto": np.str_, "entero": np.int64, "real": np.float64, "logico": bool}
+
+
+def tipo_objetos(valores):
+    """
+    "texto", "entero", "real" o "logico" si todos los valores no nulos son de ese
+    tipo, o None si mezclan tipos o son de otro (fechas, bytes...).
+    """
+    tipos = {type(v) for v in valores if v is not None}
+    if tipos <= {str}:
+        return "texto"
+    if tipos == {bool}:
+        return "logico"
+    if tipos == {int} and all(-2 ** 63 <= v < 2 ** 63 for v in valores if v is not None):
+        return "entero"
+    if tipos == {float}:
+        return "real"
+    return None
+
+
+def objetos_a_array(valores):
+    """
+    (array, nulos, tipo) de una columna de objetos sin pickle (ver `tipo_objetos`),
+    o None si no se puede.
+    """
+    valores = list(valores)
+    tipo = tipo_objetos(valores)
+    if tipo is None:
+        return None
+    dtype = DTYPES_OBJETOS[tipo]
+    array = np.array([dtype() if v is None else v for v in valores], dtype=dtype)
+    return array, np.array([v is None for v in valores], dtype=bool), tipo
+
+
+def array_a_objetos(array, nulos):
+    """Columna de objetos (valores de Python, None en los nulos) a partir de `objetos_a_array`."""
+    valores = np.asarray(array).astype(object)
+    valores[np.asarray(nulos, dtype=bool)] = None
+    return valores
@@ -0,0 +1,439 @@
+"""
+Medición por fases de los motores (tiempos, entidades, llamadas y memoria).
+
+Los motores marcan sus fases ("leer", "calcular", "escribir", "confirmar"...)
+con `fase` o con el decorador `medir`, y anotan las llamadas al proveedor con
+`contar`. Mientras no haya una sesión iniciada esas llamadas solo comprueban
+una variable global y devuelven un objeto vacío, así que el coste con la
+medición desactivada es prácticamente nulo.
+
+Con una sesión activa (`iniciar` / `terminar`, o el gestor `sesion`) se
+acumula por fase:
+
+- veces, segundos totales y segundos propios (sin contar las fases internas)
+- entidades procesadas
+- llamadas al proveedor (getFeatures, changeAttributeValues, UPDATE...)
+- variación de memoria (RSS) entre la entrada y la salida
+
+La lectura es perezosa (los motores consumen `leer_filas` a la vez que
+calculan), por eso `comun/lectura.py` mide con `iterar` el tiempo que se pasa
+dentro del iterador de entidades y lo resta de la fase que lo consume.
+
+Al terminar se informa con un resumen legible y una línea de log en JSON
+("medicion {...}"), y opcionalmente se guarda una traza en formato Chrome
+(chrome://tracing, https://ui.perfetto.dev) y un perfil de cProfile o de
+pyinstrument (si está instalado). El perfil solo cubre el hilo que inicia la
+sesión.
+
+Uso:
+    from comun import medicion
+
+    with medicion.sesion("fechas", informar=print, traza="traza.json"):
+        convertir_campo_fecha(capa, "fecha")
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import psutil
+except ImportError:  # psutil es opcional; sin él la memoria se lee de /proc (Linux)
+    psutil = None
+
+PERFILES = ("cprofile", "pyinstrument")
+
+# Eventos de traza como máximo (las fases repetidas en bucles se siguen acumulando en el resumen)
+MAX_EVENTOS = 200_000
+
+_sesion = None
+
+
+def rss_mb():
+    """Memoria residente del proceso en MB; None si no se puede consultar."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss / 2 ** 20
+    try:
+        with open("/proc/self/statm") as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _FaseNula:
+    """Lo que devuelven `fase` e `iterar` cuando no hay sesión: no hace nada."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_error, error, traza):
+        return False
+
+    def sumar(self, entidades):
+        pass
+
+
+_NULA = _FaseNula()
+
+
+class Estadistica:
+    """Acumulado de todas las ejecuciones de una fase."""
+
+    __slots__ = ("veces", "segundos", "propios", "entidades", "memoria_mb", "llamadas")
+
+    def __init__(self):
+        self.veces = 0
+        self.segundos = 0.0
+        self.propios = 0.0
+        self.entidades = 0
+        self.memoria_mb = None
+        self.llamadas = Counter()
+
+    def como_dict(self):
+        return {
+            "veces": self.veces,
+            "segundos": round(self.segundos, 6),
+            "propios": round(self.propios, 6),
+            "entidades": self.entidades,
+            "entidades_por_segundo": round(self.entidades / self.segundos) if self.segundos else None,
+            "memoria_mb": None if self.memoria_mb is None else round(self.memoria_mb, 1),
+            "llamadas": dict(self.llamadas),
+        }
+
+
+class Fase:
+    """Una ejecución de una fase; se usa como gestor de contexto."""
+
+    __slots__ = ("medicion", "nombre", "entidades", "llamadas", "inicio", "rss", "hijos")
+
+    def __init__(self, medicion, nombre, entidades=0):
+        self.medicion = medicion
+        self.nombre = nombre
+        self.entidades = entidades
+        self.llamadas = Counter()
+        self.hijos = 0.0
+
+    def sumar(self, entidades):
+        self.entidades += entidades
+
+    def __enter__(self):
+        self.medicion._pila().append(self)
+        self.rss = rss_mb()
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_error, error, traza):
+        fin = time.perf_counter()
+        pila = self.medicion._pila()
+        pila.pop()
+        segundos = fin - self.inicio
+        if pila:
+            pila[-1].hijos += segundos
+        rss = rss_mb()
+        memoria = None if rss is None or self.rss is None else rss - self.rss
+        self.medicion._registrar(self.nombre, self.inicio, segundos, segundos - self.hijos,
+                                 self.entidades, memoria, self.llamadas, carril=0)
+        return False
+
+
+class Medicion:
+    """
+    Datos de una sesión de medición.
+
+    :param nombre: nombre de la sesión (aparece en el resumen y en la traza)
+    :param traza: guardar los eventos para `guardar_traza`
+    """
+
+    def __init__(self, nombre="sesion", traza=False):
+        self.nombre = nombre
+        self.fases = {}
+        self.llamadas = Counter()
+        self.eventos = [] if traza else None
+        self.inicio = time.perf_counter()
+        self.segundos = None
+        self.rss_inicial = rss_mb()
+        self._local = threading.local()
+        self._hilos = {}
+        self._candado = threading.Lock()
+
+    def _pila(self):
+        pila = getattr(self._local, "pila", None)
+        if pila is None:
+            pila = self._local.pila = []
+        return pila
+
+    def _carril(self, desplazamiento):
+        """Identificador de la fila de la traza: dos por hilo (fases e iteradores)."""
+        hilo = threading.get_ident()
+        with self._candado:
+            posicion = self._hilos.setdefault(hilo, len(self._hilos))
+        return 2 * posicion + 1 + desplazamiento
+
+    def _registrar(self, nombre, inicio, segundos, propios, entidades, memoria, llamadas, carril):
+        with self._candado:
+            estadistica = self.fases.get(nombre)
+            if estadistica is None:
+                estadistica = self.fases[nombre] = Estadistica()
+            estadistica.veces += 1
+            estadistica.segundos += segundos
+            estadistica.propios += propios
+            estadistica.entidades += entidades
+            estadistica.llamadas.update(llamadas)
+            if memoria is not None:
+                estadistica.memoria_mb = (estadistica.memoria_mb or 0.0) + memoria
+        if self.eventos is not None and len(self.eventos) < MAX_EVENTOS:
+            self.eventos.append({
+                "name": nombre,
+                "cat": "fase",
+                "ph": "X",
+                "ts": (inicio - self.inicio) * 1e6,
+                "dur": segundos * 1e6,
+                "pid": os.getpid(),
+                "tid": self._carril(carril),
+                "args": {"entidades": entidades, "propios_ms": propios * 1e3, **llamadas},
+            })
+
+    def contar(self, llamada, veces=1):
+        with self._candado:
+            self.llamadas[llamada] += veces
+        pila = self._pila()
+        if pila:
+            pila[-1].llamadas[llamada] += veces
+
+    def iterar(self, nombre, iterable):
+        """
+        Recorre `iterable` midiendo solo el tiempo que pasa dentro de él.
+
+        Ese tiempo se acumula en la fase `nombre` (una entidad por elemento) y se
+        descuenta de la fase que está consumiendo el iterador.
+        """
+        iterador = iter(iterable)
+        segundos = 0.0
+        entidades = 0
+        primero = None
+        rss = rss_mb()
+        try:
+            while True:
+                inicio = time.perf_counter()
+                try:
+                    elemento = next(iterador)
+                except StopIteration:
+                    break
+                finally:
+                    duracion = time.perf_counter() - inicio
+                    segundos += duracion
+                    if primero is None:
+                        primero = inicio
+                    pila = self._pila()
+                    if pila:
+                        pila[-1].hijos += duracion
+                entidades += 1
+                yield elemento
+        finally:
+            fin = rss_mb()
+            memoria = None if fin is None or rss is None else fin - rss
+            # En la traza la lectura ocupa su propia fila: va intercalada con el cálculo
+            self._registrar(nombre, primero or time.perf_counter(), segundos, segundos, entidades,
+                            memoria, {}, carril=1)
+
+    def terminar(self):
+        self.segundos = time.perf_counter() - self.inicio
+        return self
+
+    def como_dict(self):
+        rss = rss_mb()
+        return {
+            "sesion": self.nombre,
+            "segundos": round(self.segundos if self.segundos is not None
+                              else time.perf_counter() - self.inicio, 6),
+            "memoria_mb": None if rss is None or self.rss_inicial is None else round(rss - self.rss_inicial, 1),
+            "fases": {nombre: estadistica.como_dict() for nombre, estadistica in self.fases.items()},
+            "llamadas": dict(self.llamadas),
+        }
+
+    def linea_log(self):
+        """Una sola línea "medicion {json}" para los registros de las ejecuciones programadas."""
+        return "medicion " + json.dumps(self.como_dict(), ensure_ascii=False)
+
+    def resumen(self):
+        """Líneas de texto con una fase por línea."""
+        datos = self.como_dict()
+        lineas = [f"Medición '{self.nombre}': {datos['segundos']:.2f} s"]
+        for nombre, fase in datos["fases"].items():
+            linea = (f"  {nombre}: {fase['segundos']:.3f} s ({fase['propios']:.3f} s propios, "
+                     f"{fase['veces']} veces), {fase['entidades']} entidades")
+            if fase["entidades_por_segundo"]:
+                linea += f" ({fase['entidades_por_segundo']} entidades/s)"
+            if fase["memoria_mb"] is not None:
+                linea += f", {fase['memoria_mb']:+.1f} MB"
+            if fase["llamadas"]:
+                linea += ", " + ", ".join(f"{llamada}: {n}" for llamada, n in fase["llamadas"].items())
+            lineas.append(linea)
+        return lineas
+
+    def guardar_traza(self, ruta):
+        """Guarda los eventos en el formato de trazas de Chrome."""
+        eventos = list(self.eventos or [])
+        for hilo, posicion in self._hilos.items():
+            for desplazamiento, tipo in ((0, "fases"), (1, "lectura")):
+                eventos.append({
+                    "name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": 2 * posicion + 1 + desplazamiento,
+                    "args": {"name": f"{tipo} (hilo {hilo})"},
+                })
+        with open(ruta, "w", encoding="utf-8") as archivo:
+            json.dump({"traceEvents": eventos, "displayTimeUnit": "ms",
+                       "otherData": {"sesion": self.nombre}}, archivo)
+
+
+class _Perfil:
+    """Perfil de cProfile o pyinstrument alrededor de una sesión."""
+
+    def __init__(self, tipo, ruta=None, lineas=25):
+        if tipo not in PERFILES:
+            raise ValueError(f"Perfil desconocido '{tipo}'. Usa uno de: {', '.join(PERFILES)}.")
+        self.tipo = tipo
+        self.ruta = ruta
+        self.lineas = lineas
+        if tipo == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise ImportError("El perfil 'pyinstrument' necesita el paquete pyinstrument.") from None
+            self._perfilador = Profiler()
+            self._perfilador.start()
+        else:
+            # cProfile y pstats solo se importan si se pide un perfil (arranque más rápido)
+            import cProfile
+
+            self._perfilador = cProfile.Profile()
+            self._perfilador.enable()
+
+    def terminar(self):
+        """Para el perfil, lo guarda en `ruta` si se indicó y devuelve el informe en texto."""
+        if self.tipo == "pyinstrument":
+            self._perfilador.stop()
+            if self.ruta:
+                with open(self.ruta, "w", encoding="utf-8") as archivo:
+                    archivo.write(self._perfilador.output_html() if self.ruta.endswith(".html")
+                                  else self._perfilador.output_text())
+            return self._perfilador.output_text()
+
+        self._perfilador.disable()
+        if self.ruta:
+            self._perfilador.dump_stats(self.ruta)
+        import io
+        import pstats
+
+        texto = io.StringIO()
+        pstats.Stats(self._perfilador, stream=texto).sort_stats("cumulative").print_stats(self.lineas)
+        return texto.getvalue()
+
+
+_perfil = None
+_salida = None
+
+
+def activa():
+    """True si hay una sesión de medición en marcha."""
+    return _sesion is not None
+
+
+def iniciar(nombre="sesion", informar=print, traza=None, perfil=None, ruta_perfil=None):
+    """
+    Empieza una sesión de medición (sustituye a la que hubiera).
+
+    :param informar: función que recibe cada línea del informe final (print, feedback.pushInfo...)
+    :param traza: ruta del JSON de traza de Chrome que se guarda al terminar
+    :param perfil: None, "cprofile" o "pyinstrument"
+    :param ruta_perfil: fichero del perfil (.prof de cProfile; .html o texto con pyinstrument)
+    :return: la `Medicion`
+    """
+    global _sesion, _perfil, _salida
+    if _sesion is not None:
+        terminar()
+    _perfil = _Perfil(perfil, ruta_perfil) if perfil else None
+    _salida = (informar, traza)
+    _sesion = Medicion(nombre, traza=bool(traza))
+    return _sesion
+
+
+def terminar():
+    """
+    Cierra la sesión, informa del resumen y guarda la traza y el perfil.
+
+    :return: la `Medicion` cerrada, o None si no había sesión
+    """
+    global _sesion, _perfil, _salida
+    if _sesion is None:
+        return None
+    medicion, perfil, (informar, traza) = _sesion.terminar(), _perfil, _salida
+    _sesion = _perfil = _salida = None
+
+    informe_perfil = perfil.terminar() if perfil is not None else None
+    if traza:
+        medicion.guardar_traza(traza)
+    if informar is not None:
+        for linea in medicion.resumen():
+            informar(linea)
+        informar(medicion.linea_log())
+        if informe_perfil:
+            informar(informe_perfil)
+        if traza:
+            informar(f"Traza guardada en {traza}")
+    return medicion
+
+
+@contextmanager
+def sesion(nombre="sesion", activa=True, **opciones):
+    """Gestor de contexto sobre `iniciar`/`terminar`; con `activa=False` no mide nada."""
+    if not activa:
+        yield None
+        return
+    medicion = iniciar(nombre, **opciones)
+    try:
+        yield medicion
+    finally:
+        terminar()
+
+
+def fase(nombre, entidades=0):
+    """Gestor de contexto de una fase; `.sumar(n)` añade entidades procesadas."""
+    if _sesion is None:
+        return _NULA
+    return Fase(_sesion, nombre, entidades)
+
+
+def contar(llamada, veces=1):
+    """Anota `veces` llamadas al proveedor en la fase actual."""
+    if _sesion is not None:
+        _sesion.contar(llamada, veces)
+
+
+def iterar(nombre, iterable):
+    """`Medicion.iterar` de la sesión activa; sin sesión devuelve `iterable` tal cual."""
+    if _sesion is None:
+        return iterable
+    return _sesion.iterar(nombre, iterable)
+
+
+def medir(nombre=None):
+    """Decorador que ejecuta la función como una fase (por defecto, con su nombre)."""
+    def decorador(funcion):
+        etiqueta = nombre or funcion.__name__
+
+        @functools.wraps(funcion)
+        def envoltorio(*args, **kwargs):
+            if _sesion is None:
+                return funcion(*args, **kwargs)
+            with Fase(_sesion, etiqueta):
+                return funcion(*args, **kwargs)
+
+        return envoltorio
+
+    return decorador
@@ -0,0 +1,285 @@
+"""
+Capa en memoria en Python puro, para probar y medir los motores sin QGIS.
+
+`CapaMemoria` guarda entidades (fid, geometría, atributos) y se lee con las
+mismas funciones de `comun/lectura.py` que una QgsVectorLayer. Sus geometrías
+(`GeometriaMemoria`) imitan la pequeña parte de la API de QgsGeometry que usan
+los motores: `isEmpty`, `asPoint`, `centroid`, `boundingBox` y `distance`, así
+que `UnionCercania`, `ConsultaRadio`, los agrupadores, etc. funcionan igual
+con ellas.
+
+Las capas tienen un único tipo de geometría, como en QGIS: "Point",
+"LineString" o "Polygon" (solo el anillo exterior). Los filtros por expresión
+se indican con una función que recibe {campo: valor} y devuelve True o False.
+"""
+
+import struct
+
+import numpy as np
+
+TIPOS_WKB = {"Point": 1, "LineString": 2, "Polygon": 3}
+
+
+class PuntoMemoria:
+    __slots__ = ("_x", "_y")
+
+    def __init__(self, x, y):
+        self._x = x
+        self._y = y
+
+    def x(self):
+        return self._x
+
+    def y(self):
+        return self._y
+
+
+class RectanguloMemoria:
+    __slots__ = ("_caja",)
+
+    def __init__(self, xmin, ymin, xmax, ymax):
+        self._caja = (xmin, ymin, xmax, ymax)
+
+    def xMinimum(self):
+        return self._caja[0]
+
+    def yMinimum(self):
+        return self._caja[1]
+
+    def xMaximum(self):
+        return self._caja[2]
+
+    def yMaximum(self):
+        return self._caja[3]
+
+    def width(self):
+        return self._caja[2] - self._caja[0]
+
+    def height(self):
+        return self._caja[3] - self._caja[1]
+
+    def intersects(self, otro):
+        return not (otro._caja[0] > self._caja[2] or otro._caja[2] < self._caja[0]
+                    or otro._caja[1] > self._caja[3] or otro._caja[3] < self._caja[1])
+
+
+def _segmentos(vertices, tipo):
+    """(inicios, finales) de los segmentos; los polígonos se cierran si hace falta."""
+    if tipo == "Polygon" and len(vertices) > 2 and not np.array_equal(vertices[0], vertices[-1]):
+        vertices = np.vstack((vertices, vertices[:1]))
+    return vertices[:-1], vertices[1:]
+
+
+def _distancia_a_segmentos(puntos, inicios, finales):
+    """Distancia mínima de cualquiera de los puntos a cualquiera de los segmentos."""
+    direccion = finales - inicios
+    longitud2 = (direccion * direccion).sum(axis=1)
+    relativos = puntos[:, None, :] - inicios[None, :, :]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = (relativos * direccion[None]).sum(axis=2) / longitud2[None]
+    t = np.clip(np.nan_to_num(t), 0.0, 1.0)
+    proyecciones = inicios[None] + t[..., None] * direccion[None]
+    return float(np.sqrt(((puntos[:, None, :] - proyecciones) ** 2).sum(axis=2)).min())
+
+
+def _orientacion(a, b, c):
+    return np.sign((b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1])
+                   - (b[..., 1] - a[..., 1]) * (c[..., 0] - a[..., 0]))
+
+
+def _se_cruzan(inicios_a, finales_a, inicios_b, finales_b):
+    """True si algún segmento de A cruza propiamente alguno de B."""
+    a1, a2 = inicios_a[:, None], finales_a[:, None]
+    b1, b2 = inicios_b[None], finales_b[None]
+    return bool(np.any(
+        (_orientacion(a1, a2, b1) * _orientacion(a1, a2, b2) < 0)
+        & (_orientacion(b1, b2, a1) * _orientacion(b1, b2, a2) < 0)
+    ))
+
+
+def _dentro_poligono(x, y, anillo):
+    """Punto en polígono por el método del rayo."""
+    xs, ys = anillo[:, 0], anillo[:, 1]
+    xs2, ys2 = np.roll(xs, -1), np.roll(ys, -1)
+    cruza = (ys > y) != (ys2 > y)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corte = xs + (y - ys) * (xs2 - xs) / (ys2 - ys)
+    return bool(np.count_nonzero(cruza & (x < corte)) % 2)
+
+
+class GeometriaMemoria:
+    """
+    Geometría simple con la parte de la API de QgsGeometry que usan los motores.
+
+    :param tipo: "Point", "LineString" o "Polygon"
+    :param vertices: array (n, 2) con las coordenadas
+    """
+
+    __slots__ = ("tipo", "vertices")
+
+    def __init__(self, tipo, vertices):
+        self.tipo = tipo
+        self.vertices = np.asarray(vertices, dtype=np.float64).reshape(-1, 2)
+
+    def isEmpty(self):
+        return len(self.vertices) == 0
+
+    def asPoint(self):
+        return PuntoMemoria(float(self.vertices[0, 0]), float(self.vertices[0, 1]))
+
+    def boundingBox(self):
+        xmin, ymin = self.vertices.min(axis=0)
+        xmax, ymax = self.vertices.max(axis=0)
+        return RectanguloMemoria(float(xmin), float(ymin), float(xmax), float(ymax))
+
+    def centroid(self):
+        v = self.vertices
+        if self.tipo == "Polygon" and len(v) > 2:
+            x, y = v[:, 0], v[:, 1]
+            x2, y2 = np.roll(x, -1), np.roll(y, -1)
+            cruz = x * y2 - x2 * y
+            area = cruz.sum() / 2
+            if area:
+                return GeometriaMemoria("Point", [((x + x2) * cruz).sum() / (6 * area),
+                                                  ((y + y2) * cruz).sum() / (6 * area)])
+        if self.tipo == "LineString" and len(v) > 1:
+            longitudes = np.hypot(*(v[1:] - v[:-1]).T)
+            if longitudes.sum():
+                medios = (v[1:] + v[:-1]) / 2
+                return GeometriaMemoria("Point", (medios * longitudes[:, None]).sum(axis=0) / longitudes.sum())
+        return GeometriaMemoria("Point", v.mean(axis=0))
+
+    def distance(self, otra):
+        """Distancia mínima entre las dos geometrías (0 si se cruzan o una contiene a la otra)."""
+        a, b = self.vertices, otra.vertices
+        for poligono, resto in ((self, b), (otra, a)):
+            if poligono.tipo == "Polygon" and _dentro_poligono(resto[0, 0], resto[0, 1], poligono.vertices):
+                return 0.0
+
+        segmentos_a = _segmentos(a, self.tipo) if self.tipo != "Point" else None
+        segmentos_b = _segmentos(b, otra.tipo) if otra.tipo != "Point" else None
+        if segmentos_a is not None and segmentos_b is not None and _se_cruzan(*segmentos_a, *segmentos_b):
+            return 0.0
+
+        candidatas = []
+        if segmentos_b is not None:
+            candidatas.append(_distancia_a_segmentos(a, *segmentos_b))
+        if segmentos_a is not None:
+            candidatas.append(_distancia_a_segmentos(b, *segmentos_a))
+        if not candidatas:
+            candidatas.append(float(np.sqrt(((a[:, None] - b[None]) ** 2).sum(axis=2)).min()))
+        return min(candidatas)
+
+    def asWkt(self):
+        coords = ", ".join(f"{x} {y}" for x, y in self.vertices)
+        if self.tipo == "Point":
+            return f"Point ({coords})"
+        if self.tipo == "Polygon":
+            return f"Polygon (({coords}))"
+        return f"LineString ({coords})"
+
+    def asWkb(self):
+        """WKB (little endian) de la geometría."""
+        tipo = TIPOS_WKB[self.tipo]
+        coords = np.ascontiguousarray(self.vertices, dtype="<f8").tobytes()
+        if self.tipo == "Point":
+            return struct.pack("<BI", 1, tipo) + coords
+        if self.tipo == "Polygon":
+            return struct.pack("<BIII", 1, tipo, 1, len(self.vertices)) + coords
+        return struct.pack("<BII", 1, tipo, len(self.vertices)) + coords
+
+    @classmethod
+    def desde_wkb(cls, datos):
+        """Geometría a partir del WKB que genera `asWkb`."""
+        orden, tipo = struct.unpack_from("<BI", datos)
+        if orden != 1:
+            raise ValueError("Solo se admite WKB little endian.")
+        nombre = {numero: nombre for nombre, numero in TIPOS_WKB.items()}.get(tipo)
+        if nombre is None:
+            raise ValueError(f"Tipo de WKB no soportado: {tipo}.")
+        inicio = {"Point": 5, "LineString": 9, "Polygon": 13}[nombre]
+        return cls(nombre, np.frombuffer(datos, dtype="<f8", offset=inicio).reshape(-1, 2))
+
+
+class CrsMemoria:
+    def __init__(self, authid):
+        self._authid = authid
+
+    def authid(self):
+        return self._authid
+
+    def toWkt(self):
+        return ""
+
+
+class CapaMemoria:
+    """
+    Capa vectorial en memoria sin QGIS.
+
+    :param tipo: tipo de geometría de la capa ("Point", "LineString", "Polygon")
+    :param campos: nombres de los campos
+    """
+
+    def __init__(self, tipo="Point", campos=(), crs="EPSG:4326", nombre="memoria"):
+        self.tipo = tipo
+        self.campos = list(campos)
+        self._posiciones = {campo: i for i, campo in enumerate(self.campos)}
+        self._crs = CrsMemoria(crs)
+        self.nombre = nombre
+        self.fids = []
+        self.geometrias = []
+        self.atributos = []
+
+    @classmethod
+    def desde_puntos(cls, xs, ys, columnas=None, **opciones):
+        """Capa de puntos a partir de arrays de X e Y y {campo: valores}."""
+        columnas = columnas or {}
+        capa = cls("Point", list(columnas), **opciones)
+        valores = list(zip(*(list(v) for v in columnas.values()))) if columnas else [()] * len(xs)
+        for x, y, fila in zip(np.asarray(xs, dtype=float).tolist(), np.asarray(ys, dtype=float).tolist(), valores):
+            capa.añadir((x, y), fila)
+        return capa
+
+    def añadir(self, coordenadas, atributos=(), fid=None):
+        """
+        Añade una entidad.
+
+        :param coordenadas: (x, y) en capas de puntos, lista de (x, y) en el resto; None sin geometría
+        :return: el fid de la entidad
+        """
+        fid = len(self.fids) if fid is None else fid
+        self.fids.append(fid)
+        self.geometrias.append(None if coordenadas is None else GeometriaMemoria(self.tipo, coordenadas))
+        self.atributos.append(tuple(atributos))
+        return fid
+
+    def name(self):
+        return self.nombre
+
+    def crs(self):
+        return self._crs
+
+    def featureCount(self):
+        return len(self.fids)
+
+    def consultar(self, consulta):
+        """(fid, geometria, valores) de las entidades que cumplen la consulta (ver `comun/lectura.py`)."""
+        faltan = [campo for campo in consulta.campos if campo not in self._posiciones]
+        if faltan:
+            raise ValueError(f"La capa '{self.nombre}' no tiene los campos: {', '.join(faltan)}")
+        if consulta.expresion is not None and not callable(consulta.expresion):
+            raise ValueError("CapaMemoria solo admite filtros por expresión como funciones.")
+
+        posiciones = [self._posiciones[campo] for campo in consulta.campos]
+        rect = None if consulta.rect is None else RectanguloMemoria(*consulta.rect)
+        seleccion = None if consulta.fids is None else set(consulta.fids)
+        con_geometria = consulta.geometria is not None
+
+        for fid, geometria, atributos in zip(self.fids, self.geometrias, self.atributos):
+            if seleccion is not None and fid not in seleccion:
+                continue
+            if rect is not None and (geometria is None or not rect.intersects(geometria.boundingBox())):
+                continue
+            if consulta.expresion is not None and not consulta.expresion(dict(zip(self.campos, atributos))):
+                continue
+            yield fid, geometria if con_geometria else None, tuple(atributos[i] for i in posiciones)
@@ -0,0 +1,293 @@
+"""
+Ejecución en paralelo, por particiones, de la unión por cercanía y de las
+distancias por clave.
+
+Unión por cercanía (`cercanos_en_paralelo`):
+
+1. Se leen las dos capas una vez y cada geometría se guarda como WKB (bytes),
+   que es lo que viaja a los procesos en lugar de objetos de QGIS.
+2. La capa principal se reparte en teselas con el mismo número de entidades
+   (franjas por X y, dentro de cada franja, cortes por Y, como en STR).
+3. Cada tesela se envía con las entidades secundarias que caen en su
+   extensión ampliada con un halo. El proceso reconstruye las geometrías,
+   indexa las secundarias con `UnionCercania` y busca el vecino de cada
+   entidad principal.
+4. Un resultado solo es seguro si el vecino encontrado está más cerca que el
+   borde de la zona enviada: cualquier secundaria de fuera está al menos a esa
+   distancia. Las entidades que no cumplen esto se resuelven al final con el
+   índice de toda la capa secundaria.
+
+Las secundarias de cada tesela se envían en su orden original, así que los
+empates se resuelven igual que en la ejecución en serie (índice más bajo) y
+el resultado es idéntico.
+
+Distancias por clave (`distancias_clave_en_paralelo`): la distancia mínima se
+calcula entre entidades con la misma clave, estén donde estén, así que aquí
+la partición es por claves: cada tarea lleva un grupo de claves con sus
+orígenes y destinos, repartidas para que las tareas tengan un número parecido
+de pares origen-destino.
+
+En ambos casos los resultados parciales se juntan y se escriben de una vez
+con `EscritorAtributos`.
+"""
+
+import heapq
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import medicion
+from .distancias_clave import distancias_minimas
+from .escritura import EscritorAtributos
+from .indice_espacial import IndiceSTR
+from .lectura import es_nulo, leer_filas
+from .vecino_cercano import UnionCercania, caja_geometria
+
+# Teselas por proceso: más teselas que procesos reparte mejor la carga
+TESELAS_POR_PROCESO = 4
+
+# Halo por defecto, en separaciones medias entre entidades secundarias
+HALO_SEPARACIONES = 3.0
+
+
+def tipo_geometrias(capa):
+    """"memoria" para una `CapaMemoria`, "qgis" para una QgsVectorLayer."""
+    return "memoria" if hasattr(capa, "consultar") else "qgis"
+
+
+def a_wkb(geometria):
+    return None if geometria is None else bytes(geometria.asWkb())
+
+
+def desde_wkb(datos, tipo):
+    """Geometría (QgsGeometry o `GeometriaMemoria`) a partir de WKB."""
+    if datos is None:
+        return None
+    if tipo == "memoria":
+        from .memoria import GeometriaMemoria
+
+        return GeometriaMemoria.desde_wkb(datos)
+    from qgis.core import QgsGeometry
+
+    geometria = QgsGeometry()
+    geometria.fromWkb(datos)
+    return geometria
+
+
+def teselas_equilibradas(centros, num_teselas):
+    """
+    Reparte los puntos en teselas con el mismo número de puntos.
+
+    :param centros: array (n, 2)
+    :return: lista de arrays de posiciones, una por tesela no vacía
+    """
+    n = len(centros)
+    if n == 0:
+        return []
+    num_teselas = max(1, min(num_teselas, n))
+    num_franjas = max(1, int(round(math.sqrt(num_teselas))))
+    por_franja = math.ceil(num_teselas / num_franjas)
+
+    teselas = []
+    for franja in np.array_split(np.argsort(centros[:, 0], kind="stable"), num_franjas):
+        orden = franja[np.argsort(centros[franja, 1], kind="stable")]
+        teselas.extend(tesela for tesela in np.array_split(orden, por_franja) if len(tesela))
+    return teselas
+
+
+def halo_por_defecto(cajas):
+    """Unas cuantas veces la separación media entre las cajas secundarias."""
+    if len(cajas) == 0:
+        return 0.0
+    ancho = cajas[:, 2].max() - cajas[:, 0].min()
+    alto = cajas[:, 3].max() - cajas[:, 1].min()
+    area = max(ancho * alto, ancho * ancho, alto * alto)
+    return HALO_SEPARACIONES * math.sqrt(area / len(cajas)) if area else 1.0
+
+
+def _margen(caja, zona):
+    """Distancia mínima de la caja al borde de la zona que la contiene."""
+    return min(caja[0] - zona[0], caja[1] - zona[1], zona[2] - caja[2], zona[3] - caja[3])
+
+
+def _cercanos_tesela(tipo, principales, secundarias, valores, zona, distancia_max):
+    """
+    Trabajo de un proceso: vecino más cercano de las entidades de una tesela.
+
+    :param principales: lista de (fid, wkb, caja)
+    :param secundarias: WKB de las secundarias que cruzan `zona`, en su orden original
+    :return: ({fid: valor} de los resultados seguros, [fids pendientes])
+    """
+    union = UnionCercania([desde_wkb(wkb, tipo) for wkb in secundarias], valores)
+    resueltos, pendientes = {}, []
+    for fid, wkb, caja in principales:
+        margen = _margen(caja, zona)
+        resultado = union.vecinos(desde_wkb(wkb, tipo), 1, distancia_max)
+        if resultado:
+            seguro = resultado[0][0] < margen
+        else:
+            seguro = distancia_max is not None and distancia_max < margen
+        if seguro:
+            resueltos[fid] = resultado[0][1] if resultado else None
+        else:
+            pendientes.append(fid)
+    return resueltos, pendientes
+
+
+def _ejecutar(funcion, tareas, max_procesos):
+    """Resultados de `funcion(*tarea)` para cada tarea, en el orden de las tareas."""
+    if max_procesos == 1:
+        return [funcion(*tarea) for tarea in tareas]
+    with ProcessPoolExecutor(max_workers=max_procesos) as grupo:
+        futuros = [grupo.submit(funcion, *tarea) for tarea in tareas]
+        return [futuro.result() for futuro in futuros]
+
+
+def _procesos(max_procesos, tareas):
+    return max(1, min(max_procesos or os.cpu_count() or 1, tareas))
+
+
+@medicion.medir()
+def cercanos_en_paralelo(capa_principal, capa_secundaria, campo_origen, distancia_max=None,
+                         max_procesos=None, num_teselas=None, halo=None):
+    """
+    Valor de `campo_origen` de la entidad secundaria más cercana a cada entidad principal.
+
+    :param max_procesos: procesos simultáneos (por defecto, el número de CPU; 1 = sin procesos)
+    :param num_teselas: teselas de la capa principal (por defecto, 4 por proceso)
+    :param halo: ampliación de cada tesela al buscar secundarias (por defecto, 3 veces la
+                 separación media entre secundarias); solo influye en la velocidad
+    :return: lista de (fid, valor) en el orden de lectura de la capa principal; valor es
+             None si no hay ninguna secundaria a menos de `distancia_max`
+    """
+    tipo = tipo_geometrias(capa_principal)
+    secundarias, valores, cajas_sec = [], [], []
+    for _, geometria, valor in leer_filas(capa_secundaria, [campo_origen], "geometria"):
+        secundarias.append(geometria)
+        valores.append(valor)
+        cajas_sec.append(caja_geometria(geometria))
+    principales = [
+        (fid, a_wkb(geometria), caja_geometria(geometria))
+        for fid, geometria in leer_filas(capa_principal, geometria="geometria")
+    ]
+    if not principales:
+        return []
+    if not secundarias:
+        return [(fid, None) for fid, _, _ in principales]
+
+    cajas_sec = np.asarray(cajas_sec, dtype=np.float64)
+    cajas_pri = np.asarray([caja for _, _, caja in principales], dtype=np.float64)
+    if halo is None:
+        halo = halo_por_defecto(cajas_sec)
+        if distancia_max is not None:
+            halo = min(halo, distancia_max)
+
+    max_procesos = _procesos(max_procesos, len(principales))
+    centros = np.column_stack(((cajas_pri[:, 0] + cajas_pri[:, 2]) / 2, (cajas_pri[:, 1] + cajas_pri[:, 3]) / 2))
+    teselas = teselas_equilibradas(centros, num_teselas or max_procesos * TESELAS_POR_PROCESO)
+
+    wkb_sec = [a_wkb(geometria) for geometria in secundarias]
+    indice = IndiceSTR(cajas_sec)
+    tareas = []
+    for posiciones in teselas:
+        caja = cajas_pri[posiciones]
+        zona = (caja[:, 0].min() - halo, caja[:, 1].min() - halo, caja[:, 2].max() + halo, caja[:, 3].max() + halo)
+        cercanas = indice.en_caja(zona).tolist()
+        tareas.append((
+            tipo, [principales[i] for i in posiciones.tolist()],
+            [wkb_sec[i] for i in cercanas], [valores[i] for i in cercanas], zona, distancia_max,
+        ))
+
+    with medicion.fase("calcular", len(principales)):
+        resueltos, pendientes = {}, []
+        for parciales, faltan in _ejecutar(_cercanos_tesela, tareas, max_procesos):
+            resueltos.update(parciales)
+            pendientes.extend(faltan)
+
+    if pendientes:
+        # Vecino fuera del halo: se busca en toda la capa secundaria
+        with medicion.fase("calcular_pendientes", len(pendientes)):
+            union = UnionCercania(secundarias, valores)
+            wkb_pri = {fid: wkb for fid, wkb, _ in principales}
+            for fid in pendientes:
+                resueltos[fid] = union.mas_cercano(desde_wkb(wkb_pri[fid], tipo), distancia_max)
+
+    return [(fid, resueltos[fid]) for fid, _, _ in principales]
+
+
+def unir_por_cercania_en_paralelo(capa_principal, capa_secundaria, campo_origen, campo_destino,
+                                  distancia_max=None, max_procesos=None, **opciones):
+    """Como `unir_por_cercania`, calculando por teselas en varios procesos."""
+    resultados = cercanos_en_paralelo(
+        capa_principal, capa_secundaria, campo_origen, distancia_max, max_procesos, **opciones
+    )
+    idx_destino = capa_principal.fields().indexOf(campo_destino)
+    with EscritorAtributos(capa_principal) as escritor:
+        for fid, valor in resultados:
+            # Igual que en serie: los valores vacíos o NULL no se copian
+            if valor:
+                escritor.cambiar(fid, idx_destino, valor)
+    return escritor.entidades
+
+
+def _distancias_grupo(tipo, origenes, grupos):
+    """Trabajo de un proceso: distancias mínimas de un grupo de claves."""
+    origenes = [(fid, clave, desde_wkb(wkb, tipo)) for fid, clave, wkb in origenes]
+    grupos = {clave: [desde_wkb(wkb, tipo) for wkb in destinos] for clave, destinos in grupos.items()}
+    return distancias_minimas(origenes, grupos)[0]
+
+
+def repartir_claves(costes, num_tareas):
+    """
+    Reparte claves en tareas de coste parecido (la mayor a la tarea menos cargada).
+
+    :param costes: diccionario clave -> coste
+    :return: lista de listas de claves (sin tareas vacías)
+    """
+    tareas = [(0, i, []) for i in range(max(1, num_tareas))]
+    for clave in sorted(costes, key=costes.get, reverse=True):
+        coste, i, claves = heapq.heappop(tareas)
+        claves.append(clave)
+        heapq.heappush(tareas, (coste + costes[clave], i, claves))
+    return [claves for _, _, claves in sorted(tareas, key=lambda t: t[1]) if claves]
+
+
+@medicion.medir()
+def distancias_clave_en_paralelo(capa_origen, capa_destino, campo, max_procesos=None, num_tareas=None):
+    """
+    Como el modo "memoria" de `calcular_distancias_por_clave`, repartiendo las claves entre procesos.
+
+    :return: (distancias, sin_coincidencia) con el mismo contenido y orden que en serie
+    """
+    tipo = tipo_geometrias(capa_origen)
+    grupos = {}
+    for _, geometria, clave in leer_filas(capa_destino, [campo], "geometria"):
+        if not es_nulo(clave):
+            grupos.setdefault(clave, []).append(a_wkb(geometria))
+
+    orden, sin_coincidencia, por_clave = [], [], {}
+    # Como en serie, los orígenes sin geometría se saltan
+    for fid, geometria, clave in leer_filas(capa_origen, [campo], "geometria"):
+        if es_nulo(clave) or not grupos.get(clave):
+            sin_coincidencia.append(clave)
+            continue
+        orden.append(fid)
+        por_clave.setdefault(clave, []).append((fid, clave, a_wkb(geometria)))
+
+    if not por_clave:
+        return {}, sin_coincidencia
+    costes = {clave: len(origenes) * len(grupos[clave]) for clave, origenes in por_clave.items()}
+    max_procesos = _procesos(max_procesos, len(costes))
+    tareas = [
+        (tipo, [origen for clave in claves for origen in por_clave[clave]],
+         {clave: grupos[clave] for clave in claves})
+        for claves in repartir_claves(costes, num_tareas or max_procesos * TESELAS_POR_PROCESO)
+    ]
+
+    with medicion.fase("calcular", len(orden)):
+        calculadas = {}
+        for parciales in _ejecutar(_distancias_grupo, tareas, max_procesos):
+            calculadas.update(parciales)
+    return {fid: calculadas[fid] for fid in orden}, sin_coincidencia
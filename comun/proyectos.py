@@ -0,0 +1,219 @@
+"""
+Edición de muchos proyectos de QGIS por lotes.
+
+La capa a añadir se abre y se valida una sola vez en el proceso principal; de
+ella se obtiene su elemento `<maplayer>` (fuente, CRS, campos, estilo...) como
+texto. Después cada proyecto se edita de una de dos formas:
+
+- modo "xml" (rápido): se añade ese `<maplayer>` y su entrada del árbol de
+  capas directamente al XML del .qgs/.qgz, sin cargar QGIS ni los datos de
+  ninguna capa del proyecto.
+- modo "qgis": cada proceso tiene su propio `QgsApplication` y usa un
+  `QgsProject` nuevo por proyecto (`read` + `addMapLayer` + `write`).
+
+Los proyectos se reparten entre procesos con un `ProcessPoolExecutor`. Cada
+fichero se escribe primero en un temporal de la misma carpeta y después se
+renombra sobre el original, de modo que un fallo nunca deja un proyecto a medias.
+"""
+
+import os
+import time
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from xml.etree import ElementTree as ET
+
+from .arranque import iniciar_qgis
+from .estilos import escribir_atomico
+
+MODOS = ("xml", "qgis")
+
+EXTENSIONES = (".qgs", ".qgz")
+
+CABECERA_QGS = "<!DOCTYPE qgis PUBLIC 'http://mrcc.com/qgis.dtd' 'SYSTEM'>\n"
+
+# Capa validada en el proceso principal, lista para enviarse a otros procesos
+CapaPreparada = namedtuple("CapaPreparada", "id nombre fuente proveedor xml")
+
+ResultadoProyecto = namedtuple("ResultadoProyecto", "proyecto segundos omitido error")
+
+
+def buscar_proyectos(carpeta):
+    """Rutas de los .qgs/.qgz de una carpeta, ordenadas."""
+    return sorted(
+        os.path.join(carpeta, nombre)
+        for nombre in os.listdir(carpeta)
+        if nombre.lower().endswith(EXTENSIONES)
+    )
+
+
+def preparar_capa(ruta_capa, nombre=None, proveedor="ogr"):
+    """
+    Abre y valida la capa una sola vez y guarda su `<maplayer>` como texto.
+
+    :raises ValueError: si la capa no es válida
+    """
+    from qgis.core import QgsReadWriteContext, QgsVectorLayer
+    from qgis.PyQt.QtXml import QDomDocument
+
+    nombre = nombre or os.path.basename(ruta_capa)
+    capa = QgsVectorLayer(ruta_capa, nombre, proveedor)
+    if not capa.isValid():
+        raise ValueError(f"La capa no es válida: {ruta_capa}")
+
+    documento = QDomDocument("qgis")
+    elemento = documento.createElement("maplayer")
+    # Sin ruta base en el contexto las rutas se guardan absolutas y sirven para cualquier proyecto
+    if not capa.writeLayerXml(elemento, documento, QgsReadWriteContext()):
+        raise ValueError(f"No se pudo describir la capa: {ruta_capa}")
+    documento.appendChild(elemento)
+    return CapaPreparada(capa.id(), nombre, capa.source(), proveedor, documento.toString())
+
+
+def _elemento_arbol(capa):
+    elemento = ET.Element("layer-tree-layer", {
+        "id": capa.id,
+        "name": capa.nombre,
+        "source": capa.fuente,
+        "providerKey": capa.proveedor,
+        "checked": "Qt::Checked",
+        "expanded": "1",
+    })
+    ET.SubElement(elemento, "customproperties")
+    return elemento
+
+
+def añadir_capa_xml(raiz, capa):
+    """
+    Añade la capa al XML de un proyecto: `<projectlayers>`, árbol de capas y orden de capas.
+
+    :return: False si el proyecto ya tenía una capa con la misma fuente (no se modifica)
+    """
+    capas = raiz.find("projectlayers")
+    if capas is None:
+        capas = ET.SubElement(raiz, "projectlayers")
+    if any(maplayer.findtext("datasource") == capa.fuente for maplayer in capas.iter("maplayer")):
+        return False
+    capas.append(ET.fromstring(capa.xml))
+
+    # Como `addMapLayer`, la capa nueva se pone la primera del grupo raíz
+    arbol = raiz.find("layer-tree-group")
+    if arbol is not None:
+        hijos = list(arbol)
+        posicion = next(
+            (i for i, hijo in enumerate(hijos)
+             if hijo.tag in ("layer-tree-layer", "layer-tree-group", "custom-order")),
+            len(hijos),
+        )
+        arbol.insert(posicion, _elemento_arbol(capa))
+        orden = arbol.find("custom-order")
+        if orden is not None:
+            item = ET.Element("item")
+            item.text = capa.id
+            orden.insert(0, item)
+
+    orden_capas = raiz.find("layerorder")
+    if orden_capas is not None:
+        orden_capas.insert(0, ET.Element("layer", {"id": capa.id}))
+    return True
+
+
+def _texto_qgs(raiz):
+    return CABECERA_QGS + ET.tostring(raiz, encoding="unicode")
+
+
+def _añadir_en_qgz(ruta, capa):
+    """Reescribe el .qgz con el .qgs modificado y el resto de ficheros (.qgd...) intactos."""
+    with zipfile.ZipFile(ruta) as comprimido:
+        miembros = [(info, comprimido.read(info)) for info in comprimido.infolist()]
+    nombre_qgs = next(info.filename for info, _ in miembros if info.filename.lower().endswith(".qgs"))
+    raiz = ET.fromstring(next(datos for info, datos in miembros if info.filename == nombre_qgs))
+    if not añadir_capa_xml(raiz, capa):
+        return False
+
+    temporal = f"{ruta}.tmp{os.getpid()}"
+    with zipfile.ZipFile(temporal, "w", zipfile.ZIP_DEFLATED) as nuevo:
+        for info, datos in miembros:
+            if info.filename == nombre_qgs:
+                datos = _texto_qgs(raiz).encode("utf-8")
+            nuevo.writestr(info, datos)
+    os.replace(temporal, ruta)
+    return True
+
+
+def añadir_capa_fichero(ruta_proyecto, capa):
+    """Añade la capa a un .qgs/.qgz editando su XML. Devuelve False si ya la tenía."""
+    if ruta_proyecto.lower().endswith(".qgz"):
+        return _añadir_en_qgz(ruta_proyecto, capa)
+    raiz = ET.parse(ruta_proyecto).getroot()
+    if not añadir_capa_xml(raiz, capa):
+        return False
+    escribir_atomico(ruta_proyecto, _texto_qgs(raiz))
+    return True
+
+
+def añadir_capa_qgis(ruta_proyecto, capa):
+    """Añade la capa con un `QgsProject` propio (no el global) y lo guarda de forma atómica."""
+    from qgis.core import QgsProject, QgsVectorLayer
+
+    iniciar_qgis()
+    proyecto = QgsProject()
+    if not proyecto.read(ruta_proyecto):
+        raise RuntimeError(proyecto.error() or "no se pudo leer el proyecto")
+    if any(c.source() == capa.fuente for c in proyecto.mapLayers().values()):
+        return False
+
+    proyecto.addMapLayer(QgsVectorLayer(capa.fuente, capa.nombre, capa.proveedor))
+    base, extension = os.path.splitext(ruta_proyecto)
+    temporal = f"{base}.tmp{os.getpid()}{extension}"
+    if not proyecto.write(temporal):
+        raise RuntimeError(proyecto.error() or "no se pudo guardar el proyecto")
+    os.replace(temporal, ruta_proyecto)
+    return True
+
+
+def _editar(ruta_proyecto, capa, modo):
+    inicio = time.perf_counter()
+    try:
+        editar = añadir_capa_fichero if modo == "xml" else añadir_capa_qgis
+        omitido = not editar(ruta_proyecto, capa)
+        error = None
+    except Exception as excepcion:  # el error se informa y el resto de proyectos sigue
+        omitido, error = False, str(excepcion)
+    return ResultadoProyecto(ruta_proyecto, time.perf_counter() - inicio, omitido, error)
+
+
+def añadir_capa_a_proyectos(rutas_proyectos, capa, modo="xml", max_procesos=None, al_terminar=None):
+    """
+    Añade una capa ya preparada (`preparar_capa`) a muchos proyectos en paralelo.
+
+    :param modo: "xml" (edita el XML directamente) o "qgis" (un QgsProject por proyecto)
+    :param max_procesos: proyectos simultáneos (por defecto, el número de CPU; 1 = sin procesos)
+    :param al_terminar: función opcional que recibe cada `ResultadoProyecto` según acaba
+    :return: lista de resultados en el orden en que terminaron
+    """
+    if modo not in MODOS:
+        raise ValueError(f"Modo desconocido '{modo}'. Usa uno de: {', '.join(MODOS)}.")
+    rutas_proyectos = list(rutas_proyectos)
+    if not rutas_proyectos:
+        return []
+
+    resultados = []
+    max_procesos = max(1, min(max_procesos or os.cpu_count() or 1, len(rutas_proyectos)))
+    if max_procesos == 1:
+        for ruta in rutas_proyectos:
+            resultado = _editar(ruta, capa, modo)
+            resultados.append(resultado)
+            if al_terminar is not None:
+                al_terminar(resultado)
+        return resultados
+
+    inicializador = iniciar_qgis if modo == "qgis" else None
+    with ProcessPoolExecutor(max_workers=max_procesos, initializer=inicializador) as grupo:
+        futuros = [grupo.submit(_editar, ruta, capa, modo) for ruta in rutas_proyectos]
+        for futuro in as_completed(futuros):
+            resultado = futuro.result()
+            resultados.append(resultado)
+            if al_terminar is not None:
+                al_terminar(resultado)
+    return resultados
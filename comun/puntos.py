@@ -0,0 +1,264 @@
+"""
+Almacén de puntos por columnas.
+
+`AlmacenPuntos` guarda una capa de puntos (o los centroides de cualquier capa)
+como arrays contiguos: fid (int64), x e y (float64) y, opcionalmente, columnas
+de atributos. Son 24 bytes por punto más los atributos, frente a los cientos
+de bytes de un `QgsGeometry`/`QgsPointXY` por entidad: 50 millones de puntos
+ocupan unos 1,2 GB.
+
+- Se construye en una sola pasada desde una capa (`desde_capa`, con la
+  lectura mínima de `comun/lectura.py`) o desde WKB (`desde_wkb`).
+- Se guarda en una carpeta con un `.npy` por columna (`guardar`) y se abre
+  con `np.load(mmap_mode="r")` (`abrir`), de modo que solo se cargan en
+  memoria las páginas que se usan.
+- Las operaciones son vectoriales: filtro por caja y por radio, centroides
+  (en total o por grupos), reproyección y escritura por lotes en una capa.
+
+Las columnas de objetos (en memoria, arrays de objetos con None) se guardan en
+disco con su tipo: texto de ancho fijo, int64, float64 o bool, con una máscara
+de nulos. Si mezclan tipos, o son fechas u otros objetos, se guardan con
+pickle y se leen enteras al abrir, sin proyectarlas en memoria.
+"""
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from .escritura import EscritorAtributos
+from .lectura import DTYPES_OBJETOS, TAM_LOTE, array_a_objetos, leer_lotes, objetos_a_array, tipo_lote
+from .reproyeccion import TAM_BLOQUE, crs_como_texto, reproyectar
+
+FICHERO_DESCRIPCION = "almacen.json"
+
+# Punto WKB 2D little endian: el formato de casi todos los proveedores
+_DTYPE_WKB_PUNTO = np.dtype([("orden", "u1"), ("tipo", "<u4"), ("x", "<f8"), ("y", "<f8")])
+
+
+def _punto_wkb(datos):
+    """(x, y) de un punto WKB en cualquier orden de bytes, con o sin Z/M."""
+    if not datos:
+        return np.nan, np.nan
+    orden = "<" if datos[0] == 1 else ">"
+    tipo, = struct.unpack_from(orden + "I", datos, 1)
+    if tipo % 1000 != 1 and tipo & 0xFF != 1:
+        raise ValueError(f"El WKB no es un punto (tipo {tipo}).")
+    return struct.unpack_from(orden + "dd", datos, 5)
+
+
+def coordenadas_wkb(wkbs):
+    """Arrays (xs, ys) a partir de una lista de puntos WKB; NaN para los vacíos."""
+    wkbs = [bytes(wkb) if wkb is not None else b"" for wkb in wkbs]
+    if wkbs and all(len(wkb) == _DTYPE_WKB_PUNTO.itemsize and wkb[0] == 1 for wkb in wkbs):
+        puntos = np.frombuffer(b"".join(wkbs), dtype=_DTYPE_WKB_PUNTO)
+        if (puntos["tipo"] == 1).all():
+            return puntos["x"].astype(np.float64), puntos["y"].astype(np.float64)
+    coordenadas = np.array([_punto_wkb(wkb) for wkb in wkbs], dtype=np.float64).reshape(-1, 2)
+    return coordenadas[:, 0].copy(), coordenadas[:, 1].copy()
+
+
+class AlmacenPuntos:
+    """
+    Puntos por columnas.
+
+    :param fids: identificadores de las entidades
+    :param xs: coordenadas X
+    :param ys: coordenadas Y
+    :param columnas: diccionario {campo: array} con los atributos
+    :param crs: CRS de las coordenadas como texto ("EPSG:25830" o WKT)
+    """
+
+    def __init__(self, fids, xs, ys, columnas=None, crs=None):
+        self.fid = np.asarray(fids, dtype=np.int64)
+        self.x = np.asarray(xs, dtype=np.float64)
+        self.y = np.asarray(ys, dtype=np.float64)
+        self.columnas = dict(columnas or {})
+        self.crs = crs
+        if not len(self.fid) == len(self.x) == len(self.y):
+            raise ValueError("fids, xs e ys deben tener la misma longitud.")
+
+    def __len__(self):
+        return len(self.fid)
+
+    @property
+    def nbytes(self):
+        """Bytes ocupados por los arrays (las columnas de objetos cuentan solo los punteros)."""
+        return sum(a.nbytes for a in (self.fid, self.x, self.y, *self.columnas.values()))
+
+    @classmethod
+    def desde_capa(cls, capa, campos=(), tipos=None, geometria="punto", tam_lote=TAM_LOTE, **filtros):
+        """
+        Lee la capa en una sola pasada.
+
+        :param tipos: dtype de cada campo ({campo: np.float64, ...}); object por defecto
+        :param geometria: "punto" (capas de puntos) o "centroide" (cualquier capa)
+        :param filtros: rect, expresion o fids, como en `leer_filas`
+        """
+        dtype = tipo_lote(campos, geometria, tipos)
+        # Un array por columna reservado con el número de entidades de la capa (con
+        # filtros o geometrías vacías sobra; si falta, se amplía) y rellenado lote a lote
+        capacidad = max(capa.featureCount(), 0)
+        if hasattr(filtros.get("fids"), "__len__"):
+            capacidad = min(capacidad, len(filtros["fids"]))
+        columnas = {nombre: np.empty(capacidad, dtype=dtype[nombre]) for nombre in dtype.names}
+        n = 0
+        for lote in leer_lotes(capa, campos, geometria, tipos, tam_lote, **filtros):
+            if n + len(lote) > capacidad:
+                capacidad = max(n + len(lote), 2 * capacidad)
+                for valores in columnas.values():
+                    valores.resize(capacidad, refcheck=False)
+            for nombre, valores in columnas.items():
+                valores[n:n + len(lote)] = lote[nombre]
+            n += len(lote)
+        for valores in columnas.values():
+            valores.resize(n, refcheck=False)
+        return cls(
+            columnas.pop("fid"), columnas.pop("x"), columnas.pop("y"),
+            {campo: columnas[campo] for campo in campos},
+            crs_como_texto(capa.crs()),
+        )
+
+    @classmethod
+    def desde_wkb(cls, fids, wkbs, columnas=None, crs=None):
+        """Almacén a partir de puntos WKB (p. ej. de `QgsGeometry.asWkb()` o de un GeoPackage)."""
+        xs, ys = coordenadas_wkb(wkbs)
+        return cls(fids, xs, ys, columnas, crs)
+
+    def seleccionar(self, seleccion):
+        """Nuevo almacén con las posiciones indicadas (máscara booleana o índices)."""
+        return AlmacenPuntos(
+            self.fid[seleccion], self.x[seleccion], self.y[seleccion],
+            {campo: valores[seleccion] for campo, valores in self.columnas.items()}, self.crs,
+        )
+
+    def caja(self):
+        """(xmin, ymin, xmax, ymax) de los puntos, sin contar los NaN."""
+        if not len(self):
+            return None
+        return (float(np.nanmin(self.x)), float(np.nanmin(self.y)),
+                float(np.nanmax(self.x)), float(np.nanmax(self.y)))
+
+    def en_caja(self, xmin, ymin, xmax, ymax):
+        """Máscara de los puntos dentro de la caja (bordes incluidos)."""
+        return (self.x >= xmin) & (self.x <= xmax) & (self.y >= ymin) & (self.y <= ymax)
+
+    def en_radio(self, cx, cy, radio):
+        """Máscara de los puntos a una distancia menor o igual que `radio` de (cx, cy)."""
+        dx = self.x - cx
+        dy = self.y - cy
+        return dx * dx + dy * dy <= radio * radio
+
+    def centroide(self):
+        """(x, y) medio de los puntos."""
+        return float(np.nanmean(self.x)), float(np.nanmean(self.y))
+
+    def centroides_por(self, campo):
+        """
+        Centroide y número de puntos de cada valor distinto de `campo` (los nulos se omiten).
+
+        :return: (claves, xs, ys, conteos) como arrays, con las claves ordenadas
+        """
+        valores = self.columnas[campo]
+        if valores.dtype == object:
+            validos = np.fromiter((v is not None for v in valores.tolist()), dtype=bool, count=len(valores))
+        elif valores.dtype.kind == "f":
+            validos = ~np.isnan(valores)
+        else:
+            validos = np.ones(len(valores), dtype=bool)
+        claves, grupos = np.unique(valores[validos], return_inverse=True)
+        conteos = np.bincount(grupos, minlength=len(claves))
+        xs = np.bincount(grupos, weights=self.x[validos], minlength=len(claves)) / conteos
+        ys = np.bincount(grupos, weights=self.y[validos], minlength=len(claves)) / conteos
+        return claves, xs, ys, conteos
+
+    def reproyectar(self, crs_destino, tam_bloque=TAM_BLOQUE, contexto=None):
+        """
+        Nuevo almacén con las coordenadas en `crs_destino` (los atributos se comparten).
+
+        :param contexto: `QgsCoordinateTransformContext`; por defecto el del proyecto (ver `comun/reproyeccion.py`)
+        """
+        xs, ys = reproyectar(self.x, self.y, self.crs, crs_destino, tam_bloque, contexto)
+        return AlmacenPuntos(self.fid, xs, ys, self.columnas, crs_destino)
+
+    def escribir(self, capa, campos, tam_bloque=None):
+        """
+        Escribe columnas en los campos de la capa por lotes.
+
+        :param campos: {columna: campo de la capa}; la columna puede ser "x", "y" o un atributo
+        :return: número de entidades actualizadas
+        """
+        columnas = {"x": self.x, "y": self.y, **self.columnas}
+        idxs = {capa.fields().indexOf(campo): columnas[columna] for columna, campo in campos.items()}
+        if -1 in idxs:
+            raise ValueError(f"La capa '{capa.name()}' no tiene alguno de los campos: {', '.join(campos.values())}")
+
+        valores = {}
+        for idx, columna in idxs.items():
+            lista = columna.tolist()
+            if columna.dtype.kind == "f":
+                lista = [None if v != v else v for v in lista]
+            valores[idx] = lista
+
+        opciones = {} if tam_bloque is None else {"tam_bloque": tam_bloque}
+        with EscritorAtributos(capa, **opciones) as escritor:
+            for fila, fid in enumerate(self.fid.tolist()):
+                escritor.cambiar_varios(fid, {idx: lista[fila] for idx, lista in valores.items()})
+        return escritor.entidades
+
+    def guardar(self, carpeta):
+        """Guarda el almacén en `carpeta` (un .npy por columna y un JSON con la descripción)."""
+        os.makedirs(carpeta, exist_ok=True)
+        descripcion = {"crs": self.crs, "entidades": len(self), "columnas": []}
+        ficheros = {"fid": self.fid, "x": self.x, "y": self.y}
+        for i, (campo, valores) in enumerate(self.columnas.items()):
+            nombre = f"columna_{i}"
+            objetos = None
+            if valores.dtype == object:
+                tipada = objetos_a_array(valores.tolist())
+                if tipada is None:
+                    objetos = "objetos"
+                    ficheros[nombre] = valores
+                else:
+                    ficheros[nombre], ficheros[nombre + "_nulos"], objetos = tipada
+            else:
+                ficheros[nombre] = valores
+            descripcion["columnas"].append({"campo": campo, "fichero": nombre, "objetos": objetos})
+
+        for nombre, valores in ficheros.items():
+            temporal = os.path.join(carpeta, nombre + ".tmp.npy")
+            np.save(temporal, np.ascontiguousarray(valores), allow_pickle=valores.dtype == object)
+            os.replace(temporal, os.path.join(carpeta, nombre + ".npy"))
+        # La descripción se escribe al final: si falta, el almacén está incompleto
+        temporal = os.path.join(carpeta, FICHERO_DESCRIPCION + ".tmp")
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            json.dump(descripcion, archivo, ensure_ascii=False)
+        os.replace(temporal, os.path.join(carpeta, FICHERO_DESCRIPCION))
+
+    @classmethod
+    def abrir(cls, carpeta, mmap=True):
+        """
+        Abre un almacén guardado con `guardar`.
+
+        :param mmap: proyectar los ficheros en memoria en lugar de leerlos; las
+                     columnas numéricas quedan de solo lectura
+        """
+        with open(os.path.join(carpeta, FICHERO_DESCRIPCION), encoding="utf-8") as archivo:
+            descripcion = json.load(archivo)
+        modo = "r" if mmap else None
+
+        def cargar(nombre, objetos=False):
+            if objetos:
+                return np.load(os.path.join(carpeta, nombre + ".npy"), allow_pickle=True)
+            return np.load(os.path.join(carpeta, nombre + ".npy"), mmap_mode=modo)
+
+        columnas = {}
+        for columna in descripcion["columnas"]:
+            objetos = columna["objetos"]
+            valores = cargar(columna["fichero"], objetos == "objetos")
+            if objetos in DTYPES_OBJETOS:
+                # Vuelven a objetos con None para que se comporten como al leer la capa
+                valores = array_a_objetos(valores, cargar(columna["fichero"] + "_nulos"))
+            columnas[columna["campo"]] = valores
+        return cls(cargar("fid"), cargar("x"), cargar("y"), columnas, descripcion["crs"])
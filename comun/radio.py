@@ -0,0 +1,231 @@
+"""
+Selección de entidades dentro de un radio alrededor de uno o varios puntos.
+
+Reproduce el criterio de `buffer(radio, segmentos).contains(geometria)` sin
+construir un buffer por entidad:
+
+1. Prefiltro: solo se leen las entidades cuya caja cae en la caja del círculo
+   (`QgsFeatureRequest().setFilterRect`) y se indexan con un `IndiceSTR`, de
+   modo que cada centro solo mira sus candidatos.
+2. Distancias: con la caja de cada candidato se decide por distancia al
+   cuadrado si está seguro dentro (toda la caja dentro del polígono inscrito
+   del buffer) o seguro fuera (la caja queda más lejos que el radio).
+3. Frontera: solo los candidatos del anillo entre ambos radios pasan por el
+   `contains` exacto con el buffer de QGIS o, sin buffer (`exacto=False`),
+   por el círculo exacto: todos sus vértices a distancia <= radio.
+
+Con una `CacheIndices` (`comun/cache_indices.py`) se indexa la capa entera
+una vez y las siguientes ejecuciones cargan ids, cajas e índice del disco en
+lugar de leer la capa con el prefiltro.
+"""
+
+import math
+
+import numpy as np
+
+from . import medicion
+from .indice_espacial import IndiceSTR
+from .lectura import leer_filas
+
+SEGMENTOS = 20
+
+
+def radio_interior(radio, segmentos=SEGMENTOS):
+    """
+    Radio del círculo inscrito en el buffer de QGIS.
+
+    El buffer de un punto tiene `segmentos` lados por cuadrante con los
+    vértices sobre el círculo, así que todo lo que está a menos de esta
+    distancia del centro está dentro del polígono.
+    """
+    return radio * math.cos(math.pi / (4 * segmentos))
+
+
+def distancia_maxima2(cajas, cx, cy):
+    """Distancia al cuadrado desde (cx, cy) a la esquina más lejana de cada caja."""
+    lejos_x = np.maximum(np.abs(cajas[:, 0] - cx), np.abs(cajas[:, 2] - cx))
+    lejos_y = np.maximum(np.abs(cajas[:, 1] - cy), np.abs(cajas[:, 3] - cy))
+    return lejos_x * lejos_x + lejos_y * lejos_y
+
+
+def distancia_minima2(cajas, cx, cy):
+    """Distancia al cuadrado desde (cx, cy) al punto más cercano de cada caja."""
+    cerca_x = np.maximum(np.maximum(cajas[:, 0] - cx, cx - cajas[:, 2]), 0.0)
+    cerca_y = np.maximum(np.maximum(cajas[:, 1] - cy, cy - cajas[:, 3]), 0.0)
+    return cerca_x * cerca_x + cerca_y * cerca_y
+
+
+def clasificar(cajas, cx, cy, radio, segmentos=SEGMENTOS):
+    """
+    Clasifica cajas (n, 4) respecto al buffer de radio `radio` centrado en (cx, cy).
+
+    :return: (dentro, frontera) como arrays booleanos; el resto queda fuera
+    """
+    cajas = np.asarray(cajas, dtype=np.float64).reshape(-1, 4)
+    maxima2 = distancia_maxima2(cajas, cx, cy)
+    minima2 = distancia_minima2(cajas, cx, cy)
+
+    # Pequeño margen para que los redondeos no metan dentro lo que está en el borde
+    interior = radio_interior(radio, segmentos) * (1 - 1e-9)
+    dentro = maxima2 <= interior * interior
+    frontera = ~dentro & (minima2 <= radio * radio)
+    return dentro, frontera
+
+
+class ConsultaRadio:
+    """
+    Índice de las entidades candidatas para consultas por radio.
+
+    :param fids: ids de las entidades
+    :param cajas: cajas envolventes (n, 4) de las entidades
+    :param contiene: función opcional `f(cx, cy, radio, fids) -> fids` con el test
+        para los candidatos de la frontera (`contiene_qgis` o `contiene_circulo`); sin
+        ella se aproxima por la caja: solo se acepta la frontera si toda la caja está a
+        distancia <= radio, lo que deja fuera entidades dentro del círculo cuya caja no lo está
+    :param segmentos: segmentos por cuadrante del buffer que se reproduce
+    :param indice: `IndiceSTR` ya construido sobre `cajas` (p. ej. de la caché)
+    """
+
+    def __init__(self, fids, cajas, contiene=None, segmentos=SEGMENTOS, capacidad=16, indice=None):
+        self.fids = np.asarray(fids, dtype=np.int64)
+        self.cajas = np.asarray(cajas, dtype=np.float64).reshape(-1, 4)
+        self.contiene = contiene
+        self.segmentos = segmentos
+        self.indice = IndiceSTR(self.cajas, capacidad) if indice is None else indice
+        self.pruebas_exactas = 0
+
+    @classmethod
+    def desde_capa(cls, capa, rectangulo=None, exacto=True, segmentos=SEGMENTOS, cache=None, **opciones):
+        """
+        Lee ids y cajas de la capa sin atributos, solo dentro de `rectangulo` si se indica.
+
+        :param rectangulo: (xmin, ymin, xmax, ymax) para prefiltrar con `setFilterRect`
+        :param exacto: usar el `contains` de QGIS en la frontera; si no, el círculo exacto
+                       (`contiene_circulo`)
+        :param cache: `CacheIndices` opcional; se indexa la capa entera (sin `rectangulo`)
+                      y se reutiliza mientras no cambie
+        """
+        def leer(rect):
+            fids, cajas = [], []
+            for fid, *caja in leer_filas(capa, geometria="caja", rect=rect):
+                fids.append(fid)
+                cajas.append(caja)
+            return np.asarray(fids, dtype=np.int64), np.asarray(cajas, dtype=np.float64).reshape(-1, 4)
+
+        contiene = contiene_qgis(capa, segmentos) if exacto else contiene_circulo(capa)
+        if cache is None:
+            return cls(*leer(rectangulo), contiene=contiene, segmentos=segmentos, **opciones)
+
+        capacidad = opciones.pop("capacidad", 16)
+
+        def construir():
+            fids, cajas = leer(None)
+            return {**IndiceSTR(cajas, capacidad).a_arrays(), "fids": fids, "cajas_entidades": cajas}
+
+        arrays = cache.obtener_o_construir(capa, ("radio", capacidad), construir)
+        return cls(arrays["fids"], arrays["cajas_entidades"], contiene=contiene, segmentos=segmentos,
+                   indice=IndiceSTR.desde_arrays(arrays), **opciones)
+
+    def consultar(self, cx, cy, radio):
+        """Ids ordenados de las entidades dentro del radio alrededor de (cx, cy)."""
+        posiciones = self.indice.en_caja((cx - radio, cy - radio, cx + radio, cy + radio))
+        cajas = self.cajas[posiciones]
+        dentro, frontera = clasificar(cajas, cx, cy, radio, self.segmentos)
+        seleccion = self.fids[posiciones[dentro]]
+
+        if frontera.any():
+            if self.contiene is not None:
+                dudosos = self.fids[posiciones[frontera]]
+                self.pruebas_exactas += len(dudosos)
+                extra = np.asarray(self.contiene(cx, cy, radio, dudosos), dtype=np.int64)
+            else:
+                dentro_circulo = distancia_maxima2(cajas[frontera], cx, cy) <= radio * radio
+                extra = self.fids[posiciones[frontera][dentro_circulo]]
+            seleccion = np.concatenate((seleccion, extra))
+
+        return np.sort(seleccion)
+
+    def consultar_varios(self, centros, radio, union=False):
+        """
+        Consulta varios centros.
+
+        :param centros: iterable de tuplas (id_centro, x, y)
+        :return: diccionario id_centro -> ids, o un único array ordenado con la unión
+        """
+        resultados = {id_centro: self.consultar(x, y, radio) for id_centro, x, y in centros}
+        if not union:
+            return resultados
+        if not resultados:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(list(resultados.values())))
+
+
+def contiene_qgis(capa, segmentos=SEGMENTOS):
+    """Test exacto con QGIS: `buffer(radio, segmentos).contains` sobre las entidades indicadas."""
+    from qgis.core import QgsGeometry, QgsPointXY
+
+    def contiene(cx, cy, radio, fids):
+        buffer_geom = QgsGeometry.fromPointXY(QgsPointXY(cx, cy)).buffer(radio, segmentos)
+        return [
+            fid for fid, geometria in leer_filas(capa, geometria="geometria", fids=fids)
+            if buffer_geom.contains(geometria)
+        ]
+
+    return contiene
+
+
+def _vertices(geometria):
+    """Array (n, 2) con los vértices de una QgsGeometry o una `GeometriaMemoria`."""
+    vertices = geometria.vertices
+    if isinstance(vertices, np.ndarray):
+        return vertices
+    return np.array([(v.x(), v.y()) for v in vertices()], dtype=np.float64).reshape(-1, 2)
+
+
+def contiene_circulo(capa):
+    """
+    Test sin buffer: entidades con todos sus vértices a distancia <= radio del centro.
+
+    El círculo es convexo, así que si todos los vértices están dentro también lo
+    están los segmentos que los unen.
+    """
+    def contiene(cx, cy, radio, fids):
+        seleccion = []
+        for fid, geometria in leer_filas(capa, geometria="geometria", fids=fids):
+            vertices = _vertices(geometria)
+            distancias2 = (vertices[:, 0] - cx) ** 2 + (vertices[:, 1] - cy) ** 2
+            if len(vertices) and distancias2.max() <= radio * radio:
+                seleccion.append(fid)
+        return seleccion
+
+    return contiene
+
+
+def leer_centros(capa):
+    """(id, x, y) de cada entidad de la capa de centros (el centroide si no es un punto)."""
+    return list(leer_filas(capa, geometria="centroide"))
+
+
+@medicion.medir()
+def seleccionar_en_radio(capa_principal, capa_radio, radio, union=True, exacto=True,
+                         segmentos=SEGMENTOS, cache=None):
+    """
+    Entidades de `capa_principal` dentro del radio de cada punto de `capa_radio`.
+
+    Solo se leen las entidades de la capa principal que caen en la extensión
+    de los círculos de todos los centros (salvo con `cache`, que indexa la capa entera).
+
+    :param cache: `CacheIndices` opcional para no reindexar la capa principal si no ha cambiado
+    :return: diccionario id_centro -> ids, o un array con la unión si `union` es True
+    """
+    centros = leer_centros(capa_radio)
+    if not centros:
+        return np.empty(0, dtype=np.int64) if union else {}
+
+    xs = [x for _, x, _ in centros]
+    ys = [y for _, _, y in centros]
+    rectangulo = (min(xs) - radio, min(ys) - radio, max(xs) + radio, max(ys) + radio)
+
+    consulta = ConsultaRadio.desde_capa(capa_principal, rectangulo, exacto=exacto, segmentos=segmentos,
+                                        cache=cache)
+    return consulta.consultar_varios(centros, radio, union=union)
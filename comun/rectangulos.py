@@ -0,0 +1,167 @@
+"""
+Generación de rectángulos (y cuadrados) centrados en puntos.
+
+Los vértices de los rectángulos se calculan con NumPy por bloques de muchos
+puntos a la vez, a partir de arrays de X e Y. El ancho, el alto y el ángulo pueden ser un valor
+fijo o un array (por ejemplo leído de un campo de la capa). Las geometrías
+se construyen directamente desde WKB generado a partir de los arrays y se
+añaden a la salida en lotes grandes: una capa en memoria o, para salidas
+grandes, un GeoPackage o FlatGeobuf (`comun/salidas.py`).
+"""
+
+import numpy as np
+
+from . import medicion
+from .puntos import AlmacenPuntos
+from .salidas import abrir_salida
+
+TAM_LOTE = 100_000
+
+# Polígono WKB little-endian con un único anillo de 5 vértices
+_DTYPE_WKB = np.dtype([
+    ("orden", "u1"),
+    ("tipo", "<u4"),
+    ("anillos", "<u4"),
+    ("puntos", "<u4"),
+    ("coordenadas", "<f8", (10,)),
+])
+_WKB_POLIGONO = 3
+
+# Esquinas del rectángulo unidad en el orden de los scripts originales, cerrando el anillo
+_ESQUINAS = np.array([[-0.5, -0.5], [0.5, -0.5], [0.5, 0.5], [-0.5, 0.5], [-0.5, -0.5]])
+
+
+def vertices_rectangulos(xs, ys, ancho, alto, angulo=0.0):
+    """
+    Vértices de rectángulos centrados en cada punto.
+
+    :param xs, ys: arrays con las coordenadas de los centros
+    :param ancho, alto: valor fijo o array por punto (unidades del CRS)
+    :param angulo: giro en grados, en sentido antihorario, fijo o por punto
+    :return: array (n, 5, 2) con los anillos cerrados
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    ancho = np.broadcast_to(np.asarray(ancho, dtype=np.float64), xs.shape)
+    alto = np.broadcast_to(np.asarray(alto, dtype=np.float64), xs.shape)
+
+    dx = _ESQUINAS[:, 0] * ancho[:, None]
+    dy = _ESQUINAS[:, 1] * alto[:, None]
+
+    angulo = np.asarray(angulo, dtype=np.float64)
+    if np.any(angulo != 0):
+        radianes = np.deg2rad(np.broadcast_to(angulo, xs.shape))[:, None]
+        coseno, seno = np.cos(radianes), np.sin(radianes)
+        dx, dy = dx * coseno - dy * seno, dx * seno + dy * coseno
+
+    return np.stack((xs[:, None] + dx, ys[:, None] + dy), axis=-1)
+
+
+def wkb_poligonos(vertices):
+    """Lista de WKB (bytes) de polígonos a partir de un array (n, 5, 2) de anillos."""
+    n = len(vertices)
+    registros = np.empty(n, dtype=_DTYPE_WKB)
+    registros["orden"] = 1
+    registros["tipo"] = _WKB_POLIGONO
+    registros["anillos"] = 1
+    registros["puntos"] = 5
+    registros["coordenadas"] = np.asarray(vertices, dtype=np.float64).reshape(n, 10)
+
+    datos = registros.tobytes()
+    tam = _DTYPE_WKB.itemsize
+    return [datos[i:i + tam] for i in range(0, n * tam, tam)]
+
+
+def _leer_puntos(capa, campos):
+    """fids, X, Y y los campos numéricos indicados (NaN si son nulos), en una sola pasada."""
+    puntos = AlmacenPuntos.desde_capa(capa, campos, tipos=dict.fromkeys(campos, np.float64))
+    return puntos.fid, puntos.x, puntos.y, puntos.columnas
+
+
+def _preparar(capa_puntos, ancho, alto, angulo):
+    """fids, X, Y, ancho, alto y ángulo de los puntos válidos (los campos se sustituyen por sus arrays)."""
+    if alto is None:
+        alto = ancho
+    parametros = (ancho, alto, angulo)
+    campos = sorted({p for p in parametros if isinstance(p, str)})
+
+    fids, xs, ys, columnas = _leer_puntos(capa_puntos, campos)
+    valores = [columnas[p] if isinstance(p, str) else p for p in parametros]
+
+    validos = ~(np.isnan(xs) | np.isnan(ys))
+    for valor in valores:
+        if isinstance(valor, np.ndarray):
+            validos &= ~np.isnan(valor)
+
+    def filtrar(valor):
+        return valor[validos] if isinstance(valor, np.ndarray) else valor
+
+    return (fids[validos], xs[validos], ys[validos], *(filtrar(valor) for valor in valores))
+
+
+def rectangulos_por_bloques(capa_puntos, ancho, alto=None, angulo=0.0, tam_bloque=TAM_LOTE):
+    """
+    Rectángulos centrados en los puntos de la capa, calculados por bloques.
+
+    `ancho`, `alto` y `angulo` pueden ser un número o el nombre de un campo
+    de la capa de puntos. Si `alto` es None se generan cuadrados de lado
+    `ancho`. Los puntos con algún valor nulo en esos campos se omiten.
+
+    Solo se guardan en memoria los vértices de un bloque cada vez.
+
+    :return: genera (fids, vertices) de cada bloque; `vertices` como en `vertices_rectangulos`
+    """
+    fids, xs, ys, ancho, alto, angulo = _preparar(capa_puntos, ancho, alto, angulo)
+
+    for inicio in range(0, len(fids), tam_bloque):
+        bloque = slice(inicio, inicio + tam_bloque)
+
+        def trozo(valor):
+            return valor[bloque] if isinstance(valor, np.ndarray) else valor
+
+        with medicion.fase("calcular", len(fids[bloque])):
+            vertices = vertices_rectangulos(xs[bloque], ys[bloque], trozo(ancho), trozo(alto), trozo(angulo))
+        yield fids[bloque], vertices
+
+
+def calcular_rectangulos(capa_puntos, ancho, alto=None, angulo=0.0):
+    """
+    Todos los rectángulos de una vez; los parámetros son los de `rectangulos_por_bloques`.
+
+    :return: (fids, vertices) de los puntos con rectángulo
+    """
+    fids, xs, ys, ancho, alto, angulo = _preparar(capa_puntos, ancho, alto, angulo)
+    with medicion.fase("calcular", len(fids)):
+        vertices = vertices_rectangulos(xs, ys, ancho, alto, angulo)
+    return fids, vertices
+
+
+@medicion.medir()
+def generar_rectangulos(capa_puntos, ancho, alto=None, angulo=0.0,
+                        nombre_salida="rectangulos_buffer", tam_lote=TAM_LOTE, destino=None, **opciones_salida):
+    """
+    Crea una capa de polígonos con un rectángulo centrado en cada punto.
+
+    Los parámetros de los rectángulos son los de `rectangulos_por_bloques`.
+
+    :param destino: None para una capa en memoria, o la ruta de un GeoPackage (.gpkg) o
+                    FlatGeobuf (.fgb) en el que se escriben los rectángulos por lotes
+    :param opciones_salida: opciones de la salida en fichero (`wal`, `sincrono`, `indice`;
+                            ver `comun/salidas.py`)
+    :return: la capa de salida (sin añadir al proyecto)
+    """
+    from qgis.core import QgsField, QgsFields
+    from PyQt5.QtCore import QVariant
+
+    campos = QgsFields()
+    campos.append(QgsField("ID", QVariant.Int))
+
+    salida = abrir_salida(destino, "Polygon", capa_puntos.crs(), campos, nombre_salida,
+                          tam_lote=tam_lote, **opciones_salida)
+    with salida:
+        siguiente = 1
+        for _, vertices in rectangulos_por_bloques(capa_puntos, ancho, alto, angulo, tam_lote):
+            salida.añadir((wkb, [id_rectangulo]) for id_rectangulo, wkb
+                          in enumerate(wkb_poligonos(vertices), start=siguiente))
+            siguiente += len(vertices)
+    return salida.capa()
@@ -0,0 +1,176 @@
+"""
+Reproyección por lotes de coordenadas.
+
+Las coordenadas se reúnen en arrays contiguos de X e Y y se transforman por
+bloques. Dentro de QGIS se usa siempre `QgsCoordinateTransform` con el
+contexto de transformación del proyecto (las operaciones y rejillas de datum
+elegidas en él): cada bloque se transforma de una vez como una
+`QgsLineString`, no punto a punto. Fuera de QGIS se usa
+`Transformer.transform` de pyproj sobre los arrays completos. Los
+transformadores se guardan en caché por (CRS origen, CRS destino, operaciones
+del contexto), de modo que reproyectar muchas capas con el mismo CRS solo crea
+uno y un cambio en el contexto crea otro.
+
+Los CRS se indican como texto: un código de autoridad ("EPSG:25830") o WKT.
+`reproyectar_centroides` admite además un modo incremental que solo recalcula
+las entidades cuya geometría ha cambiado (ver `comun/incremental.py`).
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from . import medicion
+
+try:
+    from pyproj import Transformer
+except ImportError:  # QGIS no siempre incluye pyproj
+    Transformer = None
+
+TAM_BLOQUE = 100_000
+
+# Transformadores de QGIS por (origen, destino, operaciones del contexto)
+MAX_TRANSFORMADORES = 32
+_transformadores_qgis = {}
+
+
+class _TransformadorPyproj:
+    """Transformación vectorial con pyproj (orden de ejes X/Y, como QGIS)."""
+
+    def __init__(self, origen, destino):
+        self._transformer = Transformer.from_crs(origen, destino, always_xy=True)
+
+    def transformar(self, xs, ys):
+        return self._transformer.transform(xs, ys)
+
+
+class _TransformadorQgis:
+    """Transformación con QgsCoordinateTransform y el contexto de transformación indicado."""
+
+    def __init__(self, origen, destino, contexto):
+        from qgis.core import QgsCoordinateReferenceSystem, QgsCoordinateTransform
+
+        self._transform = QgsCoordinateTransform(
+            QgsCoordinateReferenceSystem(origen),
+            QgsCoordinateReferenceSystem(destino),
+            contexto,
+        )
+
+    def transformar(self, xs, ys):
+        from qgis.core import QgsCsException, QgsLineString
+
+        # Todo el bloque en una llamada; si algún punto falla, se repite punto a punto
+        linea = QgsLineString(xs.tolist(), ys.tolist())
+        try:
+            linea.transform(self._transform)
+        except QgsCsException:
+            return self._punto_a_punto(xs, ys)
+        return np.asarray(linea.xVector(), dtype=np.float64), np.asarray(linea.yVector(), dtype=np.float64)
+
+    def _punto_a_punto(self, xs, ys):
+        """Como `transformar`, con NaN en los puntos que no se pueden transformar."""
+        from qgis.core import QgsCsException, QgsPointXY
+
+        xs_destino = np.full(len(xs), np.nan)
+        ys_destino = np.full(len(ys), np.nan)
+        for i, (x, y) in enumerate(zip(xs.tolist(), ys.tolist())):
+            try:
+                punto = self._transform.transform(QgsPointXY(x, y))
+            except QgsCsException:
+                continue
+            xs_destino[i] = punto.x()
+            ys_destino[i] = punto.y()
+        return xs_destino, ys_destino
+
+
+@lru_cache(maxsize=32)
+def _transformador_pyproj(origen, destino):
+    return _TransformadorPyproj(origen, destino)
+
+
+def _clave_contexto(contexto):
+    """Operaciones elegidas en un QgsCoordinateTransformContext, como tupla ordenada."""
+    return tuple(sorted((tuple(pareja), operacion) for pareja, operacion in contexto.coordinateOperations().items()))
+
+
+def obtener_transformador(origen, destino, contexto=None):
+    """
+    Transformador en caché para la pareja de CRS (origen, destino).
+
+    :param contexto: `QgsCoordinateTransformContext`; por defecto el del proyecto actual.
+                     Solo se usa dentro de QGIS
+    """
+    try:
+        from qgis.core import QgsProject
+    except ImportError:
+        if Transformer is None:
+            raise ImportError("Para reproyectar fuera de QGIS hace falta pyproj.") from None
+        return _transformador_pyproj(origen, destino)
+
+    if contexto is None:
+        contexto = QgsProject.instance().transformContext()
+    clave = (origen, destino, _clave_contexto(contexto))
+    transformador = _transformadores_qgis.get(clave)
+    if transformador is None:
+        if len(_transformadores_qgis) >= MAX_TRANSFORMADORES:
+            _transformadores_qgis.clear()
+        transformador = _transformadores_qgis[clave] = _TransformadorQgis(origen, destino, contexto)
+    return transformador
+
+
+def crs_como_texto(crs):
+    """Código de autoridad de un QgsCoordinateReferenceSystem, o su WKT si no tiene."""
+    return crs.authid() or crs.toWkt()
+
+
+def reproyectar(xs, ys, origen, destino, tam_bloque=TAM_BLOQUE, contexto=None):
+    """
+    Reproyecta arrays de coordenadas de `origen` a `destino` por bloques.
+
+    :param contexto: `QgsCoordinateTransformContext` (ver `obtener_transformador`)
+    :return: tupla (xs, ys) de arrays float64 en el CRS destino
+    """
+    xs = np.ascontiguousarray(xs, dtype=np.float64)
+    ys = np.ascontiguousarray(ys, dtype=np.float64)
+    if origen == destino:
+        return xs.copy(), ys.copy()
+
+    transformador = obtener_transformador(origen, destino, contexto)
+    xs_destino = np.empty_like(xs)
+    ys_destino = np.empty_like(ys)
+    for inicio in range(0, len(xs), tam_bloque):
+        fin = inicio + tam_bloque
+        xs_destino[inicio:fin], ys_destino[inicio:fin] = transformador.transformar(
+            xs[inicio:fin], ys[inicio:fin]
+        )
+    return xs_destino, ys_destino
+
+
+@medicion.medir()
+def reproyectar_centroides(capa, crs_destino="EPSG:4326", campo_x="long", campo_y="lat",
+                           decimales=3, tam_bloque=TAM_BLOQUE, fids=None, incremental=False):
+    """
+    Guarda en `campo_x` y `campo_y` las coordenadas del centroide de cada
+    entidad en `crs_destino`, escribiendo por lotes en el proveedor.
+
+    :param fids: calcular solo estas entidades
+    :param incremental: calcular solo las entidades cuya geometría ha cambiado desde la
+                        ejecución anterior (ver `comun/incremental.py`)
+    :return: número de entidades actualizadas
+    """
+    if incremental:
+        from .incremental import ejecutar_incremental
+
+        tarea = f"reproyectar_centroides|{crs_destino}|{campo_x}|{campo_y}|{decimales}"
+        return ejecutar_incremental(capa, tarea, lambda pendientes: reproyectar_centroides(
+            capa, crs_destino, campo_x, campo_y, decimales, tam_bloque, pendientes
+        ))[0]
+
+    from .puntos import AlmacenPuntos
+
+    puntos = AlmacenPuntos.desde_capa(capa, geometria="centroide", fids=fids)
+    with medicion.fase("calcular", len(puntos)):
+        puntos = puntos.reproyectar(crs_destino, tam_bloque)
+        if decimales is not None:
+            puntos.x, puntos.y = np.round(puntos.x, decimales), np.round(puntos.y, decimales)
+    return puntos.escribir(capa, {"x": campo_x, "y": campo_y})
@@ -0,0 +1,313 @@
+"""
+Salidas de los motores que crean capas nuevas.
+
+Los motores que generan entidades (agrupación de puntos, rectángulos)
+escriben siempre igual, sin saber a dónde va el resultado:
+
+    with abrir_salida(destino, "Polygon", crs, campos, "rectangulos") as salida:
+        salida.añadir(filas)        # tuplas (geometria, valores)
+    capa = salida.capa()
+
+- `SalidaMemoria` (`destino` None): capa temporal del proveedor "memory".
+  Cómoda para resultados pequeños e interactivos, pero todo queda en RAM y
+  se pierde al cerrar QGIS.
+- `SalidaFichero` (`destino` terminado en .gpkg o .fgb): escribe con GDAL/OGR
+  directamente en el fichero, lote a lote, sin crear `QgsFeature` ni
+  `QgsGeometry`, así que la memoria usada no depende del tamaño de la salida.
+  En un GeoPackage toda la carga va en una única transacción, el índice
+  espacial (R-tree) se crea después de cargar las entidades (mantenerlo fila a
+  fila es lo más caro de la carga) y se pueden ajustar los PRAGMA de SQLite
+  `journal_mode` (WAL) y `synchronous` mientras se escribe. En FlatGeobuf el
+  índice lo construye GDAL al cerrar el fichero.
+
+La geometría de cada fila va como WKB (bytes) o WKT (texto), o None. Si la
+escritura falla, el fichero a medio escribir se borra.
+"""
+
+import os
+from itertools import islice
+
+from . import medicion
+
+TAM_LOTE = 100_000
+
+# Extensión -> driver de GDAL/OGR de las salidas en fichero
+FORMATOS = {".gpkg": "GPKG", ".fgb": "FlatGeobuf"}
+
+SINCRONOS = ("OFF", "NORMAL", "FULL")
+
+
+def formato_fichero(ruta):
+    """Driver de GDAL para escribir en `ruta`, o None si la extensión no es de `FORMATOS`."""
+    return FORMATOS.get(os.path.splitext(ruta)[1].lower())
+
+
+def _lotes(filas, tam_lote):
+    filas = iter(filas)
+    while True:
+        lote = list(islice(filas, tam_lote))
+        if not lote:
+            return
+        yield lote
+
+
+def _literal(texto):
+    """Texto entre comillas simples para SQL."""
+    return "'" + texto.replace("'", "''") + "'"
+
+
+def _campo_ogr(campo):
+    """(`ogr.FieldDefn`, conversor de valores) para un `QgsField`."""
+    from osgeo import ogr
+    from PyQt5.QtCore import QVariant
+
+    from .tablas import valor_python
+
+    tipos = {
+        QVariant.Int: (ogr.OFTInteger, int),
+        QVariant.UInt: (ogr.OFTInteger64, int),
+        QVariant.LongLong: (ogr.OFTInteger64, int),
+        QVariant.ULongLong: (ogr.OFTInteger64, int),
+        QVariant.Double: (ogr.OFTReal, float),
+        QVariant.Bool: (ogr.OFTInteger, int),
+        # OGR interpreta las fechas en texto "AAAA-MM-DD hh:mm:ss"
+        QVariant.Date: (ogr.OFTDate, lambda valor: str(valor_python(valor))),
+        QVariant.DateTime: (ogr.OFTDateTime, lambda valor: str(valor_python(valor))),
+        QVariant.Time: (ogr.OFTTime, lambda valor: str(valor_python(valor))),
+    }
+    tipo, conversor = tipos.get(campo.type(), (ogr.OFTString, str))
+    definicion = ogr.FieldDefn(campo.name(), tipo)
+    if campo.type() == QVariant.Bool:
+        definicion.SetSubType(ogr.OFSTBoolean)
+    return definicion, conversor
+
+
+class SalidaMemoria:
+    """
+    Capa temporal en memoria.
+
+    :param tipo_geometria: "Point", "Polygon"... (como en la URI del proveedor "memory")
+    :param crs: `QgsCoordinateReferenceSystem` de la salida
+    :param campos: `QgsFields` de la salida
+    :param tam_lote: entidades por llamada a `addFeatures`
+    """
+
+    def __init__(self, tipo_geometria, crs, campos, nombre="salida", tam_lote=TAM_LOTE):
+        self.tipo_geometria = tipo_geometria
+        self.crs = crs
+        self.campos = campos
+        self.nombre = nombre
+        self.tam_lote = tam_lote
+        self.entidades = 0
+        self._capa = None
+
+    def __enter__(self):
+        from qgis.core import QgsVectorLayer
+
+        uri = f"{self.tipo_geometria}?crs={self.crs.authid()}"
+        self._capa = QgsVectorLayer(uri, self.nombre, "memory")
+        self._capa.dataProvider().addAttributes(self.campos)
+        self._capa.updateFields()
+        return self
+
+    def __exit__(self, tipo_error, error, traza):
+        self._capa.updateExtents()
+        return False
+
+    def _entidad(self, geometria, valores):
+        from qgis.core import QgsFeature, QgsGeometry
+
+        entidad = QgsFeature(self.campos)
+        if isinstance(geometria, str):
+            entidad.setGeometry(QgsGeometry.fromWkt(geometria))
+        elif geometria is not None:
+            geom = QgsGeometry()
+            geom.fromWkb(geometria)
+            entidad.setGeometry(geom)
+        entidad.setAttributes(list(valores))
+        return entidad
+
+    def añadir(self, filas):
+        """Añade tuplas (geometria, valores) en lotes de `tam_lote`."""
+        proveedor = self._capa.dataProvider()
+        for lote in _lotes(filas, self.tam_lote):
+            entidades = [self._entidad(geometria, valores) for geometria, valores in lote]
+            with medicion.fase("escribir", len(entidades)):
+                medicion.contar("addFeatures")
+                proveedor.addFeatures(entidades)
+            self.entidades += len(entidades)
+
+    def capa(self):
+        """La capa en memoria (sin añadir al proyecto)."""
+        return self._capa
+
+
+class SalidaFichero:
+    """
+    GeoPackage o FlatGeobuf escrito con GDAL/OGR.
+
+    Si el fichero ya existe se sustituye.
+
+    :param ruta: fichero de salida (.gpkg o .fgb)
+    :param nombre: nombre de la capa dentro del fichero
+    :param tam_lote: entidades entre dos anotaciones de la medición
+    :param wal: en un GeoPackage, escribir con `journal_mode=WAL`; al terminar se vuelve
+                al modo por defecto para que el fichero no dependa del -wal
+    :param sincrono: PRAGMA `synchronous` durante la escritura ("OFF", "NORMAL", "FULL" o
+                     None para dejar el de SQLite); con "OFF" un corte de luz puede dejar el
+                     fichero dañado, pero una salida a medias se regenera igualmente
+    :param indice: crear el índice espacial al terminar la carga
+    """
+
+    def __init__(self, ruta, tipo_geometria, crs, campos, nombre=None, tam_lote=TAM_LOTE,
+                 wal=False, sincrono="OFF", indice=True):
+        self.formato = formato_fichero(ruta)
+        if self.formato is None:
+            raise ValueError(f"Formato de salida no soportado '{ruta}'. Usa una de: {', '.join(FORMATOS)}.")
+        if sincrono is not None and sincrono.upper() not in SINCRONOS:
+            raise ValueError(f"Valor de synchronous desconocido '{sincrono}'. Usa uno de: {', '.join(SINCRONOS)}.")
+        self.ruta = ruta
+        self.tipo_geometria = tipo_geometria
+        self.crs = crs
+        self.campos = campos
+        self.nombre = nombre or os.path.splitext(os.path.basename(ruta))[0]
+        self.tam_lote = tam_lote
+        self.wal = wal
+        self.sincrono = sincrono
+        self.indice = indice
+        self.entidades = 0
+        self._datos = self._capa = self._definicion = None
+        self._conversores = []
+        self._transaccion = False
+        self._excepciones = None
+
+    @property
+    def geopackage(self):
+        return self.formato == "GPKG"
+
+    def _sql(self, sql):
+        resultado = self._datos.ExecuteSQL(sql)
+        if resultado is not None:
+            self._datos.ReleaseResultSet(resultado)
+
+    def __enter__(self):
+        from osgeo import ogr
+
+        # Las excepciones de OGR se activan solo mientras se escribe: el modo es global
+        # y en QGIS lo comparten la consola y los complementos
+        self._excepciones = ogr.GetUseExceptions()
+        ogr.UseExceptions()
+        try:
+            self._abrir()
+        except Exception:
+            self._capa = self._definicion = self._datos = None
+            self._restaurar_excepciones()
+            self._borrar()
+            raise
+        return self
+
+    def _restaurar_excepciones(self):
+        from osgeo import ogr
+
+        if not self._excepciones:
+            ogr.DontUseExceptions()
+
+    def _abrir(self):
+        from osgeo import ogr, osr
+
+        from .reproyeccion import crs_como_texto
+
+        self._borrar()
+        self._datos = ogr.GetDriverByName(self.formato).CreateDataSource(self.ruta)
+        if self.geopackage:
+            if self.wal:
+                self._sql("PRAGMA journal_mode = WAL")
+            if self.sincrono is not None:
+                self._sql(f"PRAGMA synchronous = {self.sincrono.upper()}")
+
+        srs = osr.SpatialReference()
+        srs.SetFromUserInput(crs_como_texto(self.crs))
+        srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+        # En GeoPackage el índice se crea al final; FlatGeobuf lo construye siempre al cerrar
+        opciones = ["SPATIAL_INDEX=NO"] if self.geopackage else [f"SPATIAL_INDEX={'YES' if self.indice else 'NO'}"]
+        self._capa = self._datos.CreateLayer(self.nombre, srs, getattr(ogr, "wkb" + self.tipo_geometria), opciones)
+        for campo in self.campos:
+            definicion, conversor = _campo_ogr(campo)
+            self._capa.CreateField(definicion)
+            self._conversores.append(conversor)
+        self._definicion = self._capa.GetLayerDefn()
+
+        self._transaccion = self._datos.TestCapability(ogr.ODsCTransactions)
+        if self._transaccion:
+            self._datos.StartTransaction()
+
+    def __exit__(self, tipo_error, error, traza):
+        try:
+            if tipo_error is None:
+                self._terminar()
+            elif self._transaccion:
+                self._datos.RollbackTransaction()
+        finally:
+            self._capa = self._definicion = None
+            try:
+                with medicion.fase("cerrar"):
+                    # Al cerrar se vuelca todo al disco (y FlatGeobuf construye su índice)
+                    self._datos = None
+            finally:
+                self._restaurar_excepciones()
+        if tipo_error is not None:
+            self._borrar()
+        return False
+
+    def _terminar(self):
+        if self._transaccion:
+            with medicion.fase("confirmar"):
+                self._datos.CommitTransaction()
+        if self.geopackage and self.indice:
+            with medicion.fase("indice", self.entidades):
+                columna = self._capa.GetGeometryColumn()
+                self._sql(f"SELECT CreateSpatialIndex({_literal(self.nombre)}, {_literal(columna)})")
+        if self.geopackage and self.wal:
+            self._sql("PRAGMA journal_mode = DELETE")
+
+    def _borrar(self):
+        for sufijo in ("", "-wal", "-shm"):
+            if os.path.exists(self.ruta + sufijo):
+                os.remove(self.ruta + sufijo)
+
+    def añadir(self, filas):
+        """Añade tuplas (geometria, valores)."""
+        from osgeo import ogr
+
+        for lote in _lotes(filas, self.tam_lote):
+            with medicion.fase("escribir", len(lote)):
+                medicion.contar("CreateFeature", len(lote))
+                for geometria, valores in lote:
+                    entidad = ogr.Feature(self._definicion)
+                    for i, (valor, conversor) in enumerate(zip(valores, self._conversores)):
+                        if valor is not None:
+                            entidad.SetField(i, conversor(valor))
+                    if isinstance(geometria, str):
+                        entidad.SetGeometryDirectly(ogr.CreateGeometryFromWkt(geometria))
+                    elif geometria is not None:
+                        entidad.SetGeometryDirectly(ogr.CreateGeometryFromWkb(bytes(geometria)))
+                    self._capa.CreateFeature(entidad)
+            self.entidades += len(lote)
+
+    def capa(self):
+        """El fichero abierto como capa de QGIS (sin añadir al proyecto)."""
+        from qgis.core import QgsVectorLayer
+
+        uri = f"{self.ruta}|layername={self.nombre}" if self.geopackage else self.ruta
+        return QgsVectorLayer(uri, self.nombre, "ogr")
+
+
+def abrir_salida(destino, tipo_geometria, crs, campos, nombre="salida", **opciones):
+    """
+    Salida en memoria (`destino` None) o en fichero (ruta .gpkg o .fgb).
+
+    :param opciones: `tam_lote` y, en fichero, `wal`, `sincrono` e `indice` (ver `SalidaFichero`)
+    """
+    if destino is None:
+        return SalidaMemoria(tipo_geometria, crs, campos, nombre, **opciones)
+    return SalidaFichero(destino, tipo_geometria, crs, campos, nombre, **opciones)
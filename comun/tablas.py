@@ -0,0 +1,145 @@
+"""
+Exportación por bloques de la tabla de atributos de una capa.
+
+Solo se piden al proveedor los campos a exportar y ninguna geometría
+(`setSubsetOfAttributes` + `NoGeometry`). Las filas se agrupan en bloques de
+tamaño fijo que se escriben de una vez (`writerows` en CSV, un grupo de filas
+en Parquet), así que la memoria usada no depende del tamaño de la capa.
+
+La salida Parquet necesita pyarrow; si no está instalado solo se puede
+exportar a CSV.
+"""
+
+import csv
+import os
+import time
+
+from . import medicion
+from .lectura import leer_filas
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: solo hace falta para Parquet
+    pa = pq = None
+
+TAM_BLOQUE = 10_000
+
+FORMATOS = ("csv", "parquet")
+
+
+def valor_python(valor):
+    """Convierte las fechas de Qt en objetos de `datetime` (los NULL ya llegan como None)."""
+    for metodo in ("toPyDateTime", "toPyDate", "toPyTime"):
+        if hasattr(valor, metodo):
+            return getattr(valor, metodo)()
+    return valor
+
+
+def bloques_de_filas(capa, campos, tam_bloque=TAM_BLOQUE):
+    """
+    Genera bloques (listas de tuplas) con los valores de `campos`, sin geometría.
+    """
+    bloque = []
+    for _, *valores in leer_filas(capa, campos):
+        bloque.append(tuple(valor_python(valor) for valor in valores))
+        if len(bloque) >= tam_bloque:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+class Progreso:
+    """Cuenta filas y llama a `informar(filas, segundos)` después de cada bloque."""
+
+    def __init__(self, informar=None):
+        self.informar = informar
+        self.filas = 0
+        self.inicio = time.perf_counter()
+
+    @property
+    def segundos(self):
+        return time.perf_counter() - self.inicio
+
+    @property
+    def filas_por_segundo(self):
+        return self.filas / self.segundos if self.segundos else 0.0
+
+    def sumar(self, filas):
+        self.filas += filas
+        if self.informar is not None:
+            self.informar(self.filas, self.segundos)
+
+
+def exportar_csv(bloques, campos, ruta, progreso=None):
+    """Escribe los bloques en un CSV con cabecera (UTF-8 con BOM, como abre Excel)."""
+    progreso = progreso or Progreso()
+    with open(ruta, mode="w", newline="", encoding="utf-8-sig") as archivo_csv:
+        writer = csv.writer(archivo_csv)
+        writer.writerow(campos)
+        for bloque in bloques:
+            with medicion.fase("escribir", len(bloque)):
+                writer.writerows(bloque)
+            progreso.sumar(len(bloque))
+    return progreso
+
+
+def esquema_arrow(capa, campos):
+    """Esquema de pyarrow a partir de los tipos de los campos de la capa."""
+    from PyQt5.QtCore import QVariant
+
+    tipos = {
+        QVariant.Int: pa.int64(),
+        QVariant.UInt: pa.int64(),
+        QVariant.LongLong: pa.int64(),
+        QVariant.ULongLong: pa.uint64(),
+        QVariant.Double: pa.float64(),
+        QVariant.Bool: pa.bool_(),
+        QVariant.Date: pa.date32(),
+        QVariant.DateTime: pa.timestamp("ms"),
+    }
+    return pa.schema([
+        (campo, tipos.get(capa.fields().field(campo).type(), pa.string()))
+        for campo in campos
+    ])
+
+
+def exportar_parquet(bloques, esquema, ruta, progreso=None):
+    """Escribe cada bloque como un grupo de filas de un fichero Parquet."""
+    if pa is None:
+        raise RuntimeError("La salida Parquet necesita pyarrow (pip install pyarrow).")
+    progreso = progreso or Progreso()
+    texto = [i for i, campo in enumerate(esquema) if pa.types.is_string(campo.type)]
+    with pq.ParquetWriter(ruta, esquema) as escritor:
+        for bloque in bloques:
+            columnas = [list(columna) for columna in zip(*bloque)]
+            for i in texto:
+                columnas[i] = [None if v is None else str(v) for v in columnas[i]]
+            with medicion.fase("escribir", len(bloque)):
+                escritor.write_table(pa.Table.from_arrays(columnas, schema=esquema))
+            progreso.sumar(len(bloque))
+    return progreso
+
+
+@medicion.medir()
+def exportar_tabla(capa, campos, ruta, formato=None, tam_bloque=TAM_BLOQUE, informar=None):
+    """
+    Exporta los `campos` de la capa a CSV o Parquet.
+
+    :param formato: "csv" o "parquet"; por defecto se deduce de la extensión de `ruta`
+    :param informar: función opcional `f(filas, segundos)` llamada tras cada bloque
+    :return: objeto `Progreso` con las filas escritas y el tiempo empleado
+    """
+    if formato is None:
+        formato = "parquet" if os.path.splitext(ruta)[1].lower() == ".parquet" else "csv"
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado '{formato}'. Usa uno de: {', '.join(FORMATOS)}.")
+
+    bloques = bloques_de_filas(capa, campos, tam_bloque)
+    progreso = Progreso(informar)
+    if formato == "csv":
+        return exportar_csv(bloques, campos, ruta, progreso)
+    if pa is None:
+        raise RuntimeError("La salida Parquet necesita pyarrow (pip install pyarrow).")
+    return exportar_parquet(bloques, esquema_arrow(capa, campos), ruta, progreso)
@@ -0,0 +1,163 @@
+"""
+Actualización de campos a partir de una tabla de búsqueda por clave.
+
+La fuente de valores (un diccionario, un CSV u otra capa) se lee una sola vez
+a un diccionario clave -> tupla de valores. Después se recorre la capa a
+actualizar pidiendo solo el campo clave y sin geometría, y los campos destino
+de cada entidad con coincidencia se escriben por lotes con `EscritorAtributos`.
+
+Las claves se comparan como texto normalizado (`clave_texto`), de modo que la
+clave "25" de un CSV coincide con el entero 25 de la capa. Si la capa destino
+es un GeoPackage se hace todo en SQLite con un único `UPDATE ... FROM`.
+"""
+
+import csv
+from collections import namedtuple
+
+from . import medicion
+from .escritura import EscritorAtributos
+from .lectura import es_nulo, leer_filas
+
+ResultadoUnion = namedtuple("ResultadoUnion", "actualizadas sin_coincidencia")
+
+
+def clave_texto(valor):
+    """Clave normalizada: texto sin espacios a los lados; None para nulos y vacíos."""
+    if es_nulo(valor):
+        return None
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    texto = str(valor).strip()
+    return texto or None
+
+
+class TablaBusqueda:
+    """
+    Diccionario clave -> tupla de valores de `campos`.
+
+    :param valores: diccionario {clave normalizada: tupla}
+    :param campos: nombres de los campos de la fuente, en el orden de las tuplas
+    """
+
+    def __init__(self, valores, campos):
+        self.valores = valores
+        self.campos = list(campos)
+
+    def __len__(self):
+        return len(self.valores)
+
+    def buscar(self, clave):
+        return self.valores.get(clave)
+
+    @classmethod
+    def desde_dict(cls, diccionario, campos=None, normalizar=clave_texto):
+        """
+        Tabla a partir de un diccionario.
+
+        :param campos: None si los valores son escalares ({clave: valor});
+                       lista de campos si los valores son diccionarios ({clave: {campo: valor}})
+        """
+        if campos is None:
+            valores = {normalizar(clave): (valor,) for clave, valor in diccionario.items()}
+            campos = [None]
+        else:
+            valores = {
+                normalizar(clave): tuple(fila.get(campo) for campo in campos)
+                for clave, fila in diccionario.items()
+            }
+        valores.pop(None, None)
+        return cls(valores, campos)
+
+    @classmethod
+    def desde_csv(cls, ruta, campo_clave, campos, delimitador=",", codificacion="utf-8-sig",
+                  normalizar=clave_texto):
+        """Lee un CSV fila a fila (con cabecera) guardando solo la clave y `campos`."""
+        with open(ruta, newline="", encoding=codificacion) as archivo:
+            lector = csv.reader(archivo, delimiter=delimitador)
+            cabecera = next(lector)
+            faltan = [c for c in [campo_clave, *campos] if c not in cabecera]
+            if faltan:
+                raise ValueError(f"El CSV no tiene las columnas: {', '.join(faltan)}")
+            i_clave = cabecera.index(campo_clave)
+            posiciones = [cabecera.index(campo) for campo in campos]
+
+            valores = {}
+            for fila in lector:
+                if len(fila) < len(cabecera):
+                    continue
+                clave = normalizar(fila[i_clave])
+                if clave is not None:
+                    valores[clave] = tuple(fila[i] if fila[i] != "" else None for i in posiciones)
+        return cls(valores, campos)
+
+    @classmethod
+    def desde_capa(cls, capa, campo_clave, campos, normalizar=clave_texto):
+        """Lee de otra capa solo la clave y `campos`, sin geometría."""
+        valores = {}
+        for _, clave, *fila in leer_filas(capa, [campo_clave, *campos]):
+            clave = normalizar(clave)
+            if clave is not None:
+                valores[clave] = tuple(fila)
+        return cls(valores, campos)
+
+    @classmethod
+    def desde(cls, fuente, campo_clave=None, campos=None, **opciones):
+        """Elige el lector según la fuente: diccionario, ruta a un CSV o capa."""
+        if isinstance(fuente, dict):
+            return cls.desde_dict(fuente, campos, **opciones)
+        if isinstance(fuente, str):
+            return cls.desde_csv(fuente, campo_clave, campos, **opciones)
+        return cls.desde_capa(fuente, campo_clave, campos, **opciones)
+
+
+def _pares_de_campos(campos):
+    """{campo_origen: campo_destino} a partir de un dict, una lista de nombres o un nombre destino."""
+    if isinstance(campos, str):
+        return {None: campos}
+    if isinstance(campos, dict):
+        return dict(campos)
+    return {campo: campo for campo in campos}
+
+
+@medicion.medir()
+def actualizar_por_clave(capa, fuente, campo_clave, campos, campo_clave_origen=None, sql=True,
+                         normalizar=clave_texto):
+    """
+    Copia en la capa los valores de la fuente cuya clave coincide con `campo_clave`.
+
+    :param fuente: diccionario, ruta a un CSV o QgsVectorLayer
+    :param campos: {campo_origen: campo_destino}, lista de campos con el mismo nombre en
+                   ambos lados, o el nombre del campo destino si `fuente` es {clave: valor}
+    :param campo_clave_origen: campo clave de la fuente (por defecto, el mismo que `campo_clave`)
+    :param sql: usar `UPDATE ... FROM` si la capa es un GeoPackage
+    :return: `ResultadoUnion`
+    """
+    pares = _pares_de_campos(campos)
+    origenes = None if None in pares else list(pares)
+    tabla = TablaBusqueda.desde(
+        fuente, campo_clave_origen or campo_clave, origenes, normalizar=normalizar
+    )
+
+    idx_clave = capa.fields().indexOf(campo_clave)
+    idxs = [capa.fields().indexOf(pares[campo]) for campo in tabla.campos]
+    if idx_clave == -1:
+        raise ValueError(f"La capa '{capa.name()}' no tiene el campo clave '{campo_clave}'.")
+    if -1 in idxs:
+        raise ValueError(f"La capa '{capa.name()}' no tiene alguno de los campos destino.")
+
+    escritor = EscritorAtributos(capa)
+    if sql and normalizar is clave_texto:
+        filas = ((clave, *valores) for clave, valores in tabla.valores.items())
+        actualizadas = escritor.actualizar_por_clave_sql(idx_clave, filas, idxs, normalizar)
+        if actualizadas is not None:
+            return ResultadoUnion(actualizadas, capa.featureCount() - actualizadas)
+
+    sin_coincidencia = 0
+    with escritor:
+        for fid, clave in leer_filas(capa, [campo_clave]):
+            valores = tabla.buscar(normalizar(clave))
+            if valores is None:
+                sin_coincidencia += 1
+            else:
+                escritor.cambiar_varios(fid, dict(zip(idxs, valores)))
+    return ResultadoUnion(escritor.entidades, sin_coincidencia)
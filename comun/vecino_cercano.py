@@ -0,0 +1,150 @@
+"""
+Unión por cercanía entre dos capas.
+
+Asigna a cada entidad de una capa principal el valor de un atributo de la
+entidad más cercana de una capa secundaria. La capa secundaria se lee una
+sola vez y se indexa con un `IndiceSTR`; cada consulta recorre solo los
+nodos cercanos y refina los candidatos con la distancia exacta entre
+geometrías. Los resultados se escriben en la capa principal por lotes con
+`EscritorAtributos`. Con `max_procesos` el cálculo se reparte por teselas
+entre varios procesos (`comun/particiones.py`); con `incremental` solo se
+recalculan las entidades afectadas por cambios (`comun/incremental.py`).
+"""
+
+import numpy as np
+
+from . import medicion
+from .escritura import EscritorAtributos
+from .indice_espacial import IndiceSTR
+from .lectura import leer_filas
+
+
+def caja_geometria(geometria):
+    """Caja envolvente (xmin, ymin, xmax, ymax) de una QgsGeometry."""
+    rect = geometria.boundingBox()
+    return (rect.xMinimum(), rect.yMinimum(), rect.xMaximum(), rect.yMaximum())
+
+
+def distancia_geometrias(a, b):
+    """Distancia exacta entre dos QgsGeometry."""
+    return a.distance(b)
+
+
+class UnionCercania:
+    """
+    Índice de la capa secundaria con sus geometrías y valores.
+
+    :param geometrias: geometrías de la capa secundaria
+    :param valores: valor a transferir de cada geometría
+    :param caja: función que devuelve la caja envolvente de una geometría
+    :param distancia: función con la distancia exacta entre dos geometrías
+    :param capacidad: número máximo de hijos por nodo del índice
+    :param indice: `IndiceSTR` ya construido sobre las cajas de `geometrias` (p. ej. de la
+                   caché); en ese caso `geometrias` puede ser una secuencia perezosa
+    """
+
+    def __init__(self, geometrias, valores, caja=caja_geometria,
+                 distancia=distancia_geometrias, capacidad=16, indice=None):
+        self.geometrias = list(geometrias) if indice is None else geometrias
+        self.valores = list(valores)
+        self.caja = caja
+        self.distancia = distancia
+        if indice is None:
+            indice = IndiceSTR([caja(g) for g in self.geometrias], capacidad)
+        self.indice = indice
+
+    @classmethod
+    def desde_capa(cls, capa, campo_origen, cache=None, **opciones):
+        """
+        Lee la capa secundaria una vez, pidiendo solo el campo a transferir.
+
+        :param cache: `CacheIndices` opcional; si la capa no ha cambiado desde la última vez
+                      se usan el índice y las geometrías (WKB) guardados sin leer la capa
+        """
+        def leer():
+            geometrias, valores = [], []
+            for _, geometria, valor in leer_filas(capa, [campo_origen], "geometria"):
+                geometrias.append(geometria)
+                valores.append(valor)
+            return geometrias, valores
+
+        if cache is None:
+            return cls(*leer(), **opciones)
+
+        from .cache_indices import GeometriasWkb, geometrias_a_wkb
+        from .particiones import tipo_geometrias
+
+        caja = opciones.get("caja", caja_geometria)
+        capacidad = opciones.pop("capacidad", 16)
+
+        def construir():
+            geometrias, valores = leer()
+            indice = IndiceSTR([caja(g) for g in geometrias], capacidad)
+            buffer, desplazamientos = geometrias_a_wkb(geometrias)
+            columna = np.empty(len(valores), dtype=object)
+            columna[:] = valores
+            return {**indice.a_arrays(), "wkb": buffer, "desplazamientos": desplazamientos, "valores": columna}
+
+        arrays = cache.obtener_o_construir(capa, ("cercania", campo_origen, capacidad), construir)
+        geometrias = GeometriasWkb(arrays["wkb"], arrays["desplazamientos"], tipo_geometrias(capa))
+        return cls(geometrias, arrays["valores"].tolist(), indice=IndiceSTR.desde_arrays(arrays), **opciones)
+
+    def vecinos(self, geometria, k=1, distancia_max=None):
+        """
+        Los `k` vecinos más cercanos a `geometria`.
+
+        :return: lista de tuplas (distancia, valor) de menor a mayor distancia
+        """
+        resultados = self.indice.vecinos(
+            self.caja(geometria), k, distancia_max,
+            lambda i: self.distancia(geometria, self.geometrias[i])
+        )
+        return [(distancia, self.valores[i]) for distancia, i in resultados]
+
+    def mas_cercano(self, geometria, distancia_max=None):
+        """Valor de la geometría más cercana, o None si no hay ninguna a menos de `distancia_max`."""
+        resultado = self.vecinos(geometria, 1, distancia_max)
+        return resultado[0][1] if resultado else None
+
+
+@medicion.medir()
+def unir_por_cercania(capa_principal, capa_secundaria, campo_origen, campo_destino,
+                      distancia_max=None, max_procesos=1, cache=None, incremental=False):
+    """
+    Copia en `campo_destino` de la capa principal el valor de `campo_origen`
+    de la entidad más cercana de la capa secundaria.
+
+    :param distancia_max: si se indica, las entidades sin vecino a esa distancia no se modifican
+    :param max_procesos: 1 calcula en este proceso; otro valor (None = número de CPU)
+                         reparte la capa principal en teselas (ver `comun/particiones.py`)
+    :param cache: `CacheIndices` opcional para no reindexar la capa secundaria si no ha cambiado
+                  (solo en serie)
+    :param incremental: recalcular solo las entidades principales nuevas o modificadas y
+                        las afectadas por cambios en la secundaria (ver `comun/incremental.py`);
+                        en este modo no se usan `max_procesos` ni `cache`
+    :return: número de entidades actualizadas
+    """
+    if incremental:
+        from .incremental import unir_por_cercania_incremental
+
+        return unir_por_cercania_incremental(
+            capa_principal, capa_secundaria, campo_origen, campo_destino, distancia_max
+        )[0]
+
+    if max_procesos != 1:
+        from .particiones import unir_por_cercania_en_paralelo
+
+        return unir_por_cercania_en_paralelo(
+            capa_principal, capa_secundaria, campo_origen, campo_destino, distancia_max, max_procesos
+        )
+
+    union = UnionCercania.desde_capa(capa_secundaria, campo_origen, cache=cache)
+    idx_destino = capa_principal.fields().indexOf(campo_destino)
+
+    with EscritorAtributos(capa_principal) as escritor:
+        for fid, geometria in leer_filas(capa_principal, geometria="geometria"):
+            valor = union.mas_cercano(geometria, distancia_max)
+            # Igual que antes: los valores vacíos o NULL no se copian
+            if valor:
+                escritor.cambiar(fid, idx_destino, valor)
+    return escritor.entidades
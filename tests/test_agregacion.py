@@ -0,0 +1,24 @@
+"""Envolvente convexa de grupos degenerados (sin QGIS)."""
+
+from comun.agregacion import AgrupadorStreaming, Conteo, EnvolventeConvexa, filas_grupos
+
+
+def test_envolventes_degeneradas_sin_geometria():
+    agrupador = AgrupadorStreaming({"envolvente": EnvolventeConvexa(), "conteo": Conteo()})
+    grupos = {
+        "uno": [(1.0, 1.0), (1.0, 1.0)],
+        "dos": [(0.0, 0.0), (3.0, 3.0)],
+        "alineados": [(0.0, 0.0), (1.0, 1.0), (2.0, 2.0), (3.0, 3.0)],
+        "triangulo": [(0.0, 0.0), (4.0, 0.0), (0.0, 3.0), (1.0, 1.0)],
+    }
+    for clave, puntos in grupos.items():
+        for x, y in puntos:
+            agrupador.acumular(clave, x, y)
+
+    filas = {valores[0]: wkt for wkt, valores in filas_grupos(agrupador, "envolvente")}
+
+    assert filas["uno"] is None
+    assert filas["dos"] is None
+    assert filas["alineados"] is None
+    assert filas["triangulo"] == "POLYGON((0.0 0.0, 4.0 0.0, 0.0 3.0, 0.0 0.0))"
+    assert agrupador.sin_geometria == 3
@@ -0,0 +1,99 @@
+"""Recogida de fids y escritura por bloques de la asignación en segundo plano (sin QGIS)."""
+
+import pytest
+
+from comun.asignacion import RecogidaFids, aplicar_bloques
+
+
+def test_recogida_en_bloques():
+    recogida = RecogidaFids(total=10, tam_bloque=4, cada=2)
+    porcentajes = []
+
+    assert recogida.ejecutar(range(10), porcentajes.append) is True
+    assert recogida.bloques == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+    assert recogida.cantidad == 10
+    assert not recogida.cancelada
+    assert porcentajes == [20, 40, 60, 80, 100]
+
+
+def test_recogida_vacia():
+    recogida = RecogidaFids(total=0)
+    assert recogida.ejecutar(iter(())) is True
+    assert recogida.bloques == []
+
+
+def test_recogida_cancelada():
+    consultas = []
+
+    def cancelado():
+        consultas.append(True)
+        return len(consultas) >= 2
+
+    recogida = RecogidaFids(total=100, tam_bloque=10, cada=5)
+    assert recogida.ejecutar(range(100), cancelado=cancelado) is False
+    assert recogida.cancelada
+    # Se detiene en la segunda comprobación, sin recorrer el resto
+    assert recogida.cantidad == 10
+    assert len(consultas) == 2
+
+
+def test_recogida_sin_total_conocido():
+    porcentajes = []
+    recogida = RecogidaFids(total=None, tam_bloque=3, cada=1)
+    assert recogida.ejecutar([7, 8], porcentajes.append) is True
+    assert recogida.bloques == [[7, 8]]
+    assert porcentajes[-1] == 100
+
+
+class _Campo:
+    def __init__(self, tipo):
+        self._tipo = tipo
+
+    def type(self):
+        return self._tipo
+
+    def name(self):
+        return "campo"
+
+    def typeName(self):
+        return "integer"
+
+
+class _Campos:
+    def __init__(self, tipo):
+        self._campo = _Campo(tipo)
+
+    def field(self, idx):
+        return self._campo
+
+
+class _CapaEnEdicion:
+    """Lo que usa `EscritorAtributos` de una capa en modo edición."""
+
+    def __init__(self, tipo):
+        self._campos = _Campos(tipo)
+        self.cambios = {}
+
+    def fields(self):
+        return self._campos
+
+    def isEditable(self):
+        return True
+
+    def changeAttributeValues(self, fid, valores):
+        self.cambios[fid] = valores
+
+    def triggerRepaint(self):
+        pass
+
+
+def test_aplicar_bloques_en_edicion():
+    QtCore = pytest.importorskip("PyQt5.QtCore")
+    capa = _CapaEnEdicion(QtCore.QVariant.Int)
+    porcentajes = []
+
+    escritor = aplicar_bloques(capa, 0, "12.0", [[1, 2], [3]], porcentajes.append)
+
+    assert capa.cambios == {1: {0: 12}, 2: {0: 12}, 3: {0: 12}}
+    assert escritor.entidades == 3
+    assert porcentajes == [50, 100]
@@ -0,0 +1,42 @@
+"""Caché de índices en disco (sin QGIS)."""
+
+import os
+
+import numpy as np
+
+from comun.cache_indices import CacheIndices
+
+
+def _arrays():
+    valores = np.empty(3, dtype=object)
+    valores[:] = ["a", None, "c"]
+    return {"cajas": np.arange(12, dtype=np.float64).reshape(3, 4), "valores": valores}
+
+
+def test_guardar_y_obtener_sin_pickle(tmp_path):
+    cache = CacheIndices(str(tmp_path))
+    cache.guardar("fuente", "clave", _arrays())
+
+    arrays = cache.obtener("clave")
+    np.testing.assert_array_equal(arrays["cajas"], _arrays()["cajas"])
+    assert arrays["valores"].tolist() == ["a", None, "c"]
+
+
+def test_entrada_truncada_es_un_fallo_y_se_reconstruye(tmp_path):
+    cache = CacheIndices(str(tmp_path))
+    cache.guardar("fuente", "clave", _arrays())
+    ruta = os.path.join(str(tmp_path), "clave", "valores.npy")
+    with open(ruta, "r+b") as fichero:
+        fichero.truncate(os.path.getsize(ruta) // 2)
+
+    assert cache.obtener("clave") is None
+    cache.guardar("fuente", "clave", _arrays())
+    assert cache.obtener("clave")["valores"].tolist() == ["a", None, "c"]
+
+
+def test_objetos_mezclados_no_se_guardan(tmp_path):
+    cache = CacheIndices(str(tmp_path))
+    valores = np.empty(2, dtype=object)
+    valores[:] = [1, "b"]
+    cache.guardar("fuente", "clave", {"valores": valores})
+    assert cache.obtener("clave") is None
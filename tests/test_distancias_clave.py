@@ -0,0 +1,17 @@
+"""Distancias por clave con orígenes sin geometría (sin QGIS)."""
+
+from comun.distancias_clave import distancias_por_clave
+from comun.memoria import CapaMemoria
+
+
+def test_origenes_sin_geometria_se_saltan():
+    origen = CapaMemoria("Point", ["clave"])
+    origen.añadir((0.0, 0.0), ("A",))
+    origen.añadir(None, ("A",))
+    destino = CapaMemoria("Point", ["clave"])
+    destino.añadir((3.0, 4.0), ("A",))
+
+    for procesos in (1, 2):
+        distancias, sin_coincidencia = distancias_por_clave(origen, destino, "clave", max_procesos=procesos)
+        assert distancias == {0: 5.0}
+        assert sin_coincidencia == []
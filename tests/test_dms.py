@@ -0,0 +1,37 @@
+"""Ida y vuelta decimal -> DMS -> decimal con la lectura de `comun/dms.py` (sin QGIS)."""
+
+import numpy as np
+
+from comun.dms import decimal_a_dms, dms_a_decimal, leer_textos
+from comun.memoria import CapaMemoria
+
+
+def _capa_dms(latitudes, longitudes):
+    textos = {"lat_dms": decimal_a_dms(np.asarray(latitudes)), "lon_dms": decimal_a_dms(np.asarray(longitudes))}
+    return CapaMemoria.desde_puntos(longitudes, latitudes, textos)
+
+
+def test_ida_y_vuelta_dms_a_decimal():
+    rng = np.random.default_rng(0)
+    signos = rng.choice([-1.0, 1.0], (2, 200))
+    # Entre -1 y 0 el formato heredado del script original pierde el signo ("-0" se escribe "0")
+    latitudes = signos[0] * rng.uniform(1, 90, 200)
+    longitudes = signos[1] * rng.uniform(1, 180, 200)
+    capa = _capa_dms(latitudes, longitudes)
+
+    fids, columnas = leer_textos(capa, ["lat_dms", "lon_dms"])
+
+    assert fids.tolist() == list(range(200))
+    np.testing.assert_allclose(dms_a_decimal(columnas["lat_dms"]), latitudes, atol=1e-4)
+    np.testing.assert_allclose(dms_a_decimal(columnas["lon_dms"]), longitudes, atol=1e-4)
+
+
+def test_leer_textos_con_fids_no_modifica_la_lista():
+    capa = _capa_dms([40.5, -33.25, 10.0], [-3.7, 151.2, 0.0])
+    pedidos = [2, 0]
+
+    fids, columnas = leer_textos(capa, ["lat_dms"], pedidos)
+
+    assert pedidos == [2, 0]
+    assert sorted(fids.tolist()) == [0, 2]
+    assert len(columnas["lat_dms"]) == 2
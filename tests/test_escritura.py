@@ -0,0 +1,26 @@
+"""Conversión de valores al tipo de los campos (sin QGIS)."""
+
+import pytest
+
+from comun.escritura import _a_booleano, _a_entero
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("true", True), ("false", False), ("1", True), ("0", False),
+    (" Sí ", True), ("no", False), ("FALSE", False),
+])
+def test_booleanos_desde_texto(texto, esperado):
+    assert _a_booleano(texto) is esperado
+
+
+def test_booleano_texto_desconocido():
+    with pytest.raises(ValueError):
+        _a_booleano("quizá")
+
+
+def test_enteros_desde_texto():
+    assert _a_entero("12") == 12
+    assert _a_entero(" 12.0 ") == 12
+    assert _a_entero(7.0) == 7
+    with pytest.raises(ValueError):
+        _a_entero("12.5")
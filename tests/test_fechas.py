@@ -0,0 +1,32 @@
+"""Conversión de epoch a fecha (sin QGIS)."""
+
+import time
+
+import numpy as np
+
+from comun import fechas
+from comun.fechas import convertir_fechas, epoch_a_datetime64
+
+
+def test_epoch_utc():
+    resultado = epoch_a_datetime64([0, 1_700_000_000_000], unidad="ms", hora_local=False)
+    assert resultado.tolist()[0].isoformat() == "1970-01-01T00:00:00"
+    assert resultado.tolist()[1].isoformat() == "2023-11-14T22:13:20"
+
+
+def test_hora_local_no_disponible_queda_sin_interpretar(monkeypatch):
+    # Como `time.localtime` en Windows: error antes de 1970
+    localtime = time.localtime
+
+    def localtime_windows(segundos):
+        if segundos < 0:
+            raise OSError(22, "Invalid argument")
+        return localtime(segundos)
+
+    monkeypatch.setattr(fechas.time, "localtime", localtime_windows)
+    valores = [-86_400, 1_700_000_000, None, "-1"]
+    convertidas, (_, es_numero, _, nulos) = convertir_fechas(valores)
+
+    assert np.isnat(convertidas).tolist() == [True, False, True, True]
+    assert es_numero.tolist() == [True, True, False, True]
+    assert nulos.tolist() == [False, False, True, False]
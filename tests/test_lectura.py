@@ -0,0 +1,66 @@
+"""Lectura mínima de entidades sobre `CapaMemoria` (sin QGIS)."""
+
+import numpy as np
+import pytest
+
+from comun.lectura import leer_columnas, leer_filas
+from comun.memoria import CapaMemoria
+
+
+def _capa():
+    capa = CapaMemoria("Polygon", ["nombre", "valor"])
+    capa.añadir([(0.0, 0.0), (2.0, 0.0), (2.0, 2.0), (0.0, 2.0)], ("a", 1))
+    capa.añadir(None, ("b", None))
+    capa.añadir([(10.0, 10.0), (14.0, 10.0), (14.0, 12.0), (10.0, 12.0)], ("c", 3))
+    return capa
+
+
+def test_subconjunto_de_campos_sin_geometria():
+    # Sin geometría (NoGeometry) se devuelven también las entidades sin ella
+    assert list(leer_filas(_capa(), ["valor"])) == [(0, 1), (1, None), (2, 3)]
+    assert list(leer_filas(_capa())) == [(0,), (1,), (2,)]
+
+
+def test_geometrias_vacias():
+    assert list(leer_filas(_capa(), ["nombre"], "centroide")) == [(0, 1.0, 1.0, "a"), (2, 12.0, 11.0, "c")]
+
+    filas = list(leer_filas(_capa(), geometria="caja", omitir_vacias=False))
+    assert filas[0] == (0, 0.0, 0.0, 2.0, 2.0)
+    assert filas[1][0] == 1 and all(np.isnan(filas[1][1:]))
+    assert list(leer_filas(_capa(), geometria="geometria", omitir_vacias=False))[1] == (1, None)
+
+
+def test_filtros_por_caja_fids_y_expresion():
+    capa = _capa()
+    assert [fila[0] for fila in leer_filas(capa, geometria="caja", rect=(9.0, 9.0, 20.0, 20.0))] == [2]
+    assert list(leer_filas(capa, ["nombre"], fids=[2, 1])) == [(1, "b"), (2, "c")]
+    assert list(leer_filas(capa, ["nombre"], expresion=lambda fila: fila["valor"] == 1)) == [(0, "a")]
+    with pytest.raises(ValueError):
+        list(leer_filas(capa, fids=[0], expresion=lambda fila: True))
+
+
+def test_campos_o_geometria_desconocidos():
+    with pytest.raises(ValueError):
+        list(leer_filas(_capa(), ["no_existe"]))
+    with pytest.raises(ValueError):
+        list(leer_filas(_capa(), geometria="linea"))
+
+
+def test_leer_columnas():
+    datos = leer_columnas(_capa(), ["valor"], "centroide", tipos={"valor": np.float64})
+    assert datos.dtype.names == ("fid", "x", "y", "valor")
+    assert datos["fid"].tolist() == [0, 2]
+    assert datos["x"].tolist() == [1.0, 12.0]
+    assert datos["valor"].tolist() == [1.0, 3.0]
+
+    objetos = leer_columnas(_capa(), ["valor"])
+    assert objetos["valor"].dtype == object
+    assert objetos["valor"].tolist() == [1, None, 3]
+    # Los nulos en campos float quedan como NaN
+    assert np.isnan(leer_columnas(_capa(), ["valor"], tipos={"valor": np.float64})["valor"][1])
+
+
+def test_leer_columnas_vacia():
+    datos = leer_columnas(CapaMemoria("Point", ["valor"]), ["valor"], "punto")
+    assert len(datos) == 0
+    assert datos.dtype.names == ("fid", "x", "y", "valor")
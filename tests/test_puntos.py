@@ -0,0 +1,43 @@
+"""Almacén de puntos por columnas (sin QGIS)."""
+
+import datetime
+
+import numpy as np
+
+from comun.memoria import CapaMemoria
+from comun.puntos import AlmacenPuntos
+
+
+def _capa_puntos():
+    capa = CapaMemoria("Point", ["entero", "real", "texto", "fecha", "mezcla"])
+    capa.añadir((1.0, 2.0), (10, 1.5, "a", datetime.date(2024, 1, 31), 1))
+    capa.añadir(None, (20, 2.5, "b", None, "x"))
+    capa.añadir((3.0, 4.0), (None, None, None, datetime.date(2024, 2, 1), None))
+    capa.añadir((5.0, 6.0), (30, 3.5, "c", None, 2.5))
+    return capa
+
+
+def test_desde_capa_columnas_contiguas():
+    almacen = AlmacenPuntos.desde_capa(_capa_puntos(), ["entero", "texto"], tam_lote=2)
+
+    assert almacen.fid.tolist() == [0, 2, 3]
+    assert almacen.x.tolist() == [1.0, 3.0, 5.0]
+    assert almacen.y.tolist() == [2.0, 4.0, 6.0]
+    assert almacen.columnas["entero"].tolist() == [10, None, 30]
+    for valores in (almacen.fid, almacen.x, almacen.y, *almacen.columnas.values()):
+        assert valores.flags.c_contiguous and valores.flags.owndata
+
+
+def test_guardar_y_abrir_conserva_los_tipos(tmp_path):
+    campos = ["entero", "real", "texto", "fecha", "mezcla"]
+    almacen = AlmacenPuntos.desde_capa(_capa_puntos(), campos)
+    almacen.guardar(tmp_path)
+
+    for mmap in (True, False):
+        abierto = AlmacenPuntos.abrir(tmp_path, mmap=mmap)
+        np.testing.assert_array_equal(abierto.fid, almacen.fid)
+        np.testing.assert_array_equal(abierto.x, almacen.x)
+        for campo in campos:
+            assert abierto.columnas[campo].tolist() == almacen.columnas[campo].tolist()
+            tipos = [type(v) for v in abierto.columnas[campo].tolist()]
+            assert tipos == [type(v) for v in almacen.columnas[campo].tolist()]
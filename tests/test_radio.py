@@ -0,0 +1,18 @@
+"""Selección en radio sin el buffer de QGIS (sin QGIS)."""
+
+from comun.memoria import CapaMemoria
+from comun.radio import seleccionar_en_radio
+
+
+def test_circulo_exacto_usa_los_vertices():
+    capa = CapaMemoria("Polygon", [])
+    # Dentro del círculo, pero las esquinas de su caja quedan fuera
+    capa.añadir([(9.5, 0.0), (0.0, 9.5), (-9.5, 0.0), (0.0, -9.5)], ())
+    # Un vértice fuera del círculo
+    capa.añadir([(0.0, 0.0), (11.0, 0.0), (0.0, 1.0)], ())
+    # Lejos
+    capa.añadir([(50.0, 50.0), (51.0, 50.0), (50.0, 51.0)], ())
+    centros = CapaMemoria("Point", [])
+    centros.añadir((0.0, 0.0), ())
+
+    assert seleccionar_en_radio(capa, centros, 10.0, exacto=False).tolist() == [0]